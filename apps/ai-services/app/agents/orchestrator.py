@@ -4,11 +4,13 @@ Multi-agent system using LangGraph for stateful healthcare AI workflows.
 Each agent has specialized tools, memory, and HIPAA-compliant guardrails.
 """
 
+import asyncio
+import re
+import time
 import structlog
-from typing import TypedDict, Annotated, Sequence, Literal
+from typing import AsyncIterator, TypedDict, Annotated, Sequence, Literal
 from datetime import datetime
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, END
@@ -16,6 +18,14 @@ from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import MemorySaver
 
 from app.config import settings
+from app.services.coding.embeddings import get_code_retriever
+from app.services.llm_gateway import input_token_split, llm_gateway
+from app.services.model_tiering import TierChoice, model_tiering
+from app.services.member_context import get_claim, get_eligibility, get_prior_auth
+from app.services.metrics import timed, timed_stage
+from app.services.phi import phi_scanner
+from app.services.prompt_cache import prompt_cache
+from app.services.tracing import span, traced
 
 logger = structlog.get_logger()
 
@@ -45,33 +55,18 @@ class AgentState(TypedDict):
 # ═══════════════════════════════════════════════════════
 
 @tool
-def check_member_eligibility(member_id: str, service_date: str = "") -> dict:
+async def check_member_eligibility(member_id: str, service_date: str = "") -> dict:
     """Check if a member is eligible for coverage on a given date.
     Returns eligibility status, plan info, and benefit details."""
-    # In production, this calls the NestJS Eligibility API
-    return {
-        "eligible": True,
-        "member_id": member_id,
-        "plan": "Blue PPO Gold",
-        "status": "active",
-        "effective_date": "2024-01-01",
-        "deductible_remaining": 850.00,
-        "oop_remaining": 4200.00,
-        "note": "Integration point: calls /api/v1/eligibility/verify",
-    }
+    # In production, this calls the NestJS Eligibility API (prefetched at voice call start)
+    return await get_eligibility(member_id)
 
 
 @tool
-def lookup_claim_status(claim_number: str) -> dict:
+async def lookup_claim_status(claim_number: str) -> dict:
     """Look up the current status of a claim by claim number.
     Returns claim status, dates, amounts, and processing notes."""
-    return {
-        "claim_number": claim_number,
-        "status": "in_review",
-        "received_date": "2024-01-15",
-        "total_charged": 1250.00,
-        "note": "Integration point: calls /api/v1/claims/:id",
-    }
+    return await get_claim(claim_number)
 
 
 @tool
@@ -89,36 +84,23 @@ def search_providers(specialty: str, zip_code: str = "", network: str = "in_netw
 
 
 @tool
-def check_prior_auth_status(auth_number: str) -> dict:
+async def check_prior_auth_status(auth_number: str) -> dict:
     """Check the status of a prior authorization request."""
-    return {
-        "auth_number": auth_number,
-        "status": "approved",
-        "approved_units": 10,
-        "expiration_date": "2024-06-30",
-        "note": "Integration point: calls /api/v1/prior-auth/:id",
-    }
+    return await get_prior_auth(auth_number)
 
 
 @tool
-def suggest_icd10_codes(clinical_description: str) -> list[dict]:
+async def suggest_icd10_codes(clinical_description: str) -> list[dict]:
     """Suggest ICD-10 diagnosis codes based on a clinical description.
-    Uses AI to map symptoms/conditions to standardized codes."""
-    return [
-        {"code": "M54.5", "description": "Low back pain", "confidence": 0.95},
-        {"code": "M54.2", "description": "Cervicalgia", "confidence": 0.72},
-        {"code": "G89.29", "description": "Other chronic pain", "confidence": 0.65},
-    ]
+    Matches the ICD-10-CM code set lexically and semantically."""
+    return await asyncio.to_thread(get_code_retriever().suggest, clinical_description, system="icd10cm")
 
 
 @tool
-def suggest_cpt_codes(procedure_description: str) -> list[dict]:
+async def suggest_cpt_codes(procedure_description: str) -> list[dict]:
     """Suggest CPT procedure codes based on a procedure description.
-    Uses AI to identify the most appropriate billing codes."""
-    return [
-        {"code": "99213", "description": "Office visit, established patient, low complexity", "confidence": 0.90},
-        {"code": "99214", "description": "Office visit, established patient, moderate complexity", "confidence": 0.75},
-    ]
+    Matches the CPT code set to find the most appropriate billing codes."""
+    return await asyncio.to_thread(get_code_retriever().suggest, procedure_description, system="cpt")
 
 
 @tool
@@ -271,9 +253,11 @@ If unclear, default to "member_service".
 """
 
 
+@traced("route_intent")
+@timed_stage("intent_routing")
 async def route_intent(message: str) -> str:
     """Route user message to the appropriate specialized agent."""
-    if not settings.gemini_api_key:
+    if not llm_gateway.available:
         # Fallback keyword-based routing
         message_lower = message.lower()
         if any(kw in message_lower for kw in ["claim", "adjudic", "payment", "remit", "eob"]):
@@ -288,15 +272,11 @@ async def route_intent(message: str) -> str:
             return "member_service"
 
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=settings.default_model,
-            google_api_key=settings.gemini_api_key,
-            temperature=0,
-        )
-        response = await llm.ainvoke([
+        response = await llm_gateway.invoke([
             SystemMessage(content=ROUTER_SYSTEM),
             HumanMessage(content=message),
-        ])
+        ], model=model_tiering.fast_model, temperature=0,
+            cached_content=prompt_cache.lookup("router", model_tiering.fast_model, ROUTER_SYSTEM))
         agent_type = response.content.strip().lower()
         valid_agents = ["claims", "member_service", "prior_auth", "coding", "compliance"]
         return agent_type if agent_type in valid_agents else "member_service"
@@ -343,62 +323,43 @@ class AgentOrchestrator:
             org_id=organization_id,
         )
 
-        config = get_agent_config(agent_type)
-
-        # Build conversation history
-        conv_key = conversation_id or f"{user_id}:{agent_type}"
-        history = self.conversations.get(conv_key, [])
+        config, conv_key, history, messages = self._prepare_messages(
+            message, user_id, agent_type, conversation_id,
+        )
 
-        messages = [SystemMessage(content=config["system_prompt"])]
-        messages.extend(history[-20:])  # Keep last 20 messages for context
-        messages.append(HumanMessage(content=message))
+        usage = {
+            "model": config["model"],
+            "prompt_cache": None,
+            "cached_input_tokens": 0,
+            "uncached_input_tokens": 0,
+            "llm_time_ms": 0,
+            "cost_usd": 0.0,
+        }
 
         try:
-            if settings.gemini_api_key:
-                llm = ChatGoogleGenerativeAI(
-                    model=config["model"],
-                    google_api_key=settings.gemini_api_key,
-                    temperature=0.3,
+            if llm_gateway.available:
+                choice = model_tiering.choose(agent_type, message, config["tools"])
+                model_tiering.record_turn(choice)
+                response, tool_results = await self._answer(config, agent_type, choice, list(messages), usage)
+
+                # Check the small model's answer; re-run the turn on the large model if it falls short
+                confidence = model_tiering.confidence(message, response, bool(tool_results), config["tools"])
+                if model_tiering.should_escalate(choice, confidence):
+                    logger.info("Escalating to large model", agent_type=agent_type, confidence=confidence)
+                    choice = model_tiering.escalate(choice)
+                    response, tool_results = await self._answer(config, agent_type, choice, list(messages), usage)
+
+                usage.update(
+                    model=choice.model,
+                    model_tier=choice.tier,
+                    tier_reasons=choice.reasons,
+                    escalated="escalated" in choice.reasons,
                 )
-
-                if config["tools"]:
-                    llm_with_tools = llm.bind_tools(config["tools"])
-                    response = await llm_with_tools.ainvoke(messages)
-
-                    # Handle tool calls
-                    tool_results = []
-                    if hasattr(response, 'tool_calls') and response.tool_calls:
-                        for tc in response.tool_calls:
-                            tool_fn = next(
-                                (t for t in config["tools"] if t.name == tc["name"]),
-                                None
-                            )
-                            if tool_fn:
-                                result = tool_fn.invoke(tc["args"])
-                                tool_results.append({
-                                    "tool": tc["name"],
-                                    "args": tc["args"],
-                                    "result": result,
-                                })
-
-                        # Get final response with tool results
-                        messages.append(response)
-                        for tr in tool_results:
-                            messages.append(HumanMessage(
-                                content=f"Tool '{tr['tool']}' returned: {tr['result']}"
-                            ))
-                        response = await llm.ainvoke(messages)
-                else:
-                    response = await llm.ainvoke(messages)
-
+                usage["cost_usd"] = round(usage["cost_usd"], 6)
                 response_text = response.content
             else:
                 # Fallback response when no API key
-                response_text = (
-                    f"[{agent_type.upper()} Agent] I received your message: '{message}'. "
-                    f"AI services are not configured yet (no API key). "
-                    f"Once configured, I can help with healthcare queries using specialized tools."
-                )
+                response_text = self._fallback_response(message, agent_type)
                 tool_results = []
 
             # Store in conversation history
@@ -406,6 +367,11 @@ class AgentOrchestrator:
             history.append(AIMessage(content=response_text))
             self.conversations[conv_key] = history
 
+            # PHI detection over both sides of the exchange (for audit / HITL guardrails)
+            phi_kinds = sorted({
+                span.kind for text in (message, response_text) for span in phi_scanner.scan(text)
+            })
+
             elapsed_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
 
             return {
@@ -417,8 +383,10 @@ class AgentOrchestrator:
                 "requires_hitl": False,
                 "processing_time_ms": round(elapsed_ms),
                 "metadata": {
-                    "model": config["model"],
                     "message_count": len(history),
+                    "phi_detected": bool(phi_kinds),
+                    "phi_kinds": phi_kinds,
+                    **usage,
                 },
             }
 
@@ -433,6 +401,171 @@ class AgentOrchestrator:
                 "hitl_reason": "Agent processing error",
             }
 
+    async def stream_message(
+        self,
+        message: str,
+        organization_id: str,
+        user_id: str,
+        user_role: str,
+        conversation_id: str | None = None,
+        agent_type: str | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Process a user message like `process_message`, yielding the response text
+        as the model generates it (used by the voice pipeline to start speaking
+        before the full answer exists). Tool calls are collected from the streamed
+        chunks, executed, and the final answer is streamed as well. Cancelling the
+        consumer aborts the in-flight model request.
+        """
+        if not agent_type:
+            agent_type = await route_intent(message)
+
+        logger.info(
+            "Streaming message",
+            agent_type=agent_type,
+            user_id=user_id,
+            org_id=organization_id,
+        )
+
+        config, conv_key, history, messages = self._prepare_messages(
+            message, user_id, agent_type, conversation_id,
+        )
+        parts: list[str] = []
+
+        try:
+            if llm_gateway.available:
+                # Spoken as it streams, so the answer can't be checked and escalated afterwards
+                choice = model_tiering.choose(agent_type, message, config["tools"])
+                model_tiering.record_turn(choice)
+                cached_content = prompt_cache.lookup(agent_type, choice.model, config["system_prompt"], config["tools"])
+                start = time.perf_counter()
+                response = None
+                async for chunk in llm_gateway.stream(
+                    messages, model=choice.model, temperature=0.3, tools=config["tools"],
+                    cached_content=cached_content,
+                ):
+                    response = chunk if response is None else response + chunk
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+                model_tiering.record(choice.tier, choice.model, response, time.perf_counter() - start)
+
+                if response is not None and getattr(response, "tool_calls", None):
+                    await self._run_tool_calls(config["tools"], response, messages)
+                    start = time.perf_counter()
+                    response = None
+                    async for chunk in llm_gateway.stream(
+                        messages, model=choice.model, temperature=0.3, cached_content=cached_content,
+                    ):
+                        response = chunk if response is None else response + chunk
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield chunk.content
+                    model_tiering.record(choice.tier, choice.model, response, time.perf_counter() - start)
+            else:
+                for token in re.findall(r"\S+\s*", self._fallback_response(message, agent_type)):
+                    parts.append(token)
+                    yield token
+
+        except Exception as e:
+            logger.error("Agent streaming failed", error=str(e), agent_type=agent_type)
+            if not parts:
+                error_text = "I encountered an error processing your request. Please try again or contact support."
+                parts.append(error_text)
+                yield error_text
+
+        finally:
+            # Also runs when the consumer cancels (barge-in): keep what was said so far
+            history.append(HumanMessage(content=message))
+            history.append(AIMessage(content="".join(parts)))
+            self.conversations[conv_key] = history
+
+    def _prepare_messages(
+        self,
+        message: str,
+        user_id: str,
+        agent_type: str,
+        conversation_id: str | None,
+    ) -> tuple[dict, str, list, list[BaseMessage]]:
+        """Agent config, conversation key/history and the prompt messages for one turn."""
+        config = get_agent_config(agent_type)
+
+        # Build conversation history
+        conv_key = conversation_id or f"{user_id}:{agent_type}"
+        history = self.conversations.get(conv_key, [])
+
+        messages = [SystemMessage(content=config["system_prompt"])]
+        messages.extend(history[-20:])  # Keep last 20 messages for context
+        messages.append(HumanMessage(content=message))
+        return config, conv_key, history, messages
+
+    async def _answer(
+        self,
+        config: dict,
+        agent_type: str,
+        choice: TierChoice,
+        messages: list[BaseMessage],
+        usage: dict,
+    ) -> tuple[AIMessage, list[dict]]:
+        """The chosen tier's answer to the prompt messages, running any tool calls it makes."""
+        cached_content = prompt_cache.lookup(agent_type, choice.model, config["system_prompt"], config["tools"])
+        usage["prompt_cache"] = "hit" if cached_content else "miss"
+
+        async def invoke(tools: list) -> AIMessage:
+            start = time.perf_counter()
+            response = await llm_gateway.invoke(
+                messages, model=choice.model, temperature=0.3, tools=tools, cached_content=cached_content,
+            )
+            elapsed = time.perf_counter() - start
+            cached, uncached = input_token_split(response)
+            usage["cached_input_tokens"] += cached
+            usage["uncached_input_tokens"] += uncached
+            usage["llm_time_ms"] += round(elapsed * 1000)
+            usage["cost_usd"] += model_tiering.record(choice.tier, choice.model, response, elapsed)
+            return response
+
+        response = await invoke(config["tools"])
+        tool_results = []
+        if config["tools"] and getattr(response, "tool_calls", None):
+            tool_results = await self._run_tool_calls(config["tools"], response, messages)
+            response = await invoke([])
+        return response, tool_results
+
+    @staticmethod
+    async def _run_tool_calls(tools: list, response: AIMessage, messages: list[BaseMessage]) -> list[dict]:
+        """Execute the model's tool calls and append the results to the prompt messages."""
+        tool_results = []
+        for tc in response.tool_calls:
+            tool_fn = next(
+                (t for t in tools if t.name == tc["name"]),
+                None
+            )
+            if tool_fn:
+                with span("tool_call", tool=tc["name"]), timed("tool_call", tc["name"]):
+                    result = await tool_fn.ainvoke(tc["args"])
+                tool_results.append({
+                    "tool": tc["name"],
+                    "args": tc["args"],
+                    "result": result,
+                })
+
+        # Get final response with tool results
+        messages.append(response)
+        for tr in tool_results:
+            messages.append(HumanMessage(
+                content=f"Tool '{tr['tool']}' returned: {tr['result']}"
+            ))
+        return tool_results
+
+    @staticmethod
+    def _fallback_response(message: str, agent_type: str) -> str:
+        """Response used when no API key is configured."""
+        return (
+            f"[{agent_type.upper()} Agent] I received your message: '{message}'. "
+            f"AI services are not configured yet (no API key). "
+            f"Once configured, I can help with healthcare queries using specialized tools."
+        )
+
     def clear_conversation(self, conversation_id: str):
         """Clear conversation history."""
         self.conversations.pop(conversation_id, None)
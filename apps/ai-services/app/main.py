@@ -3,13 +3,19 @@ Apex Health AI Services - FastAPI Application
 Agent orchestration, voice agents, document intelligence, and ML services.
 """
 
+import asyncio
 import structlog
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.routers import agents, voice, documents, predictions, workflows
+from app.services.coding.embeddings import get_code_retriever
+from app.services.metrics import MetricsMiddleware, loop_lag_monitor, render
+from app.services.tracing import TracingMiddleware, tracer
+from app.services.voice.campaigns import campaign_dialer
+from app.services.voice.phrases import get_phrase_cache
 
 logger = structlog.get_logger()
 
@@ -19,8 +25,17 @@ async def lifespan(app: FastAPI):
     """Application startup and shutdown."""
     logger.info("Starting Apex Health AI Services", version="1.0.0")
     # Initialize connections, load models, etc.
+    get_code_retriever()
+    # Render greetings and system phrases in the background; calls before it finishes render on first use
+    phrase_warmup = asyncio.create_task(get_phrase_cache().warm(voice.template_phrases()))
+    loop_lag_monitor.start()
+    tracer.start()
     yield
     logger.info("Shutting down Apex Health AI Services")
+    phrase_warmup.cancel()
+    await loop_lag_monitor.stop()
+    await tracer.stop()
+    await campaign_dialer.stop()
 
 
 app = FastAPI(
@@ -48,6 +63,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency histograms per route template, served at /metrics
+app.add_middleware(MetricsMiddleware)
+# Spans per request, continuing the caller's trace from its traceparent header
+app.add_middleware(TracingMiddleware)
+
 # Routers
 app.include_router(agents.router, prefix="/api/v1/agents", tags=["agents"])
 app.include_router(voice.router, prefix="/api/v1/voice", tags=["voice"])
@@ -63,3 +83,14 @@ async def health_check():
         "service": "apex-ai-services",
         "version": "1.0.0",
     }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/tracing/stats", include_in_schema=False)
+async def tracing_stats():
+    return tracer.to_dict()
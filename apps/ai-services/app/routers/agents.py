@@ -8,6 +8,9 @@ from pydantic import BaseModel, Field
 from typing import Optional
 
 from app.agents.orchestrator import orchestrator
+from app.services.llm_gateway import llm_gateway
+from app.services.model_tiering import model_tiering
+from app.services.prompt_cache import prompt_cache
 
 router = APIRouter()
 
@@ -103,3 +106,9 @@ async def list_agents():
             },
         ]
     }
+
+
+@router.get("/llm/stats")
+async def llm_gateway_stats():
+    """LLM gateway counters, prompt cache use, and per model tier latency, escalations and cost."""
+    return {**llm_gateway.to_dict(), "prompt_cache": prompt_cache.to_dict(), "model_tiering": model_tiering.to_dict()}
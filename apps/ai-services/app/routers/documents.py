@@ -4,13 +4,23 @@ OCR processing, document classification, and structured data extraction
 for healthcare documents (CMS-1500, UB-04, EOBs, medical records, etc.).
 """
 
+import asyncio
+import hashlib
+import json
+import zipfile
 import structlog
+from dataclasses import dataclass
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
+from uuid import uuid4
 
 from app.config import settings
+from app.services.coding.embeddings import get_code_retriever
+from app.services.extraction import ClassificationState, FieldExtractor, classification_signals, iter_pages
+from app.services.phi import PHI_IDENTIFIER_FIELDS, names_from_fields, phi_scanner
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -30,6 +40,12 @@ class ExtractedField(BaseModel):
     page_number: int = 1
 
 
+class PHISpanResult(BaseModel):
+    start: int
+    end: int
+    kind: str
+
+
 class DocumentAnalysisResult(BaseModel):
     document_id: str
     classification: DocumentClassification
@@ -39,6 +55,7 @@ class DocumentAnalysisResult(BaseModel):
     processing_time_ms: int
     contains_phi: bool
     phi_fields: list[str] = []
+    phi_spans: list[PHISpanResult] = []
     suggested_actions: list[str] = []
 
 
@@ -125,6 +142,25 @@ DOCUMENT_SCHEMAS = {
 }
 
 
+SUGGESTED_ACTIONS = {
+    "cms_1500": [
+        "Create professional claim from extracted data",
+        "Verify member eligibility",
+        "Check prior authorization requirements",
+    ],
+    "eob": [
+        "Reconcile with existing claim",
+        "Update payment records",
+        "Generate member statement",
+    ],
+    "prior_auth_form": [
+        "Create prior authorization request",
+        "Check clinical criteria",
+        "Route to medical director review",
+    ],
+}
+
+
 @router.post("/analyze", response_model=DocumentAnalysisResult)
 async def analyze_document(
     file: UploadFile = File(...),
@@ -141,76 +177,400 @@ async def analyze_document(
     4. **PHI Detection** - Identify and flag Protected Health Information
     5. **Action Suggestions** - Recommend next steps (create claim, verify eligibility, etc.)
     """
-    start_time = datetime.utcnow()
-
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
 
     # Read file content
     content = await file.read()
-    file_size = len(content)
 
+    return await run_document_pipeline(
+        file_name=file.filename,
+        content=content,
+        content_type=file.content_type,
+        document_type_hint=document_type_hint,
+    )
+
+
+async def run_document_pipeline(
+    file_name: str,
+    content: bytes,
+    content_type: Optional[str] = None,
+    document_type_hint: Optional[str] = None,
+) -> DocumentAnalysisResult:
+    """Run the per-document analysis pipeline shared by single and batch analysis."""
+    async for event in iter_document_analysis(file_name, content, content_type, document_type_hint):
+        if event["event"] == "result":
+            return DocumentAnalysisResult(**event["result"])
+
+
+async def iter_document_analysis(
+    file_name: str,
+    content: bytes,
+    content_type: Optional[str] = None,
+    document_type_hint: Optional[str] = None,
+):
+    """
+    Incremental document analysis. Pages are extracted lazily (OCR runs in the
+    threadpool one page at a time) and every stage emits its results as soon as
+    a page is done:
+
+    - `page`: page text, extraction source and the running classification
+    - `field`: each newly extracted field with its real page number
+    - `phi`: PHI spans on that page (offsets into the full `ocr_text`)
+    - `actions`: suggested actions whenever the classification changes them
+    - `result`: the complete `DocumentAnalysisResult`
+    """
+    start_time = datetime.utcnow()
     logger.info(
         "Analyzing document",
-        filename=file.filename,
-        size=file_size,
-        content_type=file.content_type,
+        filename=file_name,
+        size=len(content),
+        content_type=content_type,
     )
 
-    # Simulated AI analysis (replace with actual Gemini Vision API call)
-    # In production: send to Gemini 2.0 with vision capabilities
-    doc_type = document_type_hint or "cms_1500"
-    schema = DOCUMENT_SCHEMAS.get(doc_type, DOCUMENT_SCHEMAS["cms_1500"])
-
-    extracted_fields = []
-    for field in schema["fields"]:
-        extracted_fields.append(ExtractedField(
-            field_name=field,
-            value=f"[Extracted from {file.filename}]",
-            confidence=0.85,
-            page_number=1,
-        ))
-
-    phi_fields = ["patient_name", "patient_dob", "insured_id", "member_id", "ssn"]
-    detected_phi = [f for f in schema["fields"] if f in phi_fields]
-
-    suggested_actions = []
-    if doc_type == "cms_1500":
-        suggested_actions = [
-            "Create professional claim from extracted data",
-            "Verify member eligibility",
-            "Check prior authorization requirements",
-        ]
-    elif doc_type == "eob":
-        suggested_actions = [
-            "Reconcile with existing claim",
-            "Update payment records",
-            "Generate member statement",
-        ]
-    elif doc_type == "prior_auth_form":
-        suggested_actions = [
-            "Create prior authorization request",
-            "Check clinical criteria",
-            "Route to medical director review",
+    hinted_schema = DOCUMENT_SCHEMAS.get(document_type_hint or "")
+    # Without a hint the type is only known once pages are read, so look for every schema's fields
+    fields = hinted_schema["fields"] if hinted_schema else list(dict.fromkeys(
+        name for schema in DOCUMENT_SCHEMAS.values() for name in schema["fields"]
+    ))
+    extractor = FieldExtractor(fields)
+    classification = ClassificationState()
+
+    pages = iter_pages(content, content_type)
+    page_texts: list[str] = []
+    offset = 0
+    extracted_fields: list[ExtractedField] = []
+    field_values: list[tuple[str, str]] = []
+    detected_phi: list[str] = []
+    phi_spans: list[PHISpanResult] = []
+    suggested_actions: list[str] = []
+
+    def current_classification() -> DocumentClassification:
+        if hinted_schema:
+            category, confidence = document_type_hint, 0.92
+        else:
+            category, confidence = classification.best()
+        return DocumentClassification(
+            category=category,
+            confidence=confidence,
+            subcategory=DOCUMENT_SCHEMAS[category]["name"],
+        )
+
+    while (page := await asyncio.to_thread(next, pages, None)) is not None:
+        classification.update(classification_signals(page.text))
+        doc_class = current_classification()
+        yield {
+            "event": "page",
+            "page_number": page.page_number,
+            "source": page.source,
+            "text": page.text,
+            "classification": doc_class.model_dump(),
+        }
+
+        for candidate in extractor.extract(page):
+            extracted = ExtractedField(
+                field_name=candidate.field_name,
+                value=candidate.value,
+                confidence=candidate.confidence,
+                page_number=candidate.page_number,
+            )
+            extracted_fields.append(extracted)
+            field_values.append((extracted.field_name, extracted.value))
+            if extracted.field_name not in detected_phi and (
+                extracted.field_name in PHI_IDENTIFIER_FIELDS or phi_scanner.scan(extracted.value)
+            ):
+                detected_phi.append(extracted.field_name)
+            yield {"event": "field", **extracted.model_dump()}
+
+        # Names extracted so far (including this page) act as the PHI name dictionary
+        page_spans = [
+            PHISpanResult(start=span.start + offset, end=span.end + offset, kind=span.kind)
+            for span in phi_scanner.scan(page.text, names=names_from_fields(field_values))
         ]
+        if page_spans:
+            phi_spans.extend(page_spans)
+            yield {
+                "event": "phi",
+                "page_number": page.page_number,
+                "spans": [span.model_dump() for span in page_spans],
+                "phi_fields": detected_phi,
+            }
 
-    elapsed_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        actions = SUGGESTED_ACTIONS.get(doc_class.category, [])
+        if actions != suggested_actions:
+            suggested_actions = actions
+            yield {"event": "actions", "page_number": page.page_number, "suggested_actions": actions}
+
+        page_texts.append(page.text)
+        offset += len(page.text) + 1  # Pages are joined with form feeds
 
-    return DocumentAnalysisResult(
-        document_id=f"doc-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-        classification=DocumentClassification(
-            category=doc_type,
-            confidence=0.92,
-            subcategory=schema["name"],
-        ),
+    elapsed_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+    result = DocumentAnalysisResult(
+        document_id=f"doc-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid4().hex[:8]}",
+        classification=current_classification(),
         extracted_fields=extracted_fields,
-        ocr_text=f"[OCR text extracted from {file.filename} - {file_size} bytes]",
-        page_count=1,
+        ocr_text="\f".join(page_texts),
+        page_count=len(page_texts),
         processing_time_ms=elapsed_ms,
-        contains_phi=len(detected_phi) > 0,
+        contains_phi=bool(detected_phi or phi_spans),
         phi_fields=detected_phi,
+        phi_spans=phi_spans,
         suggested_actions=suggested_actions,
     )
+    yield {"event": "result", "result": result.model_dump()}
+
+
+@router.post("/analyze/stream")
+async def analyze_document_stream(
+    file: UploadFile = File(...),
+    organization_id: str = "",
+    document_type_hint: Optional[str] = None,
+):
+    """
+    Analyze a document incrementally. Streams NDJSON events (`page`, `field`,
+    `phi`, `actions`) as each page is processed, ending with a `result` event
+    that carries the same payload as `/analyze`.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+
+    content = await file.read()
+
+    async def stream():
+        async for event in iter_document_analysis(file.filename, content, file.content_type, document_type_hint):
+            yield json.dumps(event).encode() + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# ─── Batch Analysis ──
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "multipart/x-zip"}
+
+
+@dataclass
+class _BatchDocument:
+    """A single document pulled from a batch upload (plain file or zip member)."""
+    file_name: str
+    content: bytes
+    content_type: Optional[str]
+    sha256: str
+    reserved: int  # Bytes held from the batch budget until the document is done with
+
+
+class _ByteBudget:
+    """Caps the number of document bytes held in memory by an in-flight batch."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size: int):
+        async with self._condition:
+            # A single document larger than the budget is admitted on its own
+            await self._condition.wait_for(lambda: self.in_use == 0 or self.in_use + size <= self.limit)
+            self.in_use += size
+
+    async def release(self, size: int):
+        async with self._condition:
+            self.in_use -= size
+            self._condition.notify_all()
+
+
+def _is_zip_upload(file: UploadFile) -> bool:
+    return (file.content_type or "") in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def _read_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> tuple[bytes, str]:
+    """Read one archive member in chunks, hashing as it streams."""
+    digest = hashlib.sha256()
+    chunks = []
+    with archive.open(info) as member:
+        while chunk := member.read(1024 * 1024):
+            digest.update(chunk)
+            chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def _batch_line(file_name: str, status: str, **fields) -> bytes:
+    payload = {"file_name": file_name, "status": status, **fields}
+    return (json.dumps(payload, default=str) + "\n").encode()
+
+
+async def _iter_batch_documents(files: list[UploadFile], budget: _ByteBudget, rejected: asyncio.Queue):
+    """
+    Yield documents from the uploaded files, expanding zip archives member by member.
+    Each yielded document has already reserved `reserved` bytes from the budget.
+    Documents past the batch file limit, oversized or unreadable ones are reported
+    to `rejected` instead, and are not read once they are known to be over a limit.
+    """
+    max_bytes = settings.document_batch_max_file_bytes
+    count = 0
+
+    async def admit(name: str) -> bool:
+        nonlocal count
+        count += 1
+        if count > settings.document_batch_max_files:
+            await rejected.put(_batch_line(name, "failed", error="Batch file limit exceeded"))
+            return False
+        return True
+
+    for file in files:
+        file_name = file.filename or "unnamed"
+
+        if _is_zip_upload(file):
+            try:
+                # Reads the central directory, possibly from the spooled file on disk
+                archive = await asyncio.to_thread(zipfile.ZipFile, file.file)
+            except zipfile.BadZipFile:
+                await rejected.put(_batch_line(file_name, "failed", error="Invalid zip archive"))
+                continue
+
+            with archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    member_name = f"{file_name}/{info.filename}"
+                    if not await admit(member_name):
+                        continue
+                    if info.file_size > max_bytes:
+                        await rejected.put(_batch_line(member_name, "failed", error="File exceeds size limit"))
+                        continue
+                    await budget.acquire(info.file_size)
+                    try:
+                        content, sha256 = await asyncio.to_thread(_read_zip_member, archive, info)
+                    except Exception as e:
+                        # Bad CRC, encrypted member, unsupported compression: skip just this member
+                        await budget.release(info.file_size)
+                        logger.warning("Unreadable zip member", filename=member_name, error=str(e))
+                        await rejected.put(_batch_line(member_name, "failed", error=f"Unreadable zip member: {e}"))
+                        continue
+                    yield _BatchDocument(member_name, content, None, sha256, info.file_size)
+            continue
+
+        if not await admit(file_name):
+            continue
+        # Without a declared size, hold the most a single file may take
+        reserved = file.size if file.size is not None else max_bytes
+        if reserved > max_bytes:
+            await rejected.put(_batch_line(file_name, "failed", error="File exceeds size limit"))
+            continue
+        await budget.acquire(reserved)
+        content = await file.read()
+        if len(content) > max_bytes:
+            await budget.release(reserved)
+            await rejected.put(_batch_line(file_name, "failed", error="File exceeds size limit"))
+            continue
+        sha256 = (await asyncio.to_thread(hashlib.sha256, content)).hexdigest()
+        yield _BatchDocument(file_name, content, file.content_type, sha256, reserved)
+
+
+async def _stream_batch_results(
+    files: list[UploadFile],
+    document_type_hint: Optional[str],
+    concurrency: int,
+):
+    """
+    Fan documents out across a bounded worker pool and yield NDJSON result lines
+    in completion order. Identical files (by SHA-256) are analyzed once.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    work: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    budget = _ByteBudget(settings.document_batch_max_inflight_bytes)
+    seen: dict[str, asyncio.Future] = {}
+    duplicate_waiters: list[asyncio.Task] = []
+
+    async def worker():
+        while True:
+            doc, future = await work.get()
+            try:
+                result = await run_document_pipeline(
+                    file_name=doc.file_name,
+                    content=doc.content,
+                    content_type=doc.content_type,
+                    document_type_hint=document_type_hint,
+                )
+                future.set_result(result)
+                await results.put(_batch_line(
+                    doc.file_name, "completed", sha256=doc.sha256, result=result.model_dump(),
+                ))
+            except Exception as e:
+                logger.error("Batch document analysis failed", filename=doc.file_name, error=str(e))
+                future.set_exception(e)
+                await results.put(_batch_line(doc.file_name, "failed", sha256=doc.sha256, error=str(e)))
+            finally:
+                await budget.release(doc.reserved)
+                work.task_done()
+
+    async def report_duplicate(doc: _BatchDocument, original: asyncio.Future):
+        try:
+            result = await original
+            await results.put(_batch_line(
+                doc.file_name, "duplicate", sha256=doc.sha256, result=result.model_dump(),
+            ))
+        except Exception as e:
+            await results.put(_batch_line(doc.file_name, "failed", sha256=doc.sha256, error=str(e)))
+
+    async def produce():
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            async for doc in _iter_batch_documents(files, budget, results):
+                original = seen.get(doc.sha256)
+                if original is not None:
+                    await budget.release(doc.reserved)
+                    duplicate_waiters.append(asyncio.create_task(report_duplicate(doc, original)))
+                    continue
+
+                future = asyncio.get_running_loop().create_future()
+                # Failures are reported per line; keep unawaited futures from warning
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                seen[doc.sha256] = future
+                await work.put((doc, future))
+
+            await work.join()
+            await asyncio.gather(*duplicate_waiters)
+        finally:
+            for w in workers:
+                w.cancel()
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (line := await results.get()) is not None:
+            yield line
+        await producer
+    finally:
+        producer.cancel()
+        for waiter in duplicate_waiters:
+            waiter.cancel()
+
+
+@router.post("/analyze/batch")
+async def analyze_document_batch(
+    files: list[UploadFile] = File(...),
+    organization_id: str = "",
+    document_type_hint: Optional[str] = None,
+    concurrency: Optional[int] = None,
+):
+    """
+    Analyze a batch of healthcare documents (e.g. a mailroom scan run).
+
+    Accepts many files and/or zip archives (read member by member). Documents are
+    processed by a bounded worker pool, identical files are analyzed once, and
+    results stream back as NDJSON - one line per document as it finishes.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+
+    workers = max(1, min(concurrency or settings.document_batch_concurrency, settings.document_batch_concurrency))
+
+    logger.info("Analyzing document batch", file_count=len(files), concurrency=workers, org_id=organization_id)
+
+    return StreamingResponse(
+        _stream_batch_results(files, document_type_hint, workers),
+        media_type="application/x-ndjson",
+    )
 
 
 @router.post("/extract/cms1500", response_model=CMS1500ExtractionResult)
@@ -262,16 +622,21 @@ async def suggest_medical_codes(clinical_text: str = ""):
     if not clinical_text:
         raise HTTPException(status_code=400, detail="Clinical text is required")
 
-    # In production: use Gemini to analyze clinical text
+    retriever = get_code_retriever()
+
+    def suggest():
+        return (
+            retriever.suggest(clinical_text, system="icd10cm"),
+            retriever.suggest(clinical_text, system="cpt"),
+            retriever.suggest(clinical_text, system="hcpcs", limit=3),
+        )
+
+    # Embedding and index search are CPU-bound; keep them off the event loop
+    icd10_codes, cpt_codes, hcpcs_codes = await asyncio.to_thread(suggest)
     return {
-        "icd10_suggestions": [
-            {"code": "M54.5", "description": "Low back pain", "confidence": 0.95},
-            {"code": "M54.2", "description": "Cervicalgia", "confidence": 0.72},
-        ],
-        "cpt_suggestions": [
-            {"code": "99213", "description": "Office visit, established, low", "confidence": 0.88},
-            {"code": "97110", "description": "Therapeutic exercises", "confidence": 0.65},
-        ],
+        "icd10_suggestions": icd10_codes,
+        "cpt_suggestions": cpt_codes,
+        "hcpcs_suggestions": hcpcs_codes,
         "clinical_notes": "Based on documented symptoms and examination findings.",
     }
 
@@ -9,6 +9,8 @@ from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
+from app.services.metrics import timed
+
 logger = structlog.get_logger()
 router = APIRouter()
 
@@ -41,6 +43,36 @@ class FraudAnalysisResult(BaseModel):
     processing_time_ms: int
 
 
+def check_charge_amount(request: FraudAnalysisRequest) -> Optional[dict]:
+    """Charge reasonableness."""
+    if request.charged_amount > 50000:
+        return {
+            "type": "high_charge",
+            "description": f"Charge amount ${request.charged_amount:,.2f} exceeds $50,000 threshold",
+            "severity": "medium",
+            "score_impact": 0.15,
+        }
+    return None
+
+
+def check_billed_units(request: FraudAnalysisRequest) -> Optional[dict]:
+    if request.billed_units > 10:
+        return {
+            "type": "high_units",
+            "description": f"Billed {request.billed_units} units - above typical range",
+            "severity": "low",
+            "score_impact": 0.1,
+        }
+    return None
+
+
+# Evaluated in order; each returns a flag or None
+FRAUD_RULES = [
+    ("charge_amount", check_charge_amount),
+    ("billed_units", check_billed_units),
+]
+
+
 @router.post("/fraud/analyze", response_model=FraudAnalysisResult)
 async def analyze_fraud(request: FraudAnalysisRequest):
     """
@@ -61,25 +93,12 @@ async def analyze_fraud(request: FraudAnalysisRequest):
     flags = []
     fraud_score = 0.0
 
-    # Check charge reasonableness
-    if request.charged_amount > 50000:
-        flags.append({
-            "type": "high_charge",
-            "description": f"Charge amount ${request.charged_amount:,.2f} exceeds $50,000 threshold",
-            "severity": "medium",
-            "score_impact": 0.15,
-        })
-        fraud_score += 0.15
-
-    # Check for common fraud patterns
-    if request.billed_units > 10:
-        flags.append({
-            "type": "high_units",
-            "description": f"Billed {request.billed_units} units - above typical range",
-            "severity": "low",
-            "score_impact": 0.1,
-        })
-        fraud_score += 0.1
+    for rule_name, rule in FRAUD_RULES:
+        with timed("fraud_rule", rule_name):
+            flag = rule(request)
+        if flag:
+            flags.append(flag)
+            fraud_score += flag["score_impact"]
 
     # Determine risk level
     if fraud_score >= 0.7:
@@ -4,36 +4,51 @@ HIPAA-compliant voice agents for healthcare call centers.
 Integrates Deepgram (STT) + ElevenLabs/OpenAI (TTS) + LLM orchestration.
 """
 
+import asyncio
+import base64
+import binascii
+import json
+import time
 import structlog
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from pydantic import BaseModel, Field
+from contextlib import aclosing
 from typing import Optional
 from datetime import datetime
-from enum import Enum
 
 from app.agents.orchestrator import orchestrator
 from app.config import settings
+from app.services.member_context import bind_session, member_context, unbind_session
+from app.services.phi import phi_scanner
+from app.services.tracing import span
+from app.services.voice.analysis import get_escalation_matcher, record_sentiment_in_background
+from app.services.voice.calls import (
+    CallRecord,
+    CallStatus,
+    InvalidCallTransition,
+    VoiceAgentType,
+    get_call_store,
+    new_call_id,
+)
+from app.services.voice.campaigns import CampaignRequest, campaign_dialer
+from app.services.voice.frames import (
+    BINARY_SUBPROTOCOL,
+    CODECS,
+    FLAG_END_OF_SPEECH,
+    AudioPump,
+    FrameError,
+    pack_frame,
+    unpack_frame,
+)
+from app.services.voice.phrases import get_phrase_cache
+from app.services.voice.pipeline import CallMetrics, VoiceTurn
+from app.services.voice.stt import get_stt
+from app.services.voice.tts import get_tts
 
 logger = structlog.get_logger()
 router = APIRouter()
 
 
-class VoiceAgentType(str, Enum):
-    MEMBER_SERVICE = "member_service"
-    PROVIDER_SERVICE = "provider_service"
-    OUTREACH = "outreach"
-
-
-class CallStatus(str, Enum):
-    RINGING = "ringing"
-    CONNECTED = "connected"
-    IN_PROGRESS = "in_progress"
-    ON_HOLD = "on_hold"
-    TRANSFERRED = "transferred"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
-
 class VoiceAgentConfig(BaseModel):
     """Configuration for a voice agent."""
     agent_type: VoiceAgentType
@@ -57,28 +72,6 @@ class InitiateCallRequest(BaseModel):
     campaign_id: Optional[str] = None
 
 
-class CallRecord(BaseModel):
-    call_id: str
-    agent_type: VoiceAgentType
-    status: CallStatus
-    phone_number: str
-    organization_id: str
-    member_id: Optional[str] = None
-    started_at: str
-    ended_at: Optional[str] = None
-    duration_seconds: Optional[int] = None
-    transcript: list[dict] = []
-    sentiment_scores: list[float] = []
-    escalated: bool = False
-    escalation_reason: Optional[str] = None
-    outcome: Optional[str] = None
-    notes: Optional[str] = None
-
-
-# ─── In-memory call tracking (replace with Redis in production) ──
-active_calls: dict[str, CallRecord] = {}
-
-
 # ─── Voice Agent Templates ──
 
 VOICE_AGENT_TEMPLATES = {
@@ -117,6 +110,22 @@ VOICE_AGENT_TEMPLATES = {
 }
 
 
+# Fixed phrases spoken by every agent (rendered once per voice, see phrase audio cache)
+SYSTEM_PHRASES = {
+    "transfer": "Transferring you to a human representative. Please hold.",
+}
+
+
+def template_phrases() -> dict[str, tuple[str, str, str]]:
+    """Greetings and system phrases of every template, as {phrase_id: (text, voice_id, language)}."""
+    phrases = {}
+    for template in VOICE_AGENT_TEMPLATES.values():
+        phrases[f"greeting:{template.agent_type.value}"] = (template.greeting, template.voice_id, template.language)
+        for name, text in SYSTEM_PHRASES.items():
+            phrases[f"{name}:{template.voice_id}:{template.language}"] = (text, template.voice_id, template.language)
+    return phrases
+
+
 @router.get("/agents")
 async def list_voice_agents():
     """List available voice agent configurations."""
@@ -139,7 +148,7 @@ async def initiate_call(request: InitiateCallRequest):
     Initiate an outbound voice agent call.
     Used for member outreach, appointment reminders, care gap closure.
     """
-    call_id = f"call-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{len(active_calls) + 1:04d}"
+    call_id = new_call_id()
 
     record = CallRecord(
         call_id=call_id,
@@ -150,7 +159,10 @@ async def initiate_call(request: InitiateCallRequest):
         member_id=request.member_id,
         started_at=datetime.utcnow().isoformat(),
     )
-    active_calls[call_id] = record
+    await get_call_store().create(record)
+    if request.member_id:
+        # Eligibility, claims and prior auths are fetched while the call rings
+        member_context.prefetch(call_id, request.member_id)
 
     logger.info("Call initiated", call_id=call_id, agent_type=request.agent_type.value)
 
@@ -165,7 +177,7 @@ async def initiate_call(request: InitiateCallRequest):
 @router.get("/calls/{call_id}")
 async def get_call_status(call_id: str):
     """Get the current status of a voice call."""
-    record = active_calls.get(call_id)
+    record = await get_call_store().get(call_id)
     if not record:
         raise HTTPException(status_code=404, detail="Call not found")
     return record
@@ -174,62 +186,128 @@ async def get_call_status(call_id: str):
 @router.post("/calls/{call_id}/end")
 async def end_call(call_id: str, outcome: Optional[str] = None, notes: Optional[str] = None):
     """End a voice call and record outcome."""
-    record = active_calls.get(call_id)
+    store = get_call_store()
+    try:
+        record = await store.transition(call_id, CallStatus.COMPLETED, outcome=outcome, notes=notes)
+    except InvalidCallTransition as e:
+        if e.current != CallStatus.COMPLETED:
+            raise HTTPException(status_code=409, detail=str(e))
+        # Already completed when the caller hung up: just record the outcome
+        await store.update(call_id, outcome=outcome, notes=notes)
+        record = await store.get(call_id, with_transcript=False)
     if not record:
         raise HTTPException(status_code=404, detail="Call not found")
 
-    record.status = CallStatus.COMPLETED
-    record.ended_at = datetime.utcnow().isoformat()
-    record.outcome = outcome
-    record.notes = notes
-
-    if record.started_at:
-        start = datetime.fromisoformat(record.started_at)
-        end = datetime.fromisoformat(record.ended_at)
-        record.duration_seconds = int((end - start).total_seconds())
-
     return {"call_id": call_id, "status": "completed", "duration_seconds": record.duration_seconds}
 
 
 @router.get("/calls")
 async def list_active_calls(organization_id: Optional[str] = None):
     """List all active calls, optionally filtered by organization."""
-    calls = list(active_calls.values())
-    if organization_id:
-        calls = [c for c in calls if c.organization_id == organization_id]
+    calls = await get_call_store().list(organization_id)
     return {"calls": calls, "total": len(calls)}
 
 
+def require_dialer():
+    if not campaign_dialer.available:
+        raise HTTPException(status_code=503, detail="Outbound calling is not configured (campaign_telephony_adapter)")
+
+
+@router.post("/campaigns")
+async def start_campaign(request: CampaignRequest):
+    """
+    Start an outbound campaign for a member list. Calls are placed within the
+    members' local calling hours, under global and per-organization
+    concurrency caps; unanswered and busy calls are retried with backoff.
+    """
+    require_dialer()
+    campaign = campaign_dialer.start_campaign(request)
+    return campaign.summary()
+
+
+@router.get("/campaigns")
+async def list_campaigns(organization_id: Optional[str] = None):
+    """List outbound campaigns with their progress and throughput."""
+    require_dialer()
+    campaigns = [
+        campaign.summary()
+        for campaign in campaign_dialer.campaigns.values()
+        if organization_id is None or campaign.request.organization_id == organization_id
+    ]
+    return {"campaigns": campaigns, "total": len(campaigns)}
+
+
+@router.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    """Get campaign progress: attempts, retries, outcomes and calls per minute."""
+    require_dialer()
+    campaign = campaign_dialer.campaigns.get(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.summary()
+
+
+@router.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str):
+    """Stop dialing a campaign. Calls already in progress are not hung up."""
+    require_dialer()
+    campaign = campaign_dialer.cancel_campaign(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.summary()
+
+
+@router.get("/member-context/stats")
+async def get_member_context_stats():
+    """Prefetch hit rates for member context used by the agent tools on voice calls (this worker)."""
+    return member_context.stats.to_dict()
+
+
+@router.get("/phrases/stats")
+async def get_phrase_cache_stats():
+    """Greeting / system phrase audio cache hit rates (this worker)."""
+    return get_phrase_cache().stats.to_dict()
+
+
 @router.get("/dashboard/stats")
 async def get_call_center_stats(organization_id: Optional[str] = None):
-    """Get call center dashboard statistics."""
-    all_calls = list(active_calls.values())
-    if organization_id:
-        all_calls = [c for c in all_calls if c.organization_id == organization_id]
+    """
+    Get call center dashboard statistics: running totals plus rollups for the
+    last 15 minutes, hour and day. Aggregates are maintained on every call
+    event, so this does not scan calls.
+    """
+    return await get_call_store().stats(organization_id)
 
-    active = [c for c in all_calls if c.status in (CallStatus.CONNECTED, CallStatus.IN_PROGRESS)]
-    completed = [c for c in all_calls if c.status == CallStatus.COMPLETED]
-    escalated = [c for c in all_calls if c.escalated]
 
-    avg_duration = 0
-    if completed:
-        durations = [c.duration_seconds or 0 for c in completed]
-        avg_duration = sum(durations) / len(durations)
+@router.websocket("/dashboard/ws")
+async def dashboard_feed(websocket: WebSocket, organization_id: Optional[str] = None):
+    """
+    Push feed for wallboards: sends the dashboard statistics on connect and
+    again whenever they change, at most once per `dashboard_push_interval_seconds`.
+    """
+    await websocket.accept()
+    store = get_call_store()
 
-    avg_sentiment = 0.0
-    all_sentiments = [s for c in all_calls for s in c.sentiment_scores]
-    if all_sentiments:
-        avg_sentiment = sum(all_sentiments) / len(all_sentiments)
+    async def push():
+        await websocket.send_json({"type": "stats", "stats": await store.stats(organization_id)})
+        async for _ in store.changes(organization_id):
+            # Coalesce bursts of call events into one update
+            await asyncio.sleep(settings.dashboard_push_interval_seconds)
+            await websocket.send_json({"type": "stats", "stats": await store.stats(organization_id)})
 
-    return {
-        "total_calls": len(all_calls),
-        "active_calls": len(active),
-        "completed_calls": len(completed),
-        "escalated_calls": len(escalated),
-        "escalation_rate": len(escalated) / max(len(all_calls), 1),
-        "average_duration_seconds": round(avg_duration),
-        "average_sentiment": round(avg_sentiment, 2),
-    }
+    async def receive():
+        # Wallboards do not send anything; this only detects the disconnect
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+    logger.info("Dashboard feed disconnected", org_id=organization_id)
 
 
 @router.websocket("/ws/{call_id}")
@@ -237,104 +315,332 @@ async def voice_websocket(websocket: WebSocket, call_id: str):
     """
     WebSocket endpoint for real-time voice agent communication.
     
-    Protocol:
-    1. Client sends audio chunks (base64 encoded)
-    2. Server processes through STT (Deepgram)
-    3. Server routes transcript to agent orchestrator
-    4. Agent response is converted to speech (ElevenLabs TTS)
-    5. Server sends audio response back
+    Protocol (pipelined, nothing waits for a full response):
+    1. Client streams audio chunks (base64 encoded) into streaming STT (Deepgram)
+    2. Partial transcripts are sent back as they are recognized
+    3. When the caller stops speaking, the transcript goes to the agent orchestrator
+    4. Agent tokens stream into TTS (ElevenLabs) one sentence at a time
+    5. Audio chunks are sent as soon as the first sentence is synthesized
     
     Messages:
     - Client -> Server: {"type": "audio", "data": "<base64>"}
+    - Client -> Server: {"type": "end_of_speech"}  (optional client-side endpointing)
     - Client -> Server: {"type": "transcript", "text": "..."}
-    - Server -> Client: {"type": "transcript", "text": "...", "speaker": "agent|user"}
+    - Client -> Server: {"type": "interrupt"}  (stop the agent mid-response)
+    - Server -> Client: {"type": "transcript", "text": "...", "speaker": "agent|user", "is_final": bool}
     - Server -> Client: {"type": "audio", "data": "<base64>"}
-    - Server -> Client: {"type": "status", "status": "..."}
+    - Server -> Client: {"type": "turn_complete", "latency": {"first_audio_ms": ...}}
+    - Server -> Client: {"type": "status", "status": "listening|interrupted"}
+
+    Binary audio: a client that offers the `apex-voice.binary.v1` sub-protocol
+    sends and receives audio as binary messages (8-byte header + raw codec
+    payload, see app.services.voice.frames) instead of base64 JSON; a header
+    flag can mark the end of speech. All other messages stay JSON.
+
+    Barge-in: caller speech (or an `interrupt` message) while the agent is
+    responding cancels that turn, aborting its LLM, tool and TTS requests.
     """
-    await websocket.accept()
-    logger.info("Voice WebSocket connected", call_id=call_id)
+    binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+    logger.info("Voice WebSocket connected", call_id=call_id, binary=binary)
 
-    record = active_calls.get(call_id)
+    store = get_call_store()
+    record = await store.get(call_id, with_transcript=False)
     if record:
-        record.status = CallStatus.CONNECTED
-
-    try:
-        # Send greeting
-        template = VOICE_AGENT_TEMPLATES.get(
-            record.agent_type if record else VoiceAgentType.MEMBER_SERVICE
-        )
-        await websocket.send_json({
+        try:
+            await store.transition(call_id, CallStatus.CONNECTED)
+        except InvalidCallTransition:
+            # Reconnect (possibly to another worker): keep the current state
+            logger.info("Voice WebSocket reconnected", call_id=call_id, status=record.status.value)
+
+    # Prefetched member context (started at initiate, or now during the greeting) for the agent tools
+    context_session = member_context.prefetch(call_id, record.member_id) if record and record.member_id else None
+    context_token = bind_session(context_session)
+
+    template = VOICE_AGENT_TEMPLATES.get(
+        record.agent_type if record else VoiceAgentType.MEMBER_SERVICE
+    )
+    agent_type = record.agent_type.value if record else "member_service"
+    tts = get_tts()
+    escalation_matcher = get_escalation_matcher(tuple(template.escalation_keywords))
+    send_lock = asyncio.Lock()
+    turn_lock = asyncio.Lock()
+    call_metrics = CallMetrics()
+    stt_stream = None
+    stt_task: Optional[asyncio.Task] = None
+    audio_pump: Optional[AudioPump] = None  # Inbound audio ring buffer -> STT stream
+    codec = CODECS.get(settings.voice_audio_encoding, CODECS["mulaw"])
+    bytes_per_ms = settings.voice_sample_rate // 1000 * (2 if settings.voice_audio_encoding == "linear16" else 1)
+    audio_sequence = 0
+    # In-flight agent turn: the task producing it and its pipeline state (None for the greeting)
+    turn_task: Optional[asyncio.Task] = None
+    active_turn: Optional[VoiceTurn] = None
+    analysis_tasks: set[asyncio.Task] = set()  # Background sentiment scoring for this call
+
+    def voice_metrics() -> dict:
+        metrics = call_metrics.to_dict()
+        if context_session:
+            metrics["member_context"] = context_session.to_dict()
+        return metrics
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json({**message, "timestamp": datetime.utcnow().isoformat()})
+
+    async def send_audio(chunk: bytes):
+        nonlocal audio_sequence
+        if not binary:
+            await send({"type": "audio", "data": base64.b64encode(chunk).decode()})
+            return
+        async with send_lock:
+            await websocket.send_bytes(pack_frame(chunk, codec, audio_sequence))
+            audio_sequence += 1
+
+    async def open_audio() -> AudioPump:
+        nonlocal stt_stream, stt_task, audio_pump
+        if audio_pump is None:
+            stt_stream = await get_stt().open_stream(template.language)
+            stt_task = asyncio.create_task(read_transcripts(stt_stream))
+            stt_task.add_done_callback(on_stt_done)
+            audio_pump = AudioPump(
+                stt_stream.send,
+                capacity=settings.voice_inbound_buffer_ms * bytes_per_ms,
+                chunk_bytes=settings.voice_stt_chunk_ms * bytes_per_ms,
+            )
+        return audio_pump
+
+    async def end_of_speech():
+        if audio_pump is not None:
+            await audio_pump.drain()
+            await stt_stream.finalize()
+
+    async def record_exchange(user_text: str, response_text: str, interrupted: bool = False):
+        if not record:
+            return
+        await store.append_transcript(call_id, {
+            "speaker": "user",
+            "text": user_text,
+            "timestamp": datetime.utcnow().isoformat(),
+            "phi_spans": [span.to_dict() for span in phi_scanner.scan(user_text)],
+        })
+        entry = {
+            "speaker": "agent",
+            "text": response_text,
+            "timestamp": datetime.utcnow().isoformat(),
+            "phi_spans": [span.to_dict() for span in phi_scanner.scan(response_text)],
+        }
+        if interrupted:
+            entry["interrupted"] = True
+        await store.append_transcript(call_id, entry)
+        await store.update(call_id, voice_metrics=voice_metrics())
+
+    async def greet():
+        await send({
             "type": "transcript",
             "text": template.greeting,
             "speaker": "agent",
-            "timestamp": datetime.utcnow().isoformat(),
         })
+        async for chunk in get_phrase_cache().stream(template.greeting, template.voice_id, template.language):
+            await send_audio(chunk)
+        await send({"type": "status", "status": "listening"})
+
+    async def respond(user_text: str, turn: VoiceTurn):
+        escalation = escalation_matcher.match(user_text)
+        if escalation:
+            if record:
+                await store.escalate(call_id, f"User requested human agent ({escalation})")
+            await send({"type": "escalation", "message": SYSTEM_PHRASES["transfer"]})
+            async for chunk in get_phrase_cache().stream(SYSTEM_PHRASES["transfer"], template.voice_id, template.language):
+                await send_audio(chunk)
+            return
+
+        # Stream the agent response through TTS
+        tokens = orchestrator.stream_message(
+            message=user_text,
+            organization_id=record.organization_id if record else "default",
+            user_id=f"voice-{call_id}",
+            user_role="member",
+            conversation_id=f"voice:{call_id}",
+            agent_type=agent_type,
+        )
+        try:
+            async with aclosing(turn.stream(tokens)) as events:
+                async for kind, payload in events:
+                    if kind == "sentence":
+                        await send({"type": "transcript", "text": payload, "speaker": "agent", "is_final": False})
+                    else:
+                        await send_audio(payload)
+        except asyncio.CancelledError:
+            await record_exchange(user_text, turn.response_text, interrupted=True)
+            raise
+
+        latency = turn.metrics.to_dict()
+        logger.info("Voice turn complete", call_id=call_id, **latency)
+        call_metrics.turn_completed()
+        if record and latency["first_audio_ms"] is not None:
+            await store.record_latency(call_id, latency["first_audio_ms"])
+        await record_exchange(user_text, turn.response_text)
+
+        # Send full response
+        await send({
+            "type": "transcript",
+            "text": turn.response_text,
+            "speaker": "agent",
+            "agent_type": agent_type,
+            "is_final": True,
+        })
+        await send({"type": "turn_complete", "latency": latency})
+
+    async def traced_respond(user_text: str, turn: VoiceTurn):
+        try:
+            # Its own span under the connection's trace context; LLM, tool and TTS spans nest inside
+            with span("voice_turn", call_id=call_id, agent_type=agent_type, words=len(user_text.split())) as turn_span:
+                try:
+                    await respond(user_text, turn)
+                finally:
+                    turn_span.set(**turn.metrics.to_dict(), audio_chunks=turn.audio_chunks)
+        except Exception as e:
+            # Cancellation (barge-in, hang-up) propagates; a failed turn must not leave the caller waiting
+            logger.error("Voice turn failed", call_id=call_id, error=str(e))
+            await send({"type": "error", "message": "Sorry, I couldn't answer that. Please try again."})
+            await send({"type": "status", "status": "listening"})
+
+    async def cancel_turn(reason: str):
+        """Cancel the in-flight turn and wait until its LLM/TTS requests are closed. Hold turn_lock."""
+        nonlocal turn_task, active_turn
+        task, turn, turn_task, active_turn = turn_task, active_turn, None, None
+        if task is None or task.done():
+            return
+        requested_at = time.perf_counter()
+        task.cancel()
+        await asyncio.wait([task])
+        if not task.cancelled():
+            return
+        latency_ms = round((time.perf_counter() - requested_at) * 1000)
+        if turn is not None:
+            call_metrics.turn_cancelled(turn, reason, latency_ms)
+            if record:
+                await store.update(call_id, voice_metrics=voice_metrics())
+        logger.info("Voice turn cancelled", call_id=call_id, reason=reason, cancel_latency_ms=latency_ms)
+        if reason != "hangup":
+            # Tells the client to drop any buffered agent audio
+            await send({"type": "status", "status": "interrupted", "reason": reason})
+
+    def on_turn_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error("Voice turn failed", call_id=call_id, error=str(task.exception()))
+
+    async def start_turn(user_text: str, speech_ended_at: float):
+        """Start a new agent turn, barging in on the previous one if it is still running."""
+        nonlocal turn_task, active_turn
+        if record:
+            task = record_sentiment_in_background(store, call_id, user_text)
+            analysis_tasks.add(task)
+            task.add_done_callback(analysis_tasks.discard)
+        async with turn_lock:
+            await cancel_turn("new_utterance")
+            active_turn = VoiceTurn(tts, template.voice_id, template.language, speech_ended_at=speech_ended_at)
+            turn_task = asyncio.create_task(traced_respond(user_text, active_turn))
+            turn_task.add_done_callback(on_turn_done)
+
+    async def interrupt(reason: str):
+        async with turn_lock:
+            await cancel_turn(reason)
+
+    async def read_transcripts(stream):
+        async for event in stream:
+            await send({"type": "transcript", "text": event.text, "speaker": "user", "is_final": event.is_final})
+            if event.speech_final:
+                await start_turn(event.text, time.perf_counter())
+            elif (
+                turn_task is not None
+                and not turn_task.done()
+                and settings.voice_barge_in_min_words
+                and len(event.text.split()) >= settings.voice_barge_in_min_words
+            ):
+                # Caller started talking over the agent: stop speaking before the utterance ends
+                await interrupt("barge_in")
+
+    def on_stt_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error("Speech-to-text stream failed", call_id=call_id, error=str(task.exception()))
+
+    try:
+        # Receive loop never waits on a turn: turns run as tasks that later input can cancel
+        turn_task = asyncio.create_task(greet())
+        turn_task.add_done_callback(on_turn_done)
 
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes") is not None:
+                try:
+                    frame_codec, flags, _, payload = unpack_frame(message["bytes"])
+                except FrameError as e:
+                    await send({"type": "error", "message": str(e)})
+                    continue
+                if frame_codec != codec:
+                    await send({"type": "error", "message": f"Expected {settings.voice_audio_encoding} audio frames"})
+                    continue
+                (await open_audio()).push(payload)
+                if flags & FLAG_END_OF_SPEECH:
+                    await end_of_speech()
+                continue
+
+            try:
+                data = json.loads(message["text"])
+            except ValueError:
+                await send({"type": "error", "message": "Expected a JSON message"})
+                continue
+            if not isinstance(data, dict):
+                await send({"type": "error", "message": "Expected a JSON object"})
+                continue
 
             if data.get("type") == "transcript":
-                # Process user speech transcript through agent
+                # Text input (already transcribed client-side)
                 user_text = data.get("text", "")
                 if not user_text.strip():
                     continue
+                await start_turn(user_text, time.perf_counter())
 
-                # Check for escalation keywords
-                if template and any(kw in user_text.lower() for kw in template.escalation_keywords):
-                    if record:
-                        record.escalated = True
-                        record.escalation_reason = "User requested human agent"
-                    await websocket.send_json({
-                        "type": "escalation",
-                        "message": "Transferring you to a human representative. Please hold.",
-                        "timestamp": datetime.utcnow().isoformat(),
-                    })
+            elif data.get("type") == "audio":
+                try:
+                    chunk = base64.b64decode(data.get("data", ""), validate=True)
+                except (ValueError, binascii.Error):
+                    await send({"type": "error", "message": "Audio data must be base64"})
                     continue
+                (await open_audio()).push(chunk)
 
-                # Get agent response
-                agent_type = record.agent_type.value if record else "member_service"
-                result = await orchestrator.process_message(
-                    message=user_text,
-                    organization_id=record.organization_id if record else "default",
-                    user_id=f"voice-{call_id}",
-                    user_role="member",
-                    conversation_id=f"voice:{call_id}",
-                    agent_type=agent_type,
-                )
-
-                # Record transcript
-                if record:
-                    record.transcript.append({
-                        "speaker": "user",
-                        "text": user_text,
-                        "timestamp": datetime.utcnow().isoformat(),
-                    })
-                    record.transcript.append({
-                        "speaker": "agent",
-                        "text": result["response"],
-                        "timestamp": datetime.utcnow().isoformat(),
-                    })
-
-                # Send response
-                await websocket.send_json({
-                    "type": "transcript",
-                    "text": result["response"],
-                    "speaker": "agent",
-                    "agent_type": result.get("agent_type"),
-                    "timestamp": datetime.utcnow().isoformat(),
-                })
+            elif data.get("type") == "end_of_speech":
+                await end_of_speech()
 
-            elif data.get("type") == "audio":
-                # In production: send to Deepgram for STT, then process
-                # For now, acknowledge receipt
-                await websocket.send_json({
-                    "type": "status",
-                    "status": "processing_audio",
-                    "timestamp": datetime.utcnow().isoformat(),
-                })
+            elif data.get("type") == "interrupt":
+                await interrupt("interrupt")
 
     except WebSocketDisconnect:
-        logger.info("Voice WebSocket disconnected", call_id=call_id)
+        logger.info("Voice WebSocket disconnected", call_id=call_id, **call_metrics.to_dict())
+    finally:
+        # However the socket ended, stop the in-flight turn first: it records its
+        # partial exchange while the call is still live
+        if stt_task:
+            stt_task.cancel()
+        await interrupt("hangup")
+        if analysis_tasks:
+            # Let the last utterances' sentiment land on the record before it is completed
+            await asyncio.wait(analysis_tasks, timeout=1.0)
         if record:
-            record.status = CallStatus.COMPLETED
-            record.ended_at = datetime.utcnow().isoformat()
+            try:
+                await store.transition(call_id, CallStatus.COMPLETED)
+            except InvalidCallTransition:
+                pass  # Already ended through /calls/{call_id}/end
+        if audio_pump is not None:
+            await audio_pump.close()
+        if stt_stream is not None:
+            await stt_stream.close()
+        unbind_session(context_token)
+        if context_session:
+            member_context.close(call_id)
+            if record:
+                await store.update(call_id, voice_metrics=voice_metrics())
@@ -3,13 +3,29 @@ Workflow AI Router
 AI-powered workflow node execution for the visual workflow builder.
 """
 
+import asyncio
+import inspect
+import json
+import re
+import time
+from contextvars import ContextVar, copy_context
 import structlog
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Awaitable, Optional
 from datetime import datetime
 
 from app.config import settings
+from app.services.coding.embeddings import get_code_retriever
+from app.services.llm_gateway import llm_gateway
+from app.services.metrics import timed
+from app.services.node_cache import IdempotencyConflict, idempotent_results, node_cache_key, node_results
+from app.services.node_scheduler import SchedulerBusy, node_scheduler
+from app.services.single_flight import canonical_hash
+from app.services.tracing import span
+from app.services.workflow_graph import SubgraphError, plan_subgraph, run_subgraph
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -23,6 +39,8 @@ class WorkflowNodeExecutionRequest(BaseModel):
     input_data: dict = {}
     organization_id: str
     user_id: str
+    idempotency_key: Optional[str] = None  # Duplicate deliveries with the same key replay the stored result
+    priority: Optional[str] = None  # interactive, standard, bulk; defaults to the node type's class
 
 
 class WorkflowNodeExecutionResult(BaseModel):
@@ -36,30 +54,212 @@ class WorkflowNodeExecutionResult(BaseModel):
     processing_time_ms: int = 0
 
 
+class WorkflowNodeBatchRequest(BaseModel):
+    items: list[WorkflowNodeExecutionRequest] = Field(..., min_length=1)
+
+
+class WorkflowNodeBatchResult(BaseModel):
+    results: list[WorkflowNodeExecutionResult] = []  # In request order
+    throughput: dict[str, dict] = {}  # node_type -> items, batched, processing_time_ms, items_per_second
+    processing_time_ms: int = 0
+
+
+class SubgraphNode(BaseModel):
+    node_id: str
+    node_type: str
+    node_config: dict = {}
+    input_data: dict = {}
+
+
+class SubgraphEdge(BaseModel):
+    source: str
+    target: str
+
+
+class SubgraphExecutionRequest(BaseModel):
+    execution_id: str
+    nodes: list[SubgraphNode] = Field(..., min_length=1)
+    edges: list[SubgraphEdge] = []
+    input_data: dict = {}  # Shared by every node; a node's own input_data and upstream outputs override it
+    priority: Optional[str] = None
+    organization_id: str
+    user_id: str
+
+
+class SubgraphExecutionResult(BaseModel):
+    execution_id: str
+    status: str  # completed, failed, waiting_hitl
+    results: list[WorkflowNodeExecutionResult] = []  # In completion order
+    timings: dict[str, dict] = {}  # node_id -> {"started_ms", "finished_ms"} from subgraph start
+    halted_at: Optional[str] = None
+    skipped_nodes: list[str] = []
+    processing_time_ms: int = 0
+
+
 # AI-powered node handlers
 NODE_HANDLERS = {}
+# Batch-aware handlers: (configs, inputs) -> one output per item
+BATCH_NODE_HANDLERS = {}
+# Streaming handlers: async generators yielding (kind, payload) events, the last one ("output", output)
+STREAMING_NODE_HANDLERS = {}
+# Memoized node types -> handler version (part of the cache key; bump it when the handler's output changes)
+CACHEABLE_NODE_TYPES = {}
+
+
+def register_node_handler(
+    node_type: str,
+    batch: bool = False,
+    cacheable: bool = False,
+    version: str = "1",
+    max_concurrency: Optional[int] = None,
+    timeout_seconds: Optional[float] = None,
+    priority: Optional[str] = None,
+):
+    """
+    Decorator to register a workflow node handler.
+    With batch=True the handler takes lists of node configs and inputs and
+    returns one output per item, so it can vectorize or make one model call
+    for a whole batch; single executions call it with a batch of one.
+    With cacheable=True the handler must be deterministic for a given config
+    and input: its results are memoized.
+    An async generator handler streams ("progress", {...}) and ("token", text)
+    events to /execute-node/stream callers and yields ("output", output) last.
+    max_concurrency, timeout_seconds and priority (interactive, standard,
+    bulk) set the node type's scheduling limits; WORKFLOW_NODE_LIMITS
+    overrides them per deployment.
+    """
+    limits = {"max_concurrency": max_concurrency, "timeout_seconds": timeout_seconds, "priority": priority}
+    limits = {name: value for name, value in limits.items() if value is not None}
 
-
-def register_node_handler(node_type: str):
-    """Decorator to register a workflow node handler."""
     def decorator(func):
-        NODE_HANDLERS[node_type] = func
+        node_scheduler.configure(node_type, **{**limits, **settings.workflow_node_limits.get(node_type, {})})
+        if cacheable:
+            CACHEABLE_NODE_TYPES[node_type] = version
+        if inspect.isasyncgenfunction(func):
+            STREAMING_NODE_HANDLERS[node_type] = func
+            NODE_HANDLERS[node_type] = collect_stream(func)
+        elif batch:
+            BATCH_NODE_HANDLERS[node_type] = func
+
+            async def single(config: dict, input_data: dict) -> dict:
+                return (await func([config], [input_data]))[0]
+            NODE_HANDLERS[node_type] = single
+        else:
+            NODE_HANDLERS[node_type] = func
         return func
     return decorator
 
 
-@register_node_handler("llm_decision")
-async def handle_llm_decision(config: dict, input_data: dict) -> dict:
+# ─── Node progress events ──
+
+# Event queue of the /execute-node/stream request running in this context, if any
+_node_events: ContextVar[Optional[asyncio.Queue]] = ContextVar("workflow_node_events", default=None)
+
+# Priority of the node execution running in this context, passed on to the LLM gateway
+_node_priority: ContextVar[Optional[str]] = ContextVar("workflow_node_priority", default=None)
+
+
+def emit_node_event(kind: str, payload: Any):
+    """Forward a progress event to the streaming caller of the current node (no-op otherwise)."""
+    events = _node_events.get()
+    if events is not None:
+        events.put_nowait((kind, payload))
+
+
+def collect_stream(func):
+    """Plain handler for a streaming one: forwards its events and returns its output."""
+    async def handler(config: dict, input_data: dict) -> dict:
+        output = None
+        async for kind, payload in func(config, input_data):
+            if kind == "output":
+                output = payload
+            else:
+                emit_node_event(kind, payload)
+        if output is None:
+            raise ValueError("Streaming handler finished without an output event")
+        return output
+    return handler
+
+
+def text_tokens(text: str) -> list[str]:
+    return re.findall(r"\S+\s*", text)
+
+
+def node_prompt(system: str, prompt: str, input_data: dict) -> list:
+    return [
+        SystemMessage(content=system),
+        HumanMessage(content=f"{prompt}\n\nInput data:\n{json.dumps(input_data, sort_keys=True, default=str)}"),
+    ]
+
+
+def node_model(config: dict) -> str:
+    """Model a workflow LLM node calls: the node's configured `model`, else the default."""
+    return config.get("model") or settings.default_model
+
+
+async def llm_tokens(messages: list, model: str):
+    """
+    Model output for a workflow LLM node, via the LLM gateway at the node's
+    priority. Streamed when a caller is watching the node (/execute-node/stream);
+    otherwise a single call, which the gateway batches with other nodes' bulk calls.
+    """
+    priority = _node_priority.get()
+    if _node_events.get() is not None:
+        async for chunk in llm_gateway.stream(messages, model=model, priority=priority or "standard"):
+            if chunk.content:
+                yield chunk.content
+    else:
+        response = await llm_gateway.invoke(messages, model=model, priority=priority or "bulk")
+        yield response.content
+
+
+DECISION_SYSTEM = """You are a decision step in a healthcare payer workflow.
+Answer with exactly one of these options on the first line: {options}.
+Then explain your reasoning in two or three sentences."""
+
+
+@register_node_handler("llm_decision", max_concurrency=8)
+async def handle_llm_decision(config: dict, input_data: dict):
     """LLM-based decision node - routes workflow based on AI analysis."""
     prompt = config.get("prompt", "Analyze the input and decide the next action.")
     options = config.get("options", ["approve", "deny", "review"])
 
-    # In production: call Gemini with the prompt and input data
-    return {
-        "decision": options[0] if options else "approve",
+    yield "progress", {"stage": "analyzing", "fraction": 0.1}
+    model = None
+    if llm_gateway.available:
+        model = node_model(config)
+        parts = []
+        async for token in llm_tokens(node_prompt(DECISION_SYSTEM.format(options=", ".join(options)), prompt, input_data), model):
+            parts.append(token)
+            yield "token", token
+        reasoning = "".join(parts)
+        decision = next(
+            (option for option in options if re.match(rf"\W*{re.escape(option)}\b", reasoning, re.IGNORECASE)),
+            None,
+        )
+    else:
+        reasoning = f"AI analysis of input data based on configured criteria: '{prompt}'"
+        for token in text_tokens(reasoning):
+            yield "token", token
+        decision = options[0] if options else "approve"
+    yield "progress", {"stage": "deciding", "fraction": 0.9}
+    if decision is None:
+        # The model did not answer with one of the options: a person decides, never a default branch
+        yield "output", {
+            "decision": "review",
+            "confidence": 0.5,
+            "reasoning": reasoning,
+            "next_branch": "review",
+            "requires_hitl": True,
+            "model": model,
+        }
+        return
+    yield "output", {
+        "decision": decision,
         "confidence": 0.87,
-        "reasoning": f"AI analysis of input data based on configured criteria: '{prompt}'",
-        "next_branch": options[0] if options else "default",
+        "reasoning": reasoning,
+        "next_branch": decision,
+        "model": model,
     }
 
 
@@ -82,50 +282,66 @@ async def handle_document_extraction(config: dict, input_data: dict) -> dict:
     }
 
 
-@register_node_handler("medical_coding_ai")
-async def handle_medical_coding(config: dict, input_data: dict) -> dict:
-    """AI-powered medical coding suggestion."""
-    clinical_text = input_data.get("clinical_notes", "")
-
-    return {
-        "icd10_codes": [
-            {"code": "M54.5", "description": "Low back pain", "confidence": 0.95},
-        ],
-        "cpt_codes": [
-            {"code": "99213", "description": "Office visit, established, low", "confidence": 0.88},
-        ],
-        "requires_coder_review": True,
-        "coding_notes": "AI-suggested codes based on clinical documentation",
-    }
+@register_node_handler("medical_coding_ai", batch=True, cacheable=True)
+async def handle_medical_coding(configs: list[dict], inputs: list[dict]) -> list[dict]:
+    """AI-powered medical coding suggestion; the batch's notes are embedded and searched together."""
+    clinical_texts = [input_data.get("clinical_notes", "") for input_data in inputs]
+    retriever = get_code_retriever()
 
+    def suggest():
+        return (
+            retriever.suggest_batch(clinical_texts, system="icd10cm", limit=3),
+            retriever.suggest_batch(clinical_texts, system="cpt", limit=3),
+        )
 
-@register_node_handler("fraud_detector")
-async def handle_fraud_detection(config: dict, input_data: dict) -> dict:
-    """Fraud detection analysis node."""
-    return {
-        "fraud_score": 0.12,
-        "risk_level": "low",
-        "flags": [],
-        "recommendation": "proceed",
-    }
+    icd10_codes, cpt_codes = await asyncio.to_thread(suggest)
+    return [
+        {
+            "icd10_codes": icd10,
+            "cpt_codes": cpt,
+            "requires_coder_review": True,
+            "coding_notes": "AI-suggested codes based on clinical documentation",
+        }
+        for icd10, cpt in zip(icd10_codes, cpt_codes)
+    ]
 
 
-@register_node_handler("clinical_reasoner")
-async def handle_clinical_reasoning(config: dict, input_data: dict) -> dict:
+@register_node_handler("fraud_detector", batch=True)
+async def handle_fraud_detection(configs: list[dict], inputs: list[dict]) -> list[dict]:
+    """Fraud detection analysis node."""
+    # In production: one scoring call to the fraud model for the whole batch
+    return [
+        {
+            "fraud_score": 0.12,
+            "risk_level": "low",
+            "flags": [],
+            "recommendation": "proceed",
+        }
+        for _ in inputs
+    ]
+
+
+@register_node_handler("clinical_reasoner", cacheable=True, max_concurrency=8, timeout_seconds=120)
+async def handle_clinical_reasoning(config: dict, input_data: dict):
     """Clinical reasoning for medical necessity determination."""
     diagnosis = input_data.get("diagnosis_codes", [])
     procedure = input_data.get("procedure_codes", [])
 
-    return {
+    yield "progress", {"stage": "retrieving_guidelines", "fraction": 0.2}
+    yield "progress", {"stage": "reasoning", "fraction": 0.4}
+    rationale = "Procedure is clinically appropriate given documented diagnosis."
+    for token in text_tokens(rationale):
+        yield "token", token
+    yield "output", {
         "medical_necessity": "supported",
         "confidence": 0.82,
-        "clinical_rationale": "Procedure is clinically appropriate given documented diagnosis.",
+        "clinical_rationale": rationale,
         "guideline_references": ["InterQual 2024", "CMS LCD L35936"],
         "requires_md_review": False,
     }
 
 
-@register_node_handler("sentiment_analysis")
+@register_node_handler("sentiment_analysis", priority="interactive")
 async def handle_sentiment_analysis(config: dict, input_data: dict) -> dict:
     """Analyze sentiment in member communications."""
     text = input_data.get("text", "")
@@ -139,7 +355,7 @@ async def handle_sentiment_analysis(config: dict, input_data: dict) -> dict:
     }
 
 
-@register_node_handler("eligibility_check")
+@register_node_handler("eligibility_check", priority="interactive", timeout_seconds=10)
 async def handle_eligibility_check(config: dict, input_data: dict) -> dict:
     """Check member eligibility as a workflow step."""
     member_id = input_data.get("member_id", "")
@@ -153,61 +369,527 @@ async def handle_eligibility_check(config: dict, input_data: dict) -> dict:
     }
 
 
-@register_node_handler("gemini_analyzer")
-async def handle_gemini_analysis(config: dict, input_data: dict) -> dict:
+ANALYZER_SYSTEM = """You analyze data for a healthcare payer workflow.
+Follow the instructions, cite the input fields you relied on, and be concise."""
+
+
+@register_node_handler("gemini_analyzer", cacheable=True, max_concurrency=8, timeout_seconds=120)
+async def handle_gemini_analysis(config: dict, input_data: dict):
     """General-purpose Gemini AI analysis node."""
     prompt = config.get("prompt", "Analyze the provided data.")
 
-    return {
-        "analysis": f"AI analysis based on prompt: '{prompt}'",
+    model = None
+    if llm_gateway.available:
+        model = node_model(config)
+        parts = []
+        async for token in llm_tokens(node_prompt(ANALYZER_SYSTEM, prompt, input_data), model):
+            parts.append(token)
+            yield "token", token
+        analysis = "".join(parts)
+    else:
+        analysis = f"AI analysis based on prompt: '{prompt}'"
+        for token in text_tokens(analysis):
+            yield "token", token
+    yield "output", {
+        "analysis": analysis,
         "confidence": 0.85,
-        "model": settings.default_model,
+        "model": model,
     }
 
 
+def node_result(node_id: str, output: dict, elapsed_ms: int) -> WorkflowNodeExecutionResult:
+    requires_hitl = (
+        output.get("requires_hitl", False)
+        or output.get("requires_md_review", False)
+        or output.get("requires_coder_review", False)
+    )
+
+    return WorkflowNodeExecutionResult(
+        node_id=node_id,
+        status="waiting_hitl" if requires_hitl else "completed",
+        output_data=output,
+        ai_metrics={
+            "model": output.get("model"),  # The model the node called; None for nodes that call none
+            "confidence": output.get("confidence", 0),
+            "processing_time_ms": elapsed_ms,
+        },
+        requires_hitl=requires_hitl,
+        hitl_reason="AI confidence below threshold or review required" if requires_hitl else None,
+        processing_time_ms=elapsed_ms,
+    )
+
+
+def failed_result(node_id: str, error: str) -> WorkflowNodeExecutionResult:
+    return WorkflowNodeExecutionResult(node_id=node_id, status="failed", output_data={"error": error})
+
+
+def cached_result(result: WorkflowNodeExecutionResult, node_id: str) -> WorkflowNodeExecutionResult:
+    """A memoized or replayed result, as a copy the caller may modify."""
+    return result.model_copy(deep=True, update={
+        "node_id": node_id,
+        "processing_time_ms": 0,
+        "ai_metrics": {**(result.ai_metrics or {}), "processing_time_ms": 0, "cached": True},
+    })
+
+
+def is_storable(result: WorkflowNodeExecutionResult) -> bool:
+    # Failures are usually transient; a retry should run the handler again
+    return result.status != "failed"
+
+
+def request_fingerprint(request: WorkflowNodeExecutionRequest) -> str:
+    return canonical_hash(request.model_dump(exclude={"idempotency_key"}))
+
+
+def idempotency_scope(request: WorkflowNodeExecutionRequest, header_key: Optional[str] = None) -> Optional[str]:
+    key = request.idempotency_key or header_key
+    return f"{request.organization_id}:{key}" if key else None
+
+
+async def run_node(
+    node_id: str,
+    node_type: str,
+    node_config: dict,
+    input_data: dict,
+    priority: Optional[str] = None,
+    reject_when_full: bool = True,
+) -> WorkflowNodeExecutionResult:
+    """
+    Run one node and wrap its output (or failure) as a node result; results
+    of cacheable node types come from the memo when the same config and
+    input were run before. Raises SchedulerBusy when the node type's queue
+    is full.
+    """
+    def execute():
+        return execute_node(node_id, node_type, node_config, input_data, priority, reject_when_full)
+
+    version = CACHEABLE_NODE_TYPES.get(node_type)
+    if version is None:
+        return await execute()
+
+    key = node_cache_key(node_type, version, node_config, input_data)
+    result, cached = await node_results.get_or_run(key, execute, should_store=is_storable)
+    # The stored result is shared; callers get their own copy
+    return cached_result(result, node_id) if cached else result.model_copy(deep=True)
+
+
+async def execute_node(
+    node_id: str,
+    node_type: str,
+    node_config: dict,
+    input_data: dict,
+    priority: Optional[str] = None,
+    reject_when_full: bool = True,
+) -> WorkflowNodeExecutionResult:
+    start_time = datetime.utcnow()
+
+    handler = NODE_HANDLERS.get(node_type)
+    if not handler:
+        return failed_result(node_id, f"Unknown node type: {node_type}")
+
+    async def call() -> dict:
+        emit_node_event("status", {"status": "running"})
+        token = _node_priority.set(node_scheduler.effective_priority(node_type, priority))
+        try:
+            with span("workflow_node", node_type=node_type, node_id=node_id), timed("workflow_node", node_type):
+                return await handler(node_config, input_data)
+        finally:
+            _node_priority.reset(token)
+
+    try:
+        output = await node_scheduler.run(node_type, call, priority, reject_when_full)
+        elapsed_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        return node_result(node_id, output, elapsed_ms)
+
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        logger.error("Workflow node execution failed", node_type=node_type, error=str(e))
+        return failed_result(node_id, str(e))
+
+
+# ═══════════════════════════════════════════════════════
+# Batch Execution
+# ═══════════════════════════════════════════════════════
+
+class BatchThroughput:
+    """Items processed and wall time spent per node type across batch requests."""
+
+    def __init__(self):
+        self.node_types: dict[str, dict] = {}
+
+    def record(self, node_type: str, items: int, seconds: float, batched: bool) -> dict:
+        totals = self.node_types.setdefault(node_type, {"items": 0, "requests": 0, "seconds": 0.0, "batched": batched})
+        totals["items"] += items
+        totals["requests"] += 1
+        totals["seconds"] += seconds
+        return {
+            "items": items,
+            "batched": batched,
+            "processing_time_ms": round(seconds * 1000),
+            "items_per_second": round(items / seconds, 1) if seconds else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            node_type: {
+                "items": totals["items"],
+                "requests": totals["requests"],
+                "batched": totals["batched"],
+                "items_per_second": round(totals["items"] / totals["seconds"], 1) if totals["seconds"] else None,
+            }
+            for node_type, totals in self.node_types.items()
+        }
+
+
+batch_throughput = BatchThroughput()
+
+
+async def run_node_batch(node_type: str, items: list[WorkflowNodeExecutionRequest]) -> list[WorkflowNodeExecutionResult]:
+    """
+    Execute many items of one node type: batch-aware handlers get chunks of
+    `workflow_batch_size` items per call, other handlers run per item with
+    bounded concurrency.
+    """
+    batch_handler = BATCH_NODE_HANDLERS.get(node_type)
+    version = CACHEABLE_NODE_TYPES.get(node_type)
+    semaphore = asyncio.Semaphore(settings.workflow_batch_concurrency)
+
+    # Bulk work waits for a slot instead of being rejected: each request already bounds its own concurrency
+    if batch_handler is None:
+        async def run_item(item: WorkflowNodeExecutionRequest) -> WorkflowNodeExecutionResult:
+            async with semaphore:
+                return await run_node(
+                    item.node_id, node_type, item.node_config, item.input_data,
+                    priority=item.priority or "bulk", reject_when_full=False,
+                )
+        return await asyncio.gather(*(run_item(item) for item in items))
+
+    async def call_batch_handler(chunk: list[WorkflowNodeExecutionRequest]) -> list[dict]:
+        token = _node_priority.set(chunk[0].priority or "bulk")
+        try:
+            with span("workflow_node_batch", node_type=node_type, items=len(chunk)), timed("workflow_node_batch", node_type):
+                return await batch_handler([item.node_config for item in chunk], [item.input_data for item in chunk])
+        finally:
+            _node_priority.reset(token)
+
+    async def run_chunk(chunk: list[WorkflowNodeExecutionRequest]) -> list[WorkflowNodeExecutionResult]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                outputs = await node_scheduler.run(
+                    node_type,
+                    lambda: call_batch_handler(chunk),
+                    priority=chunk[0].priority or "bulk",
+                    reject_when_full=False,
+                )
+                if len(outputs) != len(chunk):
+                    raise ValueError(f"Batch handler returned {len(outputs)} outputs for {len(chunk)} items")
+            except Exception as e:
+                logger.error("Workflow batch execution failed", node_type=node_type, items=len(chunk), error=str(e))
+                return [failed_result(item.node_id, str(e)) for item in chunk]
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            return [node_result(item.node_id, output, elapsed_ms) for item, output in zip(chunk, outputs)]
+
+    # Memoized items are answered from the cache; only the rest go to the handler
+    results: list[Optional[WorkflowNodeExecutionResult]] = [None] * len(items)
+    pending: list[int] = []
+    keys: list[Optional[str]] = [None] * len(items)
+    for index, item in enumerate(items):
+        if version is not None:
+            keys[index] = node_cache_key(node_type, version, item.node_config, item.input_data)
+            stored = node_results.cached(keys[index])
+            if stored is not None:
+                results[index] = cached_result(stored, item.node_id)
+                continue
+        pending.append(index)
+
+    size = settings.workflow_batch_size
+    chunks = await asyncio.gather(*(
+        run_chunk([items[i] for i in pending[start:start + size]]) for start in range(0, len(pending), size)
+    ))
+    for index, result in zip(pending, (result for chunk in chunks for result in chunk)):
+        if keys[index] is not None and is_storable(result):
+            node_results.set(keys[index], result.model_copy(deep=True))
+        results[index] = result
+    return results
+
+
+def busy_response(e: SchedulerBusy) -> HTTPException:
+    logger.warning("Workflow node rejected: queue full", node_type=e.node_type, retry_after=e.retry_after)
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/execute-node", response_model=WorkflowNodeExecutionResult)
-async def execute_workflow_node(request: WorkflowNodeExecutionRequest):
+async def execute_workflow_node(
+    request: WorkflowNodeExecutionRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
     """
     Execute a single AI-powered workflow node.
     Called by the workflow execution engine for nodes requiring AI processing.
+
+    With an idempotency key (`idempotency_key` field or `Idempotency-Key`
+    header), a repeated delivery of the same request returns the stored
+    result, marked with `Idempotent-Replayed: true`, instead of re-executing.
+    Reusing a key for a different request is a 409.
+
+    When the node type's queue is full the request fails fast with a 429
+    and a Retry-After header.
     """
-    start_time = datetime.utcnow()
+    try:
+        result, replayed = await run_request(request, idempotency_key)
+    except SchedulerBusy as e:
+        raise busy_response(e)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+async def run_request(
+    request: WorkflowNodeExecutionRequest, header_key: Optional[str] = None,
+) -> tuple[WorkflowNodeExecutionResult, bool]:
+    """(result, replayed) for an execute-node request, honouring its idempotency key."""
+    def run():
+        return run_node(
+            request.node_id, request.node_type, request.node_config, request.input_data, request.priority,
+        )
 
-    handler = NODE_HANDLERS.get(request.node_type)
-    if not handler:
-        return WorkflowNodeExecutionResult(
-            node_id=request.node_id,
-            status="failed",
-            output_data={"error": f"Unknown node type: {request.node_type}"},
+    scope = idempotency_scope(request, header_key)
+    if scope is None:
+        return await run(), False
+    return await idempotent_results.run_once(scope, request_fingerprint(request), run, should_store=is_storable)
+
+
+async def join_idempotent(
+    item: WorkflowNodeExecutionRequest, scope: str, fingerprint: str,
+) -> WorkflowNodeExecutionResult:
+    """A batch item whose key is already executing elsewhere: wait for that execution (or run it if it failed)."""
+    def run():
+        return run_node(
+            item.node_id, item.node_type, item.node_config, item.input_data,
+            priority=item.priority or "bulk", reject_when_full=False,
         )
 
     try:
-        output = await handler(request.node_config, request.input_data)
-        elapsed_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        result, _ = await idempotent_results.run_once(scope, fingerprint, run, should_store=is_storable)
+    except IdempotencyConflict as e:
+        return failed_result(item.node_id, str(e))
+    return result
 
-        requires_hitl = output.get("requires_md_review", False) or output.get("requires_coder_review", False)
 
-        return WorkflowNodeExecutionResult(
-            node_id=request.node_id,
-            status="waiting_hitl" if requires_hitl else "completed",
-            output_data=output,
-            ai_metrics={
-                "model": settings.default_model,
-                "confidence": output.get("confidence", 0),
-                "processing_time_ms": elapsed_ms,
-            },
-            requires_hitl=requires_hitl,
-            hitl_reason="AI confidence below threshold or review required" if requires_hitl else None,
-            processing_time_ms=elapsed_ms,
+def sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps({'event': event, **data})}\n\n".encode()
+
+
+@router.post("/execute-node/stream")
+async def execute_workflow_node_stream(request: WorkflowNodeExecutionRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Execute a node, streaming its progress as server-sent events:
+    - `status` ({"status": "running"}) once the node leaves the queue
+    - `progress` ({"stage", "fraction"}) and `token` ({"text"}) from streaming handlers
+    - `result`: the same WorkflowNodeExecutionResult as /execute-node
+    - `error` instead of `result` when the node was rejected (status 429 with
+      `retry_after`) or its idempotency key conflicts (409)
+
+    Memoized and replayed results arrive as a single `result` event.
+    """
+
+    async def stream():
+        events: asyncio.Queue = asyncio.Queue()
+        context = copy_context()
+        context.run(_node_events.set, events)
+        task = asyncio.create_task(run_request(request, idempotency_key), context=context)
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                kind, payload = event
+                yield sse(kind, {"text": payload} if kind == "token" else payload)
+            try:
+                result, _ = task.result()
+            except SchedulerBusy as e:
+                yield sse("error", {"status": 429, "message": str(e), "retry_after": e.retry_after})
+                return
+            except IdempotencyConflict as e:
+                yield sse("error", {"status": 409, "message": str(e)})
+                return
+            yield sse("result", result.model_dump())
+        finally:
+            task.cancel()  # Client went away mid-stream
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/execute-node/batch", response_model=WorkflowNodeBatchResult)
+async def execute_workflow_node_batch(request: WorkflowNodeBatchRequest):
+    """
+    Execute many node executions in one request, e.g. re-running
+    fraud_detector across a claim backlog after a policy change.
+
+    Items are grouped by node type. Handlers with batch support receive whole
+    chunks of items; the rest run per item with bounded concurrency. Results
+    come back in request order with items/second per node type.
+    """
+    if len(request.items) > settings.workflow_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.workflow_batch_max_items} items per batch",
+        )
+    start = time.perf_counter()
+    results: list[Optional[WorkflowNodeExecutionResult]] = [None] * len(request.items)
+
+    # Keyed items: one execution per key within the batch, replayed when already
+    # answered, joined when already running elsewhere; the rest run with the batch
+    # and are registered as in flight so other deliveries of their key join them
+    owners: dict[str, tuple[str, int]] = {}
+    duplicates: dict[int, int] = {}
+    joined: dict[int, Awaitable[WorkflowNodeExecutionResult]] = {}
+    executions: dict[int, asyncio.Future] = {}
+    groups: dict[str, list[int]] = {}
+    for index, item in enumerate(request.items):
+        scope = idempotency_scope(item)
+        if scope is not None:
+            fingerprint = request_fingerprint(item)
+            if scope in owners:
+                owner_fingerprint, owner = owners[scope]
+                if owner_fingerprint == fingerprint:
+                    duplicates[index] = owner
+                else:
+                    results[index] = failed_result(
+                        item.node_id, f"Idempotency key '{scope}' was used for a different request",
+                    )
+                continue
+            owners[scope] = (fingerprint, index)
+            try:
+                replayed = idempotent_results.replay(scope, fingerprint)
+            except IdempotencyConflict as e:
+                results[index] = failed_result(item.node_id, str(e))
+                continue
+            if replayed is not None:
+                results[index] = replayed
+                continue
+            if idempotent_results.running(scope):
+                joined[index] = join_idempotent(item, scope, fingerprint)
+                continue
+            executions[index] = asyncio.get_running_loop().create_future()
+            idempotent_results.begin(scope, fingerprint, executions[index], should_store=is_storable)
+        groups.setdefault(item.node_type, []).append(index)
+
+    async def run_group(node_type: str, indices: list[int]):
+        group_start = time.perf_counter()
+        results = await run_node_batch(node_type, [request.items[i] for i in indices])
+        batched = node_type in BATCH_NODE_HANDLERS
+        throughput = batch_throughput.record(node_type, len(indices), time.perf_counter() - group_start, batched)
+        return indices, results, throughput
+
+    throughput = {}
+    try:
+        group_runs, joined_results = await asyncio.gather(
+            asyncio.gather(*(run_group(node_type, indices) for node_type, indices in groups.items())),
+            asyncio.gather(*joined.values()),
         )
+        for indices, group_results, group_throughput in group_runs:
+            for index, result in zip(indices, group_results):
+                results[index] = result
+                if index in executions and not executions[index].done():
+                    executions[index].set_result(result)
+            throughput[request.items[indices[0]].node_type] = group_throughput
+    finally:
+        # Deliveries waiting on an item this batch never finished get an error instead of waiting forever
+        for execution in executions.values():
+            if not execution.done():
+                execution.set_exception(RuntimeError("Batch request ended before this item ran"))
+    for index, result in zip(joined, joined_results):
+        results[index] = result
+    for index, owner in duplicates.items():
+        results[index] = results[owner].model_copy(deep=True)
+
+    return WorkflowNodeBatchResult(
+        results=results,
+        throughput=throughput,
+        processing_time_ms=round((time.perf_counter() - start) * 1000),
+    )
+
+
+@router.get("/execute-node/batch/stats")
+async def workflow_batch_stats():
+    """Items per second by node type across batch executions since startup."""
+    return {"node_types": batch_throughput.to_dict()}
+
+
+@router.get("/node-cache/stats")
+async def workflow_node_cache_stats():
+    """Hit rates of the node result memo and of idempotency-key replays."""
+    return {
+        "results": node_results.stats.to_dict(len(node_results)),
+        "idempotency": idempotent_results.stats.to_dict(len(idempotent_results)),
+        "cacheable_node_types": CACHEABLE_NODE_TYPES,
+    }
 
-    except Exception as e:
-        logger.error("Workflow node execution failed", node_type=request.node_type, error=str(e))
-        return WorkflowNodeExecutionResult(
-            node_id=request.node_id,
-            status="failed",
-            output_data={"error": str(e)},
+
+@router.get("/scheduler/stats")
+async def workflow_scheduler_stats():
+    """Running and queued executions, queue wait times and rejections per node type."""
+    return node_scheduler.to_dict()
+
+
+@router.post("/execute-subgraph", response_model=SubgraphExecutionResult)
+async def execute_workflow_subgraph(request: SubgraphExecutionRequest):
+    """
+    Execute a DAG of AI nodes in one request instead of one execute-node call per node.
+
+    Independent branches run concurrently and each node receives its
+    predecessors' outputs merged into its input. Execution stops at the first
+    failed or waiting_hitl node; nodes not run are listed in `skipped_nodes`,
+    and each result's `next_nodes` names its successors so the engine can
+    resume after review. If a node's queue is full the whole request is
+    rejected with a 429; memoized nodes make the retry cheap.
+    """
+    nodes = {node.node_id: node for node in request.nodes}
+    try:
+        plan = plan_subgraph([node.node_id for node in request.nodes], [(e.source, e.target) for e in request.edges])
+    except SubgraphError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def run_subgraph_node(node_id: str, input_data: dict) -> WorkflowNodeExecutionResult:
+        node = nodes[node_id]
+        result = await run_node(node_id, node.node_type, node.node_config, input_data, request.priority)
+        result.next_nodes = plan.successors[node_id]
+        return result
+
+    try:
+        run = await run_subgraph(
+            plan,
+            run_subgraph_node,
+            shared_inputs=request.input_data,
+            node_inputs={node.node_id: node.input_data for node in request.nodes},
         )
+    except SchedulerBusy as e:
+        raise busy_response(e)
+    logger.info(
+        "Workflow subgraph executed",
+        execution_id=request.execution_id,
+        status=run.status,
+        nodes=len(run.results),
+        skipped=len(run.skipped),
+        processing_time_ms=run.total_time_ms,
+    )
+    return SubgraphExecutionResult(
+        execution_id=request.execution_id,
+        status=run.status,
+        results=list(run.results.values()),
+        timings=run.timings,
+        halted_at=run.halted_at,
+        skipped_nodes=run.skipped,
+        processing_time_ms=run.total_time_ms,
+    )
 
 
 @router.get("/node-types")
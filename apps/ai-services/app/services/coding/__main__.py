@@ -0,0 +1,78 @@
+"""
+Build the medical code search index from official code set files.
+
+Usage:
+    python -m app.services.coding build \
+        --icd10cm-tabular icd10cm_tabular_2025.xml \
+        --icd10cm-order icd10cm_order_2025.txt \
+        --hcpcs HCPC2025_JAN_ANWEB.txt \
+        --cpt cpt_2025.csv \
+        --out /data/code-index \
+        --embed --model sentence-transformers/all-MiniLM-L6-v2
+
+Point CODE_INDEX_DIR at the output directory to serve it.
+"""
+
+import argparse
+import time
+
+from app.config import settings
+from app.services.coding.embeddings import CodeEmbeddingIndex, get_encoder
+from app.services.coding.index import CodeIndex
+from app.services.coding.sources import (
+    merge_records,
+    read_code_csv,
+    read_hcpcs_anweb,
+    read_icd10cm_order,
+    read_icd10cm_tabular,
+    read_seed_codes,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medical code index tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build an index directory from code set files")
+    build.add_argument("--icd10cm-tabular", help="ICD-10-CM tabular XML (descriptions + inclusion terms)")
+    build.add_argument("--icd10cm-order", help="ICD-10-CM order file (descriptions + billable flags)")
+    build.add_argument("--hcpcs", help="HCPCS Level II ANWEB fixed-width file")
+    build.add_argument("--cpt", help="Licensed CPT extract as CSV (code, description[, terms])")
+    build.add_argument("--seed", action="store_true", help="Include the bundled seed code set")
+    build.add_argument("--out", required=True, help="Output directory")
+    build.add_argument("--embed", action="store_true", help="Also build the semantic (embedding) index")
+    build.add_argument(
+        "--model",
+        default=settings.code_embedding_model,
+        help="Encoder: a sentence-transformers model or hashing[-dim]",
+    )
+    build.add_argument("--ann", default="ivf", choices=["ivf", "hnsw", "exact"], help="ANN backend")
+    args = parser.parse_args()
+
+    sources = []
+    if args.icd10cm_order:
+        sources.append(read_icd10cm_order(args.icd10cm_order))
+    if args.icd10cm_tabular:
+        sources.append(read_icd10cm_tabular(args.icd10cm_tabular))
+    if args.hcpcs:
+        sources.append(read_hcpcs_anweb(args.hcpcs))
+    if args.cpt:
+        sources.append(read_code_csv(args.cpt, "cpt"))
+    if args.seed or not sources:
+        sources.append(read_seed_codes())
+
+    start = time.perf_counter()
+    records = merge_records(*sources)
+    index = CodeIndex.build(records)
+    index.save(args.out)
+    print(f"Built {len(index)} codes ({index.meta['systems']}) into {args.out} in {time.perf_counter() - start:.1f}s")
+
+    if args.embed:
+        start = time.perf_counter()
+        embeddings = CodeEmbeddingIndex.build(index, records, get_encoder(args.model), args.ann)
+        embeddings.save(f"{args.out}/embeddings")
+        print(f"Embedded {len(index)} descriptors with {args.model} ({args.ann}) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Approximate Nearest Neighbor Indexes
+Cosine-similarity vector search over L2-normalized embeddings.
+
+- IVFIndex: inverted-file index in pure NumPy (spherical k-means coarse
+  quantizer, vectors stored contiguously per list, memory-mapped on load)
+- HNSWIndex: faiss HNSW graph, used when faiss is installed
+- ExactIndex: brute-force reference for recall measurement and tiny sets
+
+All indexes take a batch of queries at once and return (scores, ids) arrays
+of shape (n_queries, k); missing results have id -1.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # Optional dependency
+    faiss = None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k of one query's candidate scores, padded with -1 ids."""
+    out_scores = np.full(k, -np.inf, dtype=np.float32)
+    out_ids = np.full(k, -1, dtype=np.int64)
+    if scores.size == 0:
+        return out_scores, out_ids
+    if scores.size > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[part], ids[part]
+    order = np.argsort(-scores, kind="stable")
+    out_scores[: order.size] = scores[order]
+    out_ids[: order.size] = ids[order]
+    return out_scores, out_ids
+
+
+class ExactIndex:
+    backend = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = normalize_rows(vectors)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int = 10, **_) -> tuple[np.ndarray, np.ndarray]:
+        queries = normalize_rows(queries)
+        scores = queries @ self.vectors.T
+        results = [_top_k(row, np.arange(len(row)), k) for row in scores]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are clustered around `nlist` centroids and a
+    query only scans the `nprobe` closest lists. Vectors are stored grouped by
+    list so each probe is one contiguous matrix product, and a query batch is
+    grouped by list so every list is multiplied once for all queries probing it.
+    """
+
+    backend = "ivf"
+    ARRAYS = ("centroids", "list_offsets", "list_ids", "vectors")
+
+    def __init__(self, centroids, list_offsets, list_ids, vectors, nprobe: int = 8):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.vectors = vectors
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        iterations: int = 15,
+        nprobe: int = 8,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        vectors = normalize_rows(vectors)
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(4 * np.sqrt(n)), n))
+        centroids = cls._train_centroids(vectors, nlist, iterations, np.random.default_rng(seed))
+
+        assignments = (
+            np.concatenate([np.argmax(vectors[i : i + 8192] @ centroids.T, axis=1) for i in range(0, n, 8192)])
+            if n
+            else np.zeros(0, dtype=np.int64)
+        )
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(
+            centroids=centroids.astype(np.float32),
+            list_offsets=list_offsets,
+            list_ids=order.astype(np.int64),
+            vectors=np.ascontiguousarray(vectors[order]),
+            nprobe=nprobe,
+        )
+
+    @staticmethod
+    def _train_centroids(vectors: np.ndarray, nlist: int, iterations: int, rng) -> np.ndarray:
+        """Spherical k-means on a sample of the vectors."""
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        queries = normalize_rows(queries)
+        nprobe = max(1, min(nprobe or self.nprobe, len(self.centroids)))
+
+        coarse = queries @ self.centroids.T
+        if nprobe < coarse.shape[1]:
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(coarse.shape[1]), coarse.shape)
+
+        candidate_scores: list[list[np.ndarray]] = [[] for _ in range(len(queries))]
+        candidate_ids: list[list[np.ndarray]] = [[] for _ in range(len(queries))]
+
+        # Group (query, list) probe pairs by list: one matmul per probed list
+        flat_lists = probes.ravel()
+        flat_queries = np.repeat(np.arange(len(queries)), probes.shape[1])
+        order = np.argsort(flat_lists, kind="stable")
+        flat_lists, flat_queries = flat_lists[order], flat_queries[order]
+        boundaries = np.flatnonzero(np.diff(flat_lists)) + 1
+        for group_lists, group_queries in zip(np.split(flat_lists, boundaries), np.split(flat_queries, boundaries)):
+            if group_lists.size == 0:
+                continue
+            start, end = self.list_offsets[group_lists[0]], self.list_offsets[group_lists[0] + 1]
+            if start == end:
+                continue
+            scores = queries[group_queries] @ np.asarray(self.vectors[start:end]).T
+            ids = self.list_ids[start:end]
+            for row, q in enumerate(group_queries):
+                candidate_scores[q].append(scores[row])
+                candidate_ids[q].append(ids)
+
+        out_scores = np.empty((len(queries), k), dtype=np.float32)
+        out_ids = np.empty((len(queries), k), dtype=np.int64)
+        for q in range(len(queries)):
+            if candidate_scores[q]:
+                scores, ids = np.concatenate(candidate_scores[q]), np.concatenate(candidate_ids[q])
+            else:
+                scores, ids = np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+            out_scores[q], out_ids[q] = _top_k(scores, ids, k)
+        return out_scores, out_ids
+
+    def save(self, directory: str | Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", np.asarray(getattr(self, name)))
+        (directory / "ann.json").write_text(json.dumps({"backend": self.backend, "nprobe": self.nprobe}))
+
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "IVFIndex":
+        directory = Path(directory)
+        meta = json.loads((directory / "ann.json").read_text())
+        mode = "r" if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS}
+        return cls(**arrays, nprobe=meta.get("nprobe", 8))
+
+
+class HNSWIndex:
+    """HNSW graph index backed by faiss (inner product over normalized vectors)."""
+
+    backend = "hnsw"
+
+    def __init__(self, index, ef_search: int = 64):
+        self.index = index
+        self.ef_search = ef_search
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, m: int = 32, ef_construction: int = 200, ef_search: int = 64) -> "HNSWIndex":
+        if faiss is None:
+            raise RuntimeError("faiss is not installed; use the IVF backend")
+        vectors = normalize_rows(vectors)
+        index = faiss.IndexHNSWFlat(vectors.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.add(vectors)
+        return cls(index, ef_search)
+
+    def search(
+        self, queries: np.ndarray, k: int = 10, ef_search: Optional[int] = None, **_
+    ) -> tuple[np.ndarray, np.ndarray]:
+        self.index.hnsw.efSearch = max(ef_search or self.ef_search, k)
+        scores, ids = self.index.search(normalize_rows(queries), k)
+        scores[ids < 0] = -np.inf
+        return scores, ids.astype(np.int64)
+
+    def save(self, directory: str | Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(directory / "hnsw.faiss"))
+        (directory / "ann.json").write_text(json.dumps({"backend": self.backend, "ef_search": self.ef_search}))
+
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "HNSWIndex":
+        if faiss is None:
+            raise RuntimeError("faiss is not installed; rebuild the index with the IVF backend")
+        directory = Path(directory)
+        meta = json.loads((directory / "ann.json").read_text())
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        return cls(faiss.read_index(str(directory / "hnsw.faiss"), flags), meta.get("ef_search", 64))
+
+
+def build_ann(vectors: np.ndarray, backend: str = "ivf", nprobe: int = 8):
+    """Build an ANN index; tiny sets get an exact index, HNSW falls back to IVF without faiss."""
+    if backend == "exact" or len(vectors) < 256:
+        return ExactIndex(vectors)
+    if backend == "hnsw" and faiss is not None:
+        return HNSWIndex.build(vectors)
+    return IVFIndex.build(vectors, nprobe=nprobe)
+
+
+def save_ann(index, directory: str | Path):
+    if isinstance(index, ExactIndex):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "vectors.npy", index.vectors)
+        (directory / "ann.json").write_text(json.dumps({"backend": "exact"}))
+    else:
+        index.save(directory)
+
+
+def load_ann(directory: str | Path, mmap: bool = True):
+    directory = Path(directory)
+    backend = json.loads((directory / "ann.json").read_text())["backend"]
+    if backend == "hnsw":
+        return HNSWIndex.load(directory, mmap)
+    if backend == "exact":
+        return ExactIndex(np.load(directory / "vectors.npy", mmap_mode="r" if mmap else None))
+    return IVFIndex.load(directory, mmap)
@@ -0,0 +1,317 @@
+"""
+Embedding-Based Code Retrieval
+Semantic clinical-text-to-code retrieval on top of the lexical code index:
+catches paraphrases the BM25 index misses ("lumbago" vs. "low back pain").
+
+Every ICD-10-CM / CPT / HCPCS descriptor (description + inclusion terms) is
+embedded once with a CPU encoder into a per-code-system ANN index saved next
+to the lexical index and memory-mapped on load. A clinical note is split into
+sentences that are encoded and searched as one batch.
+"""
+
+import json
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.services.coding.ann import build_ann, load_ann, normalize_rows, save_ann
+from app.services.coding.index import SYSTEMS, CodeIndex, get_code_index
+from app.services.coding.sources import CodeRecord, read_seed_codes
+
+logger = structlog.get_logger()
+
+_SENTENCE_RE = re.compile(r"(?<=[.;!?])\s+|\n+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Reciprocal-rank-fusion constant for merging lexical and semantic rankings
+RRF_K = 60
+
+
+# ═══════════════════════════════════════════════════════
+# Text Encoders
+# ═══════════════════════════════════════════════════════
+
+
+class TextEncoder(Protocol):
+    name: str
+    dim: int
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encode texts into an (n, dim) float32 matrix of L2-normalized rows."""
+        ...
+
+
+class HashingEncoder:
+    """
+    Dependency-free encoder: hashed word and character n-gram features
+    (so "lumbar"/"lumbago" or "herniation"/"herniated" overlap), log-scaled
+    and normalized. It matches spelling variants, not paraphrases, so it is for
+    building and testing the ANN index rather than for semantic suggestions.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> dict[int, float]:
+        counts: dict[int, float] = {}
+        for word in _WORD_RE.findall(text.lower()):
+            grams = [word] + [f"<{word}>"[i : i + n] for n in (3, 4, 5) for i in range(len(word) + 3 - n)]
+            for gram in grams:
+                h = zlib.crc32(gram.encode())
+                index = h % self.dim
+                counts[index] = counts.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        return counts
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for index, value in self._features(text).items():
+                matrix[row, index] = np.sign(value) * np.log1p(abs(value))
+        return normalize_rows(matrix)
+
+
+class SentenceTransformerEncoder:
+    """Local sentence-transformers model pinned to CPU."""
+
+    def __init__(self, model_name: str, local_files_only: bool = False):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu", local_files_only=local_files_only)
+        self.name = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts,
+            batch_size=64,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.astype(np.float32)
+
+
+def is_hashing(name: str) -> bool:
+    return name.startswith("hashing")
+
+
+@lru_cache(maxsize=4)
+def get_encoder(name: str, local_files_only: bool = False) -> TextEncoder:
+    """
+    `hashing` / `hashing-<dim>`, or any sentence-transformers model name or path.
+    With `local_files_only`, a model that has not been downloaded raises OSError.
+    """
+    if is_hashing(name):
+        _, _, dim = name.partition("-")
+        return HashingEncoder(int(dim) if dim else 512)
+    return SentenceTransformerEncoder(name, local_files_only=local_files_only)
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(text) if len(s.strip()) > 2]
+
+
+# ═══════════════════════════════════════════════════════
+# Code Embedding Index
+# ═══════════════════════════════════════════════════════
+
+
+def descriptor_text(record: CodeRecord) -> str:
+    return "; ".join([record.description, *record.terms])
+
+
+class CodeEmbeddingIndex:
+    """One ANN index per code system; ANN ids are rows of the lexical CodeIndex."""
+
+    def __init__(self, encoder: TextEncoder, anns: dict[str, object], row_offsets: dict[str, int]):
+        self.encoder = encoder
+        self.anns = anns
+        self.row_offsets = row_offsets
+
+    @classmethod
+    def build(
+        cls,
+        code_index: CodeIndex,
+        records: Iterable[CodeRecord],
+        encoder: TextEncoder,
+        backend: str = "ivf",
+    ) -> "CodeEmbeddingIndex":
+        texts = [""] * len(code_index)
+        for record in records:
+            row = code_index._find_row(record.code, record.system)
+            if row >= 0:
+                texts[row] = descriptor_text(record)
+
+        anns, row_offsets = {}, {}
+        for system in SYSTEMS:
+            lo, hi = code_index._system_ranges[system]
+            if lo == hi:
+                continue
+            vectors = encoder.encode(texts[lo:hi])
+            anns[system] = build_ann(vectors, backend, nprobe=settings.code_ann_nprobe)
+            row_offsets[system] = lo
+        return cls(encoder, anns, row_offsets)
+
+    def save(self, directory: str | Path):
+        directory = Path(directory)
+        for system, ann in self.anns.items():
+            save_ann(ann, directory / system)
+        (directory / "embeddings.json").write_text(
+            json.dumps(
+                {
+                    "encoder": self.encoder.name,
+                    "dim": self.encoder.dim,
+                    "row_offsets": self.row_offsets,
+                },
+                indent=2,
+            )
+        )
+
+    @classmethod
+    def load(cls, directory: str | Path, encoder: TextEncoder) -> "CodeEmbeddingIndex":
+        directory = Path(directory)
+        meta = json.loads((directory / "embeddings.json").read_text())
+        if meta["encoder"] != encoder.name:
+            raise ValueError(f"Embeddings were built with {meta['encoder']}, configured encoder is {encoder.name}")
+        anns = {system: load_ann(directory / system) for system in meta["row_offsets"]}
+        return cls(encoder, anns, meta["row_offsets"])
+
+    def search_batch(self, texts: list[str], system: str, k: int = 10) -> list[list[tuple[int, float]]]:
+        """Encode all texts at once and return (code_index_row, similarity) lists per text."""
+        ann = self.anns.get(system)
+        if ann is None or not texts:
+            return [[] for _ in texts]
+        scores, ids = ann.search(self.encoder.encode(texts), k)
+        offset = self.row_offsets[system]
+        return [
+            [(offset + int(i), float(s)) for s, i in zip(row_scores, row_ids) if i >= 0]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+
+# ═══════════════════════════════════════════════════════
+# Hybrid Retrieval
+# ═══════════════════════════════════════════════════════
+
+
+class CodeRetriever:
+    """Fuses lexical (BM25) and semantic (ANN) rankings with reciprocal rank fusion."""
+
+    def __init__(
+        self,
+        lexical: CodeIndex,
+        semantic: Optional[CodeEmbeddingIndex] = None,
+        min_similarity: Optional[float] = None,
+    ):
+        self.lexical = lexical
+        self.semantic = semantic
+        self.min_similarity = settings.code_semantic_min_similarity if min_similarity is None else min_similarity
+
+    def semantic_search(self, text: str, system: str, k: int = 10) -> list[tuple[int, float]]:
+        """Best similarity per code across all sentences of the text."""
+        return self.semantic_search_batch([text], system, k)[0]
+
+    def semantic_search_batch(self, texts: list[str], system: str, k: int = 10) -> list[list[tuple[int, float]]]:
+        """`semantic_search` for many texts, encoding all of their sentences in one ANN query."""
+        if not self.semantic:
+            return [[] for _ in texts]
+        queries, owners = [], []
+        for owner, text in enumerate(texts):
+            sentences = split_sentences(text) or [text]
+            if len(sentences) > 1:
+                sentences.append(text)
+            queries.extend(sentences)
+            owners.extend([owner] * len(sentences))
+        best: list[dict[int, float]] = [{} for _ in texts]
+        for owner, hits in zip(owners, self.semantic.search_batch(queries, system, k)):
+            for row, similarity in hits:
+                if similarity > best[owner].get(row, -1.0):
+                    best[owner][row] = similarity
+        return [sorted(b.items(), key=lambda item: -item[1])[:k] for b in best]
+
+    def suggest(self, text: str, system: str, limit: int = 5) -> list[dict]:
+        return self.suggest_batch([text], system, limit)[0]
+
+    def suggest_batch(self, texts: list[str], system: str, limit: int = 5) -> list[list[dict]]:
+        """Suggestions for each text; the semantic side is one batched encode and search."""
+        pool = max(limit * 4, 20)
+        semantic = self.semantic_search_batch(texts, system, k=pool)
+        return [self._fuse(text, hits, system, limit, pool) for text, hits in zip(texts, semantic)]
+
+    def _fuse(self, text: str, semantic: list[tuple[int, float]], system: str, limit: int, pool: int) -> list[dict]:
+        lexical = self.lexical.search(text, system=system, limit=pool)
+
+        fused: dict[int, dict] = {}
+        for rank, match in enumerate(lexical):
+            row = self.lexical._find_row(match.code, system)
+            fused[row] = {"rrf": 1 / (RRF_K + rank), "confidence": match.confidence, "match": ["lexical"]}
+        for rank, (row, similarity) in enumerate(semantic):
+            if similarity < self.min_similarity and row not in fused:
+                continue  # Nearest neighbours always exist; a weak one alone is not a suggestion
+            entry = fused.setdefault(row, {"rrf": 0.0, "confidence": 0.0, "match": []})
+            entry["rrf"] += 1 / (RRF_K + rank)
+            entry["confidence"] = max(entry["confidence"], round(max(similarity, 0.0), 2))
+            entry["match"].append("semantic")
+
+        ranked = sorted(fused.items(), key=lambda item: (-item[1]["rrf"], not self.lexical.billable[item[0]]))
+        suggestions = []
+        for row, entry in ranked[:limit]:
+            match = self.lexical._match(row, confidence=entry["confidence"])
+            suggestion = match.to_dict()
+            suggestion["match"] = entry["match"]
+            if not match.billable:
+                suggestion["billable_children"] = [
+                    child.code for child in self.lexical.children(match.code, system) if child.billable
+                ][:5]
+            suggestions.append(suggestion)
+        return suggestions
+
+
+@lru_cache(maxsize=1)
+def get_code_retriever() -> CodeRetriever:
+    """
+    Shared hybrid retriever. Semantic search loads `<code_index_dir>/embeddings`
+    when present; for the seed code set it is built in memory. If the configured
+    model is not installed locally (or is the hashing encoder), retrieval stays
+    lexical-only.
+    """
+    code_index = get_code_index()
+    if is_hashing(settings.code_embedding_model):
+        logger.info("Hashing encoder configured; code retrieval is lexical-only")
+        return CodeRetriever(code_index)
+    try:
+        encoder = get_encoder(settings.code_embedding_model, local_files_only=True)
+    except ImportError:
+        logger.warning(
+            "sentence-transformers not installed; code retrieval is lexical-only", model=settings.code_embedding_model
+        )
+        return CodeRetriever(code_index)
+    except OSError as e:
+        logger.warning(
+            "Code embedding model not available locally; code retrieval is lexical-only",
+            model=settings.code_embedding_model,
+            error=str(e),
+        )
+        return CodeRetriever(code_index)
+
+    embeddings_dir = Path(settings.code_index_dir) / "embeddings" if settings.code_index_dir else None
+    if embeddings_dir and (embeddings_dir / "embeddings.json").exists():
+        try:
+            semantic = CodeEmbeddingIndex.load(embeddings_dir, encoder)
+        except ValueError as e:
+            logger.warning("Code embeddings unusable; code retrieval is lexical-only", error=str(e))
+            return CodeRetriever(code_index)
+    elif embeddings_dir:
+        logger.info("No code embeddings built; code retrieval is lexical-only", path=str(embeddings_dir))
+        return CodeRetriever(code_index)
+    else:
+        semantic = CodeEmbeddingIndex.build(code_index, read_seed_codes(), encoder, settings.code_ann_backend)
+
+    return CodeRetriever(code_index, semantic)
@@ -0,0 +1,395 @@
+"""
+Medical Code Search Index
+Local ICD-10-CM / CPT / HCPCS search shared by the suggest-codes endpoint,
+the orchestrator coding tools and the medical coding workflow node.
+
+The index is a set of flat NumPy arrays (saved as .npy files and memory-mapped
+on load, so startup does not parse or rebuild anything):
+- a code table sorted by (system, code) - binary search over it gives exact
+  and code-prefix lookup, i.e. a flattened prefix trie
+- parent / children arrays for hierarchy navigation (M54 -> M54.5 -> M54.50)
+- an inverted index over descriptions and inclusion terms with precomputed
+  BM25 weights, so a query is a few postings slices summed per matched code
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.services.coding.sources import CodeRecord, format_code, normalize_code, read_seed_codes
+
+logger = structlog.get_logger()
+
+SYSTEMS = ("icd10cm", "cpt", "hcpcs")
+
+# BM25 parameters; inclusion terms count at half weight relative to the description
+BM25_K1 = 1.2
+BM25_B = 0.75
+TERM_FIELD_WEIGHT = 0.5
+
+INDEX_FORMAT_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CODE_QUERY_RE = re.compile(r"^[A-Za-z]?\d[0-9A-Za-z.]{0,7}$")
+_STOPWORDS = frozenset(
+    [
+        "a",
+        "an",
+        "and",
+        "are",
+        "as",
+        "at",
+        "by",
+        "for",
+        "from",
+        "in",
+        "is",
+        "of",
+        "on",
+        "or",
+        "per",
+        "than",
+        "the",
+        "to",
+        "with",
+        "without",
+        "nos",
+        "unspecified",
+        "patient",
+        "presents",
+        "shows",
+        "reports",
+    ]
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens with stopwords removed and simple plural folding."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+@dataclass
+class CodeMatch:
+    system: str
+    code: str
+    description: str
+    billable: bool
+    score: float = 0.0
+    confidence: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code,
+            "description": self.description,
+            "confidence": self.confidence,
+            "system": self.system,
+            "billable": self.billable,
+        }
+
+
+class CodeIndex:
+    """Read-only code search index over flat (optionally memory-mapped) arrays."""
+
+    ARRAYS = (
+        "systems",
+        "keys",
+        "billable",
+        "parents",
+        "child_offsets",
+        "child_ids",
+        "desc_offsets",
+        "desc_blob",
+        "vocab",
+        "post_offsets",
+        "post_docs",
+        "post_weights",
+        "self_scores",
+    )
+
+    def __init__(self, arrays: dict[str, np.ndarray], meta: dict):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        # Contiguous row range of each system in the sorted code table
+        self._system_ranges = {
+            system: (int(np.searchsorted(self.systems, i, "left")), int(np.searchsorted(self.systems, i, "right")))
+            for i, system in enumerate(SYSTEMS)
+        }
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # ─── Build / persist ──
+
+    @classmethod
+    def build(cls, records: Iterable[CodeRecord]) -> "CodeIndex":
+        rows = sorted(
+            (r for r in records if r.system in SYSTEMS),
+            key=lambda r: (SYSTEMS.index(r.system), r.code),
+        )
+        n = len(rows)
+        systems = np.array([SYSTEMS.index(r.system) for r in rows], dtype=np.uint8)
+        key_width = max((len(r.code) for r in rows), default=1)
+        keys = np.array([r.code.encode() for r in rows], dtype=f"S{key_width}")
+        billable = np.array([r.billable for r in rows], dtype=np.bool_)
+
+        # Hierarchy: parent is the longest proper prefix present in the same system
+        position = {(r.system, r.code): i for i, r in enumerate(rows)}
+        parents = np.full(n, -1, dtype=np.int32)
+        for i, r in enumerate(rows):
+            for cut in range(len(r.code) - 1, 2, -1):
+                parent = position.get((r.system, r.code[:cut]))
+                if parent is not None:
+                    parents[i] = parent
+                    break
+        order = np.argsort(parents, kind="stable")
+        child_ids = order[parents[order] >= 0].astype(np.int32)
+        child_counts = np.bincount(parents[parents >= 0], minlength=n)
+        child_offsets = np.concatenate([[0], np.cumsum(child_counts)]).astype(np.int64)
+
+        encoded = [r.description.encode() for r in rows]
+        desc_offsets = np.concatenate([[0], np.cumsum([len(d) for d in encoded])]).astype(np.int64)
+        desc_blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        # Term frequencies per document (description + down-weighted inclusion terms)
+        doc_tfs: list[dict[str, float]] = []
+        doc_lengths = np.zeros(n, dtype=np.float64)
+        for i, r in enumerate(rows):
+            tf: dict[str, float] = {}
+            for token in tokenize(r.description):
+                tf[token] = tf.get(token, 0.0) + 1.0
+            for token in tokenize(" ".join(r.terms)):
+                tf[token] = tf.get(token, 0.0) + TERM_FIELD_WEIGHT
+            doc_tfs.append(tf)
+            doc_lengths[i] = sum(tf.values())
+        avg_length = float(doc_lengths.mean()) if n else 1.0
+
+        postings: dict[str, list[tuple[int, float]]] = {}
+        for i, tf in enumerate(doc_tfs):
+            for token, freq in tf.items():
+                postings.setdefault(token, []).append((i, freq))
+
+        vocab_terms = sorted(postings)
+        term_width = max((len(t) for t in vocab_terms), default=1)
+        vocab = np.array([t.encode() for t in vocab_terms], dtype=f"S{term_width}")
+        post_offsets = np.zeros(len(vocab_terms) + 1, dtype=np.int64)
+        post_docs, post_weights = [], []
+        for t_index, term in enumerate(vocab_terms):
+            plist = postings[term]
+            idf = np.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc, freq in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc] / avg_length)
+                post_docs.append(doc)
+                post_weights.append(idf * freq * (BM25_K1 + 1) / (freq + norm))
+            post_offsets[t_index + 1] = len(post_docs)
+
+        post_docs = np.array(post_docs, dtype=np.int32)
+        post_weights = np.array(post_weights, dtype=np.float32)
+        # A document's score against its own text - used to turn BM25 into a 0-1 confidence
+        self_scores = np.bincount(post_docs, weights=post_weights, minlength=n).astype(np.float32)
+
+        arrays = {
+            "systems": systems,
+            "keys": keys,
+            "billable": billable,
+            "parents": parents,
+            "child_offsets": child_offsets,
+            "child_ids": child_ids,
+            "desc_offsets": desc_offsets,
+            "desc_blob": desc_blob,
+            "vocab": vocab,
+            "post_offsets": post_offsets,
+            "post_docs": post_docs,
+            "post_weights": post_weights,
+            "self_scores": self_scores,
+        }
+        meta = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "code_count": n,
+            "vocab_size": len(vocab_terms),
+            "systems": {s: int((systems == i).sum()) for i, s in enumerate(SYSTEMS)},
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory: str | Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", np.asarray(getattr(self, name)))
+        (directory / "meta.json").write_text(json.dumps(self.meta, indent=2))
+
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "CodeIndex":
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text())
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported code index format: {meta.get('format_version')}")
+        mode = "r" if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS}
+        return cls(arrays, meta)
+
+    # ─── Lookup ──
+
+    def _range(self, system: Optional[str]) -> tuple[int, int]:
+        return self._system_ranges[system] if system else (0, len(self.keys))
+
+    def _match(self, row: int, score: float = 0.0, confidence: float = 0.0) -> CodeMatch:
+        system = SYSTEMS[self.systems[row]]
+        start, end = self.desc_offsets[row], self.desc_offsets[row + 1]
+        return CodeMatch(
+            system=system,
+            code=format_code(system, self.keys[row].decode()),
+            description=bytes(self.desc_blob[start:end]).decode(),
+            billable=bool(self.billable[row]),
+            score=score,
+            confidence=confidence,
+        )
+
+    def _find_row(self, code: str, system: Optional[str] = None) -> int:
+        key = normalize_code(code).encode()
+        systems = [system] if system else SYSTEMS
+        for sys_name in systems:
+            lo, hi = self._system_ranges[sys_name]
+            row = lo + int(np.searchsorted(self.keys[lo:hi], key))
+            if row < hi and self.keys[row] == key:
+                return row
+        return -1
+
+    def lookup(self, code: str, system: Optional[str] = None) -> Optional[CodeMatch]:
+        """Exact code lookup (dots and case are ignored)."""
+        row = self._find_row(code, system)
+        return self._match(row) if row >= 0 else None
+
+    def prefix(self, prefix: str, system: Optional[str] = None, limit: int = 50) -> list[CodeMatch]:
+        """All codes starting with `prefix`, in code order."""
+        key = normalize_code(prefix).encode()
+        matches = []
+        for sys_name in [system] if system else SYSTEMS:
+            lo, hi = self._system_ranges[sys_name]
+            keys = self.keys[lo:hi]
+            start = int(np.searchsorted(keys, key, "left"))
+            # Every key with this prefix sorts below prefix + 0xFF
+            end = int(np.searchsorted(keys, key + b"\xff", "left"))
+            matches.extend(self._match(lo + row) for row in range(start, min(end, start + limit - len(matches))))
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def parent(self, code: str, system: Optional[str] = None) -> Optional[CodeMatch]:
+        row = self._find_row(code, system)
+        if row < 0 or self.parents[row] < 0:
+            return None
+        return self._match(int(self.parents[row]))
+
+    def ancestors(self, code: str, system: Optional[str] = None) -> list[CodeMatch]:
+        """Ancestors from the immediate parent up to the category."""
+        row = self._find_row(code, system)
+        chain = []
+        while row >= 0 and self.parents[row] >= 0:
+            row = int(self.parents[row])
+            chain.append(self._match(row))
+        return chain
+
+    def children(self, code: str, system: Optional[str] = None) -> list[CodeMatch]:
+        row = self._find_row(code, system)
+        if row < 0:
+            return []
+        start, end = self.child_offsets[row], self.child_offsets[row + 1]
+        return [self._match(int(child)) for child in self.child_ids[start:end]]
+
+    # ─── Search ──
+
+    def _term_ids(self, tokens: list[str]) -> list[int]:
+        ids = []
+        for token in set(tokens):
+            encoded = token.encode()
+            i = int(np.searchsorted(self.vocab, encoded))
+            if i < len(self.vocab) and self.vocab[i] == encoded:
+                ids.append(i)
+        return ids
+
+    def search(self, text: str, system: Optional[str] = None, limit: int = 10) -> list[CodeMatch]:
+        """
+        Rank codes for free text (clinical note, description or code fragment).
+        Code-shaped queries ("M54", "9921") are answered by prefix lookup.
+        Confidence is the BM25 score relative to the code's own description score.
+        """
+        query = text.strip()
+        if _CODE_QUERY_RE.match(query):
+            hits = self.prefix(query, system, limit)
+            if hits:
+                for hit in hits:
+                    hit.confidence = 1.0
+                return hits
+
+        term_ids = self._term_ids(tokenize(query))
+        if not term_ids:
+            return []
+
+        slices = [slice(self.post_offsets[t], self.post_offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.post_docs[s] for s in slices])
+        weights = np.concatenate([self.post_weights[s] for s in slices])
+        lo, hi = self._range(system)
+        in_system = (docs >= lo) & (docs < hi)
+        # Sum over the matched postings only: the work scales with the query, not the code set
+        rows, inverse = np.unique(docs[in_system], return_inverse=True)
+        scores = np.zeros(rows.size, dtype=np.float64)
+        np.add.at(scores, inverse, weights[in_system])
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Best score first; prefer billable codes on ties
+        ranked = sorted(
+            (int(c) for c in candidates),
+            key=lambda c: (-scores[c], not self.billable[rows[c]], int(rows[c])),
+        )
+
+        matches = []
+        for c in ranked:
+            row, score = int(rows[c]), float(scores[c])
+            confidence = min(1.0, score / float(self.self_scores[row])) if self.self_scores[row] else 0.0
+            matches.append(self._match(row, score=score, confidence=round(confidence, 2)))
+        return matches
+
+    def suggest(self, text: str, system: str, limit: int = 5) -> list[dict]:
+        """Search results as response dicts; header codes list their billable children."""
+        suggestions = []
+        for match in self.search(text, system=system, limit=limit):
+            suggestion = match.to_dict()
+            if not match.billable:
+                suggestion["billable_children"] = [
+                    child.code for child in self.children(match.code, system) if child.billable
+                ][:5]
+            suggestions.append(suggestion)
+        return suggestions
+
+
+@lru_cache(maxsize=1)
+def get_code_index() -> CodeIndex:
+    """
+    Shared code index. Loads (memory-mapped) from settings.code_index_dir when it
+    has been built, otherwise builds in memory from the bundled seed code set.
+    """
+    index_dir = Path(settings.code_index_dir) if settings.code_index_dir else None
+    if index_dir and (index_dir / "meta.json").exists():
+        index = CodeIndex.load(index_dir)
+        logger.info("Loaded code index", path=str(index_dir), **index.meta["systems"])
+    else:
+        index = CodeIndex.build(read_seed_codes())
+        logger.info("Built seed code index", codes=len(index))
+    return index
@@ -0,0 +1,161 @@
+"""
+Medical Code Set Sources
+Readers for the official ICD-10-CM and HCPCS release files, licensed CPT
+extracts, and the small seed code set bundled for development and tests.
+"""
+
+import csv
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+SEED_CODES_PATH = Path(__file__).parent / "data" / "seed_codes.tsv"
+
+
+@dataclass
+class CodeRecord:
+    """One code from a code set, as read from a source file."""
+
+    system: str  # icd10cm, cpt, hcpcs
+    code: str  # Stored without dots (ICD-10-CM "M5450")
+    description: str
+    billable: bool = True
+    terms: list[str] = field(default_factory=list)  # Inclusion terms / synonyms
+
+
+def normalize_code(code: str) -> str:
+    """Canonical code key: uppercase, no dots or whitespace."""
+    return code.replace(".", "").replace(" ", "").upper()
+
+
+def format_code(system: str, code: str) -> str:
+    """Display form of a code key (ICD-10-CM gets its dot after the category)."""
+    if system == "icd10cm" and len(code) > 3:
+        return f"{code[:3]}.{code[3:]}"
+    return code
+
+
+def read_icd10cm_order(path: str | Path) -> Iterator[CodeRecord]:
+    """
+    Read the CMS ICD-10-CM order file (icd10cm_order_YYYY.txt).
+    Fixed width: order number (1-5), code (7-13), billable flag (15),
+    short description (17-76), long description (78-end).
+    """
+    with open(path, encoding="latin-1") as f:
+        for line in f:
+            if len(line) < 16:
+                continue
+            code = line[6:13].strip()
+            if not code:
+                continue
+            yield CodeRecord(
+                system="icd10cm",
+                code=normalize_code(code),
+                description=line[77:].strip() or line[16:76].strip(),
+                billable=line[14] == "1",
+            )
+
+
+def read_icd10cm_tabular(path: str | Path) -> Iterator[CodeRecord]:
+    """
+    Stream the CMS ICD-10-CM tabular XML (icd10cm_tabular_YYYY.xml).
+    Yields every <diag> with its inclusion terms; a diag with no child
+    diag is billable.
+    """
+    stack: list[dict] = []
+    for event, elem in ET.iterparse(str(path), events=("start", "end")):
+        if event == "start":
+            if elem.tag == "diag":
+                if stack:
+                    stack[-1]["has_children"] = True
+                stack.append({"has_children": False, "terms": []})
+            continue
+
+        if elem.tag == "inclusionTerm" and stack:
+            stack[-1]["terms"].extend((note.text or "").strip() for note in elem.findall("note"))
+        elif elem.tag == "diag" and stack:
+            state = stack.pop()
+            name = elem.findtext("name")
+            if name:
+                yield CodeRecord(
+                    system="icd10cm",
+                    code=normalize_code(name),
+                    description=(elem.findtext("desc") or "").strip(),
+                    billable=not state["has_children"],
+                    terms=[t for t in state["terms"] if t],
+                )
+            elem.clear()
+
+
+def read_hcpcs_anweb(path: str | Path) -> Iterator[CodeRecord]:
+    """
+    Read the CMS HCPCS Level II annual file (HCPC20XX_ANWEB*.txt).
+    Fixed width: code (1-5), sequence (6-10), record identification code (11),
+    long description (12-91). Record IDs 3/4 are procedure lines and their
+    continuations; modifier records (7/8) are skipped.
+    """
+    current: CodeRecord | None = None
+    with open(path, encoding="latin-1") as f:
+        for line in f:
+            if len(line) < 12:
+                continue
+            code, ric, text = line[0:5].strip(), line[10], line[11:91].strip()
+            if ric == "3":
+                if current:
+                    yield current
+                current = CodeRecord(system="hcpcs", code=normalize_code(code), description=text)
+            elif ric == "4" and current and current.code == normalize_code(code):
+                current.description = f"{current.description} {text}".strip()
+    if current:
+        yield current
+
+
+def read_code_csv(path: str | Path, system: str) -> Iterator[CodeRecord]:
+    """
+    Read a licensed code extract (e.g. AMA CPT) as CSV with `code` and
+    `description` columns and an optional `|`-separated `terms` column.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            code = (row.get("code") or "").strip()
+            if not code:
+                continue
+            yield CodeRecord(
+                system=system,
+                code=normalize_code(code),
+                description=(row.get("description") or "").strip(),
+                terms=[t.strip() for t in (row.get("terms") or "").split("|") if t.strip()],
+            )
+
+
+def read_seed_codes(path: str | Path = SEED_CODES_PATH) -> Iterator[CodeRecord]:
+    """Read the bundled seed code set (system, code, billable, description, terms)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            system, code, billable, description, terms = (line.rstrip("\n").split("\t") + [""])[:5]
+            yield CodeRecord(
+                system=system,
+                code=normalize_code(code),
+                description=description,
+                billable=billable == "1",
+                terms=[t for t in terms.split("|") if t],
+            )
+
+
+def merge_records(*sources: Iterable[CodeRecord]) -> list[CodeRecord]:
+    """Merge records from several sources; later sources fill in missing terms."""
+    merged: dict[tuple[str, str], CodeRecord] = {}
+    for source in sources:
+        for record in source:
+            key = (record.system, record.code)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = record
+                continue
+            existing.terms.extend(t for t in record.terms if t not in existing.terms)
+            if not existing.description:
+                existing.description = record.description
+    return list(merged.values())
@@ -0,0 +1,278 @@
+"""
+Document Extraction Pipeline
+Page-at-a-time text extraction, classification signals and field extraction
+for healthcare documents. Everything here is lazy: pages are produced one by
+one so callers can stream per-page results instead of waiting for the whole
+document.
+"""
+
+import io
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import structlog
+
+from app.services.metrics import timed
+from app.services.phi import is_valid_npi
+
+logger = structlog.get_logger()
+
+try:
+    import pytesseract
+except ImportError:  # Optional: OCR for scanned pages
+    pytesseract = None
+
+
+@dataclass
+class DocumentPage:
+    page_number: int
+    text: str
+    source: str  # pdf_text, ocr, text, ocr_unavailable
+
+
+@dataclass
+class FieldCandidate:
+    field_name: str
+    value: str
+    confidence: float
+    page_number: int
+
+
+@dataclass
+class ClassificationState:
+    """Running document classification accumulated over pages."""
+
+    scores: dict[str, float] = field(default_factory=dict)
+
+    def update(self, page_signals: dict[str, float]):
+        for category, score in page_signals.items():
+            self.scores[category] = self.scores.get(category, 0.0) + score
+
+    def best(self, default: str = "cms_1500") -> tuple[str, float]:
+        if not self.scores:
+            return default, 0.5
+        category = max(self.scores, key=self.scores.get)
+        total = sum(self.scores.values())
+        # Smoothed share of evidence; a single weak signal should not read as certain
+        return category, round(self.scores[category] / (total + 1.0), 2)
+
+
+# ═══════════════════════════════════════════════════════
+# Page Iteration
+# ═══════════════════════════════════════════════════════
+
+
+def _ocr_image(image) -> tuple[str, str]:
+    if pytesseract is None:
+        return "", "ocr_unavailable"
+    try:
+        with timed("ocr_page"):
+            return pytesseract.image_to_string(image), "ocr"
+    except (pytesseract.TesseractNotFoundError, OSError) as e:
+        logger.warning("OCR unavailable", error=str(e))
+        return "", "ocr_unavailable"
+
+
+def _ocr_pdf_page(content: bytes, page_number: int) -> tuple[str, str]:
+    """Rasterize one PDF page and OCR it (scanned PDFs have no text layer)."""
+    try:
+        from pdf2image import convert_from_bytes
+
+        images = convert_from_bytes(content, first_page=page_number, last_page=page_number, dpi=300)
+    except Exception as e:
+        logger.warning("PDF rasterization unavailable", error=str(e))
+        return "", "ocr_unavailable"
+    return _ocr_image(images[0]) if images else ("", "ocr_unavailable")
+
+
+def iter_pages(content: bytes, content_type: Optional[str] = None) -> Iterator[DocumentPage]:
+    """Yield document pages one at a time (PDF, images incl. multi-page TIFF, or text)."""
+    # Sniff the content; upload content types are client-supplied and often wrong
+    if content.startswith(b"%PDF"):
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(content))
+        for number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ""
+            if text.strip():
+                yield DocumentPage(number, text, "pdf_text")
+            else:
+                yield DocumentPage(number, *_ocr_pdf_page(content, number))
+        return
+
+    if (
+        (content_type or "").startswith("image/")
+        or content[:4] in (b"\x89PNG", b"II*\x00", b"MM\x00*")
+        or content[:3] == b"\xff\xd8\xff"
+    ):
+        from PIL import Image, ImageSequence
+
+        with Image.open(io.BytesIO(content)) as image:
+            for number, frame in enumerate(ImageSequence.Iterator(image), start=1):
+                yield DocumentPage(number, *_ocr_image(frame.convert("RGB")))
+        return
+
+    text = content.decode("utf-8", errors="replace")
+    # Form feeds separate pages in text exports of scanned documents
+    for number, page_text in enumerate(text.split("\f"), start=1):
+        if page_text.strip() or number == 1:
+            yield DocumentPage(number, page_text, "text")
+
+
+# ═══════════════════════════════════════════════════════
+# Classification Signals
+# ═══════════════════════════════════════════════════════
+
+CLASSIFICATION_SIGNALS = {
+    "cms_1500": [
+        "health insurance claim form",
+        "cms-1500",
+        "insured's id number",
+        "federal tax i.d",
+        "place of service",
+        "referring provider",
+        "outside lab",
+    ],
+    "ub_04": ["ub-04", "type of bill", "revenue code", "admission date", "discharge hour", "patient status"],
+    "eob": [
+        "explanation of benefits",
+        "this is not a bill",
+        "amount billed",
+        "patient responsibility",
+        "allowed amount",
+        "plan paid",
+    ],
+    "medical_record": [
+        "chief complaint",
+        "history of present illness",
+        "assessment",
+        "plan:",
+        "vital signs",
+        "physical exam",
+        "review of systems",
+    ],
+    "lab_result": ["reference range", "specimen", "collected", "abnormal", "result", "units"],
+    "prior_auth_form": [
+        "prior authorization",
+        "precertification",
+        "medical necessity",
+        "requesting provider",
+        "urgent",
+        "clinical notes",
+    ],
+    "id_card": ["member id", "rx bin", "rxpcn", "copay", "group no", "pcp"],
+}
+
+
+def classification_signals(text: str) -> dict[str, float]:
+    """Keyword evidence for each document category on one page."""
+    lowered = text.lower()
+    signals = {}
+    for category, phrases in CLASSIFICATION_SIGNALS.items():
+        score = float(sum(1 for phrase in phrases if phrase in lowered))
+        if score:
+            signals[category] = score
+    return signals
+
+
+# ═══════════════════════════════════════════════════════
+# Field Extraction
+# ═══════════════════════════════════════════════════════
+
+# Printed labels that map to schema fields (besides the field name itself)
+FIELD_LABELS = {
+    "patient_name": ["patient name", "patient", "name of patient"],
+    "patient_dob": ["date of birth", "dob", "birth date", "patient dob"],
+    "insured_id": ["insured's id number", "insured id", "subscriber id"],
+    "member_id": ["member id", "member number", "id number"],
+    "member_name": ["member name", "member"],
+    "group_number": ["group number", "group no", "group #", "group"],
+    "provider_npi": ["npi", "billing npi", "rendering npi", "provider npi"],
+    "provider_name": ["provider", "provider name", "rendering provider", "physician"],
+    "date_of_service": ["date of service", "dos", "service date"],
+    "service_date": ["service date", "date of service", "dos"],
+    "claim_number": ["claim number", "claim #", "claim no"],
+    "charges": ["total charge", "total charges", "charges"],
+    "charged_amount": ["amount billed", "billed amount", "charged amount"],
+    "allowed_amount": ["allowed amount", "amount allowed"],
+    "paid_amount": ["plan paid", "amount paid", "paid amount"],
+    "patient_responsibility": ["patient responsibility", "you owe", "amount you owe"],
+    "chief_complaint": ["chief complaint", "cc"],
+    "assessment": ["assessment", "impression"],
+    "plan": ["plan"],
+    "urgency": ["urgency", "priority"],
+    "requesting_provider": ["requesting provider", "ordering provider"],
+    "ordering_provider": ["ordering provider"],
+    "place_of_service": ["place of service", "pos"],
+}
+
+_ICD10_RE = re.compile(r"\b[A-TV-Z]\d[0-9A-Z]\.[0-9A-Z]{1,4}\b")
+_PROCEDURE_LINE_RE = re.compile(r"\b(?:cpt|hcpcs|procedure)\b", re.IGNORECASE)
+_PROCEDURE_CODE_RE = re.compile(r"\b(?:\d{4}[0-9FTU]|[A-V]\d{4})\b")
+_NPI_RE = re.compile(r"\b[12]\d{9}\b")
+
+
+def _label_pattern(fields: list[str]) -> tuple[re.Pattern, dict[str, str]]:
+    label_to_field = {}
+    for field_name in fields:
+        label_to_field.setdefault(field_name.replace("_", " "), field_name)
+        for label in FIELD_LABELS.get(field_name, []):
+            label_to_field.setdefault(label, field_name)
+    labels = sorted(label_to_field, key=len, reverse=True)
+    pattern = re.compile(
+        r"^[ \t]*(?P<label>"
+        + "|".join(re.escape(label) for label in labels)
+        + r")[ \t]*[:#][ \t]*(?P<value>\S.*?)[ \t]*$",
+        re.IGNORECASE | re.MULTILINE,
+    )
+    return pattern, label_to_field
+
+
+class FieldExtractor:
+    """Extracts schema fields page by page from printed labels and code/identifier patterns."""
+
+    def __init__(self, fields: list[str]):
+        self.fields = fields
+        self._label_re, self._label_to_field = _label_pattern(fields)
+        self._seen: set[tuple[str, str]] = set()
+
+    def extract(self, page: DocumentPage) -> list[FieldCandidate]:
+        """Fields found on this page that were not already emitted for an earlier page."""
+        candidates = []
+        for match in self._label_re.finditer(page.text):
+            field_name = self._label_to_field[match.group("label").lower()]
+            candidates.append(FieldCandidate(field_name, match.group("value"), 0.9, page.page_number))
+
+        if "diagnosis_codes" in self.fields:
+            codes = list(dict.fromkeys(_ICD10_RE.findall(page.text)))
+            if codes:
+                candidates.append(FieldCandidate("diagnosis_codes", ", ".join(codes), 0.8, page.page_number))
+
+        if "procedure_codes" in self.fields:
+            codes = []
+            for line in page.text.splitlines():
+                if _PROCEDURE_LINE_RE.search(line):
+                    codes.extend(_PROCEDURE_CODE_RE.findall(line))
+            if codes:
+                candidates.append(
+                    FieldCandidate(
+                        "procedure_codes",
+                        ", ".join(dict.fromkeys(codes)),
+                        0.75,
+                        page.page_number,
+                    )
+                )
+
+        if "provider_npi" in self.fields:
+            for npi in _NPI_RE.findall(page.text):
+                if is_valid_npi(npi):
+                    candidates.append(FieldCandidate("provider_npi", npi, 0.85, page.page_number))
+
+        fresh = []
+        for candidate in candidates:
+            key = (candidate.field_name, candidate.value)
+            if key not in self._seen:
+                self._seen.add(key)
+                fresh.append(candidate)
+        return fresh
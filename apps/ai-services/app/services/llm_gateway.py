@@ -0,0 +1,552 @@
+"""
+LLM Gateway
+Every LLM call in the service (intent routing, agent chat and voice turns,
+workflow LLM nodes) goes through one gateway, so provider limits are managed
+in one place instead of by each caller:
+
+- A global requests-per-minute and tokens-per-minute budget. Calls wait for
+  budget instead of running into provider 429s. Token use is estimated up
+  front and settled against the usage the provider reports.
+- Priority. When budget is short, interactive calls (chat, voice) get it
+  before standard ones, and both before bulk workflow work.
+- Identical prompts already in flight share one provider call, as long as
+  that call has the same or a higher priority (an interactive call never waits
+  behind a bulk one's budget queue or batch window).
+- Bulk calls are collected for a few milliseconds and sent to the provider's
+  batch endpoint together, one batch per model, when it has one.
+- Calls can reference a provider-side cached context holding their system
+  prompt and tools (see prompt_cache); cached and uncached input tokens and
+  call latency are tracked separately.
+
+Gemini (through LangChain) is used when an API key is configured. Without one
+the gateway is unavailable and callers use their offline fallbacks. The local
+fake provider answers with canned text (tests and benchmarks).
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional, Protocol, Sequence
+
+import structlog
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from app.config import settings
+from app.services.metrics import timed
+from app.services.single_flight import SharedCalls, canonical_hash
+from app.services.tracing import span, tracer
+
+logger = structlog.get_logger()
+
+PRIORITIES = {"interactive": 0, "standard": 1, "bulk": 2}
+
+
+@dataclass
+class LLMCall:
+    messages: list[BaseMessage]
+    model: str
+    temperature: float = 0.0
+    tools: Sequence = ()
+    max_output_tokens: int = 512  # Reserved against the token budget until the provider reports usage
+    cached_content: Optional[str] = None  # Provider cache holding the leading system message and tools
+
+    def key(self) -> str:
+        """Identity of the prompt: calls with equal keys get the same answer."""
+        return canonical_hash(
+            self.model,
+            self.cached_content,
+            self.temperature,
+            [getattr(tool, "name", str(tool)) for tool in self.tools],
+            [(m.type, m.content, getattr(m, "tool_calls", None)) for m in self.messages],
+        )
+
+    def estimated_tokens(self) -> int:
+        """Rough prompt size (~4 characters a token) plus the output reservation."""
+        characters = sum(len(str(m.content)) for m in self.messages)
+        return characters // 4 + 4 * len(self.messages) + self.max_output_tokens
+
+
+def used_tokens(response: Optional[BaseMessage]) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def input_token_split(response: Optional[BaseMessage]) -> tuple[int, int]:
+    """(cached, uncached) input tokens the provider reported for a response."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    return cached, usage.get("input_tokens", 0) - cached
+
+
+def usage_attributes(response: Optional[BaseMessage]) -> dict:
+    """Token counts of a response, as span attributes."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return {}
+    cached, _ = input_token_split(response)
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "cached_input_tokens": cached,
+        "output_tokens": usage.get("output_tokens", 0),
+    }
+
+
+# ─── Providers ──
+
+
+class ChatProvider(Protocol):
+    supports_batch: bool  # Whether `batch` is one provider request rather than concurrent single calls
+
+    async def invoke(self, call: LLMCall) -> AIMessage: ...
+
+    def stream(self, call: LLMCall) -> AsyncIterator[AIMessageChunk]: ...
+
+    async def batch(self, calls: list[LLMCall]) -> list[AIMessage]: ...
+
+
+class GeminiChatProvider:
+    """ChatGoogleGenerativeAI clients, one per model/temperature/tool set, reused across calls."""
+
+    supports_batch = False
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._clients: dict[tuple, object] = {}
+
+    def _client(self, call: LLMCall):
+        # Tools of a cached call live in the cached context; the request must not repeat them
+        tools = () if call.cached_content else call.tools
+        key = (call.model, call.temperature, tuple(tool.name for tool in tools))
+        client = self._clients.get(key)
+        if client is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            client = ChatGoogleGenerativeAI(model=call.model, google_api_key=self.api_key, temperature=call.temperature)
+            if tools:
+                client = client.bind_tools(list(tools))
+            self._clients[key] = client
+        return client
+
+    @staticmethod
+    def _request(call: LLMCall) -> tuple[list[BaseMessage], dict]:
+        if not call.cached_content:
+            return call.messages, {}
+        messages = call.messages[1:] if call.messages and call.messages[0].type == "system" else call.messages
+        return messages, {"cached_content": call.cached_content}
+
+    async def invoke(self, call: LLMCall) -> AIMessage:
+        messages, kwargs = self._request(call)
+        return await self._client(call).ainvoke(messages, **kwargs)
+
+    async def stream(self, call: LLMCall) -> AsyncIterator[AIMessageChunk]:
+        messages, kwargs = self._request(call)
+        async for chunk in self._client(call).astream(messages, **kwargs):
+            yield chunk
+
+    async def batch(self, calls: list[LLMCall]) -> list[AIMessage]:
+        # Gemini's Batch API is an offline job (results within hours), which
+        # no synchronous caller here can wait for; send the calls concurrently.
+        return await asyncio.gather(*(self.invoke(call) for call in calls))
+
+
+class FakeChatProvider:
+    """Canned replies after a simulated latency, with counts of the provider requests made."""
+
+    supports_batch = True
+
+    def __init__(
+        self,
+        reply: Optional[Callable[[LLMCall], str | AIMessage]] = None,
+        latency_seconds: float = 0.0,
+    ):
+        self.reply = reply or (lambda call: f"Echo: {call.messages[-1].content}")
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+        self.batch_sizes: list[int] = []
+
+    def _message(self, call: LLMCall) -> AIMessage:
+        reply = self.reply(call)
+        if isinstance(reply, AIMessage):
+            return reply
+        input_tokens = call.estimated_tokens() - call.max_output_tokens
+        output_tokens = len(reply) // 4 + 1
+        cached = len(str(call.messages[0].content)) // 4 if call.cached_content and call.messages else 0
+        return AIMessage(
+            content=reply,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached},
+            },
+        )
+
+    async def invoke(self, call: LLMCall) -> AIMessage:
+        self.requests += 1
+        await asyncio.sleep(self.latency_seconds)
+        return self._message(call)
+
+    async def stream(self, call: LLMCall) -> AsyncIterator[AIMessageChunk]:
+        self.requests += 1
+        await asyncio.sleep(self.latency_seconds)
+        message = self._message(call)
+        tokens = re.findall(r"\S+\s*", str(message.content)) or [""]
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield AIMessageChunk(content=token, usage_metadata=message.usage_metadata if last else None)
+
+    async def batch(self, calls: list[LLMCall]) -> list[AIMessage]:
+        self.requests += 1
+        self.batch_sizes.append(len(calls))
+        await asyncio.sleep(self.latency_seconds)
+        return [self._message(call) for call in calls]
+
+
+# ─── Rate budget ──
+
+
+class RateBudget:
+    """
+    Requests-per-minute and tokens-per-minute token buckets. Callers queue in
+    priority order and only the head of the queue takes budget, so a bulk
+    call never takes what an interactive call is waiting for.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._queue: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _shortfall_seconds(self, requests: int, tokens: int) -> float:
+        """How long until both buckets hold enough."""
+        return max(
+            (requests - self._requests) * 60 / self.requests_per_minute,
+            (tokens - self._tokens) * 60 / self.tokens_per_minute,
+            0.0,
+        )
+
+    async def acquire(self, priority: str, requests: int = 1, tokens: int = 0):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Waiters left on a closed loop (e.g. a finished test client) can never be woken
+            self._loop, self._changed, self._queue = loop, asyncio.Condition(), []
+        # A call bigger than a minute's budget waits for a full bucket rather than forever
+        requests = min(requests, self.requests_per_minute)
+        tokens = min(tokens, self.tokens_per_minute)
+        entry = (PRIORITIES.get(priority, PRIORITIES["standard"]), next(self._sequence))
+        heapq.heappush(self._queue, entry)
+        start = time.monotonic()
+
+        async with self._changed:
+            try:
+                while True:
+                    self._refill()
+                    timeout = None  # Not at the head: wait for the queue to move
+                    if self._queue[0] == entry:
+                        timeout = self._shortfall_seconds(requests, tokens)
+                        if not timeout:
+                            break
+                    try:
+                        async with asyncio.timeout(timeout):
+                            await self._changed.wait()
+                    except TimeoutError:
+                        pass
+            except asyncio.CancelledError:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._changed.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._requests -= requests
+            self._tokens -= tokens
+            self._changed.notify_all()
+
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_seconds += waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Return an over-estimate to the bucket, or charge an under-estimate."""
+        if actual_tokens is not None:
+            self._tokens = min(self.tokens_per_minute, self._tokens + estimated_tokens - actual_tokens)
+
+    def to_dict(self) -> dict:
+        self._refill()
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "available_requests": int(self._requests),
+            "available_tokens": int(self._tokens),
+            "queued": len(self._queue),
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+# ─── Gateway ──
+
+
+@dataclass
+class GatewayStats:
+    calls: dict[str, int] = field(default_factory=lambda: dict.fromkeys(PRIORITIES, 0))
+    provider_requests: int = 0
+    coalesced: int = 0  # Answered by an identical call already in flight
+    batches: int = 0
+    batched_calls: int = 0
+    tokens: int = 0
+    cached_input_tokens: int = 0
+    uncached_input_tokens: int = 0
+    # Provider call latency, split by whether any input was served from cache: [calls, total ms]
+    latency_ms: dict[str, list] = field(default_factory=lambda: {"cached": [0, 0.0], "uncached": [0, 0.0]})
+    errors: int = 0
+
+    def record_usage(self, response: Optional[BaseMessage], seconds: float):
+        cached, uncached = input_token_split(response)
+        self.cached_input_tokens += cached
+        self.uncached_input_tokens += uncached
+        latency = self.latency_ms["cached" if cached else "uncached"]
+        latency[0] += 1
+        latency[1] += seconds * 1000
+
+    def to_dict(self) -> dict:
+        input_tokens = self.cached_input_tokens + self.uncached_input_tokens
+        return {
+            "calls": dict(self.calls),
+            "provider_requests": self.provider_requests,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "batched_calls": self.batched_calls,
+            "avg_batch_size": round(self.batched_calls / self.batches, 1) if self.batches else None,
+            "tokens": self.tokens,
+            "input_tokens": {
+                "cached": self.cached_input_tokens,
+                "uncached": self.uncached_input_tokens,
+                "cached_ratio": round(self.cached_input_tokens / input_tokens, 3) if input_tokens else None,
+            },
+            "avg_latency_ms": {
+                kind: round(total / calls, 1) if calls else None for kind, (calls, total) in self.latency_ms.items()
+            },
+            "errors": self.errors,
+        }
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        provider: Optional[ChatProvider],
+        budget: RateBudget,
+        batch_window_ms: float = 20.0,
+        batch_max_size: int = 32,
+        max_output_tokens: int = 512,
+    ):
+        self.provider = provider
+        self.budget = budget
+        self.batch_window_ms = batch_window_ms
+        self.batch_max_size = batch_max_size
+        self.max_output_tokens = max_output_tokens
+        self.stats = GatewayStats()
+        self._inflight = SharedCalls()
+        self._pending: list[tuple[LLMCall, asyncio.Future]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def available(self) -> bool:
+        return self.provider is not None
+
+    def _call(
+        self,
+        messages: Sequence[BaseMessage],
+        model: Optional[str],
+        temperature: float,
+        tools: Sequence,
+        cached_content: Optional[str],
+    ) -> LLMCall:
+        return LLMCall(
+            messages=list(messages),
+            model=model or settings.default_model,
+            temperature=temperature,
+            tools=tuple(tools or ()),
+            max_output_tokens=self.max_output_tokens,
+            cached_content=cached_content,
+        )
+
+    def _settle(self, call: LLMCall, response: Optional[BaseMessage], seconds: float):
+        actual = used_tokens(response)
+        self.budget.settle(call.estimated_tokens(), actual)
+        self.stats.tokens += actual if actual is not None else call.estimated_tokens()
+        self.stats.record_usage(response, seconds)
+
+    async def invoke(
+        self,
+        messages: Sequence[BaseMessage],
+        model: Optional[str] = None,
+        temperature: float = 0.0,
+        tools: Sequence = (),
+        priority: str = "interactive",
+        cached_content: Optional[str] = None,
+    ) -> AIMessage:
+        """The model's reply to `messages`, sharing the provider call with any identical one in flight."""
+        call = self._call(messages, model, temperature, tools, cached_content)
+        self.stats.calls[priority] = self.stats.calls.get(priority, 0) + 1
+        with span("llm_call", model=call.model, priority=priority) as llm_span:
+            key = call.key()
+            inflight = self._running(key, priority)
+            if inflight is not None:
+                self.stats.coalesced += 1
+                llm_span.set(coalesced=True)
+                return await self._inflight.wait(inflight)
+
+            if priority == "bulk" and self.provider.supports_batch:
+                llm_span.set(batched=True)
+            # Runs in its own task: cancelling one waiter (e.g. a barged-in voice turn) leaves the others served
+            task = self._inflight.start(f"{priority}:{key}", self._invoke_once(call, priority))
+            response = await self._inflight.wait(task)
+            llm_span.set(**usage_attributes(response))
+            return response
+
+    def _running(self, key: str, priority: str) -> Optional[asyncio.Task]:
+        """An identical call in flight at `priority` or a more urgent one."""
+        for other, rank in PRIORITIES.items():
+            if rank <= PRIORITIES[priority] and (task := self._inflight.running(f"{other}:{key}")) is not None:
+                return task
+        return None
+
+    async def _invoke_once(self, call: LLMCall, priority: str) -> AIMessage:
+        try:
+            if priority == "bulk" and self.provider.supports_batch:
+                return await self._enqueue_batch(call)
+            await self.budget.acquire(priority, 1, call.estimated_tokens())
+            self.stats.provider_requests += 1
+            start = time.perf_counter()
+            with timed("llm_call", call.model):
+                response = await self.provider.invoke(call)
+            self._settle(call, response, time.perf_counter() - start)
+            return response
+        except Exception:
+            self.stats.errors += 1
+            raise
+
+    async def stream(
+        self,
+        messages: Sequence[BaseMessage],
+        model: Optional[str] = None,
+        temperature: float = 0.0,
+        tools: Sequence = (),
+        priority: str = "interactive",
+        cached_content: Optional[str] = None,
+    ) -> AsyncIterator[AIMessageChunk]:
+        """The model's reply as it is generated. Streams are never shared or batched."""
+        call = self._call(messages, model, temperature, tools, cached_content)
+        self.stats.calls[priority] = self.stats.calls.get(priority, 0) + 1
+        # Not made current: the caller's code runs between our yields
+        llm_span = tracer.start_span("llm_call", model=call.model, priority=priority, streamed=True)
+        response = None
+        try:
+            await self.budget.acquire(priority, 1, call.estimated_tokens())
+            self.stats.provider_requests += 1
+            start = time.perf_counter()
+            try:
+                with timed("llm_call", call.model):
+                    async for chunk in self.provider.stream(call):
+                        if response is None:
+                            llm_span.set(first_token_ms=round((time.perf_counter() - start) * 1000))
+                        response = chunk if response is None else response + chunk
+                        yield chunk
+            except Exception as e:
+                self.stats.errors += 1
+                llm_span.record_error(e)
+                raise
+            finally:
+                self._settle(call, response, time.perf_counter() - start)
+        finally:
+            llm_span.set(**usage_attributes(response))
+            llm_span.end()
+
+    # Bulk calls: collected into provider batches
+
+    async def _enqueue_batch(self, call: LLMCall) -> AIMessage:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._pending, self._flush_timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((call, future))
+        if len(self._pending) >= self.batch_max_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.batch_window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        pending, self._pending = self._pending, []
+        # A provider batch request is for one model
+        by_model: dict[str, list[tuple[LLMCall, asyncio.Future]]] = {}
+        for call, future in pending:
+            if not future.done():
+                by_model.setdefault(call.model, []).append((call, future))
+        for batch in by_model.values():
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)  # Keep a reference until it finishes
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[LLMCall, asyncio.Future]]):
+        calls = [call for call, _ in batch]
+        try:
+            await self.budget.acquire("bulk", len(calls), sum(call.estimated_tokens() for call in calls))
+            self.stats.provider_requests += 1
+            start = time.perf_counter()
+            with timed("llm_batch", calls[0].model):
+                responses = await self.provider.batch(calls)
+        except Exception as e:
+            logger.error("LLM batch failed", size=len(calls), error=str(e))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats.batches += 1
+        self.stats.batched_calls += len(calls)
+        elapsed = time.perf_counter() - start
+        for (call, future), response in zip(batch, responses):
+            self._settle(call, response, elapsed)
+            if not future.done():
+                future.set_result(response)
+
+    def to_dict(self) -> dict:
+        return {
+            "available": self.available,
+            "provider": type(self.provider).__name__ if self.provider else None,
+            **self.stats.to_dict(),
+            "budget": self.budget.to_dict(),
+        }
+
+
+# Singleton instance
+llm_gateway = LLMGateway(
+    GeminiChatProvider(settings.gemini_api_key) if settings.gemini_api_key else None,
+    RateBudget(settings.llm_requests_per_minute, settings.llm_tokens_per_minute),
+    batch_window_ms=settings.llm_batch_window_ms,
+    batch_max_size=settings.llm_batch_max_size,
+    max_output_tokens=settings.llm_max_output_tokens,
+)
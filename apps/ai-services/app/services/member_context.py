@@ -0,0 +1,289 @@
+"""
+Member Context Prefetch
+The first turns of a member call nearly always need the member's
+eligibility, recent claims and prior authorizations. As soon as a call is
+initiated or connects, those lookups are started concurrently (while the
+greeting plays) and kept on a per-call session.
+
+The agent tools read through the session bound to the current call
+(a context variable inherited by the turn tasks):
+- a finished prefetch answers immediately;
+- an in-flight prefetch is awaited instead of starting a second request;
+- anything else falls through to the data source.
+
+Hit rates are tracked per call and per process.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Protocol
+
+import structlog
+
+from app.config import settings
+from app.services.metrics import register_cache
+
+logger = structlog.get_logger()
+
+PREFETCH_KINDS = ("eligibility", "recent_claims", "prior_auths")
+
+
+# ─── Data source ──
+
+
+class MemberDataSource(Protocol):
+    async def eligibility(self, member_id: str) -> dict: ...
+
+    async def recent_claims(self, member_id: str) -> list[dict]: ...
+
+    async def prior_auths(self, member_id: str) -> list[dict]: ...
+
+    async def claim(self, claim_number: str) -> dict: ...
+
+    async def prior_auth(self, auth_number: str) -> dict: ...
+
+
+class StubMemberDataSource:
+    """Placeholder member data until the platform APIs are wired in, with optional simulated latency."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+
+    async def _call(self):
+        self.requests += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+    async def eligibility(self, member_id: str) -> dict:
+        await self._call()
+        return {
+            "eligible": True,
+            "member_id": member_id,
+            "plan": "Blue PPO Gold",
+            "status": "active",
+            "effective_date": "2024-01-01",
+            "deductible_remaining": 850.00,
+            "oop_remaining": 4200.00,
+            "note": "Integration point: calls /api/v1/eligibility/verify",
+        }
+
+    async def recent_claims(self, member_id: str) -> list[dict]:
+        await self._call()
+        return [
+            {
+                "claim_number": f"CLM-{member_id}-0001",
+                "status": "in_review",
+                "received_date": "2024-01-15",
+                "total_charged": 1250.00,
+                "note": "Integration point: calls /api/v1/claims?memberId=:id",
+            }
+        ]
+
+    async def prior_auths(self, member_id: str) -> list[dict]:
+        await self._call()
+        return [
+            {
+                "auth_number": f"PA-{member_id}-0001",
+                "status": "approved",
+                "approved_units": 10,
+                "expiration_date": "2024-06-30",
+                "note": "Integration point: calls /api/v1/prior-auth?memberId=:id",
+            }
+        ]
+
+    async def claim(self, claim_number: str) -> dict:
+        await self._call()
+        return {
+            "claim_number": claim_number,
+            "status": "in_review",
+            "received_date": "2024-01-15",
+            "total_charged": 1250.00,
+            "note": "Integration point: calls /api/v1/claims/:id",
+        }
+
+    async def prior_auth(self, auth_number: str) -> dict:
+        await self._call()
+        return {
+            "auth_number": auth_number,
+            "status": "approved",
+            "approved_units": 10,
+            "expiration_date": "2024-06-30",
+            "note": "Integration point: calls /api/v1/prior-auth/:id",
+        }
+
+
+# ─── Sessions ──
+
+
+@dataclass
+class PrefetchStats:
+    prefetches: int = 0
+    prefetch_errors: int = 0
+    hits: int = 0  # Served from a finished prefetch
+    inflight_hits: int = 0  # Waited on a prefetch still in flight
+    misses: int = 0  # Not prefetched (other member, unknown claim/auth): went to the source
+
+    def add(self, outcome: str):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def counts(self) -> tuple[int, int]:
+        return self.hits + self.inflight_hits, self.misses
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.inflight_hits + self.misses
+        return {
+            "prefetches": self.prefetches,
+            "prefetch_errors": self.prefetch_errors,
+            "hits": self.hits,
+            "inflight_hits": self.inflight_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.inflight_hits) / lookups, 3) if lookups else None,
+        }
+
+
+class MemberContextSession:
+    """Prefetched context for one call's member."""
+
+    def __init__(self, member_id: str, source: MemberDataSource, totals: PrefetchStats):
+        self.member_id = member_id
+        self.source = source
+        self.stats = PrefetchStats()
+        self._totals = totals
+        self._started_at = time.perf_counter()
+        self.prefetch_ms: Optional[int] = None
+        self._tasks = {kind: asyncio.create_task(getattr(source, kind)(member_id)) for kind in PREFETCH_KINDS}
+        self._loop = asyncio.get_running_loop()
+        self._count("prefetches")
+        self._timing = asyncio.create_task(self._time_prefetch())
+
+    def _count(self, outcome: str):
+        self.stats.add(outcome)
+        self._totals.add(outcome)
+
+    async def _time_prefetch(self):
+        await asyncio.wait(self._tasks.values())
+        self.prefetch_ms = round((time.perf_counter() - self._started_at) * 1000)
+        failed = [kind for kind, task in self._tasks.items() if not task.cancelled() and task.exception()]
+        if failed:
+            self._count("prefetch_errors")
+            logger.warning("Member context prefetch failed", member_id=self.member_id, kinds=failed)
+
+    @property
+    def usable(self) -> bool:
+        """Prefetch tasks belong to the running event loop (and can be awaited from it)."""
+        try:
+            return self._loop is asyncio.get_running_loop() and not self._loop.is_closed()
+        except RuntimeError:
+            return False
+
+    async def get(self, kind: str, member_id: str, match: Optional[Callable[[dict], bool]] = None) -> Any:
+        """
+        Prefetched `kind` for `member_id` (with `match`, the first matching item
+        of a prefetched list), or None, counted as a miss, if it was not prefetched.
+        """
+        task = self._tasks.get(kind)
+        if task is None or member_id != self.member_id or task.cancelled():
+            self._count("misses")
+            return None
+        outcome = "hits" if task.done() else "inflight_hits"
+        try:
+            value = await asyncio.shield(task)
+        except Exception:
+            value = None
+        if value is not None and match is not None:
+            value = next((item for item in value if match(item)), None)
+        self._count(outcome if value is not None else "misses")
+        return value
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    def to_dict(self) -> dict:
+        return {**self.stats.to_dict(), "prefetch_ms": self.prefetch_ms}
+
+
+class MemberContextCache:
+    """Per-call prefetch sessions, kept until the call ends or `ttl_seconds` after they were started."""
+
+    def __init__(self, source: MemberDataSource, ttl_seconds: float = 300):
+        self.source = source
+        self.ttl_seconds = ttl_seconds
+        self.stats = PrefetchStats()
+        self._sessions: dict[str, tuple[MemberContextSession, float]] = {}
+
+    def _purge(self):
+        now = time.monotonic()
+        for session_id in [s for s, (_, at) in self._sessions.items() if at <= now]:
+            self.close(session_id)
+
+    def prefetch(self, session_id: str, member_id: str) -> MemberContextSession:
+        """Start prefetching for a call, or return the session already prefetching the same member."""
+        self._purge()
+        existing = self._sessions.get(session_id)
+        if existing and existing[0].member_id == member_id and existing[0].usable:
+            return existing[0]
+        if existing:
+            existing[0].cancel()
+        session = MemberContextSession(member_id, self.source, self.stats)
+        self._sessions[session_id] = (session, time.monotonic() + self.ttl_seconds)
+        return session
+
+    def close(self, session_id: str) -> Optional[MemberContextSession]:
+        entry = self._sessions.pop(session_id, None)
+        if entry:
+            entry[0].cancel()
+            return entry[0]
+        return None
+
+
+_current_session: ContextVar[Optional[MemberContextSession]] = ContextVar("member_context_session", default=None)
+
+
+def bind_session(session: Optional[MemberContextSession]) -> Token:
+    """Make `session` the context the agent tools read through (inherited by tasks created afterwards)."""
+    return _current_session.set(session)
+
+
+def unbind_session(token: Token):
+    _current_session.reset(token)
+
+
+# ─── Tool lookups ──
+
+
+def _source() -> MemberDataSource:
+    session = _current_session.get()
+    return session.source if session else member_context.source
+
+
+async def get_eligibility(member_id: str) -> dict:
+    session = _current_session.get()
+    cached = await session.get("eligibility", member_id) if session else None
+    return cached or await _source().eligibility(member_id)
+
+
+async def get_claim(claim_number: str) -> dict:
+    session = _current_session.get()
+    if session:
+        claim = await session.get("recent_claims", session.member_id, lambda c: c["claim_number"] == claim_number)
+        if claim:
+            return claim
+    return await _source().claim(claim_number)
+
+
+async def get_prior_auth(auth_number: str) -> dict:
+    session = _current_session.get()
+    if session:
+        auth = await session.get("prior_auths", session.member_id, lambda a: a["auth_number"] == auth_number)
+        if auth:
+            return auth
+    return await _source().prior_auth(auth_number)
+
+
+# Singleton instance
+member_context = MemberContextCache(StubMemberDataSource(), ttl_seconds=settings.member_context_ttl_seconds)
+register_cache("member_context", lambda: member_context.stats.counts())
@@ -0,0 +1,219 @@
+"""
+Prometheus Metrics
+Latency histograms per HTTP route and per pipeline stage (intent routing, LLM
+call, tool call, OCR page, fraud rule, workflow node, voice turn), in-flight
+gauges, cache hit ratios and event-loop lag, served at /metrics.
+
+Instrumentation sits on every request path, so it is kept cheap. Durations
+come from time.perf_counter_ns. Labelled children are resolved once per
+label set and memoized, not looked up on every observation. Cache hit ratios
+are read from the caches' own counters at scrape time, so lookups pay
+nothing extra.
+"""
+
+import asyncio
+import time
+from functools import lru_cache, wraps
+from typing import Callable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Gauge,
+    GCCollector,
+    Histogram,
+    PlatformCollector,
+    ProcessCollector,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+PlatformCollector(registry=registry)
+GCCollector(registry=registry)
+
+# Sub-millisecond stages (rules, cache lookups) up to multi-second LLM calls and voice turns
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_DURATION = Histogram(
+    "apex_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+HTTP_IN_FLIGHT = Gauge("apex_http_requests_in_flight", "HTTP requests being served", registry=registry)
+STAGE_DURATION = Histogram(
+    "apex_stage_duration_seconds",
+    "Pipeline stage latency",
+    ["stage", "name"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+STAGE_IN_FLIGHT = Gauge("apex_stage_in_flight", "Pipeline stages running", ["stage"], registry=registry)
+LOOP_LAG = Histogram(
+    "apex_event_loop_lag_seconds",
+    "How late the event loop ran a timer callback",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    registry=registry,
+)
+
+
+@lru_cache(maxsize=4096)
+def _http_child(method: str, route: str, status: int):
+    return HTTP_DURATION.labels(method, route, str(status))
+
+
+@lru_cache(maxsize=4096)
+def stage_metrics(stage_name: str, name: str = ""):
+    """(histogram, in-flight gauge) children for a stage, resolved once per label set."""
+    return STAGE_DURATION.labels(stage_name, name), STAGE_IN_FLIGHT.labels(stage_name)
+
+
+class timed:
+    """Context manager timing one run of a stage: `with timed("tool_call", tool_name): ...`."""
+
+    __slots__ = ("_histogram", "_in_flight", "_start")
+
+    def __init__(self, stage_name: str, name: str = ""):
+        self._histogram, self._in_flight = stage_metrics(stage_name, name)
+
+    def __enter__(self):
+        self._in_flight.inc()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe((time.perf_counter_ns() - self._start) / 1e9)
+        self._in_flight.dec()
+        return False
+
+
+def timed_stage(stage_name: str, name: str = ""):
+    """Decorator form of `timed` for coroutine functions."""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timed(stage_name, name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_stage(stage_name: str, seconds: float, name: str = ""):
+    """Record a stage duration measured elsewhere (e.g. from existing per-turn timestamps)."""
+    stage_metrics(stage_name, name)[0].observe(seconds)
+
+
+# ─── HTTP ──
+
+
+def route_template(scope) -> str:
+    """Matched route's path template including router prefixes, e.g. /api/v1/voice/calls/{call_id}."""
+    # Routers included with a prefix keep their own route objects, so route.path lacks the prefix;
+    # FastAPI records the prefixed path on the effective route context
+    effective = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(effective, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template (not per raw path, which is unbounded)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _http_child(scope["method"], route_template(scope), status).observe((time.perf_counter_ns() - start) / 1e9)
+
+
+# ─── Caches ──
+
+
+class CacheStatsCollector:
+    """Hit/miss counters and hit ratio per cache, read from each cache's stats when scraped."""
+
+    def __init__(self):
+        self._sources: dict[str, Callable[[], tuple[int, int]]] = {}
+
+    def register(self, cache: str, counts: Callable[[], tuple[int, int]]):
+        """`counts()` returns the cache's (hits, misses) so far."""
+        self._sources[cache] = counts
+
+    def collect(self):
+        lookups = CounterMetricFamily("apex_cache_lookups", "Cache lookups by result", labels=["cache", "result"])
+        ratio = GaugeMetricFamily("apex_cache_hit_ratio", "Cache hits / lookups since start", labels=["cache"])
+        for cache, counts in sorted(self._sources.items()):
+            hits, misses = counts()
+            lookups.add_metric([cache, "hit"], hits)
+            lookups.add_metric([cache, "miss"], misses)
+            if hits + misses:
+                ratio.add_metric([cache], hits / (hits + misses))
+        yield lookups
+        yield ratio
+
+
+cache_stats = CacheStatsCollector()
+registry.register(cache_stats)
+
+
+def register_cache(cache: str, counts: Callable[[], tuple[int, int]]):
+    cache_stats.register(cache, counts)
+
+
+# ─── Event loop lag ──
+
+
+class LoopLagMonitor:
+    """Sleeps for `interval_seconds` in a loop; how much later than asked it wakes up is the loop's lag."""
+
+    def __init__(self, interval_seconds: float = 0.5):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        interval_ns = int(self.interval_seconds * 1e9)
+        while True:
+            start = time.perf_counter_ns()
+            await asyncio.sleep(self.interval_seconds)
+            LOOP_LAG.observe(max(0, time.perf_counter_ns() - start - interval_ns) / 1e9)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+            self._task = None
+
+
+def render() -> tuple[bytes, str]:
+    """Exposition body and content type for /metrics."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# Singleton instance
+loop_lag_monitor = LoopLagMonitor()
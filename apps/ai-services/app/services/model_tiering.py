@@ -0,0 +1,183 @@
+"""
+Model Tiering
+Chooses a fast small model or a larger model for each agent request. Simple
+lookups ("status of claim X") go to the small model. Agents that need
+multi-step clinical or regulatory reasoning, long or open-ended questions,
+and requests touching several records go to the large model.
+
+A small-model answer is checked before it is returned: an empty answer, a
+hedge or refusal, or a lookup question answered without calling a tool falls
+below the confidence threshold, and the turn is re-run on the large model.
+Per-tier latency, escalation rate, tokens and cost are reported by
+/agents/llm/stats.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from app.config import settings
+from app.services.llm_gateway import input_token_split
+
+TIERS = ("small", "large")
+
+# Open-ended or judgement questions the small model tends to get wrong
+REASONING_PATTERN = re.compile(
+    r"\b(why|explain|compare|difference between|appeal|medical necessity|justif\w*|should (?:i|we)|"
+    r"what if|recommend\w*|criteria|guideline\w*|denied because)\b",
+    re.IGNORECASE,
+)
+# Claim, prior auth and member identifiers: each is usually one tool call
+RECORD_PATTERN = re.compile(r"\b(?:CLM|PA|AUTH|AHP)-?[\w-]*\d+\b", re.IGNORECASE)
+HEDGE_PATTERN = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t know|i cannot|i can'?t|unable to|not able to|"
+    r"no information|unclear|it depends)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class TierChoice:
+    tier: str
+    model: str
+    reasons: list[str]
+
+
+@dataclass
+class TierStats:
+    turns: int = 0  # Agent requests started on this tier
+    calls: int = 0  # Model calls (a turn with tool calls makes two)
+    escalations: int = 0  # Small-tier turns re-run on the large model
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(pct: float) -> Optional[float]:
+            return round(latencies[min(int(len(latencies) * pct / 100), len(latencies) - 1)], 1) if latencies else None
+
+        return {
+            "turns": self.turns,
+            "calls": self.calls,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / self.turns, 3) if self.turns else None,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "max": percentile(100)},
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+class ModelTiering:
+    def __init__(
+        self,
+        small_model: str,
+        large_model: str,
+        large_agents: Sequence[str] = (),
+        escalation_confidence: float = 0.6,
+        long_message_words: int = 60,
+        prices: Optional[dict[str, dict]] = None,
+        enabled: bool = True,
+    ):
+        self.models = {"small": small_model, "large": large_model}
+        self.large_agents = set(large_agents)
+        self.escalation_confidence = escalation_confidence
+        self.long_message_words = long_message_words
+        self.prices = prices or {}
+        self.enabled = enabled
+        self.stats = {tier: TierStats() for tier in TIERS}
+
+    @property
+    def fast_model(self) -> str:
+        """Model for short classification calls such as intent routing."""
+        return self.models["small" if self.enabled else "large"]
+
+    def choose(self, agent_type: str, message: str, tools: Sequence = ()) -> TierChoice:
+        """Tier for one request, with the features that decided it."""
+        if not self.enabled:
+            return TierChoice("large", self.models["large"], ["tiering_disabled"])
+        reasons = []
+        if agent_type in self.large_agents:
+            reasons.append(f"agent:{agent_type}")
+        if len(message.split()) > self.long_message_words:
+            reasons.append("long_message")
+        if REASONING_PATTERN.search(message):
+            reasons.append("reasoning")
+        if tools and len({m.upper() for m in RECORD_PATTERN.findall(message)}) > 1:
+            reasons.append("multiple_lookups")
+        if reasons:
+            return TierChoice("large", self.models["large"], reasons)
+        return TierChoice(
+            "small", self.models["small"], ["lookup" if RECORD_PATTERN.search(message) else "short_message"]
+        )
+
+    def confidence(self, message: str, response: BaseMessage, used_tools: bool, tools: Sequence = ()) -> float:
+        """How far to trust a small-model answer; below `escalation_confidence` it is re-run on the large model."""
+        text = str(response.content).strip()
+        if not text:
+            return 0.0
+        if HEDGE_PATTERN.search(text):
+            return 0.3
+        if tools and RECORD_PATTERN.search(message) and not used_tools:
+            return 0.4  # Answered a record lookup without looking the record up
+        return 0.9
+
+    def should_escalate(self, choice: TierChoice, confidence: float) -> bool:
+        return choice.tier == "small" and confidence < self.escalation_confidence
+
+    def escalate(self, choice: TierChoice) -> TierChoice:
+        self.stats[choice.tier].escalations += 1
+        return TierChoice("large", self.models["large"], choice.reasons + ["escalated"])
+
+    def record_turn(self, choice: TierChoice):
+        self.stats[choice.tier].turns += 1
+
+    def cost(self, model: str, response: Optional[BaseMessage]) -> float:
+        """USD for one response at the configured per-million-token prices (0 for unpriced models)."""
+        usage = getattr(response, "usage_metadata", None)
+        price = self.prices.get(model)
+        if not usage or not price:
+            return 0.0
+        cached, uncached = input_token_split(response)
+        return (
+            uncached * price.get("input", 0.0)
+            + cached * price.get("cached_input", price.get("input", 0.0))
+            + usage.get("output_tokens", 0) * price.get("output", 0.0)
+        ) / 1_000_000
+
+    def record(self, tier: str, model: str, response: Optional[BaseMessage], seconds: float) -> float:
+        """Count one model call for `tier`; returns its cost."""
+        stats = self.stats[tier]
+        usage = getattr(response, "usage_metadata", None) or {}
+        cost = self.cost(model, response)
+        stats.calls += 1
+        stats.input_tokens += usage.get("input_tokens", 0)
+        stats.output_tokens += usage.get("output_tokens", 0)
+        stats.cost_usd += cost
+        stats.latencies_ms.append(seconds * 1000)
+        return cost
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "models": dict(self.models),
+            "escalation_confidence": self.escalation_confidence,
+            "tiers": {tier: stats.to_dict() for tier, stats in self.stats.items()},
+        }
+
+
+# Singleton instance
+model_tiering = ModelTiering(
+    small_model=settings.llm_small_model,
+    large_model=settings.llm_large_model or settings.default_model,
+    large_agents=settings.llm_large_model_agents,
+    escalation_confidence=settings.llm_escalation_confidence,
+    prices=settings.llm_model_prices,
+    enabled=settings.llm_tiering_enabled,
+)
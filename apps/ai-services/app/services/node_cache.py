@@ -0,0 +1,216 @@
+"""
+Workflow Node Result Cache
+Retries and re-runs of a workflow call deterministic AI nodes again with the
+same config and input. Results of node types registered as cacheable are
+memoized under (node_type, handler version, canonical hash of config and
+input), with a TTL and LRU eviction at a size bound. Concurrent executions of
+the same key share one handler call. The shared call runs in its own task and
+is cancelled only when every caller waiting on it has gone, so one cancelled
+request (an SSE client disconnecting, a halted subgraph) never cancels the
+others.
+
+Idempotency keys cover duplicate deliveries from the workflow engine for any
+node type: the first result stored under a key is returned for every later
+delivery carrying the same key and request, without re-executing.
+
+Both stores are per process.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import settings
+from app.services.metrics import register_cache
+from app.services.single_flight import SharedCalls, canonical_hash
+
+
+def node_cache_key(node_type: str, version: str, node_config: dict, input_data: dict) -> str:
+    return f"{node_type}:{version}:{canonical_hash(node_config, input_data)}"
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different request."""
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    inflight_hits: int = 0  # Joined an identical execution still running
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def counts(self) -> tuple[int, int]:
+        return self.hits + self.inflight_hits, self.misses
+
+    def to_dict(self, size: int) -> dict:
+        lookups = self.hits + self.inflight_hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "inflight_hits": self.inflight_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.inflight_hits) / lookups, 3) if lookups else None,
+        }
+
+
+class TTLCache:
+    """LRU map with a per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SingleFlightCache(TTLCache):
+    """TTLCache whose misses run the producer once per key, however many callers ask concurrently."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        super().__init__(max_entries, ttl_seconds)
+        self._inflight = SharedCalls()
+
+    def cached(self, key: str) -> Optional[Any]:
+        """Stored value for `key`, counted as a hit or miss (for callers that batch their misses)."""
+        value = self.get(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def get_or_run(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[Any]],
+        should_store: Callable[[Any], bool] = lambda value: True,
+    ) -> tuple[Any, bool]:
+        """(value, cached): the stored value, a concurrent caller's value, or a fresh one from `produce`."""
+        value = self.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value, True
+        inflight = self._inflight.running(key)
+        if inflight is not None:
+            self.stats.inflight_hits += 1
+            return await self._inflight.wait(inflight), True
+
+        self.stats.misses += 1
+        task = self._inflight.start(key, self._produce_and_store(key, produce, should_store))
+        return await self._inflight.wait(task), False
+
+    def running(self, key: str) -> bool:
+        return self._inflight.running(key) is not None
+
+    def start(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[Any]],
+        should_store: Callable[[Any], bool] = lambda value: True,
+    ) -> asyncio.Task:
+        """
+        Start producing a key that is neither stored nor running, without waiting
+        for it; get_or_run callers for the key join it. Runs until `produce` returns.
+        """
+        self.stats.misses += 1
+        return self._inflight.start(key, self._produce_and_store(key, produce, should_store), held=True)
+
+    async def _produce_and_store(
+        self, key: str, produce: Callable[[], Awaitable[Any]], should_store: Callable[[Any], bool]
+    ):
+        value = await produce()
+        if should_store(value):
+            self.set(key, value)
+        return value
+
+
+class IdempotencyStore(SingleFlightCache):
+    """Results by idempotency key, each bound to the fingerprint of the request that produced it."""
+
+    async def run_once(
+        self,
+        idempotency_key: str,
+        fingerprint: str,
+        produce: Callable[[], Awaitable[Any]],
+        should_store: Callable[[Any], bool] = lambda value: True,
+    ) -> tuple[Any, bool]:
+        """(value, replayed): the result stored under the key, or a fresh one from `produce`."""
+
+        async def produce_with_fingerprint():
+            return fingerprint, await produce()
+
+        (stored_fingerprint, value), replayed = await self.get_or_run(
+            idempotency_key,
+            produce_with_fingerprint,
+            lambda entry: should_store(entry[1]),
+        )
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key '{idempotency_key}' was used for a different request")
+        return value, replayed
+
+    def replay(self, idempotency_key: str, fingerprint: str) -> Optional[Any]:
+        """The stored result for a key, if any; raises IdempotencyConflict on a different request."""
+        stored = self.cached(idempotency_key)
+        if stored is None:
+            return None
+        if stored[0] != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key '{idempotency_key}' was used for a different request")
+        return stored[1]
+
+    def begin(
+        self,
+        idempotency_key: str,
+        fingerprint: str,
+        result: Awaitable[Any],
+        should_store: Callable[[Any], bool] = lambda value: True,
+    ) -> asyncio.Task:
+        """
+        Register `result` (e.g. a batch item about to run with its batch) as the
+        execution for a key that is neither stored nor running; concurrent
+        deliveries with the key join it through run_once.
+        """
+
+        async def produce_with_fingerprint():
+            return fingerprint, await result
+
+        return self.start(idempotency_key, produce_with_fingerprint, lambda entry: should_store(entry[1]))
+
+
+# Singleton instances
+node_results = SingleFlightCache(settings.workflow_node_cache_max_entries, settings.workflow_node_cache_ttl_seconds)
+idempotent_results = IdempotencyStore(
+    settings.workflow_idempotency_max_entries, settings.workflow_idempotency_ttl_seconds
+)
+register_cache("workflow_node_results", lambda: node_results.stats.counts())
+register_cache("workflow_idempotency", lambda: idempotent_results.stats.counts())
@@ -0,0 +1,231 @@
+"""
+Workflow Node Scheduler
+Admission control for workflow node handlers. Every handler call takes a
+slot from a global pool and from its node type's own pool, so a burst of one
+node type (e.g. gemini_analyzer saturating LLM quota) can't take every slot
+from latency-sensitive ones (eligibility_check).
+
+When no slot is free, executions wait in a priority queue: interactive before
+standard before bulk, first come first served within a class. Each node type's
+queue is bounded. A full queue rejects new executions immediately with a
+retry-after estimate, so the workflow engine backs off instead of piling up
+requests. Handler calls are cut off at the node type's timeout.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.config import settings
+
+T = TypeVar("T")
+
+PRIORITY_CLASSES = {"interactive": 0, "standard": 1, "bulk": 2}
+
+
+class SchedulerBusy(Exception):
+    """A node type's queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, node_type: str, retry_after: int):
+        super().__init__(f"{node_type} queue is full, retry after {retry_after}s")
+        self.node_type = node_type
+        self.retry_after = retry_after
+
+
+class NodeTimeoutError(TimeoutError):
+    pass
+
+
+@dataclass
+class NodeTypeLimits:
+    max_concurrency: int
+    timeout_seconds: float
+    queue_limit: int
+    priority: str = "standard"
+
+
+@dataclass
+class NodeTypeState:
+    limits: NodeTypeLimits
+    running: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    avg_service_seconds: Optional[float] = None  # EWMA of handler call durations
+    waits_ms: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record_service(self, seconds: float):
+        if self.avg_service_seconds is None:
+            self.avg_service_seconds = seconds
+        else:
+            self.avg_service_seconds += 0.2 * (seconds - self.avg_service_seconds)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained through the node type's slots."""
+        service = self.avg_service_seconds or 1.0
+        return max(1, math.ceil((self.queued + 1) * service / self.limits.max_concurrency))
+
+    def to_dict(self) -> dict:
+        waits = sorted(self.waits_ms)
+
+        def percentile(pct: float) -> Optional[float]:
+            return round(waits[min(int(len(waits) * pct / 100), len(waits) - 1)], 1) if waits else None
+
+        return {
+            "priority": self.limits.priority,
+            "max_concurrency": self.limits.max_concurrency,
+            "timeout_seconds": self.limits.timeout_seconds,
+            "queue_limit": self.limits.queue_limit,
+            "running": self.running,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_ms": {"p50": percentile(50), "p99": percentile(99), "max": percentile(100)},
+            "avg_service_ms": round(self.avg_service_seconds * 1000, 1) if self.avg_service_seconds else None,
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+class NodeScheduler:
+    def __init__(self, max_concurrency: int, default_limits: NodeTypeLimits):
+        self.max_concurrency = max_concurrency
+        self.default_limits = default_limits
+        self.running = 0
+        self._limits: dict[str, NodeTypeLimits] = {}
+        self._states: dict[str, NodeTypeState] = {}
+        self._waiters: list[tuple[int, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configure(self, node_type: str, **limits):
+        """Set a node type's limits; unspecified ones keep their current (or default) values."""
+        current = self._limits.get(node_type, self.default_limits)
+        self._limits[node_type] = NodeTypeLimits(**{**current.__dict__, **limits})
+        if node_type in self._states:
+            self._states[node_type].limits = self._limits[node_type]
+
+    def state(self, node_type: str) -> NodeTypeState:
+        if node_type not in self._states:
+            self._states[node_type] = NodeTypeState(self._limits.get(node_type, self.default_limits))
+        return self._states[node_type]
+
+    def effective_priority(self, node_type: str, priority: Optional[str] = None) -> str:
+        """The priority an execution of `node_type` runs at: the one requested, else the node type's default."""
+        return priority or self._limits.get(node_type, self.default_limits).priority
+
+    def _startable(self, state: NodeTypeState) -> bool:
+        return self.running < self.max_concurrency and state.running < state.limits.max_concurrency
+
+    def _start(self, state: NodeTypeState):
+        self.running += 1
+        state.running += 1
+        state.admitted += 1
+
+    def _release(self, state: NodeTypeState):
+        self.running -= 1
+        state.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Start the highest-priority waiters that have a free slot for their node type."""
+        blocked = []
+        while self._waiters and self.running < self.max_concurrency:
+            waiter = heapq.heappop(self._waiters)
+            _, _, node_type, future = waiter
+            if future.done():  # Cancelled while waiting
+                continue
+            state = self._states[node_type]
+            if not self._startable(state):
+                blocked.append(waiter)
+                continue
+            state.queued -= 1
+            self._start(state)
+            future.set_result(None)
+        for waiter in blocked:
+            heapq.heappush(self._waiters, waiter)
+
+    async def _acquire(self, node_type: str, priority: Optional[str], reject_when_full: bool) -> NodeTypeState:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Waiters left on a closed loop (e.g. a finished test client) can never be woken
+            self._loop, self._waiters = loop, []
+            for state in self._states.values():
+                state.queued = 0
+        state = self.state(node_type)
+        if self._startable(state):
+            self._start(state)
+            state.waits_ms.append(0.0)
+            return state
+        if reject_when_full and state.queued >= state.limits.queue_limit:
+            state.rejected += 1
+            raise SchedulerBusy(node_type, state.retry_after())
+
+        rank = PRIORITY_CLASSES.get(self.effective_priority(node_type, priority), PRIORITY_CLASSES["standard"])
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (rank, next(self._sequence), node_type, future))
+        state.queued += 1
+        enqueued = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(state)  # Granted a slot just as the caller went away
+            else:
+                state.queued -= 1
+            raise
+        state.waits_ms.append((time.perf_counter() - enqueued) * 1000)
+        return state
+
+    async def run(
+        self,
+        node_type: str,
+        call: Callable[[], Awaitable[T]],
+        priority: Optional[str] = None,
+        reject_when_full: bool = True,
+    ) -> T:
+        """
+        Run `call` in a slot for `node_type`, waiting for one if needed.
+        Raises SchedulerBusy when the queue is full (unless `reject_when_full`
+        is False, for callers that bound their own concurrency) and
+        NodeTimeoutError when the call outlives the node type's timeout.
+        """
+        state = await self._acquire(node_type, priority, reject_when_full)
+        start = time.perf_counter()
+        deadline = asyncio.timeout(state.limits.timeout_seconds)
+        try:
+            async with deadline:
+                return await call()
+        except TimeoutError:
+            if not deadline.expired():
+                raise  # The handler's own timeout, not ours
+            state.timeouts += 1
+            raise NodeTimeoutError(f"{node_type} timed out after {state.limits.timeout_seconds:g}s")
+        finally:
+            state.record_service(time.perf_counter() - start)
+            self._release(state)
+
+    def to_dict(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queued": sum(state.queued for state in self._states.values()),
+            "node_types": {node_type: state.to_dict() for node_type, state in sorted(self._states.items())},
+        }
+
+
+# Singleton instance
+node_scheduler = NodeScheduler(
+    settings.workflow_max_concurrent_nodes,
+    NodeTypeLimits(
+        max_concurrency=settings.workflow_node_max_concurrency,
+        timeout_seconds=settings.workflow_node_timeout_seconds,
+        queue_limit=settings.workflow_node_queue_limit,
+    ),
+)
@@ -0,0 +1,197 @@
+"""
+PHI Detection
+Single-pass scanner for Protected Health Information in free text
+(OCR output, agent messages, voice transcripts). Returns character spans
+so callers can redact, highlight, or audit the detected identifiers.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable
+
+# Extracted-field names whose values are patient/member names
+PHI_NAME_FIELDS = {"patient_name", "insured_name", "member_name"}
+
+# Extracted-field names that are HIPAA identifiers regardless of their value
+PHI_IDENTIFIER_FIELDS = PHI_NAME_FIELDS | {
+    "patient_dob",
+    "insured_id",
+    "member_id",
+    "ssn",
+    "patient_address",
+    "mbi",
+}
+
+# Words around a date that mark it as a date of birth
+_DOB_CONTEXT = ("dob", "birth", "d.o.b")
+
+# Words before a 9-digit number written without dashes that mark it as an SSN
+_SSN_CONTEXT = ("ssn", "social security", "ss#", "ss no")
+
+_MBI_ALPHA = "AC-HJKMNP-RT-Y"  # MBI excludes S, L, O, I, B, Z
+
+# Each alternative matches the remainder of an identifier after its first
+# character. The first character is consumed by the leading character class so
+# the regex engine can use its fast charset scan instead of trying every
+# alternative at every offset; a two-character guard rejects ordinary words
+# and short numbers in one step, and look-behinds re-check the first character.
+# An empty named group at the end of each alternative tags the match kind.
+# Grouped identifiers use one separator throughout (a back-reference), so
+# "555 123 4567" and "555.123.4567" match but a ZIP+4 like "12345-6789" doesn't.
+_DIGIT_LED_ALTERNATIVES = {
+    "ssn": r"\d{2}(?P<ssn_sep>[-. ]?)\d{2}(?P=ssn_sep)\d{4}",
+    "mbi": (
+        rf"(?<=[1-9])[{_MBI_ALPHA}][{_MBI_ALPHA}0-9]\d(?P<mbi_sep>-?)"
+        rf"[{_MBI_ALPHA}][{_MBI_ALPHA}0-9]\d(?P=mbi_sep)[{_MBI_ALPHA}]{{2}}\d{{2}}"
+    ),
+    "date": r"(?:\d?(?P<date_sep>[/-])\d{1,2}(?P=date_sep)(?:19|20)\d{2}|(?:(?<=1)9|(?<=2)0)\d{2}-\d{2}-\d{2})",
+    "phone": r"\d{2}(?P<phone_sep>[-. ])\d{3}(?P=phone_sep)\d{4}",
+    "npi": r"(?<=[12])\d{9}",
+}
+
+_PHI_PATTERN = re.compile(
+    r"[0-9(A-Z](?=[0-9A-Z/-]{2})(?<!\w.)(?:"
+    r"(?<=\d)(?:" + "|".join(f"{pattern}(?P<{kind}>)" for kind, pattern in _DIGIT_LED_ALTERNATIVES.items()) + ")"
+    r"|(?<=[A-Z])[A-Z]{2}\d{6,9}(?P<member_id>)"
+    r"|(?<=\()\d{3}\) ?\d{3}[-. ]\d{4}(?P<phone_paren>)"
+    r")(?!\w)"
+)
+
+_KIND_ALIASES = {"phone_paren": "phone"}
+
+
+@dataclass(frozen=True, slots=True)
+class PHISpan:
+    """A detected PHI identifier at text[start:end]."""
+
+    start: int
+    end: int
+    kind: str
+
+    def to_dict(self) -> dict:
+        return {"start": self.start, "end": self.end, "kind": self.kind}
+
+
+def is_valid_npi(npi: str) -> bool:
+    """NPI check digit: Luhn over the number prefixed with the 80840 issuer code."""
+    total = 24  # Luhn contribution of the "80840" prefix
+    for i, ch in enumerate(reversed(npi[:-1])):
+        digit = int(ch)
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return (10 - total % 10) % 10 == int(npi[-1])
+
+
+def names_from_fields(fields: dict[str, str] | Iterable[tuple[str, str]]) -> list[str]:
+    """Collect name strings from extracted fields for dictionary matching."""
+    items = fields.items() if isinstance(fields, dict) else fields
+    names = []
+    for field_name, value in items:
+        if field_name in PHI_NAME_FIELDS and value and not value.startswith("["):
+            names.append(value)
+    return names
+
+
+class PHIScanner:
+    """
+    Detects PHI in text with one compiled regex pass for structured identifiers
+    (SSN, MBI, dates/DOB, phone, NPI, member ID) plus case-insensitive dictionary
+    matching of known names (e.g. the patient name extracted from the same document).
+    """
+
+    def scan(self, text: str, names: Iterable[str] = ()) -> list[PHISpan]:
+        """Return non-overlapping PHI spans sorted by start offset."""
+        if not text:
+            return []
+
+        spans = []
+        for match in _PHI_PATTERN.finditer(text):
+            kind = _KIND_ALIASES.get(match.lastgroup, match.lastgroup)
+            start, end = match.span()
+            if kind == "npi" and not is_valid_npi(text[start:end]):
+                continue
+            # Undashed 9-digit numbers are mostly claim/account numbers unless labelled as an SSN
+            if (
+                kind == "ssn"
+                and match.group("ssn_sep") != "-"
+                and not any(ctx in text[max(0, start - 20) : start].lower() for ctx in _SSN_CONTEXT)
+            ):
+                continue
+            if kind == "date" and any(ctx in text[max(0, start - 12) : start].lower() for ctx in _DOB_CONTEXT):
+                kind = "dob"
+            spans.append(PHISpan(start, end, kind))
+
+        name_terms = self._name_terms(names)
+        if name_terms:
+            spans.extend(self._scan_names(text, name_terms))
+            spans = self._resolve_overlaps(spans)
+
+        return spans
+
+    def redact(self, text: str, spans: Iterable[PHISpan] | None = None, names: Iterable[str] = ()) -> str:
+        """Replace each PHI span with a [KIND] placeholder."""
+        if spans is None:
+            spans = self.scan(text, names)
+        parts = []
+        cursor = 0
+        for span in spans:
+            parts.append(text[cursor : span.start])
+            parts.append(f"[{span.kind.upper()}]")
+            cursor = span.end
+        parts.append(text[cursor:])
+        return "".join(parts)
+
+    @staticmethod
+    def _name_terms(names: Iterable[str]) -> list[str]:
+        """Full names plus their individual parts (initials and short tokens skipped)."""
+        terms = set()
+        for name in names:
+            normalized = " ".join(name.lower().replace(",", " ").split())
+            if len(normalized) < 3:
+                continue
+            terms.add(normalized)
+            terms.update(part for part in normalized.split() if len(part) >= 3)
+        # Longest first so full names win over their parts
+        return sorted(terms, key=len, reverse=True)
+
+    @staticmethod
+    def _scan_names(text: str, terms: list[str]) -> list[PHISpan]:
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Case mapping changed offsets (rare Unicode); fall back to regex matching
+            pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+            return [
+                PHISpan(m.start(), m.end(), "name")
+                for m in pattern.finditer(text)
+                if (m.start() == 0 or not text[m.start() - 1].isalnum())
+                and (m.end() == len(text) or not text[m.end()].isalnum())
+            ]
+
+        spans = []
+        for term in terms:
+            pos = lowered.find(term)
+            while pos != -1:
+                end = pos + len(term)
+                if (pos == 0 or not lowered[pos - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum()):
+                    spans.append(PHISpan(pos, end, "name"))
+                pos = lowered.find(term, end)
+        return spans
+
+    @staticmethod
+    def _resolve_overlaps(spans: list[PHISpan]) -> list[PHISpan]:
+        """Keep the earliest, then longest, span wherever spans overlap."""
+        spans.sort(key=lambda s: (s.start, -(s.end - s.start)))
+        resolved = []
+        last_end = -1
+        for span in spans:
+            if span.start >= last_end:
+                resolved.append(span)
+                last_end = span.end
+        return resolved
+
+
+# Singleton instance
+phi_scanner = PHIScanner()
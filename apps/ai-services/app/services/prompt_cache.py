@@ -0,0 +1,241 @@
+"""
+Prompt Prefix Cache
+Agent system prompts and tool schemas are identical across requests. Where
+the provider supports context caching, each prefix is uploaded once as a
+cached context and later calls reference it by name instead of resending it,
+so the provider bills those input tokens at the cached rate and skips
+re-processing them.
+
+The registry keeps one cached-context handle per (agent_type, model, prompt
+version). The prompt version is a hash of the system prompt and tool schemas,
+so editing a prompt starts a new cache instead of serving a stale one. Handles
+are created and refreshed in the background: a call never waits on the cache,
+it simply sends the full prompt until a handle is ready. Handles are
+refreshed before they expire. A failed create backs off before retrying, and
+prefixes shorter than the provider's minimum are never uploaded (the
+provider's implicit caching still applies to them).
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional, Protocol, Sequence
+
+import structlog
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.config import settings
+from app.services.metrics import register_cache
+from app.services.single_flight import canonical_hash
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class CachedContext:
+    name: str
+    expires_at: float  # time.monotonic()
+
+
+class ContextCacheBackend(Protocol):
+    async def create(self, model: str, system_prompt: str, tools: Sequence, ttl_seconds: int) -> CachedContext: ...
+
+    async def refresh(self, name: str, ttl_seconds: int) -> CachedContext: ...
+
+
+class GeminiContextCacheBackend:
+    """Gemini explicit context caches (google-genai `caches` API)."""
+
+    def __init__(self, api_key: str):
+        from google import genai
+
+        self._client = genai.Client(api_key=api_key)
+
+    async def create(self, model: str, system_prompt: str, tools: Sequence, ttl_seconds: int) -> CachedContext:
+        from google.genai import types
+        from langchain_google_genai._function_utils import convert_to_genai_function_declarations
+
+        cache = await self._client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_prompt,
+                tools=convert_to_genai_function_declarations(list(tools)) if tools else None,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return CachedContext(cache.name, time.monotonic() + ttl_seconds)
+
+    async def refresh(self, name: str, ttl_seconds: int) -> CachedContext:
+        from google.genai import types
+
+        await self._client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s"))
+        return CachedContext(name, time.monotonic() + ttl_seconds)
+
+
+class FakeContextCacheBackend:
+    """Hands out sequential cache names (tests); `fail` makes creates raise."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created: list[tuple[str, str]] = []  # (model, cache name)
+        self.refreshed: list[str] = []
+
+    async def create(self, model: str, system_prompt: str, tools: Sequence, ttl_seconds: int) -> CachedContext:
+        if self.fail:
+            raise RuntimeError("context caching is not supported for this model")
+        name = f"cachedContents/fake-{len(self.created) + 1}"
+        self.created.append((model, name))
+        return CachedContext(name, time.monotonic() + ttl_seconds)
+
+    async def refresh(self, name: str, ttl_seconds: int) -> CachedContext:
+        self.refreshed.append(name)
+        return CachedContext(name, time.monotonic() + ttl_seconds)
+
+
+@dataclass
+class PromptPrefix:
+    version: str
+    tokens: int  # Estimated, ~4 characters a token
+
+
+@dataclass
+class PrefixEntry:
+    prefix: PromptPrefix
+    context: Optional[CachedContext] = None
+    pending: Optional[asyncio.Task] = None
+    retry_at: float = 0.0
+    status: str = "pending"  # pending, cached, below_minimum, failed
+    hits: int = 0
+    misses: int = 0
+    creates: int = 0
+    refreshes: int = 0
+    failures: int = 0
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        return {
+            "status": self.status,
+            "prefix_tokens": self.prefix.tokens,
+            "cache_name": self.context.name if self.context else None,
+            "expires_in_seconds": round(self.context.expires_at - now) if self.context else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+class PromptCacheRegistry:
+    def __init__(
+        self,
+        backend: Optional[ContextCacheBackend],
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        min_tokens: int = 4096,
+        retry_seconds: int = 600,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.min_tokens = min_tokens
+        self.retry_seconds = retry_seconds
+        self._entries: dict[tuple[str, str, str], PrefixEntry] = {}
+        self._prefixes: dict[tuple[str, tuple], PromptPrefix] = {}
+
+    def prefix(self, system_prompt: str, tools: Sequence) -> PromptPrefix:
+        """Version and size of a system prompt plus tool schemas (computed once per prompt)."""
+        key = (system_prompt, tuple(tool.name for tool in tools))
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            schemas = [convert_to_openai_tool(tool) for tool in tools]
+            prefix = PromptPrefix(
+                version=canonical_hash(system_prompt, schemas)[:12],
+                tokens=(len(system_prompt) + len(json.dumps(schemas))) // 4,
+            )
+            self._prefixes[key] = prefix
+        return prefix
+
+    def lookup(self, agent_type: str, model: str, system_prompt: str, tools: Sequence = ()) -> Optional[str]:
+        """
+        Name of the cached context holding this prefix, or None when the call
+        should send the prefix itself. Starts a background create or refresh
+        when one is due.
+        """
+        if self.backend is None:
+            return None
+        prefix = self.prefix(system_prompt, tools)
+        key = (agent_type, model, prefix.version)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = PrefixEntry(prefix)
+            if prefix.tokens < self.min_tokens:
+                entry.status, entry.retry_at = "below_minimum", float("inf")
+
+        now = time.monotonic()
+        if entry.context is not None and entry.context.expires_at <= now:
+            entry.context, entry.status = None, "pending"
+        if entry.pending is not None and (
+            entry.pending.done() or entry.pending.get_loop() is not asyncio.get_running_loop()
+        ):
+            entry.pending = None  # Finished, or left on a closed loop
+        if entry.pending is None and now >= entry.retry_at:
+            if entry.context is None:
+                entry.pending = asyncio.create_task(self._create(entry, model, system_prompt, tools))
+            elif entry.context.expires_at - now <= self.refresh_margin_seconds:
+                entry.pending = asyncio.create_task(self._refresh(entry))
+
+        if entry.context is None:
+            entry.misses += 1
+            return None
+        entry.hits += 1
+        return entry.context.name
+
+    async def _create(self, entry: PrefixEntry, model: str, system_prompt: str, tools: Sequence):
+        try:
+            entry.context = await self.backend.create(model, system_prompt, tools, self.ttl_seconds)
+        except Exception as e:
+            entry.failures += 1
+            entry.status, entry.retry_at = "failed", time.monotonic() + self.retry_seconds
+            logger.warning("Context cache create failed", model=model, version=entry.prefix.version, error=str(e))
+            return
+        entry.creates += 1
+        entry.status = "cached"
+
+    async def _refresh(self, entry: PrefixEntry):
+        try:
+            entry.context = await self.backend.refresh(entry.context.name, self.ttl_seconds)
+        except Exception as e:
+            # Gone or not refreshable: drop it, and the next lookup creates a new one
+            entry.failures += 1
+            entry.context, entry.status = None, "pending"
+            logger.warning("Context cache refresh failed", version=entry.prefix.version, error=str(e))
+            return
+        entry.refreshes += 1
+
+    def counts(self) -> tuple[int, int]:
+        entries = self._entries.values()
+        return sum(entry.hits for entry in entries), sum(entry.misses for entry in entries)
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self.backend is not None,
+            "min_tokens": self.min_tokens,
+            "prefixes": {
+                f"{agent_type}/{model}/{version}": entry.to_dict()
+                for (agent_type, model, version), entry in sorted(self._entries.items())
+            },
+        }
+
+
+# Singleton instance
+prompt_cache = PromptCacheRegistry(
+    GeminiContextCacheBackend(settings.gemini_api_key)
+    if settings.gemini_api_key and settings.llm_context_cache_enabled
+    else None,
+    ttl_seconds=settings.llm_context_cache_ttl_seconds,
+    refresh_margin_seconds=settings.llm_context_cache_refresh_margin_seconds,
+    min_tokens=settings.llm_context_cache_min_tokens,
+)
+register_cache("llm_prompt_prefix", prompt_cache.counts)
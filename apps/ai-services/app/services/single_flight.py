@@ -0,0 +1,62 @@
+"""
+Single-Flight Helpers
+Shared by the workflow node result cache and the LLM gateway: a canonical
+hash that identifies a request regardless of key order, and in-flight calls
+that any number of identical requests can await instead of repeating.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Optional
+
+
+def canonical_hash(*parts: Any) -> str:
+    """Stable digest of JSON-like values: key order and whitespace don't matter."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class SharedCalls:
+    """
+    In-flight calls by key that any number of callers can await. Each call runs
+    in its own task, which is cancelled only when the last caller waiting on it
+    is cancelled.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    def running(self, key: str) -> Optional[asyncio.Task]:
+        """The call in flight for `key` on this event loop, if any."""
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task
+        return None
+
+    def start(self, key: str, call: Awaitable[Any], held: bool = False) -> asyncio.Task:
+        """Run `call` for `key`; a `held` call is never cancelled for lack of waiters."""
+        task = asyncio.get_running_loop().create_task(call)
+        self._tasks[key] = task
+        self._waiters[task] = 1 if held else 0
+
+        def finished(task: asyncio.Task):
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+            self._waiters.pop(task, None)
+            if not task.cancelled():
+                task.exception()  # Marked retrieved in case every waiter has gone
+
+        task.add_done_callback(finished)
+        return task
+
+    async def wait(self, task: asyncio.Task) -> Any:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if not task.done():
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0:
+                    task.cancel()  # Nobody is waiting for the result any more
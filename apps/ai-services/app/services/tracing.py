@@ -0,0 +1,506 @@
+"""
+Tracing
+Spans around intent routing, LLM calls, tool calls, workflow node handlers,
+voice turns and HTTP requests. When a request is slow, they show whether
+routing, the model, a tool or TTS took the time.
+
+Trace context follows W3C Trace Context. An incoming `traceparent` header
+makes our spans children of the caller's span. Each voice WebSocket turn is
+its own span under the connection's trace context. Finished spans are
+exported as OTLP/JSON, either to a collector (e.g. a local OpenTelemetry
+collector on :4318, or LangSmith's OTLP endpoint when `langsmith_api_key` is
+set) or to a JSON-lines file.
+
+Sampling is decided once per local trace. If the caller sent a sampled flag,
+it is followed; otherwise a fixed ratio of trace ids is kept. Traces that were
+not sampled are still recorded while they run, and are exported anyway if
+the local root span is slower than `tracing_slow_trace_ms`. Tail latency can
+then be attributed without re-running the request. Export runs in the
+background and never blocks a request. With no exporter configured, spans
+are no-ops.
+"""
+
+import asyncio
+import json
+import os
+import re
+import secrets
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Optional, Protocol, Sequence
+
+import httpx
+import structlog
+
+from app.config import settings
+from app.services.metrics import route_template
+
+logger = structlog.get_logger()
+
+SERVICE_NAME = "apex-ai-services"
+LANGSMITH_OTLP_ENDPOINT = "https://api.smith.langchain.com/otel/v1/traces"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str  # 32 hex chars
+    span_id: str  # 16 hex chars
+    sampled: bool
+    remote: bool = False
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """Remote parent from a W3C `traceparent` header; None when absent or malformed."""
+    match = TRACEPARENT_PATTERN.match((header or "").strip().lower())
+    if not match:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, sampled=bool(int(flags, 16) & 1), remote=True)
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+class LocalTrace:
+    """The spans of one trace recorded in this process under one local root span."""
+
+    __slots__ = ("finished", "kept", "sampled", "spans")
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        self.finished = False
+        self.kept = False
+
+
+class Span:
+    __slots__ = (
+        "_is_root",
+        "_token",
+        "_trace",
+        "attributes",
+        "context",
+        "end_ns",
+        "error",
+        "kind",
+        "name",
+        "parent_id",
+        "start_ns",
+        "tracer",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        kind: str,
+        context: SpanContext,
+        parent_id: Optional[str],
+        trace: LocalTrace,
+        is_root: bool,
+        attributes: dict,
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._trace = trace
+        self._is_root = is_root
+        self._token = None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    def set(self, **attributes):
+        """Add attributes; None values are skipped."""
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+        return self
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._on_end(self, self._trace, self._is_root)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and not isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            self.record_error(exc)
+        elif isinstance(exc, asyncio.CancelledError):
+            self.attributes["cancelled"] = True
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class NoopSpan:
+    """Returned when tracing is off, so instrumented code needs no checks."""
+
+    __slots__ = ()
+    context = None
+
+    def set(self, **attributes):
+        return self
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+# Current span, or the remote parent taken from the request headers
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_remote_parent: ContextVar[Optional[SpanContext]] = ContextVar("remote_parent", default=None)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans: Sequence[Span]) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest body for `spans`."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+            }
+        ]
+    }
+
+
+# ─── Exporters ──
+
+
+class SpanExporter(Protocol):
+    async def export(self, spans: Sequence[Span]): ...
+
+    async def close(self): ...
+
+
+class OTLPHttpExporter:
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint."""
+
+    def __init__(self, endpoint: str, headers: Optional[dict] = None, timeout_seconds: float = 10.0):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(headers=headers or {}, timeout=timeout_seconds)
+
+    async def export(self, spans: Sequence[Span]):
+        response = await self._client.post(self.endpoint, json=otlp_request(spans))
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FileExporter:
+    """Appends one OTLP/JSON span per line to `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, lines: list[str]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def export(self, spans: Sequence[Span]):
+        lines = [json.dumps({"service": SERVICE_NAME, **span.to_otlp()}) + "\n" for span in spans]
+        await asyncio.to_thread(self._write, lines)
+
+    async def close(self):
+        pass
+
+
+class InMemoryExporter:
+    """Keeps exported spans in `spans` (tests)."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    async def export(self, spans: Sequence[Span]):
+        self.spans.extend(spans)
+
+    async def close(self):
+        pass
+
+    def names(self) -> list[str]:
+        return [span.name for span in self.spans]
+
+
+# ─── Tracer ──
+
+
+class Tracer:
+    def __init__(
+        self,
+        exporter: Optional[SpanExporter],
+        sample_ratio: float = 0.05,
+        slow_trace_ms: float = 2000.0,
+        max_queued_spans: int = 10_000,
+        export_interval_seconds: float = 5.0,
+        export_batch_size: int = 512,
+    ):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self.slow_trace_ms = slow_trace_ms
+        self.export_interval_seconds = export_interval_seconds
+        self.export_batch_size = export_batch_size
+        self._queue: deque[Span] = deque(maxlen=max_queued_spans)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "traces": 0,
+            "sampled": 0,
+            "kept_slow": 0,
+            "exported_spans": 0,
+            "dropped_spans": 0,
+            "export_errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _sample(self, trace_id: str, parent: Optional[SpanContext]) -> bool:
+        if parent is not None:
+            return parent.sampled
+        # Decided from the trace id, so every process seeing this trace makes the same choice
+        return int(trace_id[16:], 16) < self.sample_ratio * 2**64
+
+    def start_span(self, name: str, kind: str = "internal", parent: Optional[SpanContext] = None, **attributes):
+        """
+        A started span, child of the current span (or of `parent` / the
+        request's remote parent). Use it as a context manager to make it
+        current, or call `end()` when it must not become the parent of
+        other work (e.g. a span held open across an async generator's yields).
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        current = _current_span.get()
+        if parent is None and current is not None:
+            trace, is_root = current._trace, False
+            parent_id, trace_id, sampled = current.context.span_id, current.context.trace_id, current.context.sampled
+        else:
+            parent = parent or _remote_parent.get()
+            trace_id = parent.trace_id if parent else secrets.token_hex(16)
+            sampled = self._sample(trace_id, parent)
+            trace, is_root, parent_id = LocalTrace(sampled), True, parent.span_id if parent else None
+            self.stats["traces"] += 1
+            self.stats["sampled"] += sampled
+        context = SpanContext(trace_id, secrets.token_hex(8), sampled)
+        return Span(self, name, kind, context, parent_id, trace, is_root, attributes)
+
+    def _on_end(self, span: Span, trace: LocalTrace, is_root: bool):
+        if trace.finished:
+            # Ended after its local root (background work): follows the root's decision
+            if trace.kept:
+                self._enqueue([span])
+            return
+        trace.spans.append(span)
+        if not is_root:
+            return
+        trace.finished = True
+        slow = self.slow_trace_ms > 0 and span.duration_ms >= self.slow_trace_ms
+        if trace.sampled or slow:
+            trace.kept = True
+            self.stats["kept_slow"] += not trace.sampled
+            self._enqueue(trace.spans)
+        trace.spans = []
+
+    def _enqueue(self, spans: list[Span]):
+        overflow = len(self._queue) + len(spans) - self._queue.maxlen
+        if overflow > 0:
+            self.stats["dropped_spans"] += overflow
+        self._queue.extend(spans)
+
+    async def flush(self):
+        """Export everything queued so far."""
+        while self._queue and self.exporter is not None:
+            batch = [self._queue.popleft() for _ in range(min(self.export_batch_size, len(self._queue)))]
+            try:
+                await self.exporter.export(batch)
+            except Exception as e:
+                self.stats["export_errors"] += 1
+                self.stats["dropped_spans"] += len(batch)
+                logger.warning("Span export failed", spans=len(batch), error=str(e))
+                return
+            self.stats["exported_spans"] += len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.export_interval_seconds)
+            await self.flush()
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+            self._task = None
+        await self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "sample_ratio": self.sample_ratio,
+            "slow_trace_ms": self.slow_trace_ms,
+            "queued_spans": len(self._queue),
+            **self.stats,
+        }
+
+
+def build_exporter() -> Optional[SpanExporter]:
+    """Exporter from settings; LangSmith's OTLP endpoint when only a LangSmith key is configured."""
+    exporter = settings.tracing_exporter or ("langsmith" if settings.langsmith_api_key else "none")
+    if exporter == "otlp":
+        return OTLPHttpExporter(settings.tracing_otlp_endpoint, settings.tracing_otlp_headers)
+    if exporter == "langsmith":
+        return OTLPHttpExporter(
+            LANGSMITH_OTLP_ENDPOINT,
+            {
+                "x-api-key": settings.langsmith_api_key,
+                "Langsmith-Project": settings.langsmith_project,
+            },
+        )
+    if exporter == "file":
+        return FileExporter(settings.tracing_file_path)
+    return None
+
+
+# Singleton instance
+tracer = Tracer(
+    build_exporter(),
+    sample_ratio=settings.tracing_sample_ratio,
+    slow_trace_ms=settings.tracing_slow_trace_ms,
+    max_queued_spans=settings.tracing_max_queued_spans,
+    export_interval_seconds=settings.tracing_export_interval_seconds,
+)
+
+
+def span(name: str, **attributes):
+    """`with span("tool.call", tool=name) as s: ...` - a child of the current span."""
+    return tracer.start_span(name, **attributes)
+
+
+def traced(name: str):
+    """Decorator form of `span` for coroutine functions."""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ─── HTTP ──
+
+
+class TracingMiddleware:
+    """
+    Reads `traceparent` from incoming requests. HTTP requests get a server
+    span named after the route template. WebSocket connections only carry
+    the caller's context, and each voice turn opens its own span under it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        header = next((value for name, value in scope["headers"] if name == b"traceparent"), None)
+        parent = parse_traceparent(header.decode("latin-1") if header else None)
+        token = _remote_parent.set(parent)
+        try:
+            if scope["type"] == "websocket":
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    server_span.set(**{"http.status_code": message["status"]})
+                    if message["status"] >= 500:
+                        server_span.error = f"HTTP {message['status']}"
+                await send(message)
+
+            with tracer.start_span(
+                f"{scope['method']} {scope['path']}",
+                kind="server",
+                **{
+                    "http.method": scope["method"],
+                    "http.target": scope["path"],
+                },
+            ) as server_span:
+                try:
+                    await self.app(scope, receive, send_with_status)
+                finally:
+                    route = route_template(scope)
+                    server_span.name = f"{scope['method']} {route}"
+                    server_span.set(**{"http.route": route})
+        finally:
+            _remote_parent.reset(token)
@@ -0,0 +1,263 @@
+"""
+Caller Utterance Analysis
+Per-utterance escalation and sentiment detection for voice calls.
+
+Escalation phrases are compiled into one regex per agent template. Multi-word
+phrases tolerate any whitespace, and a match is ignored when a negation cue
+("no need for a supervisor", "I don't want a manager") precedes it in the
+same clause.
+
+Sentiment comes from a small lexicon model that scores a whole batch of
+utterances with one vectorized pass. Utterances from concurrent calls are
+collected for a few milliseconds and scored together in a worker thread, and
+the scores are written to the call record in the background, off the
+response path.
+"""
+
+import asyncio
+import re
+from functools import lru_cache
+from typing import Iterable, Optional, Protocol
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_CLAUSE_BREAK_RE = re.compile(r"[.,;!?]|\bbut\b|\bhowever\b|\bthough\b")
+
+NEGATION_CUES = {
+    "no",
+    "not",
+    "never",
+    "without",
+    "nobody",
+    "none",
+    "neither",
+    "nor",
+    "dont",
+    "don't",
+    "doesn't",
+    "didn't",
+    "won't",
+    "wouldn't",
+    "isn't",
+    "aren't",
+    "shouldn't",
+    "cannot",
+}
+NEGATION_WINDOW = 4  # Words before a phrase that a negation cue applies to
+
+
+def _is_negated(preceding: str) -> bool:
+    clause = _CLAUSE_BREAK_RE.split(preceding)[-1]
+    words = _WORD_RE.findall(clause)[-NEGATION_WINDOW:]
+    return any(word in NEGATION_CUES for word in words)
+
+
+# ─── Escalation ──
+
+
+class EscalationMatcher:
+    """All escalation phrases of a template in one compiled, case-insensitive regex."""
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases = sorted({p.strip().lower() for p in phrases if p.strip()}, key=len, reverse=True)
+        alternatives = [r"\s+".join(map(re.escape, phrase.split())) for phrase in self.phrases]
+        # Longest phrase first so "real person" wins over "person"; plurals match too
+        self._pattern = re.compile(rf"\b(?:{'|'.join(alternatives)})(?:s|es)?\b") if alternatives else None
+
+    def match(self, text: str) -> Optional[str]:
+        """The first non-negated escalation phrase in `text`, or None."""
+        if self._pattern is None:
+            return None
+        lowered = text.lower()
+        for found in self._pattern.finditer(lowered):
+            if not _is_negated(lowered[: found.start()]):
+                return " ".join(found.group().split())
+        return None
+
+
+@lru_cache(maxsize=32)
+def get_escalation_matcher(phrases: tuple[str, ...]) -> EscalationMatcher:
+    return EscalationMatcher(phrases)
+
+
+# ─── Sentiment ──
+
+
+class SentimentModel(Protocol):
+    def predict(self, texts: list[str]) -> np.ndarray:
+        """Scores in [-1, 1], one per text."""
+        ...
+
+
+SENTIMENT_LEXICON = {
+    # Positive
+    "thank": 1.5,
+    "thanks": 1.5,
+    "great": 2.0,
+    "good": 1.5,
+    "perfect": 2.2,
+    "helpful": 1.8,
+    "appreciate": 1.8,
+    "awesome": 2.2,
+    "wonderful": 2.3,
+    "happy": 1.8,
+    "glad": 1.6,
+    "excellent": 2.4,
+    "nice": 1.3,
+    "easy": 1.2,
+    "resolved": 1.2,
+    "fine": 0.6,
+    "okay": 0.4,
+    "love": 2.2,
+    "yes": 0.3,
+    "sure": 0.4,
+    "relieved": 1.6,
+    # Negative
+    "bad": -1.8,
+    "terrible": -2.6,
+    "awful": -2.5,
+    "horrible": -2.6,
+    "angry": -2.3,
+    "upset": -2.0,
+    "frustrated": -2.2,
+    "frustrating": -2.2,
+    "annoyed": -1.8,
+    "ridiculous": -2.2,
+    "unacceptable": -2.5,
+    "wrong": -1.5,
+    "denied": -1.6,
+    "confused": -1.2,
+    "confusing": -1.3,
+    "waiting": -0.6,
+    "hate": -2.6,
+    "worst": -2.8,
+    "useless": -2.3,
+    "problem": -1.0,
+    "issue": -0.8,
+    "sick": -1.0,
+    "pain": -1.2,
+    "complaint": -1.8,
+    "cancel": -1.0,
+    "never": -0.5,
+    "overcharged": -2.0,
+    "rude": -2.2,
+    "stupid": -2.3,
+}
+INTENSIFIERS = {"very": 0.3, "really": 0.3, "so": 0.2, "extremely": 0.5, "totally": 0.3, "absolutely": 0.4}
+
+
+class LexiconSentimentModel:
+    """
+    Valence lexicon with negation flipping and intensifiers, normalized like
+    VADER's compound score. A batch is scored with one bincount over the
+    concatenated word weights.
+    """
+
+    def __init__(self, lexicon: dict[str, float] = SENTIMENT_LEXICON, alpha: float = 15.0):
+        self.lexicon = lexicon
+        self.alpha = alpha
+
+    def _weights(self, text: str) -> list[float]:
+        words = _WORD_RE.findall(text.lower())
+        weights = []
+        for i, word in enumerate(words):
+            valence = self.lexicon.get(word)
+            if valence is None:
+                continue
+            previous = words[max(i - 3, 0) : i]
+            if previous and previous[-1] in INTENSIFIERS:
+                valence *= 1 + INTENSIFIERS[previous[-1]]
+            if any(w in NEGATION_CUES for w in previous):
+                valence *= -0.75
+            weights.append(valence)
+        return weights
+
+    def predict(self, texts: list[str]) -> np.ndarray:
+        segments, weights = [], []
+        for index, text in enumerate(texts):
+            text_weights = self._weights(text)
+            weights.extend(text_weights)
+            segments.extend([index] * len(text_weights))
+        sums = np.bincount(np.asarray(segments, dtype=np.int64), weights=np.asarray(weights), minlength=len(texts))
+        return sums / np.sqrt(sums * sums + self.alpha)
+
+
+class SentimentBatcher:
+    """
+    Collects utterances from concurrent calls and scores them together: a
+    batch is flushed when it reaches `max_batch` or `max_wait_ms` after its
+    first utterance. The model runs in a worker thread, off the event loop.
+    """
+
+    def __init__(self, model: SentimentModel, max_batch: int = 64, max_wait_ms: float = 10.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.scored = 0
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def score(self, text: str) -> float:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A batch left on a closed loop (e.g. a finished test client) would never flush
+            self._loop, self._pending, self._timer = loop, [], None
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        try:
+            scores = await asyncio.to_thread(self.model.predict, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.scored += len(batch)
+        for (_, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(round(float(score), 3))
+
+
+_background: set[asyncio.Task] = set()
+
+
+def record_sentiment_in_background(store, call_id: str, text: str) -> asyncio.Task:
+    """Score `text` and append it to the call's sentiment scores without the caller awaiting it."""
+
+    async def run():
+        try:
+            await store.record_sentiment(call_id, await sentiment_batcher.score(text))
+        except Exception as e:
+            logger.warning("Sentiment analysis failed", call_id=call_id, error=str(e))
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+# Singleton instance
+sentiment_batcher = SentimentBatcher(LexiconSentimentModel())
@@ -0,0 +1,531 @@
+"""
+Voice Call Registry
+Call state shared by every worker handling the call center. A call is a small
+record of scalar fields with atomic status transitions, plus an append-only
+transcript. Completed calls are archived and expire after a retention TTL.
+
+- RedisCallStore: hash per call (WATCH/MULTI transitions), transcript as a
+  Redis stream, per-organization sorted-set index, archive stream, dashboard
+  aggregates updated in the same transactions
+- MemoryCallStore: single-process equivalent for development and tests
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from enum import Enum
+from functools import lru_cache
+from typing import AsyncIterator, Optional, Protocol
+from uuid import uuid4
+
+from pydantic import BaseModel
+from redis.exceptions import WatchError
+
+from app.config import settings
+from app.services.voice.stats import (
+    ALL_ORGS,
+    BUCKETS,
+    WINDOWED_FIELDS,
+    WINDOWS,
+    MemoryStats,
+    bucket_id,
+    created_delta,
+    escalation_delta,
+    latency_delta,
+    sentiment_delta,
+    sum_buckets,
+    summarize,
+    transition_delta,
+    window_bucket_ids,
+)
+
+
+class VoiceAgentType(str, Enum):
+    MEMBER_SERVICE = "member_service"
+    PROVIDER_SERVICE = "provider_service"
+    OUTREACH = "outreach"
+
+
+class CallStatus(str, Enum):
+    RINGING = "ringing"
+    CONNECTED = "connected"
+    IN_PROGRESS = "in_progress"
+    ON_HOLD = "on_hold"
+    TRANSFERRED = "transferred"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class CallRecord(BaseModel):
+    call_id: str
+    agent_type: VoiceAgentType
+    status: CallStatus
+    phone_number: str
+    organization_id: str
+    member_id: Optional[str] = None
+    campaign_id: Optional[str] = None  # Set for calls placed by the outbound campaign dialer
+    started_at: str
+    ended_at: Optional[str] = None
+    duration_seconds: Optional[int] = None
+    transcript: list[dict] = []
+    sentiment_scores: list[float] = []
+    first_audio_latencies_ms: list[int] = []  # End of caller speech -> first agent audio, per turn
+    voice_metrics: dict = {}  # Turn / barge-in cancellation counters
+    escalated: bool = False
+    escalation_reason: Optional[str] = None
+    outcome: Optional[str] = None
+    notes: Optional[str] = None
+
+
+TERMINAL_STATUSES = {CallStatus.COMPLETED, CallStatus.FAILED}
+
+CALL_TRANSITIONS = {
+    CallStatus.RINGING: {CallStatus.CONNECTED, CallStatus.COMPLETED, CallStatus.FAILED},
+    CallStatus.CONNECTED: {
+        CallStatus.IN_PROGRESS,
+        CallStatus.ON_HOLD,
+        CallStatus.TRANSFERRED,
+        CallStatus.COMPLETED,
+        CallStatus.FAILED,
+    },
+    CallStatus.IN_PROGRESS: {CallStatus.ON_HOLD, CallStatus.TRANSFERRED, CallStatus.COMPLETED, CallStatus.FAILED},
+    CallStatus.ON_HOLD: {CallStatus.IN_PROGRESS, CallStatus.TRANSFERRED, CallStatus.COMPLETED, CallStatus.FAILED},
+    CallStatus.TRANSFERRED: {CallStatus.COMPLETED, CallStatus.FAILED},
+    CallStatus.COMPLETED: set(),
+    CallStatus.FAILED: set(),
+}
+
+
+class InvalidCallTransition(ValueError):
+    def __init__(self, call_id: str, current: CallStatus, target: CallStatus):
+        super().__init__(f"Call {call_id} cannot move from {current.value} to {target.value}")
+        self.current = current
+        self.target = target
+
+
+def new_call_id() -> str:
+    """Unique across workers and concurrent requests (random suffix, not a counter)."""
+    return f"call-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid4().hex[:12]}"
+
+
+def _check_transition(call_id: str, current: CallStatus, target: CallStatus):
+    if target not in CALL_TRANSITIONS[current]:
+        raise InvalidCallTransition(call_id, current, target)
+
+
+def _terminal_fields(started_at: str) -> dict:
+    ended_at = datetime.utcnow()
+    return {
+        "ended_at": ended_at.isoformat(),
+        "duration_seconds": int((ended_at - datetime.fromisoformat(started_at)).total_seconds()),
+    }
+
+
+class CallStore(Protocol):
+    async def create(self, record: CallRecord) -> CallRecord: ...
+
+    async def get(self, call_id: str, with_transcript: bool = True) -> Optional[CallRecord]: ...
+
+    async def transition(self, call_id: str, status: CallStatus, **fields) -> Optional[CallRecord]:
+        """Atomically move a call to `status` (validated against CALL_TRANSITIONS) and set fields."""
+        ...
+
+    async def update(self, call_id: str, **fields) -> None:
+        """Set non-status, non-aggregated fields; each field is written whole."""
+        ...
+
+    async def escalate(self, call_id: str, reason: str) -> None:
+        """Mark the call escalated (counted once per call)."""
+        ...
+
+    async def record_sentiment(self, call_id: str, score: float) -> None: ...
+
+    async def record_latency(self, call_id: str, first_audio_ms: int) -> None: ...
+
+    async def append_transcript(self, call_id: str, entry: dict) -> None: ...
+
+    async def list(self, organization_id: Optional[str] = None) -> list[CallRecord]:
+        """Live and not-yet-expired completed calls, without transcripts."""
+        ...
+
+    async def stats(self, organization_id: Optional[str] = None) -> dict:
+        """Dashboard aggregates (running totals and windowed rollups), read without scanning calls."""
+        ...
+
+    def changes(self, organization_id: Optional[str] = None) -> AsyncIterator[None]:
+        """Yields whenever the organization's aggregates change (any organization when None)."""
+        ...
+
+
+# ─── In-Memory Store ──
+
+
+class MemoryCallStore:
+    def __init__(self, completed_ttl_seconds: int = 86400):
+        self.completed_ttl_seconds = completed_ttl_seconds
+        self._calls: dict[str, CallRecord] = {}
+        self._expires_at: dict[str, float] = {}
+        self._stats = MemoryStats()
+        self._subscribers: set[tuple[Optional[str], asyncio.Queue]] = set()
+
+    def _purge(self):
+        now = time.monotonic()
+        for call_id in [c for c, at in self._expires_at.items() if at <= now]:
+            self._calls.pop(call_id, None)
+            self._expires_at.pop(call_id, None)
+
+    def _apply_stats(self, organization_id: str, delta: dict[str, float]):
+        self._stats.apply(organization_id, delta)
+        for subscribed_org, queue in self._subscribers:
+            # One pending notification is enough: subscribers read the latest aggregates
+            if subscribed_org in (None, organization_id) and queue.empty():
+                queue.put_nowait(None)
+
+    async def create(self, record: CallRecord) -> CallRecord:
+        if record.call_id in self._calls:
+            raise ValueError(f"Call {record.call_id} already exists")
+        self._calls[record.call_id] = record.model_copy(deep=True)
+        self._apply_stats(record.organization_id, created_delta(record.status.value))
+        return record
+
+    async def get(self, call_id: str, with_transcript: bool = True) -> Optional[CallRecord]:
+        self._purge()
+        record = self._calls.get(call_id)
+        if record is None:
+            return None
+        return (
+            record.model_copy(deep=True) if with_transcript else record.model_copy(update={"transcript": []}, deep=True)
+        )
+
+    async def transition(self, call_id: str, status: CallStatus, **fields) -> Optional[CallRecord]:
+        self._purge()
+        record = self._calls.get(call_id)
+        if record is None:
+            return None
+        _check_transition(call_id, record.status, status)
+        if status in TERMINAL_STATUSES:
+            fields = {**_terminal_fields(record.started_at), **fields}
+            self._expires_at[call_id] = time.monotonic() + self.completed_ttl_seconds
+        self._calls[call_id] = record.model_copy(update={"status": status, **fields})
+        self._apply_stats(
+            record.organization_id,
+            transition_delta(
+                record.status.value,
+                status.value,
+                fields.get("duration_seconds"),
+            ),
+        )
+        return await self.get(call_id)
+
+    async def update(self, call_id: str, **fields):
+        if call_id in self._calls:
+            self._calls[call_id] = self._calls[call_id].model_copy(update=fields)
+
+    async def escalate(self, call_id: str, reason: str):
+        record = self._calls.get(call_id)
+        if record is None or record.escalated:
+            return
+        self._calls[call_id] = record.model_copy(update={"escalated": True, "escalation_reason": reason})
+        self._apply_stats(record.organization_id, escalation_delta())
+
+    async def record_sentiment(self, call_id: str, score: float):
+        record = self._calls.get(call_id)
+        if record is not None:
+            record.sentiment_scores.append(score)
+            self._apply_stats(record.organization_id, sentiment_delta(score))
+
+    async def record_latency(self, call_id: str, first_audio_ms: int):
+        record = self._calls.get(call_id)
+        if record is not None:
+            record.first_audio_latencies_ms.append(first_audio_ms)
+            self._apply_stats(record.organization_id, latency_delta(first_audio_ms))
+
+    async def append_transcript(self, call_id: str, entry: dict):
+        if call_id in self._calls:
+            self._calls[call_id].transcript.append(entry)
+
+    async def list(self, organization_id: Optional[str] = None) -> list[CallRecord]:
+        self._purge()
+        return [
+            record.model_copy(update={"transcript": []})
+            for record in self._calls.values()
+            if not organization_id or record.organization_id == organization_id
+        ]
+
+    async def stats(self, organization_id: Optional[str] = None) -> dict:
+        return self._stats.read(organization_id)
+
+    async def changes(self, organization_id: Optional[str] = None) -> AsyncIterator[None]:
+        subscription = (organization_id, asyncio.Queue(maxsize=1))
+        self._subscribers.add(subscription)
+        try:
+            while True:
+                await subscription[1].get()
+                yield
+        finally:
+            self._subscribers.discard(subscription)
+
+
+# ─── Redis Store ──
+
+
+class RedisCallStore:
+    """
+    Keys (prefix `voice:`):
+    - call:{id}             hash, one JSON-encoded value per CallRecord field
+    - call:{id}:transcript  stream, one entry per utterance
+    - calls:index           sorted set of call ids by start time (calls:org:{org} per organization)
+    - calls:archive         capped stream of completed records for downstream persistence
+    - stats:{org}           hash of running aggregate counters (stats:_all across organizations)
+    - stats:{org}:{res}:{n} per-minute / per-hour counter buckets for windowed rollups
+    - stats:changed         pub/sub channel announcing which organization's aggregates changed
+
+    Aggregate counters are updated in the same MULTI as the call change they count.
+    """
+
+    ARCHIVE_MAXLEN = 100_000
+
+    def __init__(self, redis, completed_ttl_seconds: int = 86400, prefix: str = "voice:"):
+        self.redis = redis
+        self.completed_ttl_seconds = completed_ttl_seconds
+        self.prefix = prefix
+
+    def _key(self, call_id: str) -> str:
+        return f"{self.prefix}call:{call_id}"
+
+    def _transcript_key(self, call_id: str) -> str:
+        return f"{self.prefix}call:{call_id}:transcript"
+
+    def _index_key(self, organization_id: Optional[str] = None) -> str:
+        return f"{self.prefix}calls:org:{organization_id}" if organization_id else f"{self.prefix}calls:index"
+
+    def _stats_key(self, target: str, resolution: Optional[str] = None, bucket: Optional[int] = None) -> str:
+        key = f"{self.prefix}stats:{target}"
+        return f"{key}:{resolution}:{bucket}" if resolution else key
+
+    @staticmethod
+    def _encode(fields: dict) -> dict:
+        return {name: json.dumps(value) for name, value in fields.items()}
+
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        return {_str(name): json.loads(value) for name, value in raw.items()}
+
+    def _queue_stats(self, pipe, organization_id: str, delta: dict[str, float]):
+        """Queue aggregate counter increments (totals and time buckets) on a MULTI pipeline."""
+        now = time.time()
+        windowed = {name: value for name, value in delta.items() if name in WINDOWED_FIELDS}
+        for target in (organization_id, ALL_ORGS):
+            for name, value in delta.items():
+                pipe.hincrbyfloat(self._stats_key(target), name, value)
+            if not windowed:
+                continue
+            for resolution, (_, retention) in BUCKETS.items():
+                key = self._stats_key(target, resolution, bucket_id(resolution, now))
+                for name, value in windowed.items():
+                    pipe.hincrbyfloat(key, name, value)
+                pipe.expire(key, retention)
+        pipe.publish(f"{self.prefix}stats:changed", organization_id)
+
+    async def _atomic(self, call_id: str, apply) -> Optional[dict]:
+        """
+        Run `apply(current_fields, pipe)` against the call hash in a WATCH/MULTI
+        transaction, retrying when another worker changed the call in between.
+        Returns the fields read, or None if the call does not exist.
+        """
+        key = self._key(call_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.hgetall(key)
+                    if not raw:
+                        await pipe.unwatch()
+                        return None
+                    current = self._decode(raw)
+                    pipe.multi()
+                    apply(current, pipe)
+                    await pipe.execute()
+                    return current
+                except WatchError:
+                    continue
+
+    async def create(self, record: CallRecord) -> CallRecord:
+        key = self._key(record.call_id)
+        fields = record.model_dump(mode="json", exclude={"transcript"})
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.exists(key):
+                    raise ValueError(f"Call {record.call_id} already exists")
+                score = datetime.fromisoformat(record.started_at).timestamp()
+                pipe.multi()
+                pipe.hset(key, mapping=self._encode(fields))
+                pipe.zadd(self._index_key(), {record.call_id: score})
+                pipe.zadd(self._index_key(record.organization_id), {record.call_id: score})
+                self._queue_stats(pipe, record.organization_id, created_delta(record.status.value))
+                await pipe.execute()
+            except WatchError:
+                raise ValueError(f"Call {record.call_id} already exists")
+        return record
+
+    async def get(self, call_id: str, with_transcript: bool = True) -> Optional[CallRecord]:
+        raw = await self.redis.hgetall(self._key(call_id))
+        if not raw:
+            return None
+        fields = self._decode(raw)
+        if with_transcript:
+            entries = await self.redis.xrange(self._transcript_key(call_id))
+            fields["transcript"] = [json.loads(_field(entry, "entry")) for _, entry in entries]
+        return CallRecord(**fields)
+
+    async def transition(self, call_id: str, status: CallStatus, **fields) -> Optional[CallRecord]:
+        def apply(current: dict, pipe):
+            _check_transition(call_id, CallStatus(current["status"]), status)
+            updates = {"status": status.value, **fields}
+            if status in TERMINAL_STATUSES:
+                updates = {**_terminal_fields(current["started_at"]), **updates}
+
+            pipe.hset(self._key(call_id), mapping=self._encode(updates))
+            if status in TERMINAL_STATUSES:
+                pipe.expire(self._key(call_id), self.completed_ttl_seconds)
+                pipe.expire(self._transcript_key(call_id), self.completed_ttl_seconds)
+                pipe.xadd(
+                    f"{self.prefix}calls:archive",
+                    {"call_id": call_id, "record": json.dumps({**current, **updates})},
+                    maxlen=self.ARCHIVE_MAXLEN,
+                    approximate=True,
+                )
+            self._queue_stats(
+                pipe,
+                current["organization_id"],
+                transition_delta(
+                    current["status"],
+                    status.value,
+                    updates.get("duration_seconds"),
+                ),
+            )
+
+        if await self._atomic(call_id, apply) is None:
+            return None
+        return await self.get(call_id)
+
+    async def update(self, call_id: str, **fields):
+        await self._atomic(call_id, lambda current, pipe: pipe.hset(self._key(call_id), mapping=self._encode(fields)))
+
+    async def escalate(self, call_id: str, reason: str):
+        def apply(current: dict, pipe):
+            if current.get("escalated"):
+                return
+            pipe.hset(self._key(call_id), mapping=self._encode({"escalated": True, "escalation_reason": reason}))
+            self._queue_stats(pipe, current["organization_id"], escalation_delta())
+
+        await self._atomic(call_id, apply)
+
+    async def _append_sample(self, call_id: str, field: str, value, delta: dict[str, float]):
+        def apply(current: dict, pipe):
+            pipe.hset(self._key(call_id), field, json.dumps([*current.get(field, []), value]))
+            self._queue_stats(pipe, current["organization_id"], delta)
+
+        await self._atomic(call_id, apply)
+
+    async def record_sentiment(self, call_id: str, score: float):
+        await self._append_sample(call_id, "sentiment_scores", score, sentiment_delta(score))
+
+    async def record_latency(self, call_id: str, first_audio_ms: int):
+        await self._append_sample(call_id, "first_audio_latencies_ms", first_audio_ms, latency_delta(first_audio_ms))
+
+    async def append_transcript(self, call_id: str, entry: dict):
+        def apply(current: dict, pipe):
+            transcript_key = self._transcript_key(call_id)
+            pipe.xadd(transcript_key, {"entry": json.dumps(entry)})
+            if CallStatus(current["status"]) in TERMINAL_STATUSES:
+                # Late entries must not leave a transcript that outlives (or never follows) the record's expiry
+                pipe.expire(transcript_key, self.completed_ttl_seconds)
+
+        # No record (unknown or expired call): nothing to append to
+        await self._atomic(call_id, apply)
+
+    async def list(self, organization_id: Optional[str] = None) -> list[CallRecord]:
+        index = self._index_key(organization_id)
+        call_ids = [_str(c) for c in await self.redis.zrange(index, 0, -1)]
+        if not call_ids:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for call_id in call_ids:
+                pipe.hgetall(self._key(call_id))
+            rows = await pipe.execute()
+
+        records, expired = [], []
+        for call_id, raw in zip(call_ids, rows):
+            if raw:
+                records.append(CallRecord(**self._decode(raw)))
+            else:
+                expired.append(call_id)
+        if expired:
+            # Completed calls past their TTL: drop them from the indexes
+            await self.redis.zrem(self._index_key(), *expired)
+            if organization_id:
+                await self.redis.zrem(index, *expired)
+        return records
+
+    async def stats(self, organization_id: Optional[str] = None) -> dict:
+        target = organization_id or ALL_ORGS
+        now = time.time()
+        bucket_keys = {
+            resolution: window_bucket_ids(
+                resolution, max(count for r, count in WINDOWS.values() if r == resolution), now
+            )
+            for resolution in BUCKETS
+        }
+        # One round trip: totals plus every bucket any window needs
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._stats_key(target))
+            for resolution, buckets in bucket_keys.items():
+                for bucket in buckets:
+                    pipe.hgetall(self._stats_key(target, resolution, bucket))
+            rows = [{_str(k): float(v) for k, v in row.items()} for row in await pipe.execute()]
+
+        totals, offset, by_bucket = rows[0], 1, {}
+        for resolution, buckets in bucket_keys.items():
+            for bucket, row in zip(buckets, rows[offset : offset + len(buckets)]):
+                by_bucket[(resolution, bucket)] = row
+            offset += len(buckets)
+        windows = {
+            name: sum_buckets([by_bucket[(resolution, b)] for b in window_bucket_ids(resolution, count, now)])
+            for name, (resolution, count) in WINDOWS.items()
+        }
+        return summarize(totals, windows)
+
+    async def changes(self, organization_id: Optional[str] = None) -> AsyncIterator[None]:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(f"{self.prefix}stats:changed")
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message" and organization_id in (None, _str(message["data"])):
+                    yield
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _field(entry: dict, name: str):
+    return entry.get(name, entry.get(name.encode()))
+
+
+@lru_cache(maxsize=1)
+def get_call_store() -> CallStore:
+    """Shared call store: Redis for multi-worker deployments, in-memory otherwise."""
+    if settings.call_store_backend == "redis":
+        import redis.asyncio as aioredis
+
+        return RedisCallStore(
+            aioredis.from_url(settings.redis_url),
+            completed_ttl_seconds=settings.call_completed_ttl_seconds,
+        )
+    return MemoryCallStore(completed_ttl_seconds=settings.call_completed_ttl_seconds)
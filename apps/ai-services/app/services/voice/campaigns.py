@@ -0,0 +1,443 @@
+"""
+Outbound Campaign Dialer
+Schedules outbound voice-agent calls for a member list: global and
+per-organization concurrency caps, calling-hour windows in each member's
+local timezone, and retries of unanswered calls with exponential backoff.
+
+One asyncio scheduler task per process drives a pluggable telephony adapter,
+configured by `campaign_telephony_adapter`; without one, campaigns are
+disabled (the simulator is for tests and benchmarks only).
+Attempts become due on a heap; due attempts wait in per-organization queues
+that are served round-robin, so one large campaign cannot starve other
+organizations. Call records go to the shared call store, so campaign calls
+show up on dashboards like any other call.
+"""
+
+import asyncio
+import heapq
+import importlib
+import itertools
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from datetime import time as dtime
+from enum import Enum
+from typing import Awaitable, Callable, Optional, Protocol
+from uuid import uuid4
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import structlog
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.config import settings
+from app.services.voice.calls import CallRecord, CallStatus, VoiceAgentType, get_call_store, new_call_id
+
+logger = structlog.get_logger()
+
+
+class CampaignMember(BaseModel):
+    member_id: str
+    phone_number: str
+    timezone: str = "America/New_York"
+    context: Optional[dict] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {value}")
+        return value
+
+
+class CampaignRequest(BaseModel):
+    organization_id: str
+    name: str = ""
+    agent_type: VoiceAgentType = VoiceAgentType.OUTREACH
+    members: list[CampaignMember] = Field(..., min_length=1)
+    calling_hours_start: dtime = dtime(9, 0)  # Member local time
+    calling_hours_end: dtime = dtime(20, 0)
+    max_attempts: int = Field(default=3, ge=1)
+    retry_backoff_seconds: float = Field(default=1800, ge=0)  # Doubles after each unanswered attempt
+    max_concurrent_calls: Optional[int] = Field(default=None, ge=1)  # Campaign cap within the org cap
+
+    @model_validator(mode="after")
+    def calling_hours_window(self) -> "CampaignRequest":
+        # An empty or overnight window would defer every attempt forever
+        if self.calling_hours_start >= self.calling_hours_end:
+            raise ValueError("calling_hours_start must be before calling_hours_end (same local day)")
+        return self
+
+
+# ─── Telephony ──
+
+
+class DialOutcome(str, Enum):
+    ANSWERED = "answered"
+    NO_ANSWER = "no_answer"
+    BUSY = "busy"
+    FAILED = "failed"
+
+
+RETRYABLE_OUTCOMES = {DialOutcome.NO_ANSWER, DialOutcome.BUSY}
+
+
+@dataclass
+class DialResult:
+    outcome: DialOutcome
+    talk_seconds: float = 0.0
+
+
+class TelephonyAdapter(Protocol):
+    async def dial(
+        self,
+        call_id: str,
+        phone_number: str,
+        on_answered: Callable[[], Awaitable[None]],
+    ) -> DialResult:
+        """Place a call, await `on_answered` when picked up, and return once the call has ended."""
+        ...
+
+
+def get_telephony() -> Optional[TelephonyAdapter]:
+    """The configured telephony adapter, or None when outbound calling is not set up."""
+    if not settings.campaign_telephony_adapter:
+        return None
+    module_name, _, factory = settings.campaign_telephony_adapter.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+class SimulatedTelephony:
+    """
+    Local telephony simulator: random ring time, answer/busy/fail rates and
+    talk time. `time_scale` shrinks all durations for tests and benchmarks.
+    Never used for real campaigns: its made-up calls would land in the
+    shared call store and dashboards.
+    """
+
+    def __init__(
+        self,
+        answer_rate: float = 0.6,
+        busy_rate: float = 0.1,
+        fail_rate: float = 0.02,
+        ring_seconds: tuple[float, float] = (3.0, 25.0),
+        talk_seconds: tuple[float, float] = (30.0, 240.0),
+        time_scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.answer_rate = answer_rate
+        self.busy_rate = busy_rate
+        self.fail_rate = fail_rate
+        self.ring_seconds = ring_seconds
+        self.talk_seconds = talk_seconds
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def dial(self, call_id: str, phone_number: str, on_answered) -> DialResult:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            roll = self.rng.random()
+            if roll < self.fail_rate:
+                return DialResult(DialOutcome.FAILED)
+            await asyncio.sleep(self.rng.uniform(*self.ring_seconds) * self.time_scale)
+            if roll < self.fail_rate + self.busy_rate:
+                return DialResult(DialOutcome.BUSY)
+            if roll >= self.fail_rate + self.busy_rate + self.answer_rate:
+                return DialResult(DialOutcome.NO_ANSWER)
+            await on_answered()
+            talk = self.rng.uniform(*self.talk_seconds)
+            await asyncio.sleep(talk * self.time_scale)
+            return DialResult(DialOutcome.ANSWERED, talk_seconds=talk)
+        finally:
+            self.in_flight -= 1
+
+
+# ─── Scheduling ──
+
+
+def next_calling_time(now: datetime, tz: str, start: dtime, end: dtime) -> datetime:
+    """`now` if it is within calling hours in the member's timezone, else the next window opening (UTC)."""
+    zone = ZoneInfo(tz)
+    local = now.astimezone(zone)
+    if start <= local.time() < end:
+        return now
+    day = local.date() if local.time() < start else local.date() + timedelta(days=1)
+    return datetime.combine(day, start, tzinfo=zone).astimezone(timezone.utc)
+
+
+@dataclass
+class _Attempt:
+    campaign_id: str
+    member: CampaignMember
+    number: int = 1
+
+
+@dataclass
+class Campaign:
+    campaign_id: str
+    request: CampaignRequest
+    created_at: float = field(default_factory=time.time)
+    status: str = "running"  # running | completed | cancelled
+    pending: int = 0
+    in_flight: int = 0
+    attempts: int = 0
+    retries: int = 0
+    outcomes: dict[str, int] = field(default_factory=dict)
+    deferred_for_calling_hours: int = 0
+    completed_at: Optional[float] = None
+
+    def summary(self) -> dict:
+        elapsed = (self.completed_at or time.time()) - self.created_at
+        finished = sum(self.outcomes.values())
+        return {
+            "campaign_id": self.campaign_id,
+            "name": self.request.name,
+            "organization_id": self.request.organization_id,
+            "status": self.status,
+            "members": len(self.request.members),
+            "pending_attempts": self.pending,
+            "in_flight": self.in_flight,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "outcomes": dict(self.outcomes),
+            "deferred_for_calling_hours": self.deferred_for_calling_hours,
+            "elapsed_seconds": round(elapsed, 1),
+            "calls_per_minute": round(finished / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class CampaignDialer:
+    def __init__(
+        self,
+        telephony: Optional[TelephonyAdapter],
+        max_concurrent_calls: int = 50,
+        max_concurrent_calls_per_org: int = 20,
+        store_factory=get_call_store,
+    ):
+        self.telephony = telephony
+        self.max_concurrent_calls = max_concurrent_calls
+        self.max_concurrent_calls_per_org = max_concurrent_calls_per_org
+        self.store_factory = store_factory
+        self.campaigns: dict[str, Campaign] = {}
+        self._due: list[tuple[float, int, _Attempt]] = []
+        self._ready: dict[str, deque[_Attempt]] = {}
+        self._org_in_flight: dict[str, int] = {}
+        self._in_flight = 0
+        self._calls: set[asyncio.Task] = set()
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def available(self) -> bool:
+        return self.telephony is not None
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def start_campaign(self, request: CampaignRequest) -> Campaign:
+        if not self.available:
+            raise RuntimeError("No telephony adapter configured")
+        self._ensure_running()
+        campaign = Campaign(campaign_id=f"camp-{uuid4().hex[:12]}", request=request)
+        self.campaigns[campaign.campaign_id] = campaign
+        now = time.time()
+        for member in request.members:
+            self._schedule(campaign, _Attempt(campaign.campaign_id, member), now)
+        logger.info(
+            "Campaign started",
+            campaign_id=campaign.campaign_id,
+            org_id=request.organization_id,
+            members=len(request.members),
+        )
+        self._notify()
+        return campaign
+
+    def cancel_campaign(self, campaign_id: str) -> Optional[Campaign]:
+        """Stop dialing pending attempts; calls already in progress finish normally."""
+        campaign = self.campaigns.get(campaign_id)
+        if campaign and campaign.status == "running":
+            campaign.status = "cancelled"
+            campaign.pending = 0
+            campaign.completed_at = time.time()
+            self._notify()
+        return campaign
+
+    def _schedule(self, campaign: Campaign, attempt: _Attempt, due: float):
+        campaign.pending += 1
+        heapq.heappush(self._due, (due, next(self._seq), attempt))
+
+    async def stop(self):
+        """Cancel the scheduler and calls in progress (application shutdown)."""
+        if self._task is None or self._task.get_loop() is not asyncio.get_running_loop():
+            return
+        self._task.cancel()
+        for task in list(self._calls):
+            task.cancel()
+        await asyncio.wait([self._task, *self._calls])
+        self._task = None
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            self._release_due(now)
+            self._dispatch()
+            timeout = max(self._due[0][0] - now, 0) if self._due else None
+            try:
+                # Not wait_for: it swallows a cancel that races with the wake-up
+                async with asyncio.timeout(timeout):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _release_due(self, now: float):
+        """Move due attempts to their organization's ready queue, deferring those outside calling hours."""
+        utc_now = datetime.fromtimestamp(now, tz=timezone.utc)
+        while self._due and self._due[0][0] <= now:
+            _, _, attempt = heapq.heappop(self._due)
+            campaign = self.campaigns[attempt.campaign_id]
+            if campaign.status != "running":
+                continue
+            request = campaign.request
+            opens = next_calling_time(
+                utc_now, attempt.member.timezone, request.calling_hours_start, request.calling_hours_end
+            )
+            if opens > utc_now:
+                campaign.deferred_for_calling_hours += 1
+                heapq.heappush(self._due, (opens.timestamp(), next(self._seq), attempt))
+                continue
+            self._ready.setdefault(request.organization_id, deque()).append(attempt)
+
+    def _dispatch(self):
+        """Start calls round-robin across organizations until a concurrency cap is reached."""
+        while self._in_flight < self.max_concurrent_calls:
+            started = False
+            for org in list(self._ready):
+                queue = self._ready[org]
+                if self._in_flight >= self.max_concurrent_calls:
+                    break
+                if self._org_in_flight.get(org, 0) >= self.max_concurrent_calls_per_org:
+                    continue
+                attempt = self._next_startable(queue)
+                if attempt is None:
+                    if not queue:
+                        del self._ready[org]
+                    continue
+                self._start_call(attempt)
+                started = True
+            if not started:
+                return
+
+    def _next_startable(self, queue: deque) -> Optional[_Attempt]:
+        """First queued attempt whose campaign is running and under its own cap (others keep their place)."""
+        for _ in range(len(queue)):
+            attempt = queue.popleft()
+            campaign = self.campaigns[attempt.campaign_id]
+            if campaign.status != "running":
+                continue
+            cap = campaign.request.max_concurrent_calls
+            if cap is not None and campaign.in_flight >= cap:
+                queue.append(attempt)
+                continue
+            return attempt
+        return None
+
+    def _start_call(self, attempt: _Attempt):
+        campaign = self.campaigns[attempt.campaign_id]
+        org = campaign.request.organization_id
+        campaign.pending -= 1
+        campaign.in_flight += 1
+        campaign.attempts += 1
+        self._in_flight += 1
+        self._org_in_flight[org] = self._org_in_flight.get(org, 0) + 1
+
+        task = asyncio.create_task(self._place_call(campaign, attempt))
+        self._calls.add(task)
+        task.add_done_callback(self._calls.discard)
+
+    async def _place_call(self, campaign: Campaign, attempt: _Attempt):
+        request = campaign.request
+        store = self.store_factory()
+        call_id = new_call_id()
+        outcome = DialOutcome.FAILED
+        try:
+            await store.create(
+                CallRecord(
+                    call_id=call_id,
+                    agent_type=request.agent_type,
+                    status=CallStatus.RINGING,
+                    phone_number=attempt.member.phone_number,
+                    organization_id=request.organization_id,
+                    member_id=attempt.member.member_id,
+                    campaign_id=campaign.campaign_id,
+                    started_at=datetime.utcnow().isoformat(),
+                )
+            )
+            result = await self.telephony.dial(
+                call_id,
+                attempt.member.phone_number,
+                on_answered=lambda: store.transition(call_id, CallStatus.CONNECTED),
+            )
+            outcome = result.outcome
+            if outcome == DialOutcome.ANSWERED:
+                await store.transition(call_id, CallStatus.COMPLETED, outcome=outcome.value)
+            else:
+                await store.transition(call_id, CallStatus.FAILED, outcome=outcome.value)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Campaign call failed", campaign_id=campaign.campaign_id, call_id=call_id, error=str(e))
+        finally:
+            self._finish_call(campaign, attempt, outcome)
+
+    def _finish_call(self, campaign: Campaign, attempt: _Attempt, outcome: DialOutcome):
+        org = campaign.request.organization_id
+        campaign.in_flight -= 1
+        campaign.outcomes[outcome.value] = campaign.outcomes.get(outcome.value, 0) + 1
+        self._in_flight -= 1
+        self._org_in_flight[org] -= 1
+
+        if (
+            campaign.status == "running"
+            and outcome in RETRYABLE_OUTCOMES
+            and attempt.number < campaign.request.max_attempts
+        ):
+            backoff = campaign.request.retry_backoff_seconds * 2 ** (attempt.number - 1)
+            campaign.retries += 1
+            self._schedule(
+                campaign,
+                _Attempt(attempt.campaign_id, attempt.member, attempt.number + 1),
+                time.time() + backoff * random.uniform(0.9, 1.1),
+            )
+
+        if campaign.status == "running" and campaign.pending == 0 and campaign.in_flight == 0:
+            campaign.status = "completed"
+            campaign.completed_at = time.time()
+            logger.info("Campaign completed", **campaign.summary())
+        self._notify()
+
+
+# Singleton instance
+campaign_dialer = CampaignDialer(
+    get_telephony(),
+    max_concurrent_calls=settings.campaign_max_concurrent_calls,
+    max_concurrent_calls_per_org=settings.campaign_max_concurrent_calls_per_org,
+)
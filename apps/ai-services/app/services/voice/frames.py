@@ -0,0 +1,137 @@
+"""
+Voice Audio Framing
+Binary sub-protocol for the voice WebSocket and inbound audio buffering.
+
+With the `apex-voice.binary.v1` sub-protocol, audio travels as binary
+messages: an 8-byte header followed by the raw codec payload. Control
+messages stay JSON text frames. Clients that do not negotiate the
+sub-protocol keep the base64-in-JSON audio messages.
+
+    0       1       2               4                               8
+    +-------+-------+---------------+-------------------------------+
+    |version| codec |     flags     |     sequence (uint32, BE)     |  payload...
+    +-------+-------+---------------+-------------------------------+
+
+Inbound payloads are copied once, straight from the received message into
+a preallocated per-call ring buffer. A pump drains the ring to the STT
+stream in coalesced chunks, so the receive loop never waits on the STT
+connection and no per-frame buffers are allocated.
+"""
+
+import asyncio
+import struct
+from typing import Awaitable, Callable, Optional
+
+BINARY_SUBPROTOCOL = "apex-voice.binary.v1"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("!BBHI")  # version, codec, flags, sequence
+
+CODECS = {"mulaw": 0, "linear16": 1, "opus": 2}
+
+FLAG_END_OF_SPEECH = 0x0001  # Client-side endpointing on the last frame of an utterance
+
+
+class FrameError(ValueError):
+    pass
+
+
+def pack_frame(payload: bytes, codec: int, sequence: int, flags: int = 0) -> bytes:
+    return FRAME_HEADER.pack(FRAME_VERSION, codec, flags, sequence & 0xFFFFFFFF) + payload
+
+
+def unpack_frame(message: bytes) -> tuple[int, int, int, memoryview]:
+    """(codec, flags, sequence, payload view) of a binary frame; the payload is not copied."""
+    if len(message) < FRAME_HEADER.size:
+        raise FrameError("Frame shorter than header")
+    version, codec, flags, sequence = FRAME_HEADER.unpack_from(message)
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version {version}")
+    return codec, flags, sequence, memoryview(message)[FRAME_HEADER.size :]
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity byte ring over one preallocated bytearray. When the
+    reader falls behind, the oldest audio is overwritten (counted in
+    `overrun_bytes`): late audio is worth less than current audio.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._size = 0
+        self.overrun_bytes = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def write(self, data) -> None:
+        data = memoryview(data)
+        if len(data) >= self.capacity:
+            self.overrun_bytes += self._size + len(data) - self.capacity
+            data = data[len(data) - self.capacity :]
+            self._start, self._size = 0, 0
+        overflow = self._size + len(data) - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._size -= overflow
+            self.overrun_bytes += overflow
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._view[end : end + first] = data[:first]
+        self._view[: len(data) - first] = data[first:]
+        self._size += len(data)
+
+    def read(self, max_bytes: int) -> bytes:
+        """Remove and return up to `max_bytes` of the oldest audio."""
+        count = min(max_bytes, self._size)
+        first = min(count, self.capacity - self._start)
+        if first == count:
+            chunk = bytes(self._view[self._start : self._start + count])
+        else:
+            chunk = b"".join((self._view[self._start :], self._view[: count - first]))
+        self._start = (self._start + count) % self.capacity
+        self._size -= count
+        return chunk
+
+
+class AudioPump:
+    """Drains a call's inbound ring buffer into the STT stream, up to `chunk_bytes` per send."""
+
+    def __init__(self, sink: Callable[[bytes], Awaitable[None]], capacity: int, chunk_bytes: int):
+        self.ring = AudioRingBuffer(capacity)
+        self.sink = sink
+        self.chunk_bytes = chunk_bytes
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, payload) -> None:
+        self.ring.write(payload)
+        self._idle.clear()
+        self._ready.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while len(self.ring):
+                    await self.sink(self.ring.read(self.chunk_bytes))
+                self._idle.set()
+        finally:
+            self._idle.set()  # Never leave `drain` waiting on a failed or closed pump
+
+    async def drain(self):
+        """Wait until everything pushed so far has been handed to the STT stream."""
+        await self._idle.wait()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
@@ -0,0 +1,210 @@
+"""
+Phrase Audio Cache
+Greetings and fixed system phrases ("Transferring you to a human
+representative...") are the same on every call, so they are synthesized
+once rather than per call.
+
+Rendered audio is keyed by (voice, language, output codec, TTS model, text
+hash) and stored in the output codec, in memory and, when
+VOICE_PHRASE_CACHE_DIR is set, on local disk so restarts and other workers
+on the host reuse it. Phrases are rendered at startup (`warm`) or on first
+use, when synthesized audio is streamed to the caller as it arrives and
+saved once complete.
+
+Changed template text hashes to a new key. A manifest maps each phrase id
+to its current key, so the stale render is deleted when a phrase's text
+changes.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import structlog
+
+from app.config import settings
+from app.services.metrics import register_cache
+from app.services.voice.tts import TextToSpeech, get_tts
+
+logger = structlog.get_logger()
+
+MANIFEST_FILE = "manifest.json"
+
+
+@dataclass
+class PhraseStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    renders: int = 0
+    invalidations: int = 0
+
+    def counts(self) -> tuple[int, int]:
+        return self.memory_hits + self.disk_hits, self.renders
+
+    def to_dict(self) -> dict:
+        served = self.memory_hits + self.disk_hits + self.renders
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / served, 3) if served else None,
+        }
+
+
+class PhraseAudioCache:
+    def __init__(
+        self,
+        tts: TextToSpeech,
+        directory: str = "",
+        codec: str = "mulaw_8000",
+        chunk_bytes: int = 3200,  # 400 ms of 8 kHz mu-law per WebSocket message
+        max_memory_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.tts = tts
+        self.directory = Path(directory) if directory else None
+        self.codec = getattr(tts, "output_format", codec)
+        self.model = getattr(tts, "model_id", type(tts).__name__)
+        self.chunk_bytes = chunk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.stats = PhraseStats()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._manifest: dict[str, str] = {}
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest = self.directory / MANIFEST_FILE
+            if manifest.exists():
+                self._manifest = json.loads(manifest.read_text())
+
+    def key(self, text: str, voice_id: str, language: str) -> str:
+        digest = hashlib.sha256(text.encode()).hexdigest()[:24]
+        raw = f"{self.model}|{self.codec}|{voice_id}|{language}|{digest}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.{self.codec}"
+
+    def _remember(self, key: str, audio: bytes):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget(self, key: str):
+        audio = self._memory.pop(key, None)
+        if audio is not None:
+            self._memory_bytes -= len(audio)
+        if self.directory:
+            self._path(key).unlink(missing_ok=True)
+
+    def _write(self, key: str, audio: bytes):
+        # Atomic replace: a concurrent reader never sees a partial file
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(audio)
+        os.replace(tmp, path)
+
+    def _cached(self, key: str) -> bool:
+        return key in self._memory or bool(self.directory and self._path(key).exists())
+
+    async def _load(self, key: str) -> Optional[bytes]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return self._memory[key]
+        if self.directory:
+            path = self._path(key)
+            try:
+                audio = await asyncio.to_thread(path.read_bytes)
+            except FileNotFoundError:
+                return None
+            self._remember(key, audio)
+            self.stats.disk_hits += 1
+            return audio
+        return None
+
+    async def _store(self, key: str, audio: bytes):
+        self._remember(key, audio)
+        if self.directory:
+            await asyncio.to_thread(self._write, key, audio)
+
+    async def stream(self, text: str, voice_id: str, language: str = "en-US") -> AsyncIterator[bytes]:
+        """Audio for `text`: served from the cache, or synthesized (streamed as it arrives) and cached."""
+        key = self.key(text, voice_id, language)
+        audio = await self._load(key)
+        if audio is not None:
+            for i in range(0, len(audio), self.chunk_bytes):
+                yield audio[i : i + self.chunk_bytes]
+            return
+
+        chunks = []
+        async with aclosing(self.tts.synthesize(text, voice_id, language)) as audio:
+            async for chunk in audio:
+                chunks.append(chunk)
+                yield chunk
+        # Only reached when the whole phrase was synthesized (not on hang-up mid-greeting)
+        self.stats.renders += 1
+        await self._store(key, b"".join(chunks))
+
+    async def render(self, text: str, voice_id: str, language: str = "en-US") -> bool:
+        """Make sure `text` is cached; True if it had to be synthesized."""
+        if self._cached(self.key(text, voice_id, language)):
+            return False
+        async for _ in self.stream(text, voice_id, language):
+            pass
+        return True
+
+    async def warm(self, phrases: dict[str, tuple[str, str, str]], concurrency: int = 4) -> dict:
+        """
+        Pre-render phrases given as {phrase_id: (text, voice_id, language)}.
+        A phrase whose text (or voice) changed since the last warm-up has its
+        old render deleted.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def render(phrase_id: str, text: str, voice_id: str, language: str) -> bool:
+            async with semaphore:
+                try:
+                    return await self.render(text, voice_id, language)
+                except Exception as e:
+                    logger.warning("Phrase pre-render failed", phrase_id=phrase_id, error=str(e))
+                    return False
+
+        manifest = {phrase_id: self.key(*phrase) for phrase_id, phrase in phrases.items()}
+        current = set(manifest.values())
+        for phrase_id, key in manifest.items():
+            previous = self._manifest.get(phrase_id)
+            if previous and previous != key and previous not in current:
+                self._forget(previous)
+                self.stats.invalidations += 1
+
+        rendered = await asyncio.gather(*(render(pid, *phrase) for pid, phrase in phrases.items()))
+        self._manifest.update(manifest)
+        if self.directory:
+            (self.directory / MANIFEST_FILE).write_text(json.dumps(self._manifest, indent=1, sort_keys=True))
+        result = {"phrases": len(phrases), "rendered": sum(rendered)}
+        logger.info("Phrase audio cache warmed", **result, codec=self.codec)
+        return result
+
+
+@lru_cache(maxsize=1)
+def get_phrase_cache() -> PhraseAudioCache:
+    cache = PhraseAudioCache(
+        get_tts(),
+        directory=settings.voice_phrase_cache_dir,
+        codec=f"{settings.voice_audio_encoding}_{settings.voice_sample_rate}",
+    )
+    register_cache("voice_phrases", cache.stats.counts)
+    return cache
@@ -0,0 +1,181 @@
+"""
+Voice Turn Pipeline
+Streams an agent response into speech sentence by sentence: while the LLM is
+still generating, completed sentences are already being synthesized and their
+audio sent, so the caller hears the first sentence without waiting for the
+whole answer.
+"""
+
+import asyncio
+import re
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from app.services.metrics import observe_stage, stage_metrics
+from app.services.tracing import tracer
+from app.services.voice.tts import TextToSpeech
+
+
+class SentenceChunker:
+    """
+    Accumulates streamed tokens and releases complete sentences. Fragments
+    shorter than `min_chars` are held back and merged with the next sentence
+    so TTS is not called for "Hi." or an abbreviation like "Dr.".
+    """
+
+    _BOUNDARY = re.compile(r"[.!?;:]+[\"')\]]*\s+")
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, token: str) -> list[str]:
+        self._buffer += token
+        sentences = []
+        start = 0
+        for match in self._BOUNDARY.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start : match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+@dataclass
+class TurnMetrics:
+    """Per-turn latency, measured from the end of the caller's speech."""
+
+    speech_ended_at: float
+    first_token_at: Optional[float] = None
+    first_audio_at: Optional[float] = None
+    completed_at: Optional[float] = None
+
+    def _ms(self, at: Optional[float]) -> Optional[int]:
+        return round((at - self.speech_ended_at) * 1000) if at is not None else None
+
+    def to_dict(self) -> dict:
+        return {
+            "first_token_ms": self._ms(self.first_token_at),
+            "first_audio_ms": self._ms(self.first_audio_at),
+            "total_ms": self._ms(self.completed_at),
+        }
+
+
+class VoiceTurn:
+    """
+    One agent turn: tokens -> sentences -> audio. `stream` yields
+    ("sentence", text) when a sentence goes to TTS and ("audio", bytes) for
+    each synthesized chunk; the full response is in `response_text` afterwards.
+    """
+
+    def __init__(
+        self, tts: TextToSpeech, voice_id: str, language: str = "en-US", speech_ended_at: Optional[float] = None
+    ):
+        self.tts = tts
+        self.voice_id = voice_id
+        self.language = language
+        self.metrics = TurnMetrics(speech_ended_at or time.perf_counter())
+        self.audio_chunks = 0
+        self._parts: list[str] = []
+
+    @property
+    def response_text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def token_count(self) -> int:
+        """Streamed LLM chunks received so far."""
+        return len(self._parts)
+
+    async def stream(self, tokens: AsyncIterator[str]) -> AsyncIterator[tuple[str, object]]:
+        sentences: asyncio.Queue[Optional[str]] = asyncio.Queue()
+
+        async def produce():
+            chunker = SentenceChunker()
+            try:
+                async for token in tokens:
+                    if self.metrics.first_token_at is None:
+                        self.metrics.first_token_at = time.perf_counter()
+                    self._parts.append(token)
+                    for sentence in chunker.feed(token):
+                        sentences.put_nowait(sentence)
+                for sentence in chunker.flush():
+                    sentences.put_nowait(sentence)
+            finally:
+                sentences.put_nowait(None)
+                # Close the token stream now (not at garbage collection) so the LLM request is aborted
+                if hasattr(tokens, "aclose"):
+                    await tokens.aclose()
+
+        # LLM generation keeps running while earlier sentences are synthesized
+        producer = asyncio.create_task(produce())
+        _, in_flight = stage_metrics("voice_turn", "total")
+        in_flight.inc()
+        try:
+            while (sentence := await sentences.get()) is not None:
+                yield "sentence", sentence
+                # Ended explicitly rather than made current: the consumer runs between yields
+                tts_span = tracer.start_span("tts", characters=len(sentence))
+                try:
+                    # Closed as soon as the turn is (barge-in), so the TTS request is aborted right away
+                    async with aclosing(self.tts.synthesize(sentence, self.voice_id, self.language)) as audio:
+                        async for chunk in audio:
+                            if self.metrics.first_audio_at is None:
+                                self.metrics.first_audio_at = time.perf_counter()
+                            self.audio_chunks += 1
+                            yield "audio", chunk
+                finally:
+                    tts_span.end()
+            await producer  # Surface generation errors
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.wait([producer])
+            self.metrics.completed_at = time.perf_counter()
+            in_flight.dec()
+            observe_stage("voice_turn", self.metrics.completed_at - self.metrics.speech_ended_at, "total")
+            if self.metrics.first_audio_at is not None:
+                observe_stage("voice_turn", self.metrics.first_audio_at - self.metrics.speech_ended_at, "first_audio")
+
+
+@dataclass
+class CallMetrics:
+    """Per-call turn counters, including turns cut off by barge-in."""
+
+    turns: int = 0
+    completed_turns: int = 0
+    cancelled_turns: int = 0
+    cancel_reasons: dict[str, int] = field(default_factory=dict)
+    cancelled_tokens: int = 0  # LLM chunks received for turns that were cut off
+    cancelled_audio_chunks: int = 0  # Audio synthesized for turns that were cut off
+    cancel_latency_ms: list[int] = field(default_factory=list)  # cancel() -> upstream work stopped
+
+    def turn_completed(self):
+        self.turns += 1
+        self.completed_turns += 1
+
+    def turn_cancelled(self, turn: Optional[VoiceTurn], reason: str, latency_ms: int):
+        self.turns += 1
+        self.cancelled_turns += 1
+        self.cancel_reasons[reason] = self.cancel_reasons.get(reason, 0) + 1
+        self.cancel_latency_ms.append(latency_ms)
+        if turn:
+            self.cancelled_tokens += turn.token_count
+            self.cancelled_audio_chunks += turn.audio_chunks
+
+    def to_dict(self) -> dict:
+        return {
+            "turns": self.turns,
+            "completed_turns": self.completed_turns,
+            "cancelled_turns": self.cancelled_turns,
+            "cancel_reasons": dict(self.cancel_reasons),
+            "cancelled_tokens": self.cancelled_tokens,
+            "cancelled_audio_chunks": self.cancelled_audio_chunks,
+            "max_cancel_latency_ms": max(self.cancel_latency_ms, default=None),
+        }
@@ -0,0 +1,150 @@
+"""
+Call Center Aggregates
+Dashboard statistics maintained incrementally: every call event (created,
+status transition, escalation, sentiment sample, turn latency) becomes a
+small delta of counters applied to per-organization running totals and to
+time buckets (per minute and per hour) for windowed rollups. Reading the
+dashboard sums a fixed number of buckets and never scans calls.
+"""
+
+import time
+from typing import Optional
+
+ALL_ORGS = "_all"
+
+# Bucket resolution -> (seconds per bucket, retention seconds)
+BUCKETS = {"1m": (60, 2 * 3600), "1h": (3600, 25 * 3600)}
+
+# Rollup window -> (bucket resolution, number of buckets)
+WINDOWS = {"15m": ("1m", 15), "1h": ("1m", 60), "24h": ("1h", 24)}
+
+# Event counters kept per bucket (status gauges are totals only)
+WINDOWED_FIELDS = {
+    "calls",
+    "completed",
+    "failed",
+    "escalated",
+    "duration_sum",
+    "sentiment_sum",
+    "sentiment_count",
+    "latency_sum",
+    "latency_count",
+}
+
+ACTIVE_STATUSES = ("connected", "in_progress")
+
+
+def created_delta(status: str) -> dict[str, float]:
+    return {"calls": 1, f"status:{status}": 1}
+
+
+def transition_delta(previous: str, status: str, duration_seconds: Optional[int] = None) -> dict[str, float]:
+    delta = {f"status:{previous}": -1, f"status:{status}": 1}
+    if status in ("completed", "failed"):
+        delta[status] = 1
+    if status == "completed" and duration_seconds is not None:
+        delta["duration_sum"] = duration_seconds
+    return delta
+
+
+def escalation_delta() -> dict[str, float]:
+    return {"escalated": 1}
+
+
+def sentiment_delta(score: float) -> dict[str, float]:
+    return {"sentiment_sum": score, "sentiment_count": 1}
+
+
+def latency_delta(latency_ms: int) -> dict[str, float]:
+    return {"latency_sum": latency_ms, "latency_count": 1}
+
+
+def bucket_id(resolution: str, now: float) -> int:
+    return int(now // BUCKETS[resolution][0])
+
+
+def window_bucket_ids(resolution: str, count: int, now: float) -> list[int]:
+    """The `count` most recent buckets, including the current partial one."""
+    current = bucket_id(resolution, now)
+    return list(range(current - count + 1, current + 1))
+
+
+def _rates(counters: dict[str, float]) -> dict:
+    calls = counters.get("calls", 0)
+    completed = counters.get("completed", 0)
+    sentiment_count = counters.get("sentiment_count", 0)
+    latency_count = counters.get("latency_count", 0)
+    return {
+        "total_calls": int(calls),
+        "completed_calls": int(completed),
+        "failed_calls": int(counters.get("failed", 0)),
+        "escalated_calls": int(counters.get("escalated", 0)),
+        "escalation_rate": counters.get("escalated", 0) / max(calls, 1),
+        "average_duration_seconds": round(counters.get("duration_sum", 0) / completed) if completed else 0,
+        "average_sentiment": round(counters.get("sentiment_sum", 0) / sentiment_count, 2) if sentiment_count else 0.0,
+        "average_first_audio_latency_ms": (
+            round(counters.get("latency_sum", 0) / latency_count) if latency_count else None
+        ),
+    }
+
+
+def summarize(totals: dict[str, float], windows: dict[str, dict[str, float]]) -> dict:
+    """Dashboard payload from running totals and per-window summed buckets."""
+    by_status = {
+        name.split(":", 1)[1]: int(value) for name, value in totals.items() if name.startswith("status:") and value
+    }
+    return {
+        **_rates(totals),
+        "active_calls": sum(by_status.get(status, 0) for status in ACTIVE_STATUSES),
+        "calls_by_status": by_status,
+        "windows": {name: _rates(counters) for name, counters in windows.items()},
+    }
+
+
+def sum_buckets(buckets: list[dict[str, float]]) -> dict[str, float]:
+    summed: dict[str, float] = {}
+    for bucket in buckets:
+        for name, value in bucket.items():
+            summed[name] = summed.get(name, 0) + value
+    return summed
+
+
+class MemoryStats:
+    """Single-process aggregate storage with the same bucket layout as the Redis store."""
+
+    def __init__(self):
+        self.totals: dict[str, dict[str, float]] = {}
+        self.buckets: dict[tuple[str, str, int], dict[str, float]] = {}
+
+    def apply(self, organization_id: str, delta: dict[str, float], now: Optional[float] = None):
+        now = now or time.time()
+        for target in (organization_id, ALL_ORGS):
+            totals = self.totals.setdefault(target, {})
+            for name, value in delta.items():
+                totals[name] = totals.get(name, 0) + value
+            windowed = {name: value for name, value in delta.items() if name in WINDOWED_FIELDS}
+            if not windowed:
+                continue
+            for resolution in BUCKETS:
+                bucket = self.buckets.setdefault((target, resolution, bucket_id(resolution, now)), {})
+                for name, value in windowed.items():
+                    bucket[name] = bucket.get(name, 0) + value
+        self._expire(now)
+
+    def _expire(self, now: float):
+        for key in [k for k in self.buckets if (bucket_id(k[1], now) - k[2]) * BUCKETS[k[1]][0] > BUCKETS[k[1]][1]]:
+            del self.buckets[key]
+
+    def read(self, organization_id: Optional[str] = None, now: Optional[float] = None) -> dict:
+        now = now or time.time()
+        target = organization_id or ALL_ORGS
+        windows = {
+            name: sum_buckets(
+                [
+                    self.buckets.get((target, resolution, bucket), {})
+                    for bucket in window_bucket_ids(resolution, count, now)
+                ]
+            )
+            for name, (resolution, count) in WINDOWS.items()
+        }
+        return summarize(self.totals.get(target, {}), windows)
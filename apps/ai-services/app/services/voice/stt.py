@@ -0,0 +1,180 @@
+"""
+Streaming Speech-to-Text
+Audio chunks go in, partial and final transcripts come out as they are
+recognized. Deepgram live transcription is used when an API key is
+configured; the local fake treats audio bytes as UTF-8 text so the voice
+loop can run without a provider (development and tests).
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Protocol
+from urllib.parse import urlencode
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+DEEPGRAM_LISTEN_URL = "wss://api.deepgram.com/v1/listen"
+
+
+@dataclass
+class TranscriptEvent:
+    text: str  # Utterance text so far
+    is_final: bool = False  # Recognized text will not be revised
+    speech_final: bool = False  # Caller finished speaking (endpoint detected)
+
+
+class STTStream(Protocol):
+    async def send(self, audio: bytes) -> None:
+        """Forward one chunk of caller audio."""
+        ...
+
+    async def finalize(self) -> None:
+        """Flush buffered audio and end the current utterance (client-side end of speech)."""
+        ...
+
+    async def close(self) -> None: ...
+
+    def __aiter__(self) -> AsyncIterator[TranscriptEvent]: ...
+
+
+class SpeechToText(Protocol):
+    async def open_stream(self, language: str = "en-US") -> STTStream: ...
+
+
+# ─── Deepgram ──
+
+
+class DeepgramSTTStream:
+    def __init__(self, connection):
+        self._ws = connection
+
+    async def send(self, audio: bytes):
+        await self._ws.send(audio)
+
+    async def finalize(self):
+        await self._ws.send(json.dumps({"type": "Finalize"}))
+
+    async def close(self):
+        try:
+            await self._ws.send(json.dumps({"type": "CloseStream"}))
+        finally:
+            await self._ws.close()
+
+    async def __aiter__(self) -> AsyncIterator[TranscriptEvent]:
+        segments: list[str] = []
+        async for raw in self._ws:
+            message = json.loads(raw)
+            if message.get("type") == "Results":
+                text = message["channel"]["alternatives"][0].get("transcript", "")
+                if not message.get("is_final"):
+                    if text:
+                        yield TranscriptEvent(" ".join([*segments, text]))
+                    continue
+                if text:
+                    segments.append(text)
+                if segments and (message.get("speech_final") or message.get("from_finalize")):
+                    yield TranscriptEvent(" ".join(segments), is_final=True, speech_final=True)
+                    segments = []
+                elif text:
+                    yield TranscriptEvent(" ".join(segments), is_final=True)
+            elif message.get("type") == "UtteranceEnd" and segments:
+                # Endpointing missed the pause (e.g. background noise); word timings did not
+                yield TranscriptEvent(" ".join(segments), is_final=True, speech_final=True)
+                segments = []
+
+
+class DeepgramSpeechToText:
+    """Deepgram live transcription over a WebSocket, with interim results and endpointing."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "nova-2",
+        encoding: str = "mulaw",
+        sample_rate: int = 8000,
+        endpointing_ms: int = 300,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.endpointing_ms = endpointing_ms
+
+    async def open_stream(self, language: str = "en-US") -> DeepgramSTTStream:
+        from websockets.asyncio.client import connect
+
+        params = urlencode(
+            {
+                "model": self.model,
+                "language": language,
+                "encoding": self.encoding,
+                "sample_rate": self.sample_rate,
+                "channels": 1,
+                "interim_results": "true",
+                "endpointing": self.endpointing_ms,
+                "utterance_end_ms": 1000,
+                "smart_format": "true",
+            }
+        )
+        connection = await connect(
+            f"{DEEPGRAM_LISTEN_URL}?{params}",
+            additional_headers={"Authorization": f"Token {self.api_key}"},
+        )
+        return DeepgramSTTStream(connection)
+
+
+# ─── Local Fake ──
+
+
+class FakeSTTStream:
+    """
+    Each audio chunk is decoded as UTF-8 words and reported as a partial
+    transcript; a chunk ending in a newline, or `finalize`, ends the utterance.
+    """
+
+    def __init__(self):
+        self._events: asyncio.Queue[Optional[TranscriptEvent]] = asyncio.Queue()
+        self._words: list[str] = []
+
+    async def send(self, audio: bytes):
+        text = audio.decode("utf-8", errors="ignore")
+        words = text.split()
+        if words:
+            self._words.extend(words)
+            await self._events.put(TranscriptEvent(" ".join(self._words)))
+        if text.endswith("\n"):
+            await self.finalize()
+
+    async def finalize(self):
+        if self._words:
+            await self._events.put(TranscriptEvent(" ".join(self._words), is_final=True, speech_final=True))
+            self._words = []
+
+    async def close(self):
+        await self._events.put(None)
+
+    async def __aiter__(self) -> AsyncIterator[TranscriptEvent]:
+        while (event := await self._events.get()) is not None:
+            yield event
+
+
+class FakeSpeechToText:
+    async def open_stream(self, language: str = "en-US") -> FakeSTTStream:
+        return FakeSTTStream()
+
+
+def get_stt() -> SpeechToText:
+    """Deepgram when configured, otherwise the local fake."""
+    if settings.deepgram_api_key:
+        return DeepgramSpeechToText(
+            settings.deepgram_api_key,
+            model=settings.deepgram_model,
+            encoding=settings.voice_audio_encoding,
+            sample_rate=settings.voice_sample_rate,
+        )
+    return FakeSpeechToText()
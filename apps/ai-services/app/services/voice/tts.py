@@ -0,0 +1,84 @@
+"""
+Streaming Text-to-Speech
+Text goes in, audio chunks come out as soon as the provider produces them.
+ElevenLabs streaming synthesis is used when an API key is configured; the
+local fake returns the text bytes as "audio" (development and tests).
+"""
+
+import asyncio
+from functools import lru_cache
+from typing import AsyncIterator, Protocol
+
+import httpx
+
+from app.config import settings
+
+ELEVENLABS_API_URL = "https://api.elevenlabs.io"
+
+# Template voice names -> ElevenLabs premade voice IDs
+ELEVENLABS_VOICE_IDS = {
+    "rachel": "21m00Tcm4TlvDq8ikWAM",
+    "adam": "pNInz6obpgDQGcFmaJgB",
+}
+
+
+class TextToSpeech(Protocol):
+    def synthesize(self, text: str, voice_id: str, language: str = "en-US") -> AsyncIterator[bytes]:
+        """Stream synthesized audio for one sentence."""
+        ...
+
+
+class ElevenLabsTextToSpeech:
+    """ElevenLabs streaming endpoint over a pooled HTTP client (keeps TLS connections warm)."""
+
+    def __init__(
+        self, api_key: str, model_id: str = "eleven_turbo_v2_5", encoding: str = "mulaw", sample_rate: int = 8000
+    ):
+        self.model_id = model_id
+        self.output_format = "ulaw_8000" if encoding == "mulaw" else f"pcm_{sample_rate}"
+        self._client = httpx.AsyncClient(
+            base_url=ELEVENLABS_API_URL,
+            headers={"xi-api-key": api_key},
+            timeout=httpx.Timeout(30.0, connect=5.0),
+        )
+
+    async def synthesize(self, text: str, voice_id: str, language: str = "en-US") -> AsyncIterator[bytes]:
+        voice = ELEVENLABS_VOICE_IDS.get(voice_id, voice_id)
+        async with self._client.stream(
+            "POST",
+            f"/v1/text-to-speech/{voice}/stream",
+            params={"output_format": self.output_format},
+            json={"text": text, "model_id": self.model_id},
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if chunk:
+                    yield chunk
+
+
+class FakeTextToSpeech:
+    """Yields the UTF-8 text in frame-sized chunks, optionally after a simulated synthesis delay."""
+
+    def __init__(self, frame_bytes: int = 160, delay_seconds: float = 0.0):
+        self.frame_bytes = frame_bytes
+        self.delay_seconds = delay_seconds
+
+    async def synthesize(self, text: str, voice_id: str, language: str = "en-US") -> AsyncIterator[bytes]:
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        audio = text.encode()
+        for i in range(0, len(audio), self.frame_bytes):
+            yield audio[i : i + self.frame_bytes]
+
+
+@lru_cache(maxsize=1)
+def get_tts() -> TextToSpeech:
+    """ElevenLabs when configured, otherwise the local fake. Shared so HTTP connections are reused."""
+    if settings.elevenlabs_api_key:
+        return ElevenLabsTextToSpeech(
+            settings.elevenlabs_api_key,
+            model_id=settings.elevenlabs_model,
+            encoding=settings.voice_audio_encoding,
+            sample_rate=settings.voice_sample_rate,
+        )
+    return FakeTextToSpeech()
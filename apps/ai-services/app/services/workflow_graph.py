@@ -0,0 +1,138 @@
+"""
+Workflow Subgraph Execution
+Runs a DAG of AI workflow nodes in-process, so the workflow engine makes one
+request for a chain such as eligibility_check -> document_extraction ->
+medical_coding_ai instead of one round trip per node.
+
+A node starts as soon as all of its predecessors have completed, so
+independent branches run concurrently. Upstream outputs are handed to
+downstream nodes as in-memory dicts (never re-serialized). Execution halts at
+the first node that fails or waits for human review: nodes already running
+finish, nothing new is started, and the remaining nodes are reported as
+skipped so the engine can resume from there.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+HALTING_STATUSES = ("failed", "waiting_hitl")
+
+
+class SubgraphError(ValueError):
+    """The submitted graph is not a valid DAG."""
+
+
+@dataclass
+class SubgraphPlan:
+    order: list[str]  # Topological order (submission order among independent nodes)
+    predecessors: dict[str, list[str]]
+    successors: dict[str, list[str]]
+
+
+def plan_subgraph(node_ids: list[str], edges: list[tuple[str, str]]) -> SubgraphPlan:
+    """Validate the graph and order it; raises SubgraphError on unknown nodes, duplicates or cycles."""
+    if len(set(node_ids)) != len(node_ids):
+        raise SubgraphError("Duplicate node ids")
+    predecessors: dict[str, list[str]] = {node_id: [] for node_id in node_ids}
+    successors: dict[str, list[str]] = {node_id: [] for node_id in node_ids}
+    for source, target in edges:
+        for endpoint in (source, target):
+            if endpoint not in predecessors:
+                raise SubgraphError(f"Edge references unknown node '{endpoint}'")
+        if source == target:
+            raise SubgraphError(f"Node '{source}' has an edge to itself")
+        if source not in predecessors[target]:
+            predecessors[target].append(source)
+            successors[source].append(target)
+
+    # Kahn's algorithm
+    remaining = {node_id: len(preds) for node_id, preds in predecessors.items()}
+    ready = [node_id for node_id in node_ids if not remaining[node_id]]
+    order = []
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for successor in successors[node_id]:
+            remaining[successor] -= 1
+            if not remaining[successor]:
+                ready.append(successor)
+    if len(order) != len(node_ids):
+        cyclic = sorted(node_id for node_id, count in remaining.items() if count)
+        raise SubgraphError(f"Graph has a cycle through {', '.join(cyclic)}")
+    return SubgraphPlan(order=order, predecessors=predecessors, successors=successors)
+
+
+@dataclass
+class SubgraphRun:
+    status: str  # completed, failed, waiting_hitl
+    results: dict[str, Any] = field(default_factory=dict)  # node_id -> node result, in completion order
+    timings: dict[str, dict] = field(default_factory=dict)  # node_id -> started/finished ms from subgraph start
+    halted_at: Optional[str] = None
+    skipped: list[str] = field(default_factory=list)
+    total_time_ms: int = 0
+
+
+async def run_subgraph(
+    plan: SubgraphPlan,
+    run_node: Callable[[str, dict], Awaitable[Any]],
+    shared_inputs: Optional[dict] = None,
+    node_inputs: Optional[dict[str, dict]] = None,
+    max_concurrency: int = 8,
+) -> SubgraphRun:
+    """
+    Execute a planned subgraph. A node's input is `shared_inputs`, then its
+    predecessors' outputs merged in edge order, then its own `node_inputs`
+    entry, later layers winning. `run_node(node_id, input_data)` returns a
+    result with `status` and `output_data` (a WorkflowNodeExecutionResult).
+    """
+    node_inputs = node_inputs or {}
+    start = time.perf_counter()
+    run = SubgraphRun(status="completed")
+    remaining = {node_id: len(preds) for node_id, preds in plan.predecessors.items()}
+    ready = [node_id for node_id in plan.order if not remaining[node_id]]
+    running: dict[asyncio.Task, str] = {}
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    def elapsed_ms() -> int:
+        return round((time.perf_counter() - start) * 1000)
+
+    async def execute(node_id: str):
+        async with semaphore:
+            inputs = dict(shared_inputs or {})
+            for predecessor in plan.predecessors[node_id]:
+                inputs.update(run.results[predecessor].output_data)
+            inputs.update(node_inputs.get(node_id, {}))
+            run.timings[node_id] = {"started_ms": elapsed_ms()}
+            return await run_node(node_id, inputs)
+
+    try:
+        while ready or running:
+            if run.halted_at is None:
+                for node_id in ready:
+                    running[asyncio.create_task(execute(node_id))] = node_id
+                ready = []
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node_id = running.pop(task)
+                result = task.result()
+                run.results[node_id] = result
+                run.timings[node_id]["finished_ms"] = elapsed_ms()
+                if result.status in HALTING_STATUSES:
+                    if run.halted_at is None:
+                        run.halted_at, run.status = node_id, result.status
+                    continue
+                for successor in plan.successors[node_id]:
+                    remaining[successor] -= 1
+                    if not remaining[successor]:
+                        ready.append(successor)
+    finally:
+        for task in running:
+            task.cancel()
+
+    run.skipped = [node_id for node_id in plan.order if node_id not in run.results]
+    run.total_time_ms = elapsed_ms()
+    return run
@@ -0,0 +1,74 @@
+"""
+PHI Scanner Throughput Benchmark
+Measures single-core scan throughput (MB/s) of the PHI detector over
+synthetic clinical text with a configurable density of identifiers.
+
+Usage: python -m benchmarks.phi_scan [--megabytes 20] [--phi-every 400]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.phi import phi_scanner
+
+NOTE_SENTENCES = [
+    "The patient presents today for evaluation of chronic low back pain.",
+    "Pain began approximately three months ago after lifting boxes at work.",
+    "Pain is rated 6/10 and worse with prolonged sitting.",
+    "Denies bowel or bladder dysfunction, fever or unintentional weight loss.",
+    "Exam shows paraspinal tenderness at L4-L5 with limited flexion.",
+    "BP 128/82, HR 74, Temp 98.6 F.",
+    "Assessment: lumbago without sciatica (M54.50).",
+    "Plan: physical therapy twice weekly, ibuprofen 600 mg as needed, follow up in 4 weeks.",
+]
+
+PHI_SENTENCES = [
+    "Patient John Smith, DOB 03/14/1958, member ID AHP100001.",
+    "SSN 123-45-6789 on file; callback number (555) 123-4567.",
+    "Referring NPI 1234567893, MBI 1EG4TE5MK73, seen 2024-01-15.",
+]
+
+
+def build_corpus(megabytes: float, phi_every: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1_000_000)
+    parts = []
+    size = 0
+    i = 0
+    while size < target:
+        sentence = rng.choice(PHI_SENTENCES) if i % phi_every == 0 else rng.choice(NOTE_SENTENCES)
+        parts.append(sentence)
+        size += len(sentence) + 1
+        i += 1
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=20)
+    parser.add_argument("--phi-every", type=int, default=400, help="Insert a PHI sentence every N sentences")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = build_corpus(args.megabytes, args.phi_every)
+    names = ["John Smith"]
+
+    best = 0.0
+    spans = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        spans = phi_scanner.scan(text, names=names)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(text) / 1_000_000 / elapsed)
+
+    kinds = {}
+    for span in spans:
+        kinds[span.kind] = kinds.get(span.kind, 0) + 1
+
+    print(f"corpus: {len(text) / 1_000_000:.1f} MB, spans: {len(spans)} {kinds}")
+    print(f"throughput (best of {args.repeat}): {best:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
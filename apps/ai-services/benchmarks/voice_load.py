@@ -0,0 +1,377 @@
+"""
+Voice Session Load Test
+Starts the FastAPI app in a separate worker process (uvicorn, one event loop)
+with the agent LLM stubbed at a configurable first-token and per-token
+latency, the local STT and a TTS with a configurable synthesis delay. Then
+opens N concurrent simulated callers on /api/v1/voice/ws/{call_id}.
+
+Each caller streams 20 ms audio frames for the whole call, as a telephony
+media stream does: mu-law silence while listening and the scripted
+utterance's words while speaking. After each utterance it waits for the
+agent's answer. The harness reports:
+- per-turn latency percentiles (end of speech -> first agent audio / turn complete)
+- worker event-loop lag and CPU time per session-second
+- worker memory per connected session
+- failure rate by cause
+
+Usage: python -m benchmarks.voice_load [--sessions 500] [--turns 3] [--ramp-seconds 10]
+       [--llm-first-token-ms 300] [--llm-token-ms 15] [--tts-ms 80] [--protocol json|binary]
+       [--json results.json]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import multiprocessing
+import random
+import resource
+import socket
+import time
+from typing import Optional
+
+import httpx
+import structlog
+from websockets.asyncio.client import connect
+
+from app.services.voice.frames import BINARY_SUBPROTOCOL, CODECS, pack_frame
+
+UTTERANCES = [
+    "I need to check the status of my claim from last month",
+    "Is doctor Patel in network for my plan",
+    "What is my deductible for this year",
+    "Can you help me find an urgent care near me",
+    "I want to know if my prior authorization was approved",
+]
+
+SILENCE_FRAME = b"\xff" * 160  # 20 ms of mu-law silence at 8 kHz
+
+
+def raise_open_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, off Linux
+
+
+# ─── Worker process ──
+
+
+def run_worker(port: int, args: argparse.Namespace):
+    """Serve the app with stubbed LLM and speech providers, plus a stats route for the harness."""
+    import uvicorn
+
+    from app.agents.orchestrator import orchestrator
+    from app.main import app
+    from app.routers import voice
+    from app.services.voice.stt import FakeSpeechToText
+    from app.services.voice.tts import FakeTextToSpeech
+
+    raise_open_file_limit()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    response_words = ("Thanks for waiting. I found your plan details and everything looks up to date. " * 4).split()
+    response_words = response_words[: args.response_words]
+
+    async def stub_stream_message(message: str, **kwargs):
+        await asyncio.sleep(args.llm_first_token_ms / 1000)
+        for i, word in enumerate(response_words):
+            if i:
+                await asyncio.sleep(args.llm_token_ms / 1000)
+            yield word + " "
+
+    tts = FakeTextToSpeech(delay_seconds=args.tts_ms / 1000)
+    orchestrator.stream_message = stub_stream_message
+    voice.get_tts = lambda: tts
+    voice.get_stt = FakeSpeechToText
+
+    lag_ms: list[float] = []
+
+    async def sample_loop_lag(interval: float = 0.05):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag_ms.append((time.perf_counter() - start - interval) * 1000)
+
+    @app.get("/loadtest/stats", include_in_schema=False)
+    async def loadtest_stats(reset: bool = False):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        stats = {
+            "rss_bytes": rss_bytes(),
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+            "tasks": len(asyncio.all_tasks()),
+            "loop_lag_ms": {
+                name: round(value, 2) if value is not None else None
+                for name, value in (
+                    ("p50", percentile(lag_ms, 50)),
+                    ("p99", percentile(lag_ms, 99)),
+                    ("max", max(lag_ms, default=None)),
+                )
+            },
+        }
+        if reset:
+            lag_ms.clear()
+        return stats
+
+    async def serve():
+        sampler = asyncio.create_task(sample_loop_lag())
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=8192)
+        await uvicorn.Server(config).serve()
+        sampler.cancel()
+
+    asyncio.run(serve())
+
+
+# ─── Simulated callers ──
+
+
+class Results:
+    def __init__(self):
+        self.first_audio_ms: list[float] = []
+        self.turn_ms: list[float] = []
+        self.server_first_audio_ms: list[float] = []
+        self.connect_ms: list[float] = []
+        self.session_seconds: list[float] = []
+        self.failures: dict[str, int] = {}
+        self.completed_sessions = 0
+        self.connected = 0
+        self.peak_connected = 0
+
+    def fail(self, cause: str):
+        self.failures[cause] = self.failures.get(cause, 0) + 1
+
+
+async def caller(index: int, base_url: str, http: httpx.AsyncClient, results: Results, args, rng: random.Random):
+    """One simulated call: initiate, connect, hear the greeting, then `args.turns` question/answer turns."""
+    ws_url = base_url.replace("http://", "ws://")
+    speech: asyncio.Queue[bytes] = asyncio.Queue()
+    connected = False
+    binary = args.protocol == "binary"
+
+    async def stream_audio(ws):
+        # Continuous 20 ms frames; words replace silence while the caller is talking
+        sequence = 0
+        while True:
+            frame = SILENCE_FRAME if speech.empty() else speech.get_nowait()
+            if binary:
+                await ws.send(pack_frame(frame, CODECS["mulaw"], sequence))
+                sequence += 1
+            else:
+                await ws.send(json.dumps({"type": "audio", "data": base64.b64encode(frame).decode()}))
+            await asyncio.sleep(args.frame_ms / 1000)
+
+    async def wait_for(ws, done: str, turn_started: Optional[float] = None):
+        first_audio = None
+        while True:
+            raw = await asyncio.wait_for(ws.recv(), args.turn_timeout)
+            # Binary frames are agent audio; everything else is a JSON message
+            message = {"type": "audio"} if isinstance(raw, bytes) else json.loads(raw)
+            if message["type"] == "audio" and first_audio is None and turn_started is not None:
+                first_audio = time.perf_counter()
+                results.first_audio_ms.append((first_audio - turn_started) * 1000)
+            if message["type"] == done or message.get("status") == done:
+                return message
+
+    try:
+        response = await http.post(
+            "/api/v1/voice/calls/initiate",
+            json={
+                "phone_number": f"+1555{index:07d}",
+                "organization_id": f"org-{index % 10}",
+                "agent_type": "member_service",
+            },
+        )
+        response.raise_for_status()
+        call_id = response.json()["call_id"]
+
+        start = time.perf_counter()
+        async with connect(
+            f"{ws_url}/api/v1/voice/ws/{call_id}",
+            open_timeout=args.turn_timeout,
+            subprotocols=[BINARY_SUBPROTOCOL] if binary else None,
+        ) as ws:
+            results.connect_ms.append((time.perf_counter() - start) * 1000)
+            connected = True
+            results.connected += 1
+            results.peak_connected = max(results.peak_connected, results.connected)
+            await wait_for(ws, "listening")
+            connected_at = time.perf_counter()
+
+            sender = asyncio.create_task(stream_audio(ws))
+            try:
+                for _ in range(args.turns):
+                    await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_seconds)
+                    words = rng.choice(UTTERANCES).split()
+                    for word in words[:-1]:
+                        speech.put_nowait((word + " ").encode().ljust(160, b"\xff"))
+                    speech.put_nowait((words[-1] + "\n").encode())  # Endpoint: speech_final
+                    # Speech ends when the last word frame has been sent
+                    while not speech.empty():
+                        await asyncio.sleep(args.frame_ms / 1000)
+                    turn_started = time.perf_counter()
+                    message = await wait_for(ws, "turn_complete", turn_started)
+                    results.turn_ms.append((time.perf_counter() - turn_started) * 1000)
+                    if message["latency"].get("first_audio_ms") is not None:
+                        results.server_first_audio_ms.append(message["latency"]["first_audio_ms"])
+            finally:
+                sender.cancel()
+                results.session_seconds.append(time.perf_counter() - connected_at)
+        results.completed_sessions += 1
+    except TimeoutError:
+        results.fail("turn_timeout" if connected else "connect_timeout")
+    except httpx.HTTPError as e:
+        results.fail(f"initiate:{type(e).__name__}")
+    except Exception as e:
+        results.fail(type(e).__name__)
+    finally:
+        if connected:
+            results.connected -= 1
+
+
+async def run(args) -> dict:
+    port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    worker = multiprocessing.get_context("spawn").Process(target=run_worker, args=(port, args), daemon=True)
+    worker.start()
+
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.turn_timeout) as http:
+        await wait_until_ready(http)
+        baseline = (await http.get("/loadtest/stats", params={"reset": True})).json()
+
+        results = Results()
+        rng = random.Random(args.seed)
+        peak = {"rss_bytes": baseline["rss_bytes"], "sessions": 0, "tasks": baseline["tasks"]}
+
+        async def sample_worker():
+            while True:
+                await asyncio.sleep(1.0)
+                stats = (await http.get("/loadtest/stats")).json()
+                if stats["rss_bytes"] > peak["rss_bytes"]:
+                    peak.update(rss_bytes=stats["rss_bytes"], sessions=results.connected, tasks=stats["tasks"])
+
+        sampler = asyncio.create_task(sample_worker())
+        start = time.perf_counter()
+        callers = []
+        for i in range(args.sessions):
+            callers.append(asyncio.create_task(caller(i, base_url, http, results, args, random.Random(rng.random()))))
+            await asyncio.sleep(args.ramp_seconds / args.sessions)
+        await asyncio.gather(*callers)
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+        final = (await http.get("/loadtest/stats")).json()
+
+    worker.terminate()
+    worker.join()
+
+    failed = sum(results.failures.values())
+    per_session = (peak["rss_bytes"] - baseline["rss_bytes"]) / peak["sessions"] if peak["sessions"] else None
+    cpu_seconds = final["cpu_seconds"] - baseline["cpu_seconds"]
+    session_seconds = sum(results.session_seconds)
+    return {
+        "protocol": args.protocol,
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "elapsed_seconds": round(elapsed, 1),
+        "peak_concurrent_sessions": results.peak_connected,
+        "completed_sessions": results.completed_sessions,
+        "failure_rate": round(failed / args.sessions, 4),
+        "failures": results.failures,
+        "connect_ms": summarize(results.connect_ms),
+        "first_audio_ms": summarize(results.first_audio_ms),
+        "server_first_audio_ms": summarize(results.server_first_audio_ms),
+        "turn_ms": summarize(results.turn_ms),
+        "loop_lag_ms": final["loop_lag_ms"],
+        "worker_cpu_seconds": round(cpu_seconds, 2),
+        "cpu_ms_per_session_second": round(cpu_seconds * 1000 / session_seconds, 3) if session_seconds else None,
+        "memory_per_session_kb": round(per_session / 1024, 1) if per_session is not None else None,
+        "peak_rss_mb": round(peak["rss_bytes"] / 2**20, 1),
+    }
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        **{f"p{p}": round(v, 1) if (v := percentile(values, p)) is not None else None for p in (50, 90, 99)},
+        "max": round(max(values), 1) if values else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_ready(http: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await http.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=3, help="Question/answer turns per call")
+    parser.add_argument("--ramp-seconds", type=float, default=10.0)
+    parser.add_argument("--think-seconds", type=float, default=1.0, help="Mean pause before each utterance")
+    parser.add_argument("--frame-ms", type=int, default=20, help="Inbound audio frame cadence")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--response-words", type=int, default=40)
+    parser.add_argument("--tts-ms", type=float, default=80, help="Synthesis delay per sentence")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--protocol",
+        choices=("json", "binary"),
+        default="json",
+        help="Audio transport: base64 JSON messages or the binary frame sub-protocol",
+    )
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    raise_open_file_limit()
+    results = asyncio.run(run(args))
+
+    print(
+        f"sessions: {results['sessions']} x {results['turns_per_session']} turns in {results['elapsed_seconds']}s, "
+        f"peak concurrent {results['peak_concurrent_sessions']}"
+    )
+    print(f"failure rate: {results['failure_rate']:.2%} {results['failures']}")
+    for name in ("connect_ms", "first_audio_ms", "server_first_audio_ms", "turn_ms"):
+        print(f"{name:>22}: {results[name]}")
+    print(f"{'loop_lag_ms':>22}: {results['loop_lag_ms']}")
+    print(
+        f"worker CPU: {results['worker_cpu_seconds']}s ({results['cpu_ms_per_session_second']} ms per session-second)"
+    )
+    print(f"memory per session: {results['memory_per_session_kb']} KB (peak RSS {results['peak_rss_mb']} MB)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
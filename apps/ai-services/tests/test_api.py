@@ -3,9 +3,15 @@ Tests for the FastAPI application endpoints.
 Tests verify that endpoints exist, accept correct inputs,
 and return proper response shapes.
 """
+import io
+import json
+import zipfile
+
 import pytest
 from unittest.mock import patch, AsyncMock
 
+from app.config import settings
+
 
 class TestHealthEndpoints:
     """Test health check and info endpoints."""
@@ -128,3 +134,116 @@ class TestWorkflowEndpoints:
             },
         )
         assert response.status_code != 404
+
+
+class TestDocumentBatchEndpoints:
+    """Test batch document analysis streaming."""
+
+    def test_batch_streams_ndjson_and_dedupes(self, client):
+        """Each file yields one NDJSON line; identical files are analyzed once."""
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("scan-001.txt", b"claim form one")
+            zf.writestr("scan-002.txt", b"claim form two")
+
+        response = client.post(
+            "/api/v1/documents/ai/analyze/batch",
+            files=[
+                ("files", ("a.pdf", b"claim form one", "application/pdf")),
+                ("files", ("mailroom.zip", archive.getvalue(), "application/zip")),
+            ],
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        assert len(lines) == 3
+        statuses = sorted(line["status"] for line in lines)
+        assert statuses == ["completed", "completed", "duplicate"]
+        assert all("result" in line for line in lines)
+
+    def test_unreadable_zip_member_fails_alone(self, client):
+        """A member with a bad CRC gets a failed line; the rest of the batch is still analyzed."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("bad.txt", b"claim form one")
+            zf.writestr("good.txt", b"claim form two")
+        corrupt = archive.getvalue().replace(b"claim form one", b"claim form 0ne", 1)
+
+        response = client.post(
+            "/api/v1/documents/ai/analyze/batch",
+            files=[
+                ("files", ("mailroom.zip", corrupt, "application/zip")),
+                ("files", ("y.pdf", b"claim form three", "application/pdf")),
+            ],
+        )
+        assert response.status_code == 200
+
+        lines = {line["file_name"]: line for line in map(json.loads, response.text.splitlines())}
+        assert lines["mailroom.zip/bad.txt"]["status"] == "failed"
+        assert "Bad CRC-32" in lines["mailroom.zip/bad.txt"]["error"]
+        assert lines["mailroom.zip/good.txt"]["status"] == "completed"
+        assert lines["y.pdf"]["status"] == "completed"
+
+    def test_oversized_file_is_rejected(self, client, monkeypatch):
+        """Files over the per-file limit fail without stopping the batch."""
+        monkeypatch.setattr(settings, "document_batch_max_file_bytes", 16)
+
+        response = client.post(
+            "/api/v1/documents/ai/analyze/batch",
+            files=[
+                ("files", ("big.pdf", b"claim form with a long body", "application/pdf")),
+                ("files", ("small.pdf", b"claim form", "application/pdf")),
+            ],
+        )
+
+        lines = {line["file_name"]: line for line in map(json.loads, response.text.splitlines())}
+        assert lines["big.pdf"] == {"file_name": "big.pdf", "status": "failed", "error": "File exceeds size limit"}
+        assert lines["small.pdf"]["status"] == "completed"
+
+    def test_files_past_the_limit_are_not_read(self, client, monkeypatch):
+        """Documents over the batch file limit are rejected before they are read or hashed."""
+        monkeypatch.setattr(settings, "document_batch_max_files", 2)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("scan-001.txt", b"claim form one")
+            zf.writestr("scan-002.txt", b"claim form two")
+
+        response = client.post(
+            "/api/v1/documents/ai/analyze/batch",
+            files=[
+                ("files", ("mailroom.zip", archive.getvalue(), "application/zip")),
+                ("files", ("late.pdf", b"claim form three", "application/pdf")),
+            ],
+        )
+
+        lines = {line["file_name"]: line for line in map(json.loads, response.text.splitlines())}
+        assert [lines[f"mailroom.zip/scan-00{i}.txt"]["status"] for i in (1, 2)] == ["completed", "completed"]
+        assert lines["late.pdf"] == {"file_name": "late.pdf", "status": "failed", "error": "Batch file limit exceeded"}
+
+    def test_analyze_stream_emits_pages_and_fields(self, client):
+        """Per-page events carry real page numbers, followed by the full result."""
+        document = (
+            b"HEALTH INSURANCE CLAIM FORM\nPatient Name: Jane Doe\nDate of Birth: 03/14/1962\n"
+            b"\f"
+            b"Place of Service: 11\nDiagnosis M54.5 and G89.29\nCPT 99213\n"
+        )
+        response = client.post(
+            "/api/v1/documents/ai/analyze/stream",
+            files={"file": ("claim.txt", document, "text/plain")},
+        )
+        assert response.status_code == 200
+
+        events = [json.loads(line) for line in response.text.splitlines() if line]
+        assert [e["page_number"] for e in events if e["event"] == "page"] == [1, 2]
+        fields = {e["field_name"]: e for e in events if e["event"] == "field"}
+        assert fields["patient_name"]["page_number"] == 1
+        assert fields["diagnosis_codes"] == {**fields["diagnosis_codes"], "value": "M54.5, G89.29", "page_number": 2}
+        assert any(e["event"] == "phi" and e["page_number"] == 1 for e in events)
+
+        result = events[-1]["result"]
+        assert events[-1]["event"] == "result"
+        assert result["page_count"] == 2
+        assert result["classification"]["category"] == "cms_1500"
+        assert result["contains_phi"]
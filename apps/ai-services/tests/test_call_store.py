@@ -0,0 +1,129 @@
+"""
+Tests for the Redis-backed voice call registry (run against fakeredis).
+"""
+
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from app.services.voice.calls import (
+    CallRecord,
+    CallStatus,
+    InvalidCallTransition,
+    RedisCallStore,
+    VoiceAgentType,
+    new_call_id,
+)
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def make_store(server) -> RedisCallStore:
+    """A store with its own connection, like one uvicorn worker."""
+    return RedisCallStore(fakeredis.FakeAsyncRedis(server=server), completed_ttl_seconds=60)
+
+
+def make_record(organization_id: str = "org-1") -> CallRecord:
+    return CallRecord(
+        call_id=new_call_id(),
+        agent_type=VoiceAgentType.MEMBER_SERVICE,
+        status=CallStatus.RINGING,
+        phone_number="+15555550100",
+        organization_id=organization_id,
+        started_at=datetime.utcnow().isoformat(),
+    )
+
+
+class TestRedisCallStore:
+    """Test call state shared across workers."""
+
+    async def test_lifecycle_transcript_and_archival(self, redis_server):
+        """Transitions are validated, transcripts append as stream entries, completion expires the call."""
+        store = make_store(redis_server)
+        record = make_record()
+        await store.create(record)
+        await make_store(redis_server).create(make_record("org-2"))
+
+        await store.transition(record.call_id, CallStatus.CONNECTED)
+        await store.append_transcript(record.call_id, {"speaker": "user", "text": "Hi"})
+        await store.append_transcript(record.call_id, {"speaker": "agent", "text": "Hello"})
+        await store.update(record.call_id, escalated=True)
+
+        other_worker = make_store(redis_server)
+        fetched = await other_worker.get(record.call_id)
+        assert fetched.status == CallStatus.CONNECTED
+        assert [entry["text"] for entry in fetched.transcript] == ["Hi", "Hello"]
+        assert fetched.escalated
+        assert [c.call_id for c in await other_worker.list("org-1")] == [record.call_id]
+
+        with pytest.raises(InvalidCallTransition):
+            await store.transition(record.call_id, CallStatus.RINGING)
+
+        completed = await store.transition(record.call_id, CallStatus.COMPLETED, outcome="resolved")
+        assert completed.outcome == "resolved"
+        assert completed.duration_seconds is not None
+        assert 0 < await store.redis.ttl(store._key(record.call_id)) <= 60
+        assert 0 < await store.redis.ttl(store._transcript_key(record.call_id)) <= 60
+        assert await store.redis.xlen("voice:calls:archive") == 1
+
+    async def test_late_transcript_entries_keep_the_expiry(self, redis_server):
+        """Entries appended after completion never leave a transcript without a TTL."""
+        store = make_store(redis_server)
+        record = make_record()
+        await store.create(record)
+        await store.transition(record.call_id, CallStatus.COMPLETED)
+
+        await store.redis.persist(store._transcript_key(record.call_id))  # Stream did not exist at completion
+        await store.append_transcript(record.call_id, {"speaker": "agent", "text": "Goodbye", "interrupted": True})
+        assert 0 < await store.redis.ttl(store._transcript_key(record.call_id)) <= 60
+
+        await store.redis.delete(store._key(record.call_id), store._transcript_key(record.call_id))  # Expired
+        await store.append_transcript(record.call_id, {"speaker": "agent", "text": "Too late"})
+        assert not await store.redis.exists(store._transcript_key(record.call_id))
+
+    async def test_concurrent_transitions_from_two_workers(self, redis_server):
+        """Only one of two racing terminal transitions wins; the other sees the new state."""
+        record = make_record()
+        await make_store(redis_server).create(record)
+
+        results = await asyncio.gather(
+            make_store(redis_server).transition(record.call_id, CallStatus.COMPLETED),
+            make_store(redis_server).transition(record.call_id, CallStatus.FAILED),
+            return_exceptions=True,
+        )
+        assert sum(isinstance(r, InvalidCallTransition) for r in results) == 1
+        assert len({new_call_id() for _ in range(10_000)}) == 10_000
+
+    async def test_dashboard_aggregates_maintained_incrementally(self, redis_server):
+        """Totals, status gauges and windowed rollups follow call events, per organization."""
+        store = make_store(redis_server)
+        first, second = make_record("org-1"), make_record("org-1")
+        await store.create(first)
+        await store.create(second)
+        await store.create(make_record("org-2"))
+
+        await store.transition(first.call_id, CallStatus.CONNECTED)
+        await store.escalate(first.call_id, "User requested human agent")
+        await store.escalate(first.call_id, "User requested human agent")
+        await store.record_sentiment(first.call_id, 0.5)
+        await store.record_sentiment(first.call_id, -0.1)
+        await store.record_latency(first.call_id, 400)
+        await store.transition(second.call_id, CallStatus.COMPLETED)
+
+        stats = await make_store(redis_server).stats("org-1")
+        assert stats["total_calls"] == 2
+        assert stats["calls_by_status"] == {"connected": 1, "completed": 1}
+        assert stats["active_calls"] == 1
+        assert stats["escalated_calls"] == 1
+        assert stats["average_sentiment"] == 0.2
+        assert stats["average_first_audio_latency_ms"] == 400
+        assert stats["windows"]["15m"]["total_calls"] == 2
+        assert stats["windows"]["24h"]["completed_calls"] == 1
+
+        assert (await store.stats())["total_calls"] == 3
+        assert (await store.get(first.call_id)).sentiment_scores == [0.5, -0.1]
@@ -0,0 +1,169 @@
+"""
+Tests for the outbound campaign dialer (run against the telephony simulator).
+"""
+
+import asyncio
+from datetime import datetime, time, timezone
+
+from app.config import settings
+from app.services.voice.calls import CallStatus, MemoryCallStore
+from app.services.voice.campaigns import (
+    CampaignDialer,
+    CampaignMember,
+    CampaignRequest,
+    SimulatedTelephony,
+    campaign_dialer,
+    get_telephony,
+    next_calling_time,
+)
+
+ALL_DAY = {"calling_hours_start": time(0, 0), "calling_hours_end": time(23, 59, 59, 999999)}
+
+
+class OrgTrackingTelephony(SimulatedTelephony):
+    """Simulator that also records peak concurrent calls per organization (encoded in the phone number)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.org_in_flight: dict[str, int] = {}
+        self.org_peak: dict[str, int] = {}
+
+    async def dial(self, call_id, phone_number, on_answered):
+        org = phone_number.split(":")[0]
+        self.org_in_flight[org] = self.org_in_flight.get(org, 0) + 1
+        self.org_peak[org] = max(self.org_peak.get(org, 0), self.org_in_flight[org])
+        try:
+            return await super().dial(call_id, phone_number, on_answered)
+        finally:
+            self.org_in_flight[org] -= 1
+
+
+def make_request(org: str, members: int, **kwargs) -> CampaignRequest:
+    return CampaignRequest(
+        organization_id=org,
+        members=[CampaignMember(member_id=f"{org}-m{i}", phone_number=f"{org}:+1555{i:07d}") for i in range(members)],
+        **{**ALL_DAY, **kwargs},
+    )
+
+
+async def wait_for_campaigns(dialer: CampaignDialer, timeout: float = 10.0):
+    async def done():
+        while any(c.status == "running" for c in dialer.campaigns.values()):
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(done(), timeout)
+
+
+class TestCallingHours:
+    """Test calling-hour windows in the member's timezone."""
+
+    def test_inside_window_is_now(self):
+        now = datetime(2024, 6, 3, 15, 0, tzinfo=timezone.utc)  # 11:00 in New York
+        assert next_calling_time(now, "America/New_York", time(9), time(20)) == now
+
+    def test_before_and_after_window(self):
+        early = datetime(2024, 6, 3, 11, 0, tzinfo=timezone.utc)  # 07:00 in New York
+        assert next_calling_time(early, "America/New_York", time(9), time(20)) == datetime(
+            2024, 6, 3, 13, 0, tzinfo=timezone.utc
+        )
+        late = datetime(2024, 6, 4, 3, 30, tzinfo=timezone.utc)  # 20:30 in Los Angeles on June 3
+        assert next_calling_time(late, "America/Los_Angeles", time(9), time(20)) == datetime(
+            2024, 6, 4, 16, 0, tzinfo=timezone.utc
+        )
+
+
+class TestCampaignDialer:
+    """Test concurrency caps, retries and throughput tracking."""
+
+    async def test_caps_retries_and_outcomes(self):
+        """Calls stay under the global and per-org caps; unanswered calls are retried up to max_attempts."""
+        telephony = OrgTrackingTelephony(
+            answer_rate=0.5,
+            busy_rate=0.2,
+            fail_rate=0.0,
+            ring_seconds=(0.5, 1.0),
+            talk_seconds=(1.0, 2.0),
+            time_scale=0.005,
+            seed=7,
+        )
+        store = MemoryCallStore()
+        dialer = CampaignDialer(
+            telephony, max_concurrent_calls=5, max_concurrent_calls_per_org=3, store_factory=lambda: store
+        )
+
+        first = dialer.start_campaign(make_request("org-a", 20, retry_backoff_seconds=0.01))
+        second = dialer.start_campaign(make_request("org-b", 10, retry_backoff_seconds=0.01, max_attempts=2))
+        try:
+            await wait_for_campaigns(dialer)
+        finally:
+            await dialer.stop()
+
+        assert telephony.peak_in_flight == 5
+        assert max(telephony.org_peak.values()) <= 3
+        for campaign in (first, second):
+            summary = campaign.summary()
+            assert summary["status"] == "completed"
+            assert summary["in_flight"] == summary["pending_attempts"] == 0
+            assert sum(summary["outcomes"].values()) == summary["attempts"]
+            assert summary["attempts"] == len(campaign.request.members) + summary["retries"]
+            assert summary["calls_per_minute"] > 0
+        assert first.retries > 0
+
+        calls = await store.list("org-a")
+        assert len(calls) == first.attempts
+        assert {c.campaign_id for c in calls} == {first.campaign_id}
+        answered = [c for c in calls if c.outcome == "answered"]
+        assert answered and all(c.status == CallStatus.COMPLETED for c in answered)
+        assert all(c.status == CallStatus.FAILED for c in calls if c.outcome != "answered")
+
+    async def test_outside_calling_hours_is_deferred_and_cancellable(self):
+        """Members outside their window are not dialed; cancelling drops their pending attempts."""
+        telephony = SimulatedTelephony(time_scale=0.001, seed=1)
+        dialer = CampaignDialer(telephony, store_factory=MemoryCallStore)
+        local_hour = datetime.now(timezone.utc).hour
+        # A one-hour window that does not include now and does not wrap past midnight
+        opens = (local_hour + 2) % 24 if local_hour < 21 else 0
+        closed = {"calling_hours_start": time(opens), "calling_hours_end": time(opens + 1)}
+        request = CampaignRequest(
+            organization_id="org-a",
+            members=[CampaignMember(member_id="m1", phone_number="+15555550100", timezone="UTC")],
+            **closed,
+        )
+        campaign = dialer.start_campaign(request)
+        await asyncio.sleep(0.05)
+        assert campaign.attempts == 0
+        assert campaign.deferred_for_calling_hours == 1
+
+        dialer.cancel_campaign(campaign.campaign_id)
+        assert campaign.summary()["status"] == "cancelled"
+        await dialer.stop()
+
+
+class TestCampaignEndpoints:
+    """Test that campaigns need a configured telephony adapter."""
+
+    def test_campaign_endpoints_unavailable_without_telephony(self, client, monkeypatch):
+        monkeypatch.setattr(campaign_dialer, "telephony", None)
+        body = make_request("org-a", 1).model_dump(mode="json")
+        assert client.post("/api/v1/voice/campaigns", json=body).status_code == 503
+        assert client.get("/api/v1/voice/campaigns").status_code == 503
+        assert client.get("/api/v1/voice/campaigns/camp-1").status_code == 503
+
+    def test_calling_hours_must_open_before_they_close(self, client):
+        body = make_request("org-a", 1).model_dump(mode="json")
+        for start, end in [("20:00:00", "09:00:00"), ("09:00:00", "09:00:00")]:
+            response = client.post(
+                "/api/v1/voice/campaigns",
+                json={
+                    **body,
+                    "calling_hours_start": start,
+                    "calling_hours_end": end,
+                },
+            )
+            assert response.status_code == 422
+
+    def test_telephony_adapter_comes_from_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "campaign_telephony_adapter", "")
+        assert get_telephony() is None
+        monkeypatch.setattr(settings, "campaign_telephony_adapter", "app.services.voice.campaigns:SimulatedTelephony")
+        assert isinstance(get_telephony(), SimulatedTelephony)
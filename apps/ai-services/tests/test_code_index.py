@@ -0,0 +1,86 @@
+"""
+Tests for the medical code search index shared by suggest-codes,
+the orchestrator coding tools and the medical coding workflow node.
+"""
+
+import numpy as np
+
+from app.config import settings
+from app.services.coding.ann import ExactIndex, IVFIndex
+from app.services.coding.embeddings import CodeEmbeddingIndex, CodeRetriever, HashingEncoder, get_code_retriever
+from app.services.coding.index import CodeIndex, get_code_index
+from app.services.coding.sources import read_seed_codes
+
+
+def hashing_retriever() -> CodeRetriever:
+    """Hybrid retriever over the seed codes with the dependency-free encoder."""
+    index = get_code_index()
+    return CodeRetriever(index, CodeEmbeddingIndex.build(index, read_seed_codes(), HashingEncoder()))
+
+
+class TestCodeIndex:
+    """Test search, prefix lookup, hierarchy and persistence."""
+
+    def test_search_ranks_matching_descriptions(self):
+        """Clinical text ranks the low back pain family first."""
+        results = get_code_index().search("acute low back pain", system="icd10cm", limit=3)
+        assert results
+        assert all(r.code.startswith("M54.5") for r in results)
+        assert 0 < results[0].confidence <= 1
+
+    def test_inclusion_terms_are_searchable(self):
+        """Inclusion terms (e.g. 'Lumbago NOS') contribute to matches."""
+        codes = [r.code for r in get_code_index().search("lumbago", system="icd10cm")]
+        assert "M54.50" in codes
+
+    def test_prefix_lookup_and_hierarchy(self):
+        """Code-shaped queries use prefix lookup; parents/children follow the code structure."""
+        index = get_code_index()
+        assert [r.code for r in index.search("M54.5")][:2] == ["M54.5", "M54.50"]
+        assert [a.code for a in index.ancestors("M54.50")] == ["M54.5", "M54"]
+        assert "M54.50" in [c.code for c in index.children("M54.5")]
+
+    def test_save_and_mmap_load_round_trip(self, tmp_path):
+        """A saved index loads memory-mapped and answers identically."""
+        index = get_code_index()
+        index.save(tmp_path)
+        loaded = CodeIndex.load(tmp_path)
+        query = "office visit established patient"
+        assert [r.code for r in loaded.search(query)] == [r.code for r in index.search(query)]
+
+
+class TestSemanticCodeRetrieval:
+    """Test the ANN index and hybrid lexical + semantic retrieval."""
+
+    def test_ivf_recall_against_exact_search(self):
+        """IVF with a few probes recovers nearly all exact nearest neighbors."""
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(50, 32))
+        vectors = centers[rng.integers(0, 50, 5000)] + 0.3 * rng.normal(size=(5000, 32))
+        queries = centers[rng.integers(0, 50, 64)] + 0.3 * rng.normal(size=(64, 32))
+
+        _, truth = ExactIndex(vectors).search(queries, 10)
+        _, found = IVFIndex.build(vectors).search(queries, 10, nprobe=8)
+        recall = np.mean([len(set(f) & set(t)) / 10 for f, t in zip(found, truth)])
+        assert recall >= 0.95
+
+    def test_retriever_fuses_semantic_matches(self):
+        """Nearest descriptors from the ANN index are fused with the lexical ranking."""
+        suggestions = hashing_retriever().suggest("herniated lumbar disk", system="icd10cm", limit=3)
+        assert suggestions[0]["code"] == "M51.26"
+        assert "semantic" in suggestions[0]["match"]
+
+    def test_weak_semantic_only_matches_are_dropped(self):
+        """Unrelated text gets no suggestions just because every query has nearest neighbours."""
+        retriever = hashing_retriever()
+        assert retriever.semantic_search("shortness of breath", "icd10cm", k=3)
+        assert retriever.suggest("shortness of breath", system="icd10cm") == []
+
+    def test_hashing_encoder_is_not_used_for_suggestions(self, monkeypatch):
+        """The hashing encoder can't match paraphrases, so the shared retriever stays lexical-only."""
+        monkeypatch.setattr(settings, "code_embedding_model", "hashing")
+        get_code_retriever.cache_clear()
+        try:
+            assert get_code_retriever().semantic is None
+        finally:
+            get_code_retriever.cache_clear()
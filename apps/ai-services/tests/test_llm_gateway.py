@@ -0,0 +1,439 @@
+"""
+Tests for the LLM gateway (rate budget, priority, coalescing, batching) and
+the code paths that call through it, plus the prompt prefix cache and model
+tiering, using the local fake chat provider and context cache backend.
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.agents.orchestrator import CLAIMS_AGENT_SYSTEM, ROUTER_SYSTEM, orchestrator
+from app.routers.workflows import WorkflowNodeExecutionRequest, run_node, run_node_batch
+from app.services.llm_gateway import FakeChatProvider, LLMGateway, RateBudget, llm_gateway
+from app.services.model_tiering import TIERS, ModelTiering, TierStats, model_tiering
+from app.services.prompt_cache import FakeContextCacheBackend, PromptCacheRegistry, prompt_cache
+
+
+def prompt(text: str) -> list:
+    return [SystemMessage(content="You are terse."), HumanMessage(content=text)]
+
+
+def prompt_key(gateway: LLMGateway, text: str, priority: str = "interactive") -> str:
+    return f"{priority}:{gateway._call(prompt(text), None, 0.0, (), None).key()}"
+
+
+def make_gateway(provider: FakeChatProvider, requests_per_minute: int = 10_000, tokens_per_minute: int = 10_000_000):
+    return LLMGateway(provider, RateBudget(requests_per_minute, tokens_per_minute), batch_window_ms=10)
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """Route the shared gateway to a fake provider that answers routing prompts with 'coding'."""
+
+    def reply(call):
+        if call.messages[0].content == ROUTER_SYSTEM:
+            return "coding"
+        return f"deny\nReply to: {call.messages[-1].content[:40]}"
+
+    provider = FakeChatProvider(reply, latency_seconds=0.01)
+    monkeypatch.setattr(llm_gateway, "provider", provider)
+    return provider
+
+
+class TestLLMGateway:
+    async def test_identical_inflight_prompts_share_one_call(self):
+        provider = FakeChatProvider(latency_seconds=0.05)
+        gateway = make_gateway(provider)
+
+        responses = await asyncio.gather(*(gateway.invoke(prompt("same question")) for _ in range(5)))
+
+        assert {r.content for r in responses} == {"Echo: same question"}
+        assert provider.requests == 1
+        assert gateway.stats.coalesced == 4
+
+    async def test_different_prompts_are_not_coalesced(self):
+        provider = FakeChatProvider(latency_seconds=0.01)
+        gateway = make_gateway(provider)
+
+        await asyncio.gather(gateway.invoke(prompt("a")), gateway.invoke(prompt("b")))
+
+        assert provider.requests == 2
+        assert gateway.stats.coalesced == 0
+
+    async def test_bulk_calls_go_to_the_batch_endpoint(self):
+        provider = FakeChatProvider()
+        gateway = make_gateway(provider)
+
+        responses = await asyncio.gather(*(gateway.invoke(prompt(f"item {i}"), priority="bulk") for i in range(10)))
+
+        assert [r.content for r in responses] == [f"Echo: item {i}" for i in range(10)]
+        assert provider.batch_sizes == [10]
+        assert gateway.stats.batched_calls == 10
+
+    async def test_batches_are_capped_at_max_size(self):
+        provider = FakeChatProvider()
+        gateway = make_gateway(provider)
+        gateway.batch_max_size = 4
+
+        await asyncio.gather(*(gateway.invoke(prompt(f"item {i}"), priority="bulk") for i in range(10)))
+
+        assert sorted(provider.batch_sizes) == [2, 4, 4]
+
+    async def test_urgent_calls_do_not_join_bulk_calls(self):
+        """An interactive call never waits on an identical bulk call's batch; bulk calls may join interactive ones."""
+        provider = FakeChatProvider(latency_seconds=0.05)
+        gateway = make_gateway(provider)
+        gateway.batch_window_ms = 200
+
+        bulk = asyncio.create_task(gateway.invoke(prompt("same question"), priority="bulk"))
+        await asyncio.sleep(0.01)
+        start = asyncio.get_running_loop().time()
+        await gateway.invoke(prompt("same question"), priority="interactive")
+        assert asyncio.get_running_loop().time() - start < 0.15
+        assert gateway.stats.coalesced == 0
+
+        interactive = asyncio.create_task(gateway.invoke(prompt("other question")))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(bulk, interactive, gateway.invoke(prompt("other question"), priority="bulk"))
+        assert gateway.stats.coalesced == 1
+
+    async def test_batches_hold_one_model_each(self):
+        provider = FakeChatProvider()
+        gateway = make_gateway(provider)
+        models = []
+        provider.reply = lambda call: models.append(call.model) or "ok"
+
+        await asyncio.gather(
+            *(
+                gateway.invoke(prompt(f"item {i}"), model=("model-a", "model-b")[i % 2], priority="bulk")
+                for i in range(6)
+            )
+        )
+
+        assert sorted(provider.batch_sizes) == [3, 3]
+        assert models[:3] in (["model-a"] * 3, ["model-b"] * 3)
+
+    async def test_interactive_calls_get_budget_first(self):
+        provider = FakeChatProvider()
+        gateway = make_gateway(provider, requests_per_minute=600)  # One request per 100 ms
+        gateway.budget._requests = 0
+        order = []
+
+        async def call(name: str, priority: str):
+            await gateway.invoke(prompt(name), priority=priority)
+            order.append(name)
+
+        standard = [asyncio.create_task(call(f"standard-{i}", "standard")) for i in range(2)]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call("chat", "interactive"))
+        await asyncio.gather(*standard, interactive)
+
+        assert order == ["chat", "standard-0", "standard-1"]
+        assert gateway.budget.waits == 3
+
+    async def test_token_budget_throttles_and_settles_actual_usage(self):
+        provider = FakeChatProvider(lambda call: "ok")
+        gateway = make_gateway(provider, tokens_per_minute=60_000)  # 1000 tokens a second
+        gateway.max_output_tokens = 500
+
+        await gateway.invoke(prompt("first"))
+        # The unused output reservation is returned to the bucket
+        assert gateway.budget.to_dict()["available_tokens"] > 60_000 - 100
+
+        gateway.budget._tokens = 0
+        start = asyncio.get_running_loop().time()
+        await gateway.invoke(prompt("second"))
+        assert asyncio.get_running_loop().time() - start >= 0.4
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        gateway = make_gateway(FakeChatProvider(), requests_per_minute=60)
+        gateway.budget._requests = 0
+
+        waiter = asyncio.create_task(gateway.invoke(prompt("never mind")))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)  # The shared call sees its last waiter gone
+
+        assert gateway.budget.to_dict()["queued"] == 0
+        assert gateway._inflight.running(prompt_key(gateway, "never mind")) is None
+
+    async def test_cancelled_caller_does_not_cancel_coalesced_callers(self):
+        provider = FakeChatProvider(latency_seconds=0.05)
+        gateway = make_gateway(provider)
+
+        barged_in = asyncio.create_task(gateway.invoke(prompt("same question")))
+        await asyncio.sleep(0.01)
+        others = [asyncio.create_task(gateway.invoke(prompt("same question"))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        barged_in.cancel()
+
+        responses = await asyncio.gather(*others)
+        assert barged_in.cancelled()
+        assert {r.content for r in responses} == {"Echo: same question"}
+        assert provider.requests == 1 and gateway.stats.coalesced == 2
+
+    async def test_errors_reach_every_coalesced_caller(self):
+        def fail(call):
+            raise RuntimeError("provider down")
+
+        gateway = make_gateway(FakeChatProvider(fail, latency_seconds=0.01))
+
+        results = await asyncio.gather(*(gateway.invoke(prompt("x")) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert gateway.stats.errors == 1
+
+    async def test_stream_takes_budget_and_records_usage(self):
+        gateway = make_gateway(FakeChatProvider(lambda call: "one two three"))
+
+        chunks = [chunk.content async for chunk in gateway.stream(prompt("go"))]
+
+        assert "".join(chunks) == "one two three"
+        assert gateway.stats.calls["interactive"] == 1
+        assert gateway.stats.tokens > 0
+
+
+class TestGatewayCallers:
+    async def test_chat_routes_and_answers_through_gateway(self, fake_provider):
+        result = await orchestrator.process_message(
+            "What code fits lumbar pain?",
+            organization_id="org-1",
+            user_id="gateway-user",
+            user_role="coder",
+        )
+
+        assert result["agent_type"] == "coding"
+        assert result["response"].startswith("deny\nReply to: What code fits lumbar pain?")
+        assert fake_provider.requests == 2  # Routing, then the agent's answer
+        orchestrator.clear_conversation(result["conversation_id"])
+
+    async def test_streamed_turn_uses_gateway(self, fake_provider):
+        tokens = [
+            t
+            async for t in orchestrator.stream_message(
+                "Is my claim paid?",
+                organization_id="org-1",
+                user_id="gateway-voice",
+                user_role="member",
+                agent_type="claims",
+            )
+        ]
+
+        assert "".join(tokens).startswith("deny")
+        orchestrator.clear_conversation("gateway-voice:claims")
+
+    async def test_workflow_llm_nodes_are_batched(self, fake_provider):
+        items = [
+            WorkflowNodeExecutionRequest(
+                execution_id=f"exec-{i}",
+                node_id=f"decide-{i}",
+                node_type="llm_decision",
+                input_data={"claim_id": f"CLM-{i}"},
+                organization_id="org-1",
+                user_id="user-1",
+            )
+            for i in range(12)
+        ]
+
+        results = await run_node_batch("llm_decision", items)
+
+        assert [r.output_data["decision"] for r in results] == ["deny"] * 12
+        assert sum(fake_provider.batch_sizes) == 12
+        assert fake_provider.requests < 12
+
+    async def test_workflow_llm_nodes_call_at_the_node_priority(self, fake_provider, monkeypatch):
+        """An interactive node execution is not sent to the bulk batch queue."""
+        monkeypatch.setattr(llm_gateway, "stats", type(llm_gateway.stats)())
+
+        result = await run_node("decide", "llm_decision", {}, {"claim_id": "CLM-1"}, priority="interactive")
+
+        assert result.output_data["decision"] == "deny"
+        assert llm_gateway.stats.calls == {"interactive": 1, "standard": 0, "bulk": 0}
+        assert fake_provider.batch_sizes == []
+
+    async def test_unparseable_decision_goes_to_review(self, monkeypatch):
+        monkeypatch.setattr(
+            llm_gateway, "provider", FakeChatProvider(lambda call: "It is hard to say from this input.")
+        )
+
+        result = await run_node("decide", "llm_decision", {"model": "gemini-test"}, {"claim_id": "CLM-1"})
+
+        assert result.status == "waiting_hitl" and result.requires_hitl
+        assert result.output_data["decision"] == result.output_data["next_branch"] == "review"
+        assert result.ai_metrics["model"] == "gemini-test"
+
+    async def test_analyzer_reports_the_model_it_called(self, fake_provider):
+        result = await run_node("analyze", "gemini_analyzer", {"model": "gemini-test"}, {"claim_id": "CLM-1"})
+
+        assert result.output_data["model"] == result.ai_metrics["model"] == "gemini-test"
+
+
+class TestPromptCache:
+    def registry(self, backend=None, **kwargs) -> PromptCacheRegistry:
+        return PromptCacheRegistry(backend or FakeContextCacheBackend(), **{"min_tokens": 0, **kwargs})
+
+    async def test_handle_is_created_in_background_then_reused(self):
+        backend = FakeContextCacheBackend()
+        registry = self.registry(backend)
+
+        assert registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM) is None  # First call sends the prefix
+        await asyncio.sleep(0)
+        name = registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM)
+
+        assert name == "cachedContents/fake-1"
+        assert registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM) == name
+        prefixes = registry.to_dict()["prefixes"]
+        assert [p["hits"] for p in prefixes.values()] == [2]
+        assert len(backend.created) == 1
+
+    async def test_one_handle_per_agent_model_and_prompt_version(self):
+        backend = FakeContextCacheBackend()
+        registry = self.registry(backend)
+
+        for agent_type, model, system in [
+            ("claims", "model-a", CLAIMS_AGENT_SYSTEM),
+            ("claims", "model-b", CLAIMS_AGENT_SYSTEM),
+            ("claims", "model-a", CLAIMS_AGENT_SYSTEM + "\n- Be brief"),  # Edited prompt: new version
+        ]:
+            registry.lookup(agent_type, model, system)
+        await asyncio.sleep(0)
+
+        assert len(backend.created) == 3
+        assert len(registry.to_dict()["prefixes"]) == 3
+
+    async def test_handle_is_refreshed_before_expiry(self):
+        backend = FakeContextCacheBackend()
+        registry = self.registry(backend, ttl_seconds=60, refresh_margin_seconds=120)
+
+        registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM)
+        await asyncio.sleep(0)
+        assert registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM) == "cachedContents/fake-1"
+        await asyncio.sleep(0)
+
+        assert backend.refreshed == ["cachedContents/fake-1"]
+
+    async def test_prefix_below_provider_minimum_is_not_uploaded(self):
+        backend = FakeContextCacheBackend()
+        registry = self.registry(backend, min_tokens=100_000)
+
+        registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM)
+        await asyncio.sleep(0)
+
+        assert registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM) is None
+        assert backend.created == []
+        assert [e["status"] for e in registry.to_dict()["prefixes"].values()] == ["below_minimum"]
+
+    async def test_failed_create_backs_off(self):
+        backend = FakeContextCacheBackend(fail=True)
+        registry = self.registry(backend, retry_seconds=600)
+
+        registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM)
+        await asyncio.sleep(0)
+        registry.lookup("claims", "model-a", CLAIMS_AGENT_SYSTEM)
+        await asyncio.sleep(0)
+
+        entry = next(iter(registry.to_dict()["prefixes"].values()))
+        assert entry["status"] == "failed"
+        assert entry["failures"] == 1
+
+    async def test_chat_reports_cached_input_tokens(self, fake_provider, monkeypatch):
+        monkeypatch.setattr(prompt_cache, "backend", FakeContextCacheBackend())
+        monkeypatch.setattr(prompt_cache, "min_tokens", 0)
+        monkeypatch.setattr(prompt_cache, "_entries", {})
+
+        async def ask():
+            result = await orchestrator.process_message(
+                "How do I check a claim?",
+                organization_id="org-1",
+                user_id="cache-user",
+                user_role="member",
+                agent_type="claims",
+            )
+            orchestrator.clear_conversation(result["conversation_id"])
+            return result["metadata"]
+
+        first = await ask()
+        await asyncio.sleep(0)
+        second = await ask()
+
+        assert (first["prompt_cache"], first["cached_input_tokens"]) == ("miss", 0)
+        assert second["prompt_cache"] == "hit"
+        assert second["cached_input_tokens"] > 0
+        assert second["uncached_input_tokens"] < first["uncached_input_tokens"]
+
+
+class TestModelTiering:
+    def tiering(self, **kwargs) -> ModelTiering:
+        return ModelTiering("small-model", "large-model", large_agents=["prior_auth"], **kwargs)
+
+    def test_simple_lookup_goes_to_small_model(self):
+        choice = self.tiering().choose("claims", "What is the status of claim CLM-2024-000001?", ["tool"])
+
+        assert (choice.tier, choice.model, choice.reasons) == ("small", "small-model", ["lookup"])
+
+    def test_reasoning_agents_and_multi_record_requests_go_to_large_model(self):
+        tiering = self.tiering()
+
+        assert tiering.choose("claims", "Why was CLM-1 denied?").reasons == ["reasoning"]
+        assert tiering.choose("prior_auth", "Status of PA-77?").reasons == ["agent:prior_auth"]
+        assert tiering.choose("claims", "Compare CLM-1 and CLM-2", ["tool"]).reasons == [
+            "reasoning",
+            "multiple_lookups",
+        ]
+        assert tiering.choose("claims", "word " * 80).reasons == ["long_message"]
+        assert self.tiering(enabled=False).choose("claims", "Status of CLM-1?").tier == "large"
+
+    def test_confidence_check(self):
+        tiering = self.tiering()
+
+        assert tiering.confidence("hi", AIMessage(content=""), used_tools=False) == 0.0
+        assert tiering.confidence("hi", AIMessage(content="I'm not sure about that."), used_tools=False) < 0.6
+        assert tiering.confidence("Status of CLM-1?", AIMessage(content="Paid."), False, ["tool"]) < 0.6
+        assert tiering.confidence("Status of CLM-1?", AIMessage(content="Paid."), True, ["tool"]) > 0.6
+
+    def test_cost_uses_cached_input_price(self):
+        tiering = self.tiering(prices={"large-model": {"input": 1.0, "cached_input": 0.25, "output": 2.0}})
+        response = AIMessage(
+            content="ok",
+            usage_metadata={
+                "input_tokens": 1000,
+                "output_tokens": 500,
+                "total_tokens": 1500,
+                "input_token_details": {"cache_read": 400},
+            },
+        )
+
+        assert tiering.cost("large-model", response) == pytest.approx((600 * 1.0 + 400 * 0.25 + 500 * 2.0) / 1e6)
+        assert tiering.cost("unpriced", response) == 0.0
+
+    async def test_low_confidence_answer_escalates(self, monkeypatch):
+        def reply(call):
+            return "I'm not sure." if call.model == model_tiering.models["small"] else "Your deductible is met."
+
+        provider = FakeChatProvider(reply)
+        monkeypatch.setattr(llm_gateway, "provider", provider)
+        monkeypatch.setattr(model_tiering, "stats", {tier: TierStats() for tier in TIERS})
+
+        result = await orchestrator.process_message(
+            "Is my deductible met?",
+            organization_id="org-1",
+            user_id="tier-user",
+            user_role="member",
+            agent_type="member_service",
+        )
+        orchestrator.clear_conversation(result["conversation_id"])
+
+        assert result["response"] == "Your deductible is met."
+        assert result["metadata"]["escalated"] is True
+        assert result["metadata"]["model"] == model_tiering.models["large"]
+        stats = model_tiering.to_dict()["tiers"]
+        assert (stats["small"]["turns"], stats["small"]["escalations"], stats["small"]["escalation_rate"]) == (
+            1,
+            1,
+            1.0,
+        )
+        assert stats["large"]["calls"] == 1
@@ -0,0 +1,91 @@
+"""
+Tests for the Prometheus metrics endpoint, stage timers, cache hit ratios
+and the event-loop lag monitor.
+"""
+
+import asyncio
+import time
+
+from app.services.metrics import (
+    LoopLagMonitor,
+    register_cache,
+    registry,
+    timed,
+    timed_stage,
+)
+
+
+def sample(name: str, labels: dict) -> float:
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics:
+    def test_http_latency_is_labelled_by_route_template(self, client):
+        labels = {"method": "GET", "route": "/api/v1/voice/calls/{call_id}", "status": "404"}
+        before = sample("apex_http_request_duration_seconds_count", labels)
+        client.get("/api/v1/voice/calls/does-not-exist-1")
+        client.get("/api/v1/voice/calls/does-not-exist-2")
+        assert sample("apex_http_request_duration_seconds_count", labels) == before + 2
+
+        body = client.get("/metrics").text
+        assert 'route="/api/v1/voice/calls/{call_id}"' in body
+        assert "does-not-exist" not in body
+        assert "process_cpu_seconds_total" in body
+
+    def test_unknown_paths_share_one_label(self, client):
+        client.get("/no/such/path/123")
+        assert 'route="unmatched"' in client.get("/metrics").text
+
+    def test_fraud_rules_are_timed_and_still_flag(self, client):
+        labels = {"stage": "fraud_rule", "name": "charge_amount"}
+        before = sample("apex_stage_duration_seconds_count", labels)
+        response = client.post(
+            "/api/v1/predictions/fraud/analyze",
+            json={
+                "provider_npi": "1234567890",
+                "member_id": "AHP100001",
+                "diagnosis_codes": ["M54.5"],
+                "procedure_codes": ["99214"],
+                "charged_amount": 75000.0,
+                "service_date": "2024-01-15",
+                "place_of_service": "11",
+                "billed_units": 12,
+                "organization_id": "org-1",
+            },
+        )
+        assert response.status_code == 200
+        assert {flag["type"] for flag in response.json()["flags"]} == {"high_charge", "high_units"}
+        assert sample("apex_stage_duration_seconds_count", labels) == before + 1
+
+    async def test_timed_stage_observes_and_tracks_in_flight(self):
+        @timed_stage("test_stage", "sleepy")
+        async def sleepy():
+            assert sample("apex_stage_in_flight", {"stage": "test_stage"}) == 1
+            await asyncio.sleep(0.01)
+
+        await sleepy()
+        with timed("test_stage", "sync"):
+            pass
+        assert sample("apex_stage_in_flight", {"stage": "test_stage"}) == 0
+        assert sample("apex_stage_duration_seconds_count", {"stage": "test_stage", "name": "sleepy"}) == 1
+        assert sample("apex_stage_duration_seconds_sum", {"stage": "test_stage", "name": "sleepy"}) >= 0.01
+
+    def test_cache_hit_ratio_is_read_at_scrape_time(self, client):
+        counts = {"hits": 0, "misses": 0}
+        register_cache("test_cache", lambda: (counts["hits"], counts["misses"]))
+        assert sample("apex_cache_hit_ratio", {"cache": "test_cache"}) == 0.0
+
+        counts.update(hits=3, misses=1)
+        assert sample("apex_cache_hit_ratio", {"cache": "test_cache"}) == 0.75
+        assert sample("apex_cache_lookups_total", {"cache": "test_cache", "result": "miss"}) == 1
+        assert 'apex_cache_lookups_total{cache="workflow_node_results",result="hit"}' in client.get("/metrics").text
+
+    async def test_loop_lag_monitor_sees_a_blocked_loop(self):
+        before = sample("apex_event_loop_lag_seconds_sum", {})
+        monitor = LoopLagMonitor(interval_seconds=0.01)
+        monitor.start()
+        await asyncio.sleep(0.005)
+        asyncio.get_running_loop().call_soon(time.sleep, 0.05)  # Block the loop
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+        assert sample("apex_event_loop_lag_seconds_sum", {}) - before >= 0.03
@@ -0,0 +1,65 @@
+"""
+Tests for the PHI scanner used by document intelligence, the agent
+orchestrator and voice transcripts.
+"""
+
+import pytest
+
+from app.services.phi import phi_scanner
+
+
+class TestPHIScanner:
+    """Test span detection and redaction."""
+
+    def test_detects_structured_identifiers(self):
+        """Each identifier format is detected with exact character spans."""
+        text = (
+            "SSN 123-45-6789, DOB 01/02/1960, phone (555) 123-4567, NPI 1234567893, MBI 1EG4TE5MK73, member AHP100001"
+        )
+        spans = phi_scanner.scan(text)
+        found = {span.kind: text[span.start : span.end] for span in spans}
+        assert found == {
+            "ssn": "123-45-6789",
+            "dob": "01/02/1960",
+            "phone": "(555) 123-4567",
+            "npi": "1234567893",
+            "mbi": "1EG4TE5MK73",
+            "member_id": "AHP100001",
+        }
+
+    @pytest.mark.parametrize(
+        "text, kind, value",
+        [
+            ("call 555 123 4567", "phone", "555 123 4567"),
+            ("call 555.123.4567", "phone", "555.123.4567"),
+            ("call (555) 123 4567", "phone", "(555) 123 4567"),
+            ("SSN 123456789", "ssn", "123456789"),
+            ("Social Security: 123 45 6789", "ssn", "123 45 6789"),
+            ("MBI 1EG4-TE5-MK73", "mbi", "1EG4-TE5-MK73"),
+        ],
+    )
+    def test_detects_separator_variants(self, text, kind, value):
+        """Space, dot and dash separators; undashed SSNs when labelled; dashed MBIs."""
+        assert [(span.kind, text[span.start : span.end]) for span in phi_scanner.scan(text)] == [(kind, value)]
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "Claim ref 123456789",  # 9 digits without SSN context
+            "Account 123 45 6789",
+            "ZIP 12345-6789",
+            "Phone 555-123.4567",  # Mixed separators
+            "MBI 1EG4-TE5MK73",  # Dashes must group all three parts
+        ],
+    )
+    def test_ignores_lookalike_numbers(self, text):
+        assert phi_scanner.scan(text) == []
+
+    def test_ignores_clinical_codes_and_invalid_npi(self):
+        """ICD/CPT codes and 10-digit numbers failing the NPI check digit are not PHI."""
+        assert phi_scanner.scan("Dx M54.5, CPT 99213, ref 1234567890, BP 120/80") == []
+
+    def test_dictionary_names_and_redaction(self):
+        """Names from extracted fields are matched case-insensitively and redacted."""
+        text = "Seen: JOHN SMITH. Smith tolerated the procedure."
+        assert phi_scanner.redact(text, names=["John Smith"]) == "Seen: [NAME]. [NAME] tolerated the procedure."
@@ -0,0 +1,200 @@
+"""
+Tests for tracing: traceparent propagation, span nesting through the
+orchestrator, workflow nodes and voice turns, sampling, and the exporters.
+"""
+
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.agents.orchestrator import ROUTER_SYSTEM, orchestrator
+from app.routers.workflows import run_node
+from app.services.llm_gateway import FakeChatProvider, llm_gateway
+from app.services.tracing import (
+    FileExporter,
+    InMemoryExporter,
+    Tracer,
+    format_traceparent,
+    parse_traceparent,
+    span,
+    tracer,
+)
+from app.services.voice.pipeline import VoiceTurn
+from app.services.voice.tts import FakeTextToSpeech
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Trace everything into memory through the shared tracer."""
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "sample_ratio", 1.0)
+    return exporter
+
+
+def by_name(exporter: InMemoryExporter, name: str) -> list:
+    return [s for s in exporter.spans if s.name == name]
+
+
+class TestTraceContext:
+    def test_traceparent_round_trip(self):
+        context = parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01")
+        assert (context.trace_id, context.span_id, context.sampled, context.remote) == (TRACE_ID, PARENT_ID, True, True)
+        assert format_traceparent(context) == f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+    @pytest.mark.parametrize(
+        "header", [None, "", "garbage", f"00-{'0' * 32}-{PARENT_ID}-01", f"00-{TRACE_ID}-{PARENT_ID}"]
+    )
+    def test_malformed_traceparent_is_ignored(self, header):
+        assert parse_traceparent(header) is None
+
+    def test_http_request_continues_the_callers_trace(self, client, exporter):
+        response = client.get(
+            "/api/v1/voice/calls/no-such-call", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+        assert response.status_code == 404
+        asyncio.run(tracer.flush())
+
+        (server,) = [
+            s for s in by_name(exporter, "GET /api/v1/voice/calls/{call_id}") if s.context.trace_id == TRACE_ID
+        ]
+        assert server.parent_id == PARENT_ID
+        assert server.kind == "server"
+        assert server.attributes["http.status_code"] == 404
+
+    def test_disabled_tracer_records_nothing(self, monkeypatch):
+        monkeypatch.setattr(tracer, "exporter", None)
+        with span("anything") as s:
+            s.set(ignored=True)
+        assert s.context is None
+
+
+class TestSpans:
+    async def test_orchestrator_spans_nest_under_the_request(self, exporter, monkeypatch):
+        def reply(call):
+            if call.messages[0].content == ROUTER_SYSTEM:
+                return "member_service"
+            if not any("returned:" in str(m.content) for m in call.messages):
+                return AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": "search_providers",
+                            "args": {"specialty": "cardiology"},
+                            "id": "call-1",
+                        }
+                    ],
+                )
+            return "Dr. Sarah Johnson is in network."
+
+        monkeypatch.setattr(llm_gateway, "provider", FakeChatProvider(reply, latency_seconds=0.01))
+        with span("chat_request") as request:
+            result = await orchestrator.process_message(
+                "Find me a cardiologist",
+                organization_id="org-1",
+                user_id="trace-user",
+                user_role="member",
+            )
+        orchestrator.clear_conversation(result["conversation_id"])
+        await tracer.flush()
+
+        assert {s.context.trace_id for s in exporter.spans} == {request.context.trace_id}
+        (routing,) = by_name(exporter, "route_intent")
+        (tool_call,) = by_name(exporter, "tool_call")
+        llm_calls = by_name(exporter, "llm_call")
+        assert routing.parent_id == request.context.span_id
+        assert tool_call.parent_id == request.context.span_id
+        assert tool_call.attributes["tool"] == "search_providers"
+        assert len(llm_calls) == 3  # Routing, tool call request, answer
+        assert [s.parent_id for s in llm_calls].count(routing.context.span_id) == 1
+        assert llm_calls[-1].attributes["input_tokens"] > 0
+        assert {s.attributes["priority"] for s in llm_calls} == {"interactive"}
+
+    async def test_workflow_node_span(self, exporter):
+        result = await run_node("node-1", "eligibility_check", {}, {"member_id": "AHP100001"})
+        assert result.status == "completed"
+        await tracer.flush()
+
+        (node,) = by_name(exporter, "workflow_node")
+        assert node.attributes == {"node_type": "eligibility_check", "node_id": "node-1"}
+        assert node.error is None
+
+    async def test_voice_turn_has_a_tts_span_per_sentence(self, exporter):
+        async def tokens():
+            for token in ["Your claim was approved on Monday. ", "The payment is on its way to you now."]:
+                yield token
+
+        turn = VoiceTurn(FakeTextToSpeech(), "voice-1")
+        with span("voice_turn") as turn_span:
+            events = [kind async for kind, _ in turn.stream(tokens())]
+        await tracer.flush()
+
+        tts = by_name(exporter, "tts")
+        assert events.count("sentence") == len(tts) == 2
+        assert all(s.parent_id == turn_span.context.span_id for s in tts)
+
+    async def test_failed_span_records_the_error(self, exporter):
+        with pytest.raises(ValueError), span("failing"):
+            raise ValueError("boom")
+        await tracer.flush()
+
+        (failing,) = by_name(exporter, "failing")
+        assert failing.to_otlp()["status"] == {"code": 2, "message": "ValueError: boom"}
+
+
+class TestSampling:
+    async def test_unsampled_traces_are_kept_only_when_slow(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter, sample_ratio=0.0, slow_trace_ms=30)
+        with tracer.start_span("fast"), tracer.start_span("fast_child"):
+            pass
+        with tracer.start_span("slow"), tracer.start_span("slow_child"):
+            await asyncio.sleep(0.05)
+        await tracer.flush()
+
+        assert sorted(exporter.names()) == ["slow", "slow_child"]
+        assert tracer.stats["kept_slow"] == 1
+
+    async def test_callers_sampled_flag_decides(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter, sample_ratio=0.0, slow_trace_ms=0)
+        with tracer.start_span("sampled", parent=parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01")):
+            pass
+        with tracer.start_span("not_sampled", parent=parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")):
+            pass
+        await tracer.flush()
+
+        assert exporter.names() == ["sampled"]
+
+    async def test_queue_overflow_drops_oldest_spans(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter, sample_ratio=1.0, max_queued_spans=3)
+        for i in range(5):
+            with tracer.start_span(f"span-{i}"):
+                pass
+        await tracer.flush()
+
+        assert exporter.names() == ["span-2", "span-3", "span-4"]
+        assert tracer.stats["dropped_spans"] == 2
+
+
+class TestExporters:
+    async def test_file_exporter_writes_otlp_json_lines(self, tmp_path):
+        path = tmp_path / "traces" / "spans.jsonl"
+        tracer = Tracer(FileExporter(str(path)), sample_ratio=1.0)
+        with tracer.start_span("parent", claim_id="CLM-1"), tracer.start_span("child", attempt=2, cached=True):
+            pass
+        await tracer.stop()
+
+        child, parent = [json.loads(line) for line in path.read_text().splitlines()]
+        assert child["parentSpanId"] == parent["spanId"]
+        assert child["traceId"] == parent["traceId"]
+        assert parent["attributes"] == [{"key": "claim_id", "value": {"stringValue": "CLM-1"}}]
+        assert child["attributes"][0] == {"key": "attempt", "value": {"intValue": "2"}}
+        assert child["attributes"][1] == {"key": "cached", "value": {"boolValue": True}}
+        assert int(parent["endTimeUnixNano"]) >= int(child["endTimeUnixNano"])
@@ -0,0 +1,417 @@
+"""
+Tests for the streaming voice pipeline (STT -> agent -> TTS) using the
+local fake speech providers.
+"""
+
+import asyncio
+import base64
+import json
+import time
+from contextlib import aclosing
+
+from app.agents.orchestrator import check_member_eligibility, lookup_claim_status
+from app.services.member_context import MemberContextCache, StubMemberDataSource, bind_session, unbind_session
+from app.services.voice.analysis import EscalationMatcher, LexiconSentimentModel, SentimentBatcher
+from app.services.voice.frames import (
+    BINARY_SUBPROTOCOL,
+    CODECS,
+    FLAG_END_OF_SPEECH,
+    AudioRingBuffer,
+    pack_frame,
+    unpack_frame,
+)
+from app.services.voice.phrases import PhraseAudioCache
+from app.services.voice.pipeline import SentenceChunker, VoiceTurn
+from app.services.voice.tts import FakeTextToSpeech
+
+
+def receive_until(ws, message_type):
+    """Collect server messages up to and including the first of `message_type`."""
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message["type"] == message_type:
+            return messages
+
+
+def receive_any(ws) -> tuple[str, object]:
+    """Next server message as ("json", dict) or ("frame", (codec, flags, sequence, payload))."""
+    message = ws.receive()
+    if message.get("bytes") is not None:
+        codec, flags, sequence, payload = unpack_frame(message["bytes"])
+        return "frame", (codec, flags, sequence, bytes(payload))
+    return "json", json.loads(message["text"])
+
+
+class TestSentenceChunker:
+    """Test sentence segmentation of streamed tokens."""
+
+    def test_emits_sentences_as_tokens_arrive(self):
+        """Complete sentences are released immediately; short fragments are merged."""
+        chunker = SentenceChunker(min_chars=10)
+        tokens = ["Hi. Your deduct", "ible is $850.00 this year. ", "Anything ", "else?"]
+        emitted = [chunker.feed(token) for token in tokens]
+        assert emitted == [[], ["Hi. Your deductible is $850.00 this year."], [], []]
+        assert chunker.flush() == ["Anything else?"]
+
+
+class ClosingTTS(FakeTextToSpeech):
+    """Records whether each synthesis stream was closed, not just abandoned."""
+
+    def __init__(self):
+        super().__init__(frame_bytes=8)
+        self.closed = 0
+
+    async def synthesize(self, text, voice_id, language="en-US"):
+        try:
+            async for chunk in super().synthesize(text, voice_id, language):
+                yield chunk
+        finally:
+            self.closed += 1
+
+
+class TestVoiceTurn:
+    """Test a turn being cut off part-way through its audio."""
+
+    async def test_barge_in_closes_the_tts_stream(self):
+        async def tokens():
+            yield "Your claim was approved on Monday and the payment is on its way. "
+
+        tts = ClosingTTS()
+        turn = VoiceTurn(tts, "voice-1")
+        async with aclosing(turn.stream(tokens())) as events:
+            async for kind, _ in events:
+                if kind == "audio":
+                    break  # The caller started speaking
+        assert turn.audio_chunks == 1
+        assert tts.closed == 1
+
+
+class TestUtteranceAnalysis:
+    """Test escalation matching and batched sentiment scoring."""
+
+    def test_escalation_phrases_and_negation(self):
+        """Multi-word phrases and plurals match on word boundaries; negated requests do not escalate."""
+        matcher = EscalationMatcher(["supervisor", "human", "real person"])
+        assert matcher.match("Can I talk to a real   person please") == "real person"
+        assert matcher.match("Get me one of your supervisors") == "supervisors"
+        assert matcher.match("My plan is with Humana") is None
+        assert matcher.match("No need for a supervisor, you answered it") is None
+        assert matcher.match("I don't want a human") is None
+        assert matcher.match("I don't know, just get me a human") == "human"
+
+    async def test_concurrent_utterances_are_scored_in_one_batch(self):
+        """Utterances arriving together share one model call; polarity follows the lexicon and negation."""
+        batcher = SentimentBatcher(LexiconSentimentModel(), max_wait_ms=5)
+        scores = await asyncio.gather(
+            batcher.score("Thanks, that was really helpful"),
+            batcher.score("This is ridiculous, I am so frustrated"),
+            batcher.score("I am not happy with this"),
+            batcher.score("What is my member ID"),
+        )
+        assert batcher.batches == 1
+        assert scores[0] > 0.5 and scores[1] < -0.5 and scores[2] < 0
+        assert scores[3] == 0
+
+
+class TestMemberContextPrefetch:
+    """Test prefetched member context served to the agent tools."""
+
+    async def test_tools_read_prefetched_context(self):
+        """In-flight and finished prefetches are reused; other lookups fall through to the source."""
+        source = StubMemberDataSource(latency_seconds=0.05)
+        cache = MemberContextCache(source)
+        session = cache.prefetch("call-1", "M100")
+        assert cache.prefetch("call-1", "M100") is session
+        token = bind_session(session)
+        try:
+            eligibility = await check_member_eligibility.ainvoke({"member_id": "M100"})
+            claim = await lookup_claim_status.ainvoke({"claim_number": "CLM-M100-0001"})
+            await lookup_claim_status.ainvoke({"claim_number": "CLM-OTHER"})
+            await check_member_eligibility.ainvoke({"member_id": "M200"})
+        finally:
+            unbind_session(token)
+
+        assert eligibility["member_id"] == "M100" and claim["status"] == "in_review"
+        assert session.to_dict()["inflight_hits"] == 1
+        assert session.to_dict()["hits"] == 1
+        assert session.to_dict()["misses"] == 2
+        assert cache.stats.to_dict()["hit_rate"] == 0.5
+        assert source.requests == 3 + 2  # Prefetch, then only the two misses
+
+    def test_call_prefetches_at_initiate_and_reports_on_record(self, client):
+        """Initiating a call with a member starts the prefetch; the call's hit stats land on the record."""
+        with client:
+            before = client.get("/api/v1/voice/member-context/stats").json()["prefetches"]
+            call_id = client.post(
+                "/api/v1/voice/calls/initiate",
+                json={
+                    "agent_type": "member_service",
+                    "phone_number": "+15555550100",
+                    "organization_id": "org-1",
+                    "member_id": "AHP100001",
+                },
+            ).json()["call_id"]
+
+            with client.websocket_connect(f"/api/v1/voice/ws/{call_id}") as ws:
+                receive_until(ws, "status")
+                ws.send_json({"type": "transcript", "text": "Am I covered"})
+                receive_until(ws, "turn_complete")
+
+            assert client.get("/api/v1/voice/member-context/stats").json()["prefetches"] == before + 1
+            metrics = client.get(f"/api/v1/voice/calls/{call_id}").json()["voice_metrics"]
+        assert metrics["member_context"]["prefetches"] == 1
+        assert metrics["member_context"]["prefetch_ms"] is not None
+
+
+class TestAudioFraming:
+    """Test binary frame headers and the inbound ring buffer."""
+
+    def test_ring_buffer_wraps_and_overwrites_oldest(self):
+        """Reads return audio in order across the wrap point; overflow drops the oldest bytes."""
+        ring = AudioRingBuffer(8)
+        ring.write(b"abcde")
+        assert ring.read(3) == b"abc"
+        ring.write(memoryview(b"fghij"))  # Wraps around the end of the buffer
+        assert len(ring) == 7 and ring.read(10) == b"defghij"
+        ring.write(b"0123456789")
+        assert ring.read(10) == b"23456789" and ring.overrun_bytes == 2
+
+    def test_frame_round_trip(self):
+        frame = pack_frame(b"\xff" * 160, CODECS["mulaw"], 7, FLAG_END_OF_SPEECH)
+        codec, flags, sequence, payload = unpack_frame(frame)
+        assert (codec, flags, sequence) == (CODECS["mulaw"], FLAG_END_OF_SPEECH, 7)
+        assert len(frame) == 168 and payload == b"\xff" * 160
+
+
+class CountingTTS(FakeTextToSpeech):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def synthesize(self, text, voice_id, language="en-US"):
+        self.calls += 1
+        async for chunk in super().synthesize(text, voice_id, language):
+            yield chunk
+
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+class TestPhraseAudioCache:
+    """Test pre-rendered greeting and system phrase audio."""
+
+    async def test_warm_restart_and_invalidation(self, tmp_path):
+        """Rendered phrases survive a restart on disk; changed text replaces the stale render."""
+        tts = CountingTTS()
+        phrases = {"greeting:outreach": ("Hello, this is Ava from Apex Health.", "rachel", "en-US")}
+        assert (await PhraseAudioCache(tts, str(tmp_path)).warm(phrases))["rendered"] == 1
+
+        restarted = PhraseAudioCache(tts, str(tmp_path))
+        assert (await restarted.warm(phrases))["rendered"] == 0
+        audio = await collect(restarted.stream(*phrases["greeting:outreach"]))
+        assert audio == b"Hello, this is Ava from Apex Health."
+        assert tts.calls == 1 and restarted.stats.disk_hits == 1
+
+        old_key = restarted.key(*phrases["greeting:outreach"])
+        changed = {"greeting:outreach": ("Hi, Ava here from Apex Health.", "rachel", "en-US")}
+        assert (await restarted.warm(changed))["rendered"] == 1
+        assert restarted.stats.invalidations == 1
+        assert not list(tmp_path.glob(f"{old_key}.*"))
+        assert await collect(restarted.stream(*changed["greeting:outreach"])) == b"Hi, Ava here from Apex Health."
+        assert tts.calls == 2
+
+    async def test_first_use_renders_then_serves_from_memory(self):
+        """An uncached phrase is synthesized once while streaming and then served from memory."""
+        tts = CountingTTS()
+        cache = PhraseAudioCache(tts)
+        phrase = ("Transferring you to a human representative. Please hold.", "adam", "en-US")
+        first = await collect(cache.stream(*phrase))
+        second = await collect(cache.stream(*phrase))
+        assert first == second and tts.calls == 1
+        assert cache.stats.to_dict()["hit_rate"] == 0.5
+        assert cache.key(*phrase) != cache.key(phrase[0], "rachel", "en-US")
+
+
+class TestVoiceWebSocket:
+    """Test the pipelined voice loop over the WebSocket."""
+
+    def test_audio_turn_streams_partials_audio_and_latency(self, client):
+        """Partial transcripts, agent audio and end-of-speech latency are sent per turn."""
+        with client.websocket_connect("/api/v1/voice/ws/call-test") as ws:
+            greeting = receive_until(ws, "status")
+            assert greeting[0]["speaker"] == "agent"
+            assert greeting[-1]["status"] == "listening"
+
+            for chunk in (b"What is my ", b"deductible\n"):
+                ws.send_json({"type": "audio", "data": base64.b64encode(chunk).decode()})
+            messages = receive_until(ws, "turn_complete")
+
+        user = [m for m in messages if m["type"] == "transcript" and m["speaker"] == "user"]
+        assert [m["text"] for m in user][-1] == "What is my deductible"
+        assert user[-1]["is_final"]
+
+        # Every sentence is synthesized (fake TTS audio is the sentence text)
+        agent = [m for m in messages if m["type"] == "transcript" and m["speaker"] == "agent"]
+        sentences = [m["text"] for m in agent if not m["is_final"]]
+        audio = b"".join(base64.b64decode(m["data"]) for m in messages if m["type"] == "audio")
+        assert len(sentences) > 1
+        assert audio.decode() == "".join(sentences)
+        assert "What is my deductible" in agent[-1]["text"]
+        assert messages[-1]["latency"]["first_audio_ms"] is not None
+
+    def test_binary_subprotocol_frames_audio(self, client):
+        """With the binary sub-protocol, audio flows as framed binary messages and control stays JSON."""
+        with client.websocket_connect("/api/v1/voice/ws/call-binary", subprotocols=[BINARY_SUBPROTOCOL]) as ws:
+            assert ws.accepted_subprotocol == BINARY_SUBPROTOCOL
+            greeting = []
+            while (message := receive_any(ws))[0] == "frame" or message[1].get("status") != "listening":
+                greeting.append(message)
+            assert any(kind == "frame" for kind, _ in greeting)
+
+            mulaw = CODECS["mulaw"]
+            ws.send_bytes(pack_frame(b"What is my ", mulaw, 0))
+            ws.send_bytes(pack_frame(b"deductible", mulaw, 1, FLAG_END_OF_SPEECH))
+            messages = []
+            while (message := receive_any(ws))[0] == "frame" or message[1]["type"] != "turn_complete":
+                messages.append(message)
+
+            ws.send_bytes(pack_frame(b"hello", CODECS["linear16"], 2))
+            error = receive_any(ws)
+
+        user = [m for kind, m in messages if kind == "json" and m.get("speaker") == "user"]
+        assert user[-1]["text"] == "What is my deductible" and user[-1]["is_final"]
+        frames = [m for kind, m in messages if kind == "frame"]
+        agent = [m for kind, m in messages if kind == "json" and m.get("speaker") == "agent" and not m["is_final"]]
+        assert b"".join(payload for _, _, _, payload in frames).decode() == "".join(m["text"] for m in agent)
+        assert [sequence for _, _, sequence, _ in frames] == sorted(sequence for _, _, sequence, _ in frames)
+        assert error[0] == "json" and error[1]["type"] == "error"  # Codec other than the call's
+
+    def test_interrupt_cancels_in_flight_turn(self, client, monkeypatch):
+        """An interrupt stops the agent mid-response and is counted on the call."""
+        from app.routers import voice
+        from app.services.voice.tts import FakeTextToSpeech
+
+        monkeypatch.setattr(voice, "get_tts", lambda: FakeTextToSpeech(delay_seconds=0.2))
+        call_id = client.post(
+            "/api/v1/voice/calls/initiate",
+            json={
+                "agent_type": "member_service",
+                "phone_number": "+15555550100",
+                "organization_id": "org-1",
+            },
+        ).json()["call_id"]
+
+        with client.websocket_connect(f"/api/v1/voice/ws/{call_id}") as ws:
+            receive_until(ws, "status")
+            ws.send_json({"type": "transcript", "text": "Tell me about my benefits"})
+            first = receive_until(ws, "transcript")
+            assert first[-1]["speaker"] == "agent" and not first[-1]["is_final"]
+
+            ws.send_json({"type": "interrupt"})
+            messages = receive_until(ws, "status")
+            assert messages[-1]["status"] == "interrupted"
+            assert not any(m["type"] == "turn_complete" for m in messages)
+
+        call = client.get(f"/api/v1/voice/calls/{call_id}").json()
+        assert call["voice_metrics"]["cancelled_turns"] == 1
+        assert call["voice_metrics"]["cancel_reasons"] == {"interrupt": 1}
+        assert call["transcript"][-1]["interrupted"]
+
+    def test_failed_turn_reports_an_error(self, client, monkeypatch):
+        """An LLM/tool/TTS failure reaches the client as an error, and the call goes back to listening."""
+        from app.routers import voice
+
+        async def failing_stream(**kwargs):
+            yield "Let me check that. "
+            raise RuntimeError("model unavailable")
+
+        monkeypatch.setattr(voice.orchestrator, "stream_message", failing_stream)
+        with client.websocket_connect("/api/v1/voice/ws/call-failing") as ws:
+            receive_until(ws, "status")
+            ws.send_json({"type": "transcript", "text": "What is my copay"})
+            messages = receive_until(ws, "status")
+
+        assert [m["type"] for m in messages][-2:] == ["error", "status"]
+        assert messages[-1]["status"] == "listening"
+        assert not any(m["type"] == "turn_complete" for m in messages)
+
+    def test_malformed_messages_are_rejected_and_the_call_still_completes(self, client):
+        """Bad JSON or base64 gets an error reply without dropping the socket; hang-up completes the call."""
+        call_id = client.post(
+            "/api/v1/voice/calls/initiate",
+            json={
+                "agent_type": "member_service",
+                "phone_number": "+15555550100",
+                "organization_id": "org-1",
+            },
+        ).json()["call_id"]
+
+        with client.websocket_connect(f"/api/v1/voice/ws/{call_id}") as ws:
+            receive_until(ws, "status")
+            ws.send_text("{not json")
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json(["transcript"])
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json({"type": "audio", "data": "%%% not base64"})
+            assert ws.receive_json()["type"] == "error"
+
+        assert client.get(f"/api/v1/voice/calls/{call_id}").json()["status"] == "completed"
+
+    def test_utterance_sentiment_recorded_and_negated_escalation_ignored(self, client):
+        """Sentiment is appended to the call record; a negated request for a supervisor is answered."""
+        call_id = client.post(
+            "/api/v1/voice/calls/initiate",
+            json={
+                "agent_type": "member_service",
+                "phone_number": "+15555550100",
+                "organization_id": "org-1",
+            },
+        ).json()["call_id"]
+
+        with client:
+            with client.websocket_connect(f"/api/v1/voice/ws/{call_id}") as ws:
+                receive_until(ws, "status")
+                ws.send_json({"type": "transcript", "text": "Thanks, no need for a supervisor. What is my copay"})
+                messages = receive_until(ws, "turn_complete")
+                assert not any(m["type"] == "escalation" for m in messages)
+
+                ws.send_json({"type": "transcript", "text": "This is terrible, let me talk to a real person"})
+                assert receive_until(ws, "escalation")[-1]["type"] == "escalation"
+
+            for _ in range(50):  # Sentiment is recorded in the background
+                call = client.get(f"/api/v1/voice/calls/{call_id}").json()
+                if len(call["sentiment_scores"]) == 2:
+                    break
+                time.sleep(0.02)
+        assert call["escalated"]
+        assert "real person" in call["escalation_reason"]
+        assert len(call["sentiment_scores"]) == 2
+        assert call["sentiment_scores"][0] > 0 > call["sentiment_scores"][1]
+
+
+class TestDashboardFeed:
+    """Test the wallboard push feed."""
+
+    def test_pushes_stats_on_call_events(self, client, monkeypatch):
+        """The feed sends a snapshot on connect and an update after each call event."""
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "dashboard_push_interval_seconds", 0)
+        with client, client.websocket_connect("/api/v1/voice/dashboard/ws?organization_id=org-wallboard") as ws:
+            assert ws.receive_json()["stats"]["total_calls"] == 0
+
+            client.post(
+                "/api/v1/voice/calls/initiate",
+                json={
+                    "agent_type": "outreach",
+                    "phone_number": "+15555550101",
+                    "organization_id": "org-wallboard",
+                },
+            )
+            update = ws.receive_json()["stats"]
+            assert update["total_calls"] == 1
+            assert update["calls_by_status"] == {"ringing": 1}
+            assert update["windows"]["15m"]["total_calls"] == 1
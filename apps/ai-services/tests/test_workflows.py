@@ -0,0 +1,565 @@
+"""
+Tests for workflow AI node execution.
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+import httpx
+import pytest
+
+from app.main import app
+from app.routers import workflows
+from app.services.node_cache import CacheStats, SingleFlightCache, TTLCache, idempotent_results, node_results
+from app.services.node_scheduler import NodeScheduler, NodeTimeoutError, NodeTypeLimits, SchedulerBusy, node_scheduler
+
+
+def subgraph_request(nodes: list[tuple[str, str]], edges: list[tuple[str, str]], **extra) -> dict:
+    return {
+        "execution_id": "exec-001",
+        "organization_id": "org-1",
+        "user_id": "user-1",
+        "nodes": [{"node_id": node_id, "node_type": node_type} for node_id, node_type in nodes],
+        "edges": [{"source": source, "target": target} for source, target in edges],
+        **extra,
+    }
+
+
+@pytest.fixture(autouse=True)
+def clean_node_registry():
+    """Drop handlers registered by a test and results memoized during it."""
+    registries = (
+        workflows.NODE_HANDLERS,
+        workflows.BATCH_NODE_HANDLERS,
+        workflows.STREAMING_NODE_HANDLERS,
+        workflows.CACHEABLE_NODE_TYPES,
+    )
+    before = [dict(registry) for registry in registries]
+    node_results.stats, idempotent_results.stats = CacheStats(), CacheStats()
+    yield
+    for registry, saved in zip(registries, before):
+        registry.clear()
+        registry.update(saved)
+    node_results.clear()
+    idempotent_results.clear()
+
+
+@pytest.fixture
+def counting_handler():
+    """Register test handlers (flags as for register_node_handler) that log their calls to one shared list."""
+    calls = []
+
+    def register(node_type: str, **flags):
+        @workflows.register_node_handler(node_type, **flags)
+        async def handler(config: dict, input_data: dict) -> dict:
+            calls.append(input_data)
+            await asyncio.sleep(0.05)
+            if input_data.get("fail"):
+                raise RuntimeError("model unavailable")
+            return {"answer": input_data.get("question"), "confidence": 0.9}
+
+        return calls
+
+    return register
+
+
+def node_request(node_type: str, node_config: Optional[dict] = None, **input_data) -> dict:
+    return {
+        "execution_id": "exec-001",
+        "node_id": "node-001",
+        "node_type": node_type,
+        "node_config": node_config or {},
+        "input_data": input_data,
+        "organization_id": "org-1",
+        "user_id": "user-1",
+    }
+
+
+@pytest.fixture
+def slow_handlers(monkeypatch):
+    """Test handlers that take 100 ms and echo what they were given."""
+
+    def register(node_type: str, output_key: str):
+        async def handler(config: dict, input_data: dict) -> dict:
+            await asyncio.sleep(0.1)
+            return {output_key: True, "seen": sorted(input_data)}
+
+        monkeypatch.setitem(workflows.NODE_HANDLERS, node_type, handler)
+
+    register("test_left", "left")
+    register("test_right", "right")
+    register("test_join", "joined")
+
+
+class TestSubgraphExecution:
+    """Test executing a DAG of AI nodes in one request."""
+
+    def test_independent_branches_run_concurrently(self, client, slow_handlers):
+        """A diamond runs both branches at once, and the join sees both branches' outputs."""
+        response = client.post(
+            "/api/v1/workflows/ai/execute-subgraph",
+            json=subgraph_request(
+                [("elig", "eligibility_check"), ("a", "test_left"), ("b", "test_right"), ("join", "test_join")],
+                [("elig", "a"), ("elig", "b"), ("a", "join"), ("b", "join")],
+                input_data={"member_id": "M123"},
+            ),
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "completed" and body["skipped_nodes"] == []
+        results = {r["node_id"]: r for r in body["results"]}
+        assert results["a"]["output_data"]["seen"] == sorted(
+            ["member_id", "eligible", "plan", "status", "deductible_remaining"]
+        )
+        assert {"left", "right", "member_id"} <= set(results["join"]["output_data"]["seen"])
+        assert results["elig"]["next_nodes"] == ["a", "b"]
+
+        timings = body["timings"]
+        assert abs(timings["a"]["started_ms"] - timings["b"]["started_ms"]) < 50
+        # Two 100 ms levels, not three
+        assert body["processing_time_ms"] < 280
+
+    def test_stops_at_first_hitl_node(self, client):
+        """Nodes downstream of a node waiting for review are skipped, not run."""
+        response = client.post(
+            "/api/v1/workflows/ai/execute-subgraph",
+            json=subgraph_request(
+                [
+                    ("elig", "eligibility_check"),
+                    ("extract", "document_extraction"),
+                    ("coding", "medical_coding_ai"),
+                    ("fraud", "fraud_detector"),
+                    ("decide", "llm_decision"),
+                ],
+                [("elig", "extract"), ("extract", "coding"), ("coding", "fraud"), ("fraud", "decide")],
+                input_data={"member_id": "M123", "clinical_notes": "Acute low back pain"},
+            ),
+        )
+        body = response.json()
+        assert body["status"] == "waiting_hitl"
+        assert body["halted_at"] == "coding"
+        assert [r["node_id"] for r in body["results"]] == ["elig", "extract", "coding"]
+        assert body["results"][-1]["next_nodes"] == ["fraud"]
+        assert body["skipped_nodes"] == ["fraud", "decide"]
+
+    def test_failed_node_halts_subgraph(self, client):
+        response = client.post(
+            "/api/v1/workflows/ai/execute-subgraph",
+            json=subgraph_request(
+                [("bad", "no_such_node"), ("after", "fraud_detector")],
+                [("bad", "after")],
+            ),
+        )
+        body = response.json()
+        assert body["status"] == "failed" and body["halted_at"] == "bad"
+        assert body["skipped_nodes"] == ["after"]
+
+    @pytest.mark.parametrize("edges", [[("a", "b"), ("b", "a")], [("a", "missing")]])
+    def test_invalid_graph_rejected(self, client, edges):
+        response = client.post(
+            "/api/v1/workflows/ai/execute-subgraph",
+            json=subgraph_request(
+                [("a", "fraud_detector"), ("b", "fraud_detector")],
+                edges,
+            ),
+        )
+        assert response.status_code == 400
+
+
+class TestBatchExecution:
+    """Test batched execution of many items of the same node types."""
+
+    def batch_item(self, index: int, node_type: str, **input_data) -> dict:
+        return {
+            "execution_id": f"exec-{index}",
+            "node_id": f"node-{index}",
+            "node_type": node_type,
+            "input_data": input_data,
+            "organization_id": "org-1",
+            "user_id": "user-1",
+        }
+
+    def test_batch_handler_called_per_chunk(self, client, monkeypatch):
+        """Batch-aware handlers get whole chunks; results come back in request order."""
+        calls = []
+
+        @workflows.register_node_handler("test_batch_scorer", batch=True)
+        async def score(configs: list[dict], inputs: list[dict]) -> list[dict]:
+            calls.append(len(inputs))
+            return [{"score": item["claim"] * 2} for item in inputs]
+
+        monkeypatch.setattr(workflows.settings, "workflow_batch_size", 10)
+        items = [self.batch_item(i, "test_batch_scorer", claim=i) for i in range(25)]
+        items.insert(5, self.batch_item(99, "eligibility_check", member_id="M1"))
+        response = client.post("/api/v1/workflows/ai/execute-node/batch", json={"items": items})
+
+        body = response.json()
+        assert sorted(calls) == [5, 10, 10]
+        assert [r["node_id"] for r in body["results"]] == [item["node_id"] for item in items]
+        assert body["results"][0]["output_data"]["score"] == 0 and body["results"][-1]["output_data"]["score"] == 48
+        assert body["results"][5]["output_data"]["member_id"] == "M1"
+        assert body["throughput"]["test_batch_scorer"]["batched"] is True
+        assert body["throughput"]["eligibility_check"]["items"] == 1
+        assert body["throughput"]["eligibility_check"]["batched"] is False
+
+        stats = client.get("/api/v1/workflows/ai/execute-node/batch/stats").json()["node_types"]
+        assert stats["test_batch_scorer"]["items"] >= 25
+
+    def test_batch_matches_single_execution(self, client):
+        """A batch-aware handler gives each item the same output as a single execution."""
+        notes = ["Acute low back pain, lumbar strain", "Type 2 diabetes follow-up visit"]
+        items = [self.batch_item(i, "medical_coding_ai", clinical_notes=text) for i, text in enumerate(notes)]
+        batch = client.post("/api/v1/workflows/ai/execute-node/batch", json={"items": items}).json()["results"]
+        node_results.clear()
+        for item, result in zip(items, batch):
+            single = client.post("/api/v1/workflows/ai/execute-node", json=item).json()
+            assert result["output_data"] == single["output_data"]
+            assert result["status"] == single["status"] == "waiting_hitl"
+
+    def test_unknown_node_type_fails_its_items(self, client):
+        items = [self.batch_item(0, "no_such_node"), self.batch_item(1, "fraud_detector")]
+        results = client.post("/api/v1/workflows/ai/execute-node/batch", json={"items": items}).json()["results"]
+        assert [r["status"] for r in results] == ["failed", "completed"]
+
+
+class TestNodeResultMemoization:
+    """Test memoized cacheable nodes and idempotent duplicate deliveries."""
+
+    def test_cacheable_node_runs_once_per_config_and_input(self, client, counting_handler):
+        calls = counting_handler("test_reasoner", cacheable=True)
+        url = "/api/v1/workflows/ai/execute-node"
+
+        first = client.post(url, json=node_request("test_reasoner", {"a": 1, "b": 2}, question="q1")).json()
+        # Same config with keys in another order: same canonical hash
+        second = client.post(url, json=node_request("test_reasoner", {"b": 2, "a": 1}, question="q1")).json()
+        other = client.post(url, json=node_request("test_reasoner", {"a": 1, "b": 2}, question="q2")).json()
+
+        assert len(calls) == 2
+        assert second["output_data"] == first["output_data"]
+        assert second["ai_metrics"]["cached"] is True and "cached" not in first["ai_metrics"]
+        assert other["output_data"]["answer"] == "q2"
+
+        stats = client.get("/api/v1/workflows/ai/node-cache/stats").json()
+        assert stats["results"]["hits"] == 1 and stats["results"]["misses"] == 2
+        assert stats["cacheable_node_types"]["test_reasoner"] == "1"
+
+    def test_handler_version_is_part_of_the_key(self, client, counting_handler):
+        calls = counting_handler("test_reasoner", cacheable=True)
+        client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_reasoner", question="q"))
+        counting_handler("test_reasoner", cacheable=True, version="2")
+        client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_reasoner", question="q"))
+        assert len(calls) == 2
+
+    def test_concurrent_identical_nodes_share_one_call(self, client, counting_handler):
+        """Independent subgraph branches with the same config and input run the handler once."""
+        calls = counting_handler("test_reasoner", cacheable=True)
+        body = client.post(
+            "/api/v1/workflows/ai/execute-subgraph",
+            json=subgraph_request(
+                [("a", "test_reasoner"), ("b", "test_reasoner")],
+                [],
+                input_data={"question": "q"},
+            ),
+        ).json()
+        assert len(calls) == 1
+        assert {r["node_id"] for r in body["results"]} == {"a", "b"}
+
+    def test_non_cacheable_and_failed_results_are_not_memoized(self, client, counting_handler):
+        calls = counting_handler("test_lookup")
+        counting_handler("test_flaky", cacheable=True)
+        for _ in range(2):
+            client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_lookup", question="q"))
+            client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_flaky", fail=True))
+        assert len(calls) == 4
+
+    def test_idempotency_key_replays_duplicate_delivery(self, client, counting_handler):
+        calls = counting_handler("test_lookup")
+        url = "/api/v1/workflows/ai/execute-node"
+        headers = {"Idempotency-Key": "exec-001:node-001:1"}
+
+        first = client.post(url, json=node_request("test_lookup", question="q"), headers=headers)
+        duplicate = client.post(url, json=node_request("test_lookup", question="q"), headers=headers)
+        assert len(calls) == 1
+        assert duplicate.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+        assert duplicate.json() == first.json()
+
+        conflict = client.post(url, json=node_request("test_lookup", question="other"), headers=headers)
+        assert conflict.status_code == 409
+
+    def test_batch_items_replay_by_idempotency_key(self, client, counting_handler):
+        calls = counting_handler("test_lookup")
+        item = {**node_request("test_lookup", question="q"), "idempotency_key": "delivery-1"}
+        url = "/api/v1/workflows/ai/execute-node/batch"
+        client.post(url, json={"items": [item]})
+        results = client.post(url, json={"items": [item, {**item, "input_data": {"question": "x"}}]}).json()["results"]
+        assert len(calls) == 1
+        assert results[0]["output_data"]["answer"] == "q"
+        assert results[1]["status"] == "failed" and "different request" in results[1]["output_data"]["error"]
+
+    def test_batch_runs_each_idempotency_key_once(self, client, counting_handler):
+        """Items repeating a key within one batch share its execution; a different request with it fails."""
+        calls = counting_handler("test_lookup")
+        item = {**node_request("test_lookup", question="q"), "idempotency_key": "delivery-1"}
+        conflicting = {**item, "input_data": {"question": "x"}}
+        results = client.post(
+            "/api/v1/workflows/ai/execute-node/batch",
+            json={"items": [item, item, conflicting]},
+        ).json()["results"]
+        assert len(calls) == 1
+        assert results[0] == results[1] and results[0]["output_data"]["answer"] == "q"
+        assert results[2]["status"] == "failed" and "different request" in results[2]["output_data"]["error"]
+
+    async def test_batch_and_single_deliveries_share_in_flight_executions(self, counting_handler):
+        """A key running through /execute-node is joined by the batch, and the other way round."""
+        calls = counting_handler("test_lookup")
+        single = {**node_request("test_lookup", question="single"), "idempotency_key": "delivery-1"}
+        batched = {**node_request("test_lookup", question="batched"), "idempotency_key": "delivery-2"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            first = asyncio.create_task(http.post("/api/v1/workflows/ai/execute-node", json=single))
+            await asyncio.sleep(0.01)  # delivery-1 is now running
+            batch = asyncio.create_task(
+                http.post("/api/v1/workflows/ai/execute-node/batch", json={"items": [single, batched]}),
+            )
+            await asyncio.sleep(0.01)  # delivery-2 is now running with the batch
+            second = await http.post("/api/v1/workflows/ai/execute-node", json=batched)
+            first, batch = await first, await batch
+
+        assert sorted(call["question"] for call in calls) == ["batched", "single"]
+        results = batch.json()["results"]
+        assert results[0] == first.json()
+        assert results[1] == second.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+
+    async def test_cancelled_caller_does_not_cancel_joiners(self):
+        """The shared call keeps running for the callers still waiting, and stops once none are left."""
+        cache = SingleFlightCache(max_entries=10, ttl_seconds=60)
+        started, release, runs = asyncio.Event(), asyncio.Event(), []
+
+        async def produce():
+            runs.append(1)
+            started.set()
+            await release.wait()
+            return "value"
+
+        owner = asyncio.create_task(cache.get_or_run("k", produce))
+        await started.wait()
+        joiner = asyncio.create_task(cache.get_or_run("k", produce))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.wait([owner])
+        release.set()
+        assert await joiner == ("value", True)
+        assert owner.cancelled() and len(runs) == 1
+        assert cache.get("k") == "value"
+
+        release.clear()
+        abandoned = asyncio.create_task(cache.get_or_run("other", produce))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        await asyncio.wait([abandoned])
+        await asyncio.sleep(0)
+        assert cache._inflight.running("other") is None  # Last caller gone: the call was cancelled
+
+    def test_ttl_cache_expires_and_evicts_least_recently_used(self):
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "b" is now least recently used
+        cache.set("c", 3)
+        assert cache.get("b") is None and cache.get("a") == 1 and cache.stats.evictions == 1
+
+        expired = TTLCache(max_entries=2, ttl_seconds=0)
+        expired.set("a", 1)
+        assert expired.get("a") is None and expired.stats.expirations == 1
+
+
+class TestNodeScheduler:
+    """Test per-node-type concurrency limits, priorities, timeouts and admission control."""
+
+    def scheduler(self, max_concurrency: int = 4, **limits) -> NodeScheduler:
+        defaults = {"max_concurrency": 2, "timeout_seconds": 5.0, "queue_limit": 10, **limits}
+        return NodeScheduler(max_concurrency, NodeTypeLimits(**defaults))
+
+    async def test_node_type_limit_does_not_starve_other_types(self):
+        scheduler = self.scheduler()
+        release = asyncio.Event()
+        started = []
+
+        async def call(name: str):
+            started.append(name)
+            await release.wait()
+
+        burst = [
+            asyncio.create_task(scheduler.run("gemini_analyzer", lambda i=i: call(f"gemini-{i}"))) for i in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        eligibility = asyncio.create_task(scheduler.run("eligibility_check", lambda: call("eligibility")))
+        await asyncio.sleep(0.01)
+
+        assert started == ["gemini-0", "gemini-1", "eligibility"]
+        stats = scheduler.to_dict()["node_types"]["gemini_analyzer"]
+        assert stats["running"] == 2 and stats["queued"] == 3
+        release.set()
+        await asyncio.gather(*burst, eligibility)
+        assert scheduler.running == 0 and scheduler.to_dict()["queued"] == 0
+
+    async def test_waiters_start_in_priority_order(self):
+        scheduler = self.scheduler(max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+
+        async def call(name: str):
+            order.append(name)
+            if name == "first":
+                await release.wait()
+
+        tasks = [asyncio.create_task(scheduler.run("llm_decision", lambda: call("first")))]
+        await asyncio.sleep(0)
+        for name, priority in (("bulk", "bulk"), ("standard", None), ("interactive", "interactive")):
+            tasks.append(asyncio.create_task(scheduler.run("llm_decision", lambda name=name: call(name), priority)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == ["first", "interactive", "standard", "bulk"]
+
+    async def test_full_queue_fails_fast_with_retry_after(self):
+        scheduler = self.scheduler(max_concurrency=1, queue_limit=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.run("fraud_detector", release.wait))
+        queued = asyncio.create_task(scheduler.run("fraud_detector", release.wait))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(SchedulerBusy) as rejected:
+            await scheduler.run("fraud_detector", release.wait)
+        assert rejected.value.retry_after >= 1
+        # Callers that bound their own concurrency can still wait
+        waiting = asyncio.create_task(scheduler.run("fraud_detector", release.wait, reject_when_full=False))
+        await asyncio.sleep(0.01)
+        assert scheduler.to_dict()["node_types"]["fraud_detector"]["queued"] == 2
+
+        release.set()
+        await asyncio.gather(running, queued, waiting)
+        stats = scheduler.to_dict()["node_types"]["fraud_detector"]
+        assert stats["rejected"] == 1 and stats["admitted"] == 3 and stats["wait_ms"]["max"] > 0
+
+    async def test_handler_timeout(self):
+        scheduler = self.scheduler(timeout_seconds=0.05)
+        with pytest.raises(NodeTimeoutError):
+            await scheduler.run("clinical_reasoner", lambda: asyncio.sleep(1))
+        assert scheduler.to_dict()["node_types"]["clinical_reasoner"]["timeouts"] == 1
+        assert scheduler.running == 0
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = self.scheduler(max_concurrency=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.run("llm_decision", release.wait))
+        waiter = asyncio.create_task(scheduler.run("llm_decision", release.wait))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.to_dict()["queued"] == 0
+        release.set()
+        await running
+        assert scheduler.running == 0
+
+    async def test_execute_node_returns_429_when_queue_full(self, counting_handler):
+        counting_handler("test_saturated")
+        node_scheduler.configure("test_saturated", max_concurrency=1, queue_limit=0)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(
+                *(
+                    http.post("/api/v1/workflows/ai/execute-node", json=node_request("test_saturated", question=str(i)))
+                    for i in range(2)
+                )
+            )
+            stats = (await http.get("/api/v1/workflows/ai/scheduler/stats")).json()
+
+        assert sorted(r.status_code for r in responses) == [200, 429]
+        rejected = next(r for r in responses if r.status_code == 429)
+        assert int(rejected.headers["Retry-After"]) >= 1
+        assert stats["node_types"]["test_saturated"]["rejected"] == 1
+
+    def test_timed_out_node_fails(self, client, monkeypatch):
+        async def hang(config: dict, input_data: dict) -> dict:
+            await asyncio.sleep(1)
+
+        monkeypatch.setitem(workflows.NODE_HANDLERS, "test_hang", hang)
+        node_scheduler.configure("test_hang", timeout_seconds=0.05)
+        result = client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_hang")).json()
+        assert result["status"] == "failed" and "timed out" in result["output_data"]["error"]
+
+
+def sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestNodeProgressStreaming:
+    """Test server-sent progress events from workflow nodes."""
+
+    def test_streams_tokens_then_unchanged_result(self, client):
+        request = node_request("llm_decision", {"prompt": "Should this claim be approved?"}, claim_amount=500)
+        response = client.post("/api/v1/workflows/ai/execute-node/stream", json=request)
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = sse_events(response.text)
+
+        kinds = [kind for kind, _ in events]
+        assert kinds[0] == "status" and kinds[-1] == "result"
+        assert kinds.index("progress") < kinds.index("token")
+        result = events[-1][1]
+        streamed = "".join(data["text"] for kind, data in events if kind == "token")
+        assert streamed == result["output_data"]["reasoning"]
+
+        single = client.post("/api/v1/workflows/ai/execute-node", json=request).json()
+        assert result.pop("event") == "result" and result.keys() == single.keys()
+        assert result["output_data"] == single["output_data"] and result["status"] == single["status"]
+
+    def test_plain_handlers_can_emit_progress(self, client, monkeypatch):
+        async def chunked(config: dict, input_data: dict) -> dict:
+            for page in range(1, 3):
+                workflows.emit_node_event("progress", {"stage": "page", "fraction": page / 2})
+            return {"pages": 2}
+
+        monkeypatch.setitem(workflows.NODE_HANDLERS, "test_pages", chunked)
+        events = sse_events(
+            client.post("/api/v1/workflows/ai/execute-node/stream", json=node_request("test_pages")).text
+        )
+        assert [kind for kind, _ in events] == ["status", "progress", "progress", "result"]
+        assert events[-1][1]["output_data"] == {"pages": 2}
+
+    def test_rejection_is_an_error_event(self, client, counting_handler, monkeypatch):
+        counting_handler("test_lookup")
+
+        async def busy(*args, **kwargs):
+            raise SchedulerBusy("test_lookup", 3)
+
+        monkeypatch.setattr(workflows.node_scheduler, "run", busy)
+        events = sse_events(
+            client.post("/api/v1/workflows/ai/execute-node/stream", json=node_request("test_lookup")).text
+        )
+        assert events == [
+            (
+                "error",
+                {
+                    "event": "error",
+                    "status": 429,
+                    "message": "test_lookup queue is full, retry after 3s",
+                    "retry_after": 3,
+                },
+            )
+        ]
+
+    def test_streaming_handler_without_output_fails(self, client):
+        @workflows.register_node_handler("test_no_output")
+        async def no_output(config: dict, input_data: dict):
+            yield "token", "partial"
+
+        result = client.post("/api/v1/workflows/ai/execute-node", json=node_request("test_no_output")).json()
+        assert result["status"] == "failed" and "without an output" in result["output_data"]["error"]
+        assert "test_no_output" in workflows.STREAMING_NODE_HANDLERS